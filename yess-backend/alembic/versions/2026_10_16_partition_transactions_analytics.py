@@ -0,0 +1,182 @@
+"""Monthly range partitions for transactions and analytics_events
+
+Revision ID: partition_monthly
+Revises: add_stories
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.partitioning import (
+    PARTITIONED_TABLES,
+    add_months,
+    create_default_partition_sql,
+    create_partition_sql,
+    is_partitioned,
+    month_start,
+)
+from app.core.config import settings
+
+# revision identifiers, used by Alembic.
+revision = 'partition_monthly'
+down_revision = 'add_stories'
+branch_labels = None
+depends_on = None
+
+SPECS = {spec.table: spec for spec in PARTITIONED_TABLES}
+
+# Индексы объявляются на родительской таблице и создаются в каждой секции
+INDEXES = {
+    'transactions': [
+        ('idx_transaction_user_status', ['user_id', 'status', 'created_at']),
+        ('idx_transaction_type_status', ['type', 'status', 'created_at']),
+        ('idx_transaction_date_range', ['created_at', 'status']),
+        ('idx_transaction_partner', ['partner_id', 'created_at']),
+        # Одностолбцовые индексы из index=True модели app.models.transaction
+        ('ix_transactions_id', ['id']),
+        ('ix_transactions_user_id', ['user_id']),
+        ('ix_transactions_partner_id', ['partner_id']),
+        ('ix_transactions_order_id', ['order_id']),
+        ('ix_transactions_type', ['type']),
+        ('ix_transactions_status', ['status']),
+        ('ix_transactions_created_at', ['created_at']),
+    ],
+    'analytics_events': [
+        ('idx_analytics_events_user_ts', ['user_id', 'timestamp']),
+        ('idx_analytics_events_ts_type', ['timestamp', 'event_type']),
+    ],
+}
+
+# Внешние ключи на transactions(id) невозможны: первичный ключ секционированной таблицы
+# обязан включать ключ секционирования, поэтому он (id, created_at)
+TRANSACTION_REFERENCES = [('orders', 'transaction_id'), ('refunds', 'transaction_id')]
+
+
+def _columns(bind, table):
+    return {column['name'] for column in sa.inspect(bind).get_columns(table)}
+
+
+def _create_partitions(bind, table, first):
+    spec = SPECS[table]
+    month = month_start(first)
+    last = add_months(month_start(datetime.utcnow()), settings.DB_PARTITION_PREMAKE_MONTHS)
+    while month <= last:
+        op.execute(create_partition_sql(spec, month))
+        month = add_months(month, 1)
+    op.execute(create_default_partition_sql(spec))
+
+
+def _create_indexes(bind, table):
+    columns = _columns(bind, table)
+    for name, index_columns in INDEXES[table]:
+        # Таблицы старых установок могут не иметь поздно добавленных столбцов
+        if set(index_columns) <= columns:
+            op.create_index(name, table, index_columns)
+
+
+def _partition_transactions(bind):
+    if is_partitioned(bind, 'transactions'):
+        return
+    references = bind.execute(sa.text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = 'transactions'::regclass"
+    )).fetchall()
+    for table, constraint in references:
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}"')
+
+    op.execute("UPDATE transactions SET created_at = COALESCE(processed_at, now()) WHERE created_at IS NULL")
+    op.execute("ALTER TABLE transactions RENAME TO transactions_legacy")
+    op.execute("ALTER SEQUENCE IF EXISTS transactions_id_seq OWNED BY NONE")
+    for name, _ in INDEXES['transactions']:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(
+        "CREATE TABLE transactions (LIKE transactions_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE transactions ALTER COLUMN created_at SET DEFAULT now(), ALTER COLUMN created_at SET NOT NULL")
+    op.execute("ALTER TABLE transactions ADD PRIMARY KEY (id, created_at)")
+
+    first = bind.execute(sa.text("SELECT min(created_at) FROM transactions_legacy")).scalar()
+    _create_partitions(bind, 'transactions', first or datetime.utcnow())
+    op.execute("INSERT INTO transactions SELECT * FROM transactions_legacy")
+    op.execute("DROP TABLE transactions_legacy")
+    op.execute("ALTER SEQUENCE IF EXISTS transactions_id_seq OWNED BY transactions.id")
+    _create_indexes(bind, 'transactions')
+
+
+def _partition_analytics_events(bind):
+    if is_partitioned(bind, 'analytics_events'):
+        return
+    exists = sa.inspect(bind).has_table('analytics_events')
+    if exists:
+        op.execute("ALTER TABLE analytics_events RENAME TO analytics_events_legacy")
+        for name, _ in INDEXES['analytics_events']:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("""
+        CREATE TABLE analytics_events (
+            id VARCHAR(64) NOT NULL,
+            user_id INTEGER,
+            event_type VARCHAR(50) NOT NULL,
+            event_name VARCHAR(255) NOT NULL,
+            properties JSONB,
+            timestamp DOUBLE PRECISION NOT NULL,
+            session_id VARCHAR(255),
+            platform VARCHAR(50),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    first = datetime.utcnow()
+    if exists:
+        oldest = bind.execute(sa.text("SELECT min(timestamp) FROM analytics_events_legacy")).scalar()
+        if oldest is not None:
+            first = datetime.fromtimestamp(float(oldest), tz=timezone.utc)
+    _create_partitions(bind, 'analytics_events', first)
+    if exists:
+        op.execute("""
+            INSERT INTO analytics_events (id, user_id, event_type, event_name, properties, timestamp, session_id, platform)
+            SELECT id, user_id, event_type, event_name, properties::jsonb, timestamp, session_id, platform
+            FROM analytics_events_legacy
+        """)
+        op.execute("DROP TABLE analytics_events_legacy")
+    _create_indexes(bind, 'analytics_events')
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # Декларативное секционирование есть только в PostgreSQL
+        return
+    _partition_transactions(bind)
+    _partition_analytics_events(bind)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    # Секционированные таблицы → обычные (данные архивных секций не возвращаются)
+    op.execute("ALTER TABLE transactions RENAME TO transactions_partitioned")
+    op.execute("ALTER SEQUENCE IF EXISTS transactions_id_seq OWNED BY NONE")
+    for name, _ in INDEXES['transactions']:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute(
+        "CREATE TABLE transactions (LIKE transactions_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    op.execute("INSERT INTO transactions SELECT * FROM transactions_partitioned")
+    op.execute("DROP TABLE transactions_partitioned CASCADE")
+    op.execute("ALTER TABLE transactions ADD PRIMARY KEY (id)")
+    op.execute("ALTER SEQUENCE IF EXISTS transactions_id_seq OWNED BY transactions.id")
+    _create_indexes(bind, 'transactions')
+    for table, column in TRANSACTION_REFERENCES:
+        if sa.inspect(bind).has_table(table) and column in _columns(bind, table):
+            op.create_foreign_key(f'{table}_{column}_fkey', table, 'transactions', [column], ['id'])
+
+    op.execute("ALTER TABLE analytics_events RENAME TO analytics_events_partitioned")
+    op.execute("CREATE TABLE analytics_events (LIKE analytics_events_partitioned INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO analytics_events SELECT * FROM analytics_events_partitioned")
+    op.execute("DROP TABLE analytics_events_partitioned CASCADE")
+    op.execute("ALTER TABLE analytics_events ADD PRIMARY KEY (id)")
+    _create_indexes(bind, 'analytics_events')
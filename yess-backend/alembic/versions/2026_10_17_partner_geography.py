@@ -0,0 +1,71 @@
+"""Index-friendly radius search on partners: lat/lon index, PostGIS geography or earthdistance
+
+Revision ID: partner_geography
+Revises: partition_monthly
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'partner_geography'
+down_revision = 'partition_monthly'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# Точка вычисляется из latitude/longitude самой БД: приложение пишет только координаты
+GEOGRAPHY_COLUMN = """
+    ALTER TABLE partners ADD COLUMN IF NOT EXISTS geog geography(Point, 4326)
+    GENERATED ALWAYS AS (
+        CASE WHEN latitude IS NOT NULL AND longitude IS NOT NULL
+             THEN ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography END
+    ) STORED
+"""
+
+
+def _create_extension(bind, *names):
+    """CREATE EXTENSION, если пакет установлен и прав хватает; иначе False"""
+    available = {row[0] for row in bind.execute(sa.text("SELECT name FROM pg_available_extensions"))}
+    if not set(names) <= available:
+        return False
+    try:
+        # Отказ (нет прав) не должен обрывать транзакцию миграции
+        with bind.begin_nested():
+            for name in names:
+                op.execute(f"CREATE EXTENSION IF NOT EXISTS {name}")
+    except sa.exc.DBAPIError as e:
+        logger.warning(f"Extension {', '.join(names)} unavailable: {e}")
+        return False
+    return True
+
+
+def upgrade():
+    # Прямоугольник вокруг точки: idx_partner_location начинается с city_id и без города не подходит
+    op.create_index('idx_partner_lat_lon', 'partners', ['latitude', 'longitude'], if_not_exists=True)
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    # Выбранное здесь app.services.geo_search находит само (столбец geog / индекс idx_partner_earth)
+    if _create_extension(bind, 'postgis'):
+        op.execute(GEOGRAPHY_COLUMN)
+        op.execute("CREATE INDEX IF NOT EXISTS idx_partner_geog ON partners USING GIST (geog)")
+    elif _create_extension(bind, 'cube', 'earthdistance'):
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS idx_partner_earth ON partners USING GIST (ll_to_earth(latitude, longitude))"
+        )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        # Расширения не удаляются: ими могут пользоваться другие объекты
+        op.execute("DROP INDEX IF EXISTS idx_partner_earth")
+        op.execute("DROP INDEX IF EXISTS idx_partner_geog")
+        op.execute("ALTER TABLE partners DROP COLUMN IF EXISTS geog")
+    op.drop_index('idx_partner_lat_lon', table_name='partners', if_exists=True)
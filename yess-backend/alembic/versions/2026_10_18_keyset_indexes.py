@@ -0,0 +1,51 @@
+"""NOT NULL sort keys and matching indexes for keyset pagination of orders, products and wallet history
+
+Revision ID: keyset_indexes
+Revises: partner_geography
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'keyset_indexes'
+down_revision = 'partner_geography'
+branch_labels = None
+depends_on = None
+
+# Фильтр списка + ключ сортировки (app.core.pagination.Keyset): ORDER BY и курсор идут по индексу
+INDEXES = [
+    ('idx_order_user_created', 'orders', ['user_id', 'created_at', 'id']),
+    ('idx_product_partner_sort', 'partner_products', ['partner_id', 'sort_order', 'name', 'id']),
+    # История кошелька без фильтра по status: idx_transaction_user_status порядок не дает
+    ('idx_transaction_user_created', 'transactions', ['user_id', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    # COALESCE в ORDER BY не дает использовать индекс, поэтому NULL убираются из данных
+    op.execute(
+        "UPDATE orders SET created_at = COALESCE(paid_at, completed_at, cancelled_at, '1970-01-01 00:00:00') "
+        "WHERE created_at IS NULL"
+    )
+    op.execute("UPDATE partner_products SET sort_order = 0 WHERE sort_order IS NULL")
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=False)
+    with op.batch_alter_table('partner_products') as batch_op:
+        batch_op.alter_column(
+            'sort_order', existing_type=sa.Integer(), nullable=False, server_default=sa.text('0')
+        )
+
+    # На секционированной transactions индекс родителя создается в каждой секции
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
+    with op.batch_alter_table('partner_products') as batch_op:
+        batch_op.alter_column('sort_order', existing_type=sa.Integer(), nullable=True, server_default=None)
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.alter_column('created_at', existing_type=sa.DateTime(), nullable=True)
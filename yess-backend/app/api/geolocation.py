@@ -29,7 +29,7 @@ async def find_nearby_partners(
     - Сортировка по расстоянию
     """
     try:
-        nearby_partners = GeolocationService.find_nearby_partners(
+        nearby_partners = await GeolocationService.find_nearby_partners(
             db=db, 
             request=request
         )
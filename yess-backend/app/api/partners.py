@@ -4,10 +4,13 @@ from typing import List, Optional
 from sqlalchemy import or_
 
 from app.core.database import get_db
+from app.core.exceptions import ValidationException
+from app.core.pagination import Keyset, PageParams, paginate
 from app.services.geolocation_service import GeolocationService
 from app.schemas.partner import (
     PartnerRecommendation, 
     PartnerSearchRequest,
+    PartnerSortRequest,
     PartnerFilterRequest,
     NearbyPartnerRequest
 )
@@ -15,9 +18,24 @@ from app.services.recommendation_service import RecommendationService
 from app.services.auth_service import get_current_user
 from app.models.user import User
 from app.models.partner import Partner
+from app.schemas.pagination import CursorPage
 
 router = APIRouter(prefix="/partners", tags=["Partners"])
 
+_SEARCH_SORT_COLUMNS = {"cashback": Partner.default_cashback_rate, "name": Partner.name}
+# Партнёр без ставки кэшбэка сортируется как с нулевой
+_SEARCH_SORT_NULLS = {"default_cashback_rate": 0.0}
+
+
+def _search_keyset(sort: Optional[PartnerSortRequest]) -> Keyset:
+    """Порядок выдачи поиска; без сортировки или с неподдерживаемой (distance) — по id"""
+    column = _SEARCH_SORT_COLUMNS.get(sort.sort_by) if sort else None
+    descending = bool(sort) and sort.sort_order == "desc"
+    if column is None:
+        return Keyset(Partner.id, descending=descending)
+    return Keyset(column, Partner.id, descending=descending, nulls=_SEARCH_SORT_NULLS)
+
+
 @router.get("/recommendations", response_model=List[PartnerRecommendation])
 async def get_personalized_partners(
     limit: int = 10,
@@ -76,7 +94,7 @@ async def get_partner_categories(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/search", response_model=List[PartnerRecommendation])
+@router.post("/search", response_model=CursorPage[PartnerRecommendation])
 async def search_partners(
     search_request: PartnerSearchRequest,
     current_user: Optional[User] = Depends(get_current_user),
@@ -89,7 +107,7 @@ async def search_partners(
     - Текстовый поиск
     - Фильтрация по категориям, кешбэку и другим параметрам
     - Сортировка результатов
-    - Постраничная навигация
+    - Постраничная навигация по курсору (next_cursor → cursor)
     """
     try:
         # Базовый запрос на поиск
@@ -123,28 +141,12 @@ async def search_partners(
                     Partner.is_verified == filter_req.is_verified
                 )
         
-        # Сортировка
-        if search_request.sort:
-            sort_field = search_request.sort.sort_by
-            sort_order = search_request.sort.sort_order
-            
-            if sort_field == 'cashback':
-                base_query = base_query.order_by(
-                    Partner.default_cashback_rate.desc() 
-                    if sort_order == 'desc' 
-                    else Partner.default_cashback_rate.asc()
-                )
-            elif sort_field == 'name':
-                base_query = base_query.order_by(
-                    Partner.name.desc() 
-                    if sort_order == 'desc' 
-                    else Partner.name.asc()
-                )
-        
-        # Постраничная навигация
-        partners = base_query.offset(
-            (search_request.page - 1) * search_request.page_size
-        ).limit(search_request.page_size).all()
+        # Сортировка и постраничная навигация по курсору
+        partners, next_cursor = paginate(
+            base_query,
+            _search_keyset(search_request.sort),
+            PageParams(cursor=search_request.cursor, limit=search_request.page_size)
+        )
         
         # Персонализация для авторизованного пользователя
         if current_user:
@@ -170,8 +172,14 @@ async def search_partners(
                 ) for partner in partners
             ]
         
-        return recommendations
+        return CursorPage[PartnerRecommendation](
+            items=recommendations,
+            next_cursor=next_cursor,
+            has_more=next_cursor is not None
+        )
     
+    except ValidationException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -191,7 +199,7 @@ async def find_nearby_partners_with_filter(
     """
     try:
         # Поиск ближайших партнеров с фильтрацией
-        nearby_locations = GeolocationService.find_nearby_partners(
+        nearby_locations = await GeolocationService.find_nearby_partners(
             db=db, 
             request=nearby_request,
             filter_request=filter_request
@@ -5,6 +5,7 @@ from typing import List, Optional
 from datetime import datetime
 
 from app.core.database import get_db
+from app.core.pagination import Keyset, PageParams, estimate_total, page_params, paginate
 from app.models.story import Story, StoryStatus
 from app.models.user import User
 from app.schemas.story import (
@@ -20,6 +21,8 @@ from app.core.exceptions import NotFoundException, ValidationException
 
 router = APIRouter(prefix="/admin/stories", tags=["Admin Stories"])
 
+STORIES_ORDER = Keyset(Story.created_at, Story.id, descending=True)
+
 
 @router.get("", response_model=StoryListResponse)
 async def get_stories(
@@ -27,8 +30,7 @@ async def get_stories(
     partner_id: Optional[int] = Query(None, description="Фильтр по партнеру"),
     city_id: Optional[int] = Query(None, description="Фильтр по городу"),
     is_active: Optional[bool] = Query(None, description="Фильтр по активности"),
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
+    page: PageParams = Depends(page_params),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -49,13 +51,8 @@ async def get_stories(
     if is_active is not None:
         query = query.filter(Story.is_active == is_active)
     
-    # Подсчет общего количества
-    total = query.count()
-    
-    # Пагинация
-    stories = query.order_by(
-        Story.created_at.desc()
-    ).offset((page - 1) * page_size).limit(page_size).all()
+    # Пагинация по курсору
+    stories, next_cursor = paginate(query, STORIES_ORDER, page)
     
     # Формируем ответы
     items = []
@@ -71,9 +68,9 @@ async def get_stories(
     
     return StoryListResponse(
         items=items,
-        total=total,
-        page=page,
-        page_size=page_size
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=estimate_total(db, query) if page.include_total else None
     )
 
 
@@ -106,3 +106,19 @@ try:
     logger.info("✅ Partner locations router loaded")
 except ImportError as e:
     logger.warning(f"partner_locations router not available: {e}")
+
+# Admin Cache router (метрики кэша по пространствам имён)
+try:
+    from app.api.v1 import cache_admin
+    api_router.include_router(cache_admin.router, tags=["Admin Cache"])
+    logger.info("✅ Admin cache router loaded")
+except ImportError as e:
+    logger.warning(f"admin cache router not available: {e}")
+
+# Admin DB router (статистика SQL-запросов по отпечаткам)
+try:
+    from app.api.v1 import db_admin
+    api_router.include_router(db_admin.router, tags=["Admin DB"])
+    logger.info("✅ Admin DB router loaded")
+except ImportError as e:
+    logger.warning(f"admin DB router not available: {e}")
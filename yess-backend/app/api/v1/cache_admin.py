@@ -0,0 +1,35 @@
+"""Admin API: наблюдаемость кэша (трафик и память по пространствам имён)"""
+from fastapi import APIRouter, Depends, Query
+
+from app.core.cache import redis_cache
+from app.core.cache_metrics import sample_memory_usage, top_namespaces
+from app.models.user import User
+from app.services.cache_service import cache_service
+from app.services.dependencies import get_current_admin
+
+router = APIRouter(prefix="/admin/cache", tags=["Admin Cache"])
+
+
+@router.get("/namespaces")
+async def get_cache_namespaces(
+    limit: int = Query(20, ge=1, le=200, description="Сколько пространств имён вернуть"),
+    sort_by: str = Query("traffic", pattern="^(traffic|bytes)$", description="traffic | bytes"),
+    sample: int = Query(1000, ge=10, le=10000, description="Ключей в выборке MEMORY USAGE"),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Топ пространств имён кэша
+    - traffic: попадания/промахи/ошибки/байты этого воркера с момента старта
+    - memory: оценка памяти в Redis по выборке ключей (MEMORY USAGE), для выбора TTL и размера Redis
+    """
+    memory = {"sampled_keys": 0, "total_keys": 0, "namespaces": []}
+    if await redis_cache.ping():
+        memory = await sample_memory_usage(redis_cache.redis, sample)
+        memory["namespaces"] = memory["namespaces"][:limit]
+
+    return {
+        "traffic": top_namespaces(limit, sort_by),
+        "memory": memory,
+        "pool": cache_service.get_pool_stats(),
+        "tiers": redis_cache.get_stats()
+    }
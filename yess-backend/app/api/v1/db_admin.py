@@ -0,0 +1,45 @@
+"""Admin API: статистика SQL-запросов по отпечаткам и планы медленных запросов"""
+from fastapi import APIRouter, Depends, Query
+
+from app.core.database import get_engine_stats
+from app.core.query_plans import plan_capture
+from app.core.query_stats import SORT_KEYS, query_stats
+from app.models.user import User
+from app.services.dependencies import get_current_admin
+
+router = APIRouter(prefix="/admin/db", tags=["Admin DB"])
+
+
+@router.get("/statements")
+async def get_statement_stats(
+    limit: int = Query(20, ge=1, le=500, description="Сколько отпечатков вернуть"),
+    sort_by: str = Query("total", pattern=f"^({'|'.join(SORT_KEYS)})$", description=" | ".join(SORT_KEYS)),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Самые дорогие запросы этого воркера с момента старта (или сброса)
+    - total: суммарное время — главный кандидат на оптимизацию
+    - mean / p95 / max: время одного вызова (сек), rows: строк всего
+    """
+    return {
+        "summary": query_stats.summary(),
+        "statements": query_stats.top(limit, sort_by),
+        "pool": get_engine_stats()
+    }
+
+
+@router.post("/statements/reset")
+async def reset_statement_stats(current_user: User = Depends(get_current_admin)):
+    """Сброс статистики (например, перед нагрузочным тестом)"""
+    query_stats.reset()
+    return {"success": True}
+
+
+@router.get("/plans")
+async def get_slow_query_plans(
+    limit: int = Query(20, ge=1, le=100, description="Сколько последних планов вернуть"),
+    flagged_only: bool = Query(False, description="Только планы с Seq Scan по отслеживаемым таблицам"),
+    current_user: User = Depends(get_current_admin)
+):
+    """EXPLAIN (FORMAT JSON) медленных запросов этого воркера, новые первыми"""
+    return {"plans": plan_capture.recent(limit, flagged_only)}
@@ -15,13 +15,17 @@ import logging
 from enum import Enum
 
 from app.core.database import get_db
+from app.core.pagination import Keyset, PageParams, estimate_total, page_params, paginate
 from app.models.user import User
 from app.models.notification import Notification, NotificationTemplate
 from app.core.config import settings
+from app.schemas.pagination import CursorPage
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/v1/notifications", tags=["notifications"])
 
+NOTIFICATIONS_ORDER = Keyset(Notification.created_at, Notification.id, descending=True)
+
 class NotificationType(str, Enum):
     PUSH = "push"
     SMS = "sms"
@@ -64,13 +68,8 @@ class NotificationResponse(BaseModel):
     sent_at: Optional[datetime]
     read_at: Optional[datetime]
 
-class NotificationListResponse(BaseModel):
-    notifications: List[NotificationResponse]
-    total: int
-    page: int
-    per_page: int
-    has_next: bool
-    has_prev: bool
+class NotificationListResponse(CursorPage[NotificationResponse]):
+    pass
 
 class NotificationTemplateCreate(BaseModel):
     name: str
@@ -394,8 +393,7 @@ async def send_bulk_notification(
 @router.get("/user/{user_id}", response_model=NotificationListResponse)
 async def get_user_notifications(
     user_id: int,
-    page: int = 1,
-    per_page: int = 20,
+    page: PageParams = Depends(page_params),
     notification_type: Optional[NotificationType] = None,
     status: Optional[NotificationStatus] = None,
     db: Session = Depends(get_db)
@@ -410,20 +408,14 @@ async def get_user_notifications(
     if status:
         query = query.filter(Notification.status == status)
     
-    # Подсчет общего количества
-    total = query.count()
-    
-    # Пагинация
-    offset = (page - 1) * per_page
-    notifications = query.order_by(desc(Notification.created_at)).offset(offset).limit(per_page).all()
+    # Пагинация по курсору
+    notifications, next_cursor = paginate(query, NOTIFICATIONS_ORDER, page)
     
     return NotificationListResponse(
-        notifications=[NotificationResponse.from_orm(n) for n in notifications],
-        total=total,
-        page=page,
-        per_page=per_page,
-        has_next=offset + per_page < total,
-        has_prev=page > 1
+        items=[NotificationResponse.from_orm(n) for n in notifications],
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=estimate_total(db, query) if page.include_total else None
     )
 
 @router.patch("/{notification_id}/read")
@@ -1,35 +1,40 @@
 """API endpoints for orders"""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
+from app.core.pagination import Keyset, PageParams, estimate_total, page_params, paginate
 from app.models.order import Order
 from app.models.user import User
 from app.schemas.order import (
     OrderCreateRequest,
     OrderResponse,
+    OrderListResponse,
     OrderCalculateRequest,
     OrderCalculateResponse,
     OrderConfirmRequest,
     OrderConfirmResponse
 )
-from app.services.dependencies import get_current_user
+from app.services.dependencies import get_current_user, get_current_user_async
 from app.services.order_service import OrderService
 from app.core.exceptions import NotFoundException, ValidationException
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+# Порядок совпадает с хвостом idx_order_user_created (user_id, created_at, id)
+ORDERS_ORDER = Keyset(Order.created_at, Order.id, descending=True)
+
 
 @router.post("/calculate", response_model=OrderCalculateResponse)
 async def calculate_order(
     request: OrderCalculateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Рассчитать стоимость заказа"""
     try:
-        calculation = OrderService.calculate_order(
+        calculation = await OrderService.acalculate_order(
             db=db,
             partner_id=request.partner_id,
             items=request.items,
@@ -101,16 +106,20 @@ async def get_order(
     return OrderResponse.model_validate(order)
 
 
-@router.get("", response_model=List[OrderResponse])
+@router.get("", response_model=OrderListResponse)
 async def get_user_orders(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    limit: int = 20
+    page: PageParams = Depends(page_params)
 ):
-    """Получить список заказов пользователя"""
-    orders = db.query(Order).filter(
-        Order.user_id == current_user.id
-    ).order_by(Order.created_at.desc()).limit(limit).all()
+    """Получить список заказов пользователя (новые первыми, по курсору)"""
+    query = db.query(Order).filter(Order.user_id == current_user.id)
+    orders, next_cursor = paginate(query.options(selectinload(Order.items)), ORDERS_ORDER, page)
     
-    return [OrderResponse.model_validate(order) for order in orders]
+    return OrderListResponse(
+        items=[OrderResponse.model_validate(order) for order in orders],
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=estimate_total(db, query) if page.include_total else None
+    )
 
@@ -2,44 +2,50 @@
 Partner endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from app.core.database import get_db
+from sqlalchemy import and_, select
+from app.core.coalescing import CoalescedRoute, coalesce
+from app.core.database import get_async_read_db, get_db
+from app.core.http_cache import conditional_get
 from app.models.partner import Partner, PartnerLocation
-from app.schemas.partner import PartnerResponse, PartnerLocationResponse
+from app.schemas.partner import PartnerCategoryResponse, PartnerResponse, PartnerLocationResponse
+from app.services.spatial_index import locations_within
 from typing import List, Optional
 
-router = APIRouter()
+# Каталог одинаков для всех: одинаковые анонимные GET выполняются один раз (app.core.coalescing)
+router = APIRouter(route_class=CoalescedRoute)
 
 
-@router.get("/list", response_model=List[PartnerResponse])
+@router.get(
+    "/list",
+    response_model=List[PartnerResponse],
+    dependencies=[conditional_get("partners", cache_control="public, max-age=60")]
+)
+@coalesce(ttl=1.0)
 async def get_partners(
     category: Optional[str] = None,
     active: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get list of partners"""
-    query = db.query(Partner)
+    query = select(Partner)
     
     if active:
-        query = query.filter(Partner.is_active == True)
+        query = query.where(Partner.is_active == True)
     if category:
-        query = query.filter(Partner.category == category)
+        query = query.where(Partner.category == category)
     
-    partners = query.all()
+    partners = (await db.scalars(query)).all()
     return partners
 
 
-@router.get("/{partner_id}", response_model=PartnerResponse)
-async def get_partner(partner_id: int, db: Session = Depends(get_db)):
-    """Get partner details"""
-    partner = db.query(Partner).filter(Partner.id == partner_id).first()
-    if not partner:
-        raise HTTPException(status_code=404, detail="Partner not found")
-    return partner
-
-
-@router.get("/locations", response_model=List[PartnerLocationResponse])
+@router.get(
+    "/locations",
+    response_model=List[PartnerLocationResponse],
+    dependencies=[conditional_get("partners", cache_control="public, max-age=60")]
+)
+@coalesce(ttl=1.0)
 async def get_partner_locations(
     partner_id: Optional[int] = None,
     latitude: Optional[float] = None,
@@ -48,37 +54,53 @@ async def get_partner_locations(
     db: Session = Depends(get_db)
 ):
     """Get partner locations for map"""
-    query = db.query(PartnerLocation).join(Partner).filter(PartnerLocation.is_active == True)
+    # Партнёр — из того же JOIN, а не отдельным запросом на каждую точку
+    # Строки SELECT уже с полями ответа: без ORM-объектов, ответ валидируется один раз
+    query = db.query(
+        PartnerLocation.id,
+        PartnerLocation.partner_id,
+        Partner.name.label("partner_name"),
+        PartnerLocation.address,
+        PartnerLocation.latitude,
+        PartnerLocation.longitude,
+        PartnerLocation.phone_number,
+        PartnerLocation.working_hours,
+        Partner.max_discount_percent
+    ).select_from(PartnerLocation).join(Partner).filter(PartnerLocation.is_active == True)
     
     if partner_id:
         query = query.filter(PartnerLocation.partner_id == partner_id)
     
-    # TODO: Add geographic filtering by radius
-    # For now, return all active locations
-    
-    locations = query.all()
-    
-    # Build response with partner info
-    result = []
-    for loc in locations:
-        result.append({
-            "id": loc.id,
-            "partner_id": loc.partner_id,
-            "partner_name": loc.partner.name,
-            "address": loc.address,
-            "latitude": loc.latitude,
-            "longitude": loc.longitude,
-            "phone_number": loc.phone_number,
-            "working_hours": loc.working_hours,
-            "max_discount_percent": loc.partner.max_discount_percent
-        })
-    
-    return result
+    if latitude is None or longitude is None:
+        return query.all()
+
+    # Точки в радиусе — по индексу в памяти, ближние первыми
+    distances = await locations_within(db, latitude, longitude, radius)
+    rows = query.filter(PartnerLocation.id.in_(distances)).all()
+    rows.sort(key=lambda row: distances[row.id])
+    return rows
 
 
-@router.get("/categories")
+@router.get(
+    "/categories",
+    response_model=List[PartnerCategoryResponse],
+    dependencies=[conditional_get("partners", cache_control="public, max-age=3600")]
+)
+@coalesce(ttl=1.0)
 async def get_categories(db: Session = Depends(get_db)):
     """Get list of partner categories"""
-    categories = db.query(Partner.category).distinct().all()
-    return [{"name": cat[0]} for cat in categories if cat[0]]
+    categories = db.query(Partner.category.label("name")).distinct().all()
+    return [category for category in categories if category.name]
 
+
+@router.get(
+    "/{partner_id}",
+    response_model=PartnerResponse,
+    dependencies=[conditional_get("partners", cache_control="public, max-age=60")]
+)
+async def get_partner(partner_id: int, db: Session = Depends(get_db)):
+    """Get partner details"""
+    partner = db.query(Partner).filter(Partner.id == partner_id).first()
+    if not partner:
+        raise HTTPException(status_code=404, detail="Partner not found")
+    return partner
@@ -9,7 +9,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import or_
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.services.dependencies import get_current_user
 from app.models.user import User
 from app.models.partner import Partner, PartnerEmployee
@@ -112,7 +112,7 @@ async def get_current_partner(
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> Any:
     """
     Получить статистику для дашборда партнера
@@ -5,6 +5,8 @@ from typing import List, Optional
 from decimal import Decimal
 
 from app.core.database import get_db
+from app.core.http_cache import conditional_get
+from app.core.pagination import Keyset, PageParams, estimate_total, page_params, paginate
 from app.models.partner_product import PartnerProduct
 from app.models.partner import Partner
 from app.schemas.partner_product import (
@@ -18,14 +20,19 @@ from app.models.user import User
 
 router = APIRouter(prefix="/partners/{partner_id}/products", tags=["Partner Products"])
 
+# Порядок совпадает с хвостом idx_product_partner_sort (partner_id, sort_order, name, id)
+PRODUCTS_ORDER = Keyset(PartnerProduct.sort_order, PartnerProduct.name, PartnerProduct.id)
 
-@router.get("", response_model=PartnerProductListResponse)
+# Товары зависят и от партнёра: отключённый партнёр — 404
+PRODUCTS_CACHE = conditional_get("products", "partners", cache_control="public, max-age=60")
+
+
+@router.get("", response_model=PartnerProductListResponse, dependencies=[PRODUCTS_CACHE])
 async def get_partner_products(
     partner_id: int,
     category: Optional[str] = Query(None, description="Фильтр по категории"),
     is_available: Optional[bool] = Query(None, description="Фильтр по доступности"),
-    page: int = Query(1, ge=1),
-    page_size: int = Query(20, ge=1, le=100),
+    page: PageParams = Depends(page_params),
     db: Session = Depends(get_db)
 ):
     """Получить список товаров/услуг партнера"""
@@ -43,23 +50,18 @@ async def get_partner_products(
     if is_available is not None:
         query = query.filter(PartnerProduct.is_available == is_available)
     
-    # Подсчет общего количества
-    total = query.count()
-    
-    # Пагинация
-    products = query.order_by(PartnerProduct.sort_order, PartnerProduct.name).offset(
-        (page - 1) * page_size
-    ).limit(page_size).all()
+    # Пагинация по курсору
+    products, next_cursor = paginate(query, PRODUCTS_ORDER, page)
     
     return PartnerProductListResponse(
         items=[PartnerProductResponse.model_validate(p) for p in products],
-        total=total,
-        page=page,
-        page_size=page_size
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=estimate_total(db, query) if page.include_total else None
     )
 
 
-@router.get("/{product_id}", response_model=PartnerProductResponse)
+@router.get("/{product_id}", response_model=PartnerProductResponse, dependencies=[PRODUCTS_CACHE])
 async def get_partner_product(
     partner_id: int,
     product_id: int,
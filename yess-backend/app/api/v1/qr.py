@@ -2,16 +2,20 @@
 QR Code API
 Эндпоинты для сканирования и оплаты через QR коды
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, List
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
+from app.core.db_replicas import CONSISTENCY_HEADER, aremember_write
 from app.models.user import User
 from app.models.partner import Partner
 from app.models.transaction import Transaction
 from app.models.wallet import Wallet
 from app.api.v1.auth import get_current_user
+from app.services.dependencies import get_current_user_async
 from app.services.qr_service import qr_service
 from app.core.notifications import sms_service, push_service
 from app.core.cache import redis_cache
@@ -42,8 +46,8 @@ class QRScanResponse(BaseModel):
 @router.post("/scan", response_model=QRScanResponse)
 async def scan_qr_code(
     request: QRScanRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Сканирование QR кода партнёра
@@ -53,10 +57,10 @@ async def scan_qr_code(
     qr_data = await qr_service.parse_qr_data(request.qr_data)
     
     # Получаем партнёра
-    partner = db.query(Partner).filter(
+    partner = await db.scalar(select(Partner).where(
         Partner.id == qr_data["partner_id"],
         Partner.is_active == True
-    ).first()
+    ))
     
     if not partner:
         raise HTTPException(
@@ -65,7 +69,7 @@ async def scan_qr_code(
         )
     
     # Получаем баланс пользователя
-    wallet = db.query(Wallet).filter(Wallet.user_id == current_user.id).first()
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == current_user.id))
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -91,8 +95,9 @@ async def scan_qr_code(
 @router.post("/pay", response_model=QRPaymentResponse)
 async def pay_with_qr(
     request: QRPaymentRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    response: Response,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Оплата через QR код
@@ -113,10 +118,10 @@ async def pay_with_qr(
         )
     
     # Получаем партнёра
-    partner = db.query(Partner).filter(
+    partner = await db.scalar(select(Partner).where(
         Partner.id == request.partner_id,
         Partner.is_active == True
-    ).first()
+    ))
     
     if not partner:
         raise HTTPException(
@@ -124,8 +129,10 @@ async def pay_with_qr(
             detail="Partner not found or inactive"
         )
     
-    # Получаем кошелёк
-    wallet = db.query(Wallet).filter(Wallet.user_id == current_user.id).first()
+    # Получаем кошелёк (с блокировкой строки до commit — параллельные оплаты не перезапишут баланс)
+    wallet = await db.scalar(
+        select(Wallet).where(Wallet.user_id == current_user.id).with_for_update()
+    )
     if not wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
     
@@ -162,8 +169,13 @@ async def pay_with_qr(
         description=f"Оплата в {partner.name}"
     )
     db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
+    await db.commit()
+    await db.refresh(transaction)
+    
+    # Consistency token: следующее чтение баланса пойдёт на реплику, уже видящую эту оплату
+    token = await aremember_write(db, current_user.id)
+    if token:
+        response.headers[CONSISTENCY_HEADER] = token
     
     # Инвалидируем кэш
     await redis_cache.invalidate_user_cache(current_user.id)
@@ -1,26 +1,36 @@
 """API endpoints for stories (public - for mobile app)"""
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_async_read_db, get_db
+from app.core.http_cache import conditional_get
 from app.models.story import Story
 from app.models.user import User
 from app.schemas.story import StoryResponse, StoryViewRequest, StoryClickRequest
-from app.services.dependencies import get_current_user
+from app.services.dependencies import get_current_user, get_current_user_async
 from app.services.story_service import StoryService
+from app.services.entity_cache import EntityCache
 from app.core.exceptions import NotFoundException
 
 router = APIRouter(prefix="/stories", tags=["Stories"])
 
 
-@router.get("", response_model=List[StoryResponse])
+# Город по умолчанию — из профиля пользователя, сторисы истекают по времени
+@router.get(
+    "",
+    response_model=List[StoryResponse],
+    dependencies=[conditional_get(
+        "stories", "partners", cache_control="private, max-age=60", per_user=True, refresh_every=60
+    )]
+)
 async def get_active_stories(
     city_id: Optional[int] = Query(None, description="Фильтр по городу"),
     partner_id: Optional[int] = Query(None, description="Фильтр по партнеру"),
     limit: int = Query(50, ge=1, le=100, description="Лимит результатов"),
-    current_user: Optional[User] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Optional[User] = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Получить активные сторисы для пользователя"""
     try:
@@ -30,7 +40,7 @@ async def get_active_stories(
         if not city_id and current_user:
             city_id = current_user.city_id
         
-        stories = StoryService.get_active_stories(
+        stories = await StoryService.aget_active_stories(
             db=db,
             user_id=user_id,
             city_id=city_id,
@@ -38,24 +48,30 @@ async def get_active_stories(
             limit=limit
         )
         
+        # Партнёры, акции и города — пакетно через кэш, а не ленивой загрузкой на каждый сторис
+        partners = await EntityCache.aget_many(db, "partner", (story.partner_id for story in stories))
+        promotions = await EntityCache.aget_many(db, "promotion", (story.promotion_id for story in stories))
+        cities = await EntityCache.aget_many(db, "city", (story.city_id for story in stories))
+
         # Преобразуем в ответы с дополнительной информацией
+        # Одна валидация на сторис; готовые StoryResponse FastAPI сериализует без повторной (app.core.responses)
         result = []
         for story in stories:
-            story_dict = StoryResponse.model_validate(story).dict()
+            item = StoryResponse.model_validate(story)
             
             # Добавляем информацию о партнере
-            if story.partner:
-                story_dict['partner_name'] = story.partner.name
+            if story.partner_id in partners:
+                item.partner_name = partners[story.partner_id]['name']
             
             # Добавляем информацию об акции
-            if story.promotion:
-                story_dict['promotion_title'] = story.promotion.title
+            if story.promotion_id in promotions:
+                item.promotion_title = promotions[story.promotion_id]['title']
             
             # Добавляем информацию о городе
-            if story.city:
-                story_dict['city_name'] = story.city.name
+            if story.city_id in cities:
+                item.city_name = cities[story.city_id]['name']
             
-            result.append(StoryResponse(**story_dict))
+            result.append(item)
         
         return result
     except Exception as e:
@@ -72,16 +88,16 @@ async def get_story(
     if not story:
         raise HTTPException(status_code=404, detail="Сторис не найден")
     
-    story_dict = StoryResponse.model_validate(story).dict()
+    item = StoryResponse.model_validate(story)
     
     if story.partner:
-        story_dict['partner_name'] = story.partner.name
+        item.partner_name = story.partner.name
     if story.promotion:
-        story_dict['promotion_title'] = story.promotion.title
+        item.promotion_title = story.promotion.title
     if story.city:
-        story_dict['city_name'] = story.city.name
+        item.city_name = story.city.name
     
-    return StoryResponse(**story_dict)
+    return item
 
 
 @router.post("/{story_id}/view")
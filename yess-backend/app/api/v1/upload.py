@@ -9,7 +9,6 @@ from app.models.user import User
 from app.models.partner import Partner
 from app.api.v1.auth import get_current_user
 from app.core.storage import file_storage
-from app.core.rate_limit import upload_rate_limit
 from app.core.cache import redis_cache
 import logging
 
@@ -18,7 +17,6 @@ router = APIRouter(prefix="/upload", tags=["File Upload"])
 
 
 @router.post("/avatar")
-@upload_rate_limit()
 async def upload_avatar(
     request: Request,
     file: UploadFile = File(..., description="Изображение профиля"),
@@ -61,7 +59,6 @@ async def upload_avatar(
 
 
 @router.post("/partner/logo/{partner_id}")
-@upload_rate_limit()
 async def upload_partner_logo(
     request: Request,
     partner_id: int,
@@ -117,7 +114,6 @@ async def upload_partner_logo(
 
 
 @router.post("/partner/cover/{partner_id}")
-@upload_rate_limit()
 async def upload_partner_cover(
     request: Request,
     partner_id: int,
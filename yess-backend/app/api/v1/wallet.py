@@ -1,9 +1,13 @@
 """
 Wallet endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_async_read_db, get_db
+from app.core.db_replicas import CONSISTENCY_HEADER, aread_your_writes
+from app.core.pagination import Keyset, PageParams, estimate_total, page_params, paginate
 from app.models.wallet import Wallet
 from app.models.transaction import Transaction
 from app.models.user import User
@@ -12,7 +16,8 @@ from app.schemas.wallet import (
     TopUpRequest, 
     TopUpResponse,
     WalletSyncRequest,
-    WalletSyncResponse
+    WalletSyncResponse,
+    TransactionHistoryResponse
 )
 from app.core.config import settings
 import qrcode
@@ -20,9 +25,13 @@ import io
 import base64
 from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
 router = APIRouter()
 
+# Порядок совпадает с хвостом idx_transaction_user_created (user_id, created_at, id)
+HISTORY_ORDER = Keyset(Transaction.created_at, Transaction.id, descending=True)
+
 
 @router.get("/", response_model=WalletResponse)
 async def get_balance(userId: int = Query(...), db: Session = Depends(get_db)):
@@ -36,10 +45,18 @@ async def get_balance(userId: int = Query(...), db: Session = Depends(get_db)):
 @router.get("/balance", response_model=WalletResponse)
 async def get_wallet_balance(
     user_id: int = Query(..., description="User ID"),
-    db: Session = Depends(get_db)
+    consistency_token: Optional[str] = Header(None, alias=CONSISTENCY_HEADER),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get wallet balance with Yess!Coin"""
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
+    # Только что оплативший пользователь должен увидеть новый баланс, а не отставшую реплику
+    await aread_your_writes(db, user_id, consistency_token)
+    wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id))
+    if not wallet:
+        # Перед созданием проверяем primary: на реплику кошелёк мог ещё не доехать
+        wallet = await db.scalar(
+            select(Wallet).where(Wallet.user_id == user_id).execution_options(replica=False)
+        )
     if not wallet:
         # Создаем кошелек если его нет
         wallet = Wallet(
@@ -50,8 +67,8 @@ async def get_wallet_balance(
             total_spent=Decimal('0.00')
         )
         db.add(wallet)
-        db.commit()
-        db.refresh(wallet)
+        await db.commit()
+        await db.refresh(wallet)
     return wallet
 
 
@@ -176,12 +193,24 @@ async def payment_webhook(
     return {"success": False, "message": "Invalid payment"}
 
 
-@router.get("/history")
-async def get_transaction_history(user_id: int = Query(...), db: Session = Depends(get_db)):
-    """Get transaction history"""
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == user_id
-    ).order_by(Transaction.created_at.desc()).all()
+@router.get("/history", response_model=TransactionHistoryResponse)
+async def get_transaction_history(
+    user_id: int = Query(...),
+    status: Optional[str] = Query(None, description="Фильтр по статусу (pending, completed, failed)"),
+    page: PageParams = Depends(page_params),
+    db: Session = Depends(get_db)
+):
+    """Get transaction history (newest first, cursor-paginated)"""
+    query = db.query(Transaction).filter(Transaction.user_id == user_id)
+    if status:
+        query = query.filter(Transaction.status == status)
+    transactions, next_cursor = paginate(query, HISTORY_ORDER, page)
     
-    return transactions
+    # ORM-строки валидируются в TransactionResponse один раз, при создании страницы
+    return TransactionHistoryResponse(
+        items=transactions,
+        next_cursor=next_cursor,
+        has_more=next_cursor is not None,
+        total=estimate_total(db, query) if page.include_total else None
+    )
 
@@ -1,144 +1,490 @@
 """
 Redis Caching Utilities
+Асинхронный клиент (redis.asyncio) с общим пулом соединений:
+операции кэша не блокируют event loop uvicorn.
+Горячие ключи дополнительно кэшируются в памяти процесса (L1, app.core.local_cache),
+инвалидация L1 во всех воркерах — через Redis pub/sub.
+Групповая инвалидация — по тегам и SCAN (app.core.cache_invalidation), без KEYS
 """
+import asyncio
 import json
 import logging
-from typing import Optional, Any
-from redis import Redis
+import time
+from typing import Optional, Any, Dict, Iterable, Mapping, Union
+from redis.asyncio import Redis, ConnectionPool
+from redis.exceptions import RedisError, ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from app.core.config import settings
+from app.core import cache_invalidation
+from app.core.cache_codec import CacheCodec, codec as default_codec, raw_get, raw_mget
+from app.core.cache_metrics import CacheMetrics, register_pool_metrics
+from app.core.local_cache import LocalCache, local_cache
 
 logger = logging.getLogger(__name__)
 
 
 class RedisCache:
     """Redis кэш для оптимизации запросов"""
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        local: Optional[LocalCache] = None,
+        codec: Optional[CacheCodec] = None
+    ):
+        self.redis_url = redis_url or settings.REDIS_URL
+        self.codec = codec if codec is not None else default_codec
+        self.local = local if local is not None else local_cache
+        self.invalidation_channel = settings.CACHE_INVALIDATION_CHANNEL
+        self._listener_task: Optional[asyncio.Task] = None
+
+        # Статистика L2 (Redis) и метрики Prometheus по пространствам имён
+        self.hits = 0
+        self.misses = 0
+        self.metrics = CacheMetrics("redis_cache")
+
+        # Соединения создаются лениво при первой операции внутри event loop,
+        # поэтому здесь нет сетевого вызова (раньше был блокирующий PING при импорте)
         try:
-            self.redis = Redis.from_url(
-                settings.REDIS_URL,
-                decode_responses=True
+            self.pool = ConnectionPool.from_url(
+                self.redis_url,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                decode_responses=True,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                socket_keepalive=True,
+                retry_on_timeout=False,  # Повтор по таймауту удваивает задержку запроса
+                health_check_interval=30
             )
-            # Проверяем соединение
-            self.redis.ping()
+            self.redis = Redis(connection_pool=self.pool)
             self.enabled = True
-            logger.info("Redis cache initialized successfully")
+            register_pool_metrics("redis_cache", self.pool)
         except Exception as e:
-            logger.error(f"Redis connection failed: {str(e)}")
-            self.enabled = False
+            logger.error(f"Redis cache initialization failed: {str(e)}")
+            self.pool = None
             self.redis = None
-    
+            self.enabled = False
+
+        # Момент, до которого кэш пропускается после ошибки соединения
+        self._unavailable_until = 0.0
+
+    def _is_available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._unavailable_until
+
+    def _handle_error(self, operation: str, error: Exception, key: Optional[str] = None):
+        """Логирование ошибки; при недоступности Redis — временное отключение кэша"""
+        self.metrics.error(operation.replace(" ", "_"), key)
+        if isinstance(error, (RedisConnectionError, RedisTimeoutError)):
+            self._unavailable_until = time.monotonic() + settings.REDIS_RETRY_BACKOFF
+        logger.error(f"Redis {operation} error: {str(error)}")
+
+    def pipeline(self, transaction: bool = False):
+        """
+        Pipeline для отправки нескольких команд за один round-trip
+        Пример:
+            async with redis_cache.pipeline() as pipe:
+                pipe.get("a").get("b")
+                a, b = await pipe.execute()
+        """
+        return self.redis.pipeline(transaction=transaction)
+
     async def get(self, key: str) -> Optional[Any]:
-        """Получение значения из кэша"""
-        if not self.enabled:
+        """Получение значения из кэша (сначала L1, затем Redis)"""
+        in_local = self.local.is_cacheable(key)
+        if in_local:
+            value = self.local.get(key)
+            if value is not None:
+                self.metrics.hit(key, tier="l1")
+                return value
+
+        if not self._is_available():
             return None
-        
+
         try:
-            value = self.redis.get(key)
-            if value:
-                return json.loads(value)
-            return None
-        except Exception as e:
-            logger.error(f"Redis get error: {str(e)}")
+            generation = self.local.generation
+            with self.metrics.timer("get", key):
+                raw = await raw_get(self.redis, key)
+            if not raw:
+                self.misses += 1
+                self.metrics.miss(key)
+                return None
+
+            self.hits += 1
+            self.metrics.hit(key, size=len(raw))
+            value = self.codec.decode(raw)
+            if in_local:
+                self.local.set(key, value, size=len(raw), generation=generation)
+            return value
+        except (RedisError, ValueError) as e:
+            self._handle_error("get", e, key)
             return None
-    
+
     async def set(
-        self, 
-        key: str, 
-        value: Any, 
-        ttl: Optional[int] = None
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
     ) -> bool:
         """
         Сохранение значения в кэш
         ttl: время жизни в секундах
+        tags: теги для групповой инвалидации через invalidate_tag
         """
-        if not self.enabled:
+        if not self._is_available():
             return False
-        
+
         try:
             ttl = ttl or settings.REDIS_CACHE_TTL
-            serialized = json.dumps(value)
-            self.redis.setex(key, ttl, serialized)
+            serialized = self.codec.encode(value)
+            self.metrics.written(key, len(serialized))
+            local = self.local.is_cacheable(key)
+            if not local and not tags:
+                with self.metrics.timer("set", key):
+                    await self.redis.setex(key, ttl, serialized)
+                return True
+
+            # Запись, регистрация в тегах и оповещение остальных воркеров — один round-trip
+            if local:
+                self.local.delete(key)
+            async with self.pipeline() as pipe:
+                pipe.setex(key, ttl, serialized)
+                for tag in tags or ():
+                    pipe.sadd(cache_invalidation.tag_key(tag), key)
+                    pipe.expire(cache_invalidation.tag_key(tag), cache_invalidation.tag_ttl(ttl))
+                if local:
+                    pipe.publish(self.invalidation_channel, self._invalidation_message(keys=[key]))
+                with self.metrics.timer("set", key):
+                    await pipe.execute()
+            if not local:
+                return True
+            self.local.set(key, self.codec.decode(serialized), size=len(serialized), ttl=ttl)
             return True
-        except Exception as e:
-            logger.error(f"Redis set error: {str(e)}")
+        except (RedisError, TypeError, ValueError) as e:
+            self._handle_error("set", e, key)
             return False
-    
-    async def delete(self, key: str) -> bool:
-        """Удаление из кэша"""
-        if not self.enabled:
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Получение нескольких значений: L1, затем один MGET для остальных
+        Возвращает только найденные ключи
+        """
+        result, remote = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key) if self.local.is_cacheable(key) else None
+            if value is None:
+                remote.append(key)
+            else:
+                self.metrics.hit(key, tier="l1")
+                result[key] = value
+
+        if not remote or not self._is_available():
+            return result
+
+        try:
+            generation = self.local.generation
+            with self.metrics.timer("get_many", remote[0]):
+                values = await raw_mget(self.redis, remote)
+        except RedisError as e:
+            self._handle_error("get many", e, remote[0])
+            return result
+
+        for key, raw in zip(remote, values):
+            if not raw:
+                self.misses += 1
+                self.metrics.miss(key)
+                continue
+            try:
+                value = self.codec.decode(raw)
+            except ValueError as e:
+                self._handle_error("get many", e, key)
+                continue
+            self.hits += 1
+            self.metrics.hit(key, size=len(raw))
+            result[key] = value
+            if self.local.is_cacheable(key):
+                self.local.set(key, value, size=len(raw), generation=generation)
+        return result
+
+    async def set_many(
+        self,
+        items: Mapping[str, Any],
+        ttl: Union[int, Mapping[str, int], None] = None,
+        tags: Optional[Mapping[str, Iterable[str]]] = None
+    ) -> bool:
+        """
+        Сохранение нескольких значений одним pipeline (SETEX на ключ)
+        ttl: общий или словарь ключ → TTL; tags: словарь ключ → теги
+        """
+        if not items:
+            return True
+        if not self._is_available():
             return False
-        
+
         try:
-            self.redis.delete(key)
+            prepared = []
+            for key, value in items.items():
+                key_ttl = (ttl.get(key) if isinstance(ttl, Mapping) else ttl) or settings.REDIS_CACHE_TTL
+                prepared.append((key, self.codec.encode(value), key_ttl))
+                self.metrics.written(key, len(prepared[-1][1]))
+
+            local_keys = [key for key, _, _ in prepared if self.local.is_cacheable(key)]
+            self.local.delete(*local_keys)
+            async with self.pipeline() as pipe:
+                for key, serialized, key_ttl in prepared:
+                    pipe.setex(key, key_ttl, serialized)
+                    for tag in (tags or {}).get(key, ()):
+                        pipe.sadd(cache_invalidation.tag_key(tag), key)
+                        pipe.expire(cache_invalidation.tag_key(tag), cache_invalidation.tag_ttl(key_ttl))
+                if local_keys:
+                    pipe.publish(self.invalidation_channel, self._invalidation_message(keys=local_keys))
+                with self.metrics.timer("set_many", prepared[0][0]):
+                    await pipe.execute()
+
+            for key, serialized, key_ttl in prepared:
+                if self.local.is_cacheable(key):
+                    self.local.set(key, self.codec.decode(serialized), size=len(serialized), ttl=key_ttl)
             return True
-        except Exception as e:
-            logger.error(f"Redis delete error: {str(e)}")
+        except (RedisError, TypeError, ValueError) as e:
+            self._handle_error("set many", e, next(iter(items)))
+            return False
+
+    async def delete(self, *keys: str) -> bool:
+        """Удаление одного или нескольких ключей из кэша (одна команда DEL)"""
+        if not keys:
+            return False
+
+        local_keys = [key for key in keys if self.local.is_cacheable(key)]
+        self.local.delete(*local_keys)
+
+        if not self._is_available():
             return False
-    
+
+        try:
+            if not local_keys:
+                await self.redis.delete(*keys)
+                return True
+
+            async with self.pipeline() as pipe:
+                pipe.delete(*keys)
+                pipe.publish(self.invalidation_channel, self._invalidation_message(keys=local_keys))
+                await pipe.execute()
+            return True
+        except RedisError as e:
+            self._handle_error("delete", e, keys[0])
+            return False
+
     async def clear_pattern(self, pattern: str) -> int:
         """
         Удаление всех ключей по шаблону
         Пример: 'user:*' удалит все ключи начинающиеся с 'user:'
+        Ключи перебираются через SCAN порциями (KEYS блокирует Redis на всё время обхода)
         """
-        if not self.enabled:
+        self.local.delete_pattern(pattern)
+
+        if not self._is_available():
             return 0
-        
+
         try:
-            keys = self.redis.keys(pattern)
-            if keys:
-                return self.redis.delete(*keys)
+            deleted = await cache_invalidation.adelete_pattern(self.redis, pattern)
+            await self._publish_invalidation(pattern=pattern)
+            return deleted
+        except RedisError as e:
+            self._handle_error("clear pattern", e, pattern)
             return 0
-        except Exception as e:
-            logger.error(f"Redis clear pattern error: {str(e)}")
+
+    async def invalidate_tag(self, tag: str) -> int:
+        """
+        Удаление всех записей, сохранённых с тегом
+        Пример: invalidate_tag('partner:42') удалит карточку партнёра и все списки с ним
+        """
+        if not self._is_available():
             return 0
-    
-    async def increment(self, key: str, amount: int = 1) -> int:
-        """Инкремент значения (для счётчиков)"""
-        if not self.enabled:
+
+        async def evict_local(keys: list):
+            local_keys = [key for key in keys if self.local.is_cacheable(key)]
+            if local_keys:
+                self.local.delete(*local_keys)
+                await self._publish_invalidation(keys=local_keys)
+
+        try:
+            return await cache_invalidation.ainvalidate_tag(self.redis, tag, on_batch=evict_local)
+        except RedisError as e:
+            self._handle_error("invalidate tag", e, cache_invalidation.tag_key(tag))
+            return 0
+
+    async def increment(self, key: str, amount: int = 1, ttl: Optional[int] = None) -> int:
+        """
+        Инкремент значения (для счётчиков)
+        ttl: если указан, INCRBY и EXPIRE отправляются одним pipeline
+        """
+        if not self._is_available():
             return 0
-        
+
         try:
-            return self.redis.incrby(key, amount)
-        except Exception as e:
-            logger.error(f"Redis increment error: {str(e)}")
+            if ttl is None:
+                return await self.redis.incrby(key, amount)
+            async with self.pipeline() as pipe:
+                pipe.incrby(key, amount).expire(key, ttl)
+                value, _ = await pipe.execute()
+            return value
+        except RedisError as e:
+            self._handle_error("increment", e, key)
             return 0
-    
+
+    async def run_script(self, script, keys: list, args: list) -> Optional[Any]:
+        """
+        Lua-скрипт из redis.register_script (EVALSHA, при NOSCRIPT — EVAL)
+        None — Redis недоступен или ошибка; вызывающий решает, как работать без Redis
+        """
+        if not self._is_available():
+            return None
+
+        try:
+            with self.metrics.timer("script", keys[0] if keys else None):
+                return await script(keys=keys, args=args, client=self.redis)
+        except RedisError as e:
+            self._handle_error("script", e, keys[0] if keys else None)
+            return None
+
+    async def ping(self) -> bool:
+        """Проверка доступности Redis"""
+        if not self.enabled:
+            return False
+
+        try:
+            return await self.redis.ping()
+        except RedisError as e:
+            self._handle_error("ping", e)
+            return False
+
+    def _invalidation_message(self, keys: Optional[list] = None, pattern: Optional[str] = None) -> str:
+        return json.dumps({"origin": self.local.instance_id, "keys": keys or [], "pattern": pattern})
+
+    async def _publish_invalidation(self, keys: Optional[list] = None, pattern: Optional[str] = None):
+        await self.redis.publish(self.invalidation_channel, self._invalidation_message(keys, pattern))
+
+    def _apply_invalidation(self, data: str):
+        """Применение сообщения об инвалидации к локальному L1"""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            logger.warning(f"Malformed cache invalidation message: {data[:100]}")
+            return
+
+        # Собственные сообщения процесса уже применены локально
+        if message.get("origin") == self.local.instance_id:
+            return
+
+        if message.get("keys"):
+            self.local.delete(*message["keys"])
+        if message.get("pattern"):
+            self.local.delete_pattern(message["pattern"])
+
+    async def _listen_invalidations(self):
+        """Подписка на канал инвалидации с переподключением"""
+        while True:
+            # Отдельный клиент без socket_timeout: подписка может молчать часами
+            client = Redis.from_url(
+                self.redis_url,
+                decode_responses=True,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                socket_keepalive=True
+            )
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.invalidation_channel)
+                # Пока подписки не было, сообщения могли быть пропущены
+                self.local.clear()
+                self.local.subscribed = True
+                async for message in pubsub.listen():
+                    if message and message.get("type") == "message":
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error: {str(e)}")
+                self.local.subscribed = False
+                self.local.clear()
+                await asyncio.sleep(settings.REDIS_RETRY_BACKOFF)
+            finally:
+                self.local.subscribed = False
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+    def start_invalidation_listener(self):
+        """Запуск фоновой подписки на инвалидацию L1 (вызывается при старте воркера)"""
+        if not self.enabled or not self.local.enabled:
+            return
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.get_running_loop().create_task(self._listen_invalidations())
+
+    def get_stats(self) -> dict:
+        """Статистика попаданий по уровням кэша"""
+        total = self.hits + self.misses
+        return {
+            "l1": self.local.get_stats(),
+            "l2": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+        }
+
+    async def close(self):
+        """Остановка подписки и закрытие пула соединений (вызывается при остановке приложения)"""
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener_task = None
+        if self.pool is not None:
+            await self.pool.disconnect()
+
     # Специализированные методы для YESS
-    
+
     async def cache_user(self, user_id: int, user_data: dict, ttl: int = 3600) -> bool:
         """Кэширование данных пользователя"""
         return await self.set(f"user:{user_id}", user_data, ttl)
-    
+
     async def get_cached_user(self, user_id: int) -> Optional[dict]:
         """Получение данных пользователя из кэша"""
         return await self.get(f"user:{user_id}")
-    
+
     async def cache_partner(self, partner_id: int, partner_data: dict, ttl: int = 3600) -> bool:
         """Кэширование данных партнёра"""
-        return await self.set(f"partner:{partner_id}", partner_data, ttl)
-    
+        return await self.set(f"partner:{partner_id}", partner_data, ttl, tags=[f"partner:{partner_id}"])
+
     async def get_cached_partner(self, partner_id: int) -> Optional[dict]:
         """Получение данных партнёра из кэша"""
         return await self.get(f"partner:{partner_id}")
-    
+
     async def cache_partners_list(self, city_id: int, partners: list, ttl: int = 1800) -> bool:
-        """Кэширование списка партнёров по городу"""
-        return await self.set(f"partners:city:{city_id}", partners, ttl)
-    
+        """Кэширование списка партнёров по городу (с тегами всех партнёров списка)"""
+        tags = ["partners"] + [
+            f"partner:{partner['id']}" for partner in partners
+            if isinstance(partner, dict) and partner.get("id") is not None
+        ]
+        return await self.set(f"partners:city:{city_id}", partners, ttl, tags=tags)
+
     async def get_cached_partners_list(self, city_id: int) -> Optional[list]:
         """Получение списка партнёров из кэша"""
         return await self.get(f"partners:city:{city_id}")
-    
+
     async def invalidate_user_cache(self, user_id: int) -> bool:
         """Очистка кэша пользователя"""
         return await self.delete(f"user:{user_id}")
-    
+
     async def invalidate_partner_cache(self, partner_id: int) -> bool:
-        """Очистка кэша партнёра"""
-        return await self.delete(f"partner:{partner_id}")
+        """Очистка кэша партнёра и всех списков, в которые он входит"""
+        deleted = await self.delete(f"partner:{partner_id}")
+        await self.invalidate_tag(f"partner:{partner_id}")
+        return deleted
 
 
 # Singleton instance
 redis_cache = RedisCache()
-
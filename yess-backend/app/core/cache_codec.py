@@ -0,0 +1,175 @@
+"""
+Кодек значений кэша
+Формат записи: 1 байт заголовка + тело
+  биты 0-1 — сериализатор (1 — JSON/orjson, 2 — msgpack)
+  биты 2-3 — сжатие (0 — нет, 1 — zstd, 2 — lz4)
+Байт заголовка всегда < 0x10 и не может начинать JSON-текст, поэтому записи,
+сохранённые до перехода на кодек (обычный json.dumps), читаются как раньше.
+orjson, msgpack, zstandard и lz4 — необязательные зависимости: без них кодек
+откатывается на стандартный json и запись без сжатия
+"""
+import json
+import logging
+from typing import Any, Optional
+
+from redis.client import NEVER_DECODE
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_JSON = 0x01
+FORMAT_MSGPACK = 0x02
+COMPRESSION_ZSTD = 0x04
+COMPRESSION_LZ4 = 0x08
+_FORMAT_MASK = 0x03
+_COMPRESSION_MASK = 0x0C
+_MAX_HEADER = 0x0F
+
+
+class CacheCodecError(ValueError):
+    """Запись в кэше не удалось декодировать"""
+
+
+class CacheCodec:
+    """Сериализация + сжатие значений кэша"""
+
+    def __init__(
+        self,
+        serializer: Optional[str] = None,
+        compression: Optional[str] = None,
+        threshold: Optional[int] = None,
+        level: Optional[int] = None
+    ):
+        self.serializer = self._resolve_serializer(serializer or settings.CACHE_CODEC)
+        self.compression = self._resolve_compression(compression or settings.CACHE_COMPRESSION)
+        self.threshold = settings.CACHE_COMPRESSION_THRESHOLD if threshold is None else threshold
+        self.level = settings.CACHE_COMPRESSION_LEVEL if level is None else level
+
+        self._zstd_compressor = None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+        if self.compression == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=self.level)
+
+    @staticmethod
+    def _resolve_serializer(name: str) -> str:
+        if name == "msgpack" and msgpack is None:
+            logger.warning("msgpack is not installed, falling back to JSON cache codec")
+            return "json"
+        return "msgpack" if name == "msgpack" else "json"
+
+    @staticmethod
+    def _resolve_compression(name: str) -> str:
+        if (name == "zstd" and zstandard is None) or (name == "lz4" and lz4_frame is None):
+            logger.warning(f"{name} is not installed, cache values will not be compressed")
+            return "none"
+        return name if name in ("zstd", "lz4") else "none"
+
+    # Сериализация
+
+    @staticmethod
+    def _dumps_json(value: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+            except (TypeError, orjson.JSONEncodeError):
+                pass  # Например, int больше 64 бит — сериализуем стандартным json
+        return json.dumps(value, default=str).encode()
+
+    @staticmethod
+    def _loads_json(body: bytes) -> Any:
+        return orjson.loads(body) if orjson is not None else json.loads(bytes(body))
+
+    def encode(self, value: Any) -> bytes:
+        """Значение → bytes с байтом заголовка"""
+        if self.serializer == "msgpack":
+            header = FORMAT_MSGPACK
+            body = msgpack.packb(value, default=str, use_bin_type=True)
+        else:
+            header = FORMAT_JSON
+            body = self._dumps_json(value)
+
+        if self.compression != "none" and len(body) >= self.threshold:
+            if self.compression == "zstd":
+                compressed = self._zstd_compressor.compress(body)
+                flag = COMPRESSION_ZSTD
+            else:
+                compressed = lz4_frame.compress(body)  # Быстрый режим; уровень — только для zstd
+                flag = COMPRESSION_LZ4
+            # Несжимаемые данные храним как есть
+            if len(compressed) < len(body):
+                header |= flag
+                body = compressed
+
+        return bytes((header,)) + body
+
+    def decode(self, data: Any) -> Any:
+        """bytes из Redis → значение; понимает и старые JSON-записи без заголовка"""
+        if data is None:
+            return None
+        try:
+            return self._decode(data)
+        except CacheCodecError:
+            raise
+        except Exception as e:
+            raise CacheCodecError(f"Corrupted cache entry: {e}") from e
+
+    def _decode(self, data: Any) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] > _MAX_HEADER:
+            return self._loads_json(data)
+
+        header = data[0]
+        body = memoryview(data)[1:]
+        compression = header & _COMPRESSION_MASK
+        if compression == COMPRESSION_ZSTD:
+            if self._zstd_decompressor is None:
+                raise CacheCodecError("zstandard is required to read this cache entry")
+            body = self._zstd_decompressor.decompress(body)
+        elif compression == COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise CacheCodecError("lz4 is required to read this cache entry")
+            body = lz4_frame.decompress(body)
+
+        fmt = header & _FORMAT_MASK
+        if fmt == FORMAT_MSGPACK:
+            if msgpack is None:
+                raise CacheCodecError("msgpack is required to read this cache entry")
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if fmt == FORMAT_JSON:
+            return self._loads_json(body)
+        raise CacheCodecError(f"Unknown cache entry header: {header:#04x}")
+
+
+def raw_get(client, key: str):
+    """GET без декодирования в str (клиенты созданы с decode_responses=True)"""
+    return client.execute_command("GET", key, **{NEVER_DECODE: []})
+
+
+def raw_mget(client, keys: list):
+    """MGET без декодирования в str"""
+    return client.execute_command("MGET", *keys, **{NEVER_DECODE: []})
+
+
+codec = CacheCodec()
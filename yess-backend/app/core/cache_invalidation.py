@@ -0,0 +1,150 @@
+"""
+Инвалидация кэша без KEYS
+- Теги: каждая запись регистрируется в множестве tag:{tag} (например, tag:partner:42),
+  инвалидация тега удаляет его участников порциями (SRANDMEMBER + UNLINK + SREM)
+- Шаблоны: SCAN по всем primary-узлам (в Redis Cluster SCAN видит только один узел),
+  удаление порциями, сгруппированными по слоту (многоключевые команды в кластере
+  допустимы только в пределах одного слота)
+Функции принимают как синхронный, так и асинхронный клиент (вариант с префиксом a*)
+"""
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from redis.cluster import RedisCluster
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+
+from app.core.config import settings
+
+TAG_PREFIX = "tag:"
+
+
+def tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}{tag}"
+
+
+def tag_ttl(ttl: int) -> int:
+    """TTL множества тега не меньше TTL любой его записи (EXPIRE GT нет в Redis 6)"""
+    return max(ttl, settings.CACHE_TAG_TTL)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _is_cluster(client) -> bool:
+    return isinstance(client, (RedisCluster, AsyncRedisCluster))
+
+
+def group_by_slot(client, keys: List[str]) -> List[List[str]]:
+    """Для кластера — разбивка ключей по слотам, для одиночного Redis — без изменений"""
+    if not _is_cluster(client):
+        return [keys]
+    groups: Dict[int, List[str]] = {}
+    for key in keys:
+        groups.setdefault(client.keyslot(key), []).append(key)
+    return list(groups.values())
+
+
+def _scan_nodes(client) -> list:
+    return client.get_primaries() if _is_cluster(client) else [None]
+
+
+def scan_keys(client, pattern: str, batch_size: Optional[int] = None) -> Iterator[List[str]]:
+    """Порции ключей по шаблону через SCAN (по всем primary-узлам кластера)"""
+    batch_size = batch_size or settings.CACHE_INVALIDATION_BATCH
+    for node in _scan_nodes(client):
+        kwargs = {"target_nodes": node} if node is not None else {}
+        cursor = 0
+        while True:
+            cursor, keys = client.scan(cursor=cursor, match=pattern, count=batch_size, **kwargs)
+            if isinstance(cursor, dict):  # RedisCluster возвращает курсоры по узлам
+                cursor = next(iter(cursor.values()), 0)
+            if keys:
+                yield keys
+            if not cursor:
+                break
+
+
+async def ascan_keys(client, pattern: str, batch_size: Optional[int] = None):
+    batch_size = batch_size or settings.CACHE_INVALIDATION_BATCH
+    for node in _scan_nodes(client):
+        kwargs = {"target_nodes": node} if node is not None else {}
+        cursor = 0
+        while True:
+            cursor, keys = await client.scan(cursor=cursor, match=pattern, count=batch_size, **kwargs)
+            if isinstance(cursor, dict):
+                cursor = next(iter(cursor.values()), 0)
+            if keys:
+                yield keys
+            if not cursor:
+                break
+
+
+def unlink_keys(client, keys: List[str]) -> int:
+    """Неблокирующее удаление (UNLINK) с учётом слотов кластера"""
+    return sum(client.unlink(*group) for group in group_by_slot(client, keys) if group)
+
+
+async def aunlink_keys(client, keys: List[str]) -> int:
+    deleted = 0
+    for group in group_by_slot(client, keys):
+        if group:
+            deleted += await client.unlink(*group)
+    return deleted
+
+
+def delete_pattern(client, pattern: str, on_batch: Optional[Callable[[List[str]], None]] = None) -> int:
+    """Удаление ключей по шаблону без KEYS; on_batch вызывается для каждой удалённой порции"""
+    deleted = 0
+    for keys in scan_keys(client, pattern):
+        deleted += unlink_keys(client, keys)
+        if on_batch:
+            on_batch(keys)
+    return deleted
+
+
+async def adelete_pattern(client, pattern: str, on_batch: Optional[Callable] = None) -> int:
+    deleted = 0
+    async for keys in ascan_keys(client, pattern):
+        deleted += await aunlink_keys(client, keys)
+        if on_batch:
+            await on_batch(keys)
+    return deleted
+
+
+def invalidate_tag(client, tag: str, on_batch: Optional[Callable[[List[str]], None]] = None) -> int:
+    """
+    Удаление всех записей тега порциями
+    Обработанные участники убираются из множества через SREM (а не DEL всего множества),
+    чтобы записи, добавленные во время инвалидации, не потеряли связь с тегом
+    """
+    key = tag_key(tag)
+    batch_size = settings.CACHE_INVALIDATION_BATCH
+    deleted = 0
+    while True:
+        members = client.srandmember(key, batch_size)
+        if not members:
+            return deleted
+        deleted += unlink_keys(client, members)
+        client.srem(key, *members)
+        if on_batch:
+            on_batch(members)
+
+
+async def ainvalidate_tag(client, tag: str, on_batch: Optional[Callable] = None) -> int:
+    key = tag_key(tag)
+    batch_size = settings.CACHE_INVALIDATION_BATCH
+    deleted = 0
+    while True:
+        members = await client.srandmember(key, batch_size)
+        if not members:
+            return deleted
+        deleted += await aunlink_keys(client, members)
+        await client.srem(key, *members)
+        if on_batch:
+            await on_batch(members)
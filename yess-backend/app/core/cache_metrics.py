@@ -0,0 +1,216 @@
+"""
+Метрики кэша (Prometheus) по пространствам имён ключей
+Пространство имён — префикс ключа до первого двоеточия ("partner:42" → "partner");
+для служебных префиксов cache:/tag:/lock: берутся два сегмента ("cache:achievements:v3:..." →
+"cache:achievements"). Число различных значений ограничено, остальное попадает в "other".
+Кроме счётчиков Prometheus ведётся компактная статистика процесса для /admin/cache/namespaces
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+from app.core.request_timing import record_span
+
+CACHE_HITS = Counter(
+    "cache_hits_total", "Cache hits", ["cache", "namespace", "tier"]
+)
+CACHE_MISSES = Counter(
+    "cache_misses_total", "Cache misses", ["cache", "namespace"]
+)
+CACHE_ERRORS = Counter(
+    "cache_errors_total", "Failed cache operations", ["cache", "namespace", "operation"]
+)
+CACHE_BYTES = Counter(
+    "cache_bytes_total", "Bytes read from / written to Redis", ["cache", "namespace", "direction"]
+)
+CACHE_LATENCY = Histogram(
+    "cache_operation_duration_seconds", "Cache operation latency",
+    ["cache", "namespace", "operation"],
+    buckets=(0.0002, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+CACHE_POOL_CONNECTIONS = Gauge(
+    "cache_pool_connections", "Redis connection pool utilization", ["pool", "state"]
+)
+
+_COMPOSITE_PREFIXES = ("cache", "tag", "lock")
+OTHER = "other"
+
+
+class _NamespaceRegistry:
+    """Ограничение кардинальности меток + статистика трафика по пространствам имён"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def resolve(self, key) -> str:
+        if isinstance(key, bytes):
+            key = key.decode("utf-8", "replace")
+        head, sep, rest = str(key).partition(":")
+        if not sep:
+            return OTHER
+        namespace = f"{head}:{rest.split(':', 1)[0]}" if head in _COMPOSITE_PREFIXES else head
+        if namespace in self._stats:
+            return namespace
+        with self._lock:
+            if namespace not in self._stats and len(self._stats) >= self.limit:
+                return OTHER
+            self._stats.setdefault(namespace, self._empty())
+        return namespace
+
+    @staticmethod
+    def _empty() -> Dict[str, int]:
+        return {"hits": 0, "misses": 0, "errors": 0, "bytes_read": 0, "bytes_written": 0}
+
+    def add(self, namespace: str, field: str, amount: int = 1):
+        stats = self._stats.get(namespace)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(namespace, self._empty())
+        stats[field] += amount
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {namespace: dict(stats) for namespace, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+namespaces = _NamespaceRegistry(settings.CACHE_METRICS_MAX_NAMESPACES)
+
+
+def namespace_of(key) -> str:
+    return namespaces.resolve(key)
+
+
+class CacheMetrics:
+    """Инструментирование одного экземпляра кэша (redis_cache / cache_service)"""
+
+    def __init__(self, cache: str):
+        self.cache = cache
+
+    def hit(self, key, tier: str = "l2", size: int = 0):
+        namespace = namespace_of(key)
+        CACHE_HITS.labels(self.cache, namespace, tier).inc()
+        namespaces.add(namespace, "hits")
+        if size:
+            CACHE_BYTES.labels(self.cache, namespace, "read").inc(size)
+            namespaces.add(namespace, "bytes_read", size)
+
+    def miss(self, key):
+        namespace = namespace_of(key)
+        CACHE_MISSES.labels(self.cache, namespace).inc()
+        namespaces.add(namespace, "misses")
+
+    def written(self, key, size: int):
+        namespace = namespace_of(key)
+        CACHE_BYTES.labels(self.cache, namespace, "written").inc(size)
+        namespaces.add(namespace, "bytes_written", size)
+
+    def error(self, operation: str, key=None):
+        namespace = namespace_of(key) if key is not None else OTHER
+        CACHE_ERRORS.labels(self.cache, namespace, operation).inc()
+        namespaces.add(namespace, "errors")
+
+    @contextmanager
+    def timer(self, operation: str, key=None):
+        """Латентность операции (и участок cache запроса); для пакетных операций — по первому ключу пачки"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            record_span("cache", elapsed)
+            namespace = namespace_of(key) if key is not None else OTHER
+            CACHE_LATENCY.labels(self.cache, namespace, operation).observe(elapsed)
+
+
+def register_pool_metrics(name: str, pool) -> None:
+    """Заполненность пула соединений, вычисляется в момент сбора метрик"""
+    if pool is None:
+        return
+    CACHE_POOL_CONNECTIONS.labels(name, "in_use").set_function(
+        lambda: len(getattr(pool, "_in_use_connections", ()))
+    )
+    CACHE_POOL_CONNECTIONS.labels(name, "available").set_function(
+        lambda: len(getattr(pool, "_available_connections", ()))
+    )
+    CACHE_POOL_CONNECTIONS.labels(name, "max").set_function(
+        lambda: getattr(pool, "max_connections", 0) or 0
+    )
+
+
+def top_namespaces(limit: int = 20, sort_by: str = "traffic") -> list:
+    """Пространства имён процесса, отсортированные по трафику (hits + misses) или байтам"""
+    rows = []
+    for namespace, stats in namespaces.snapshot().items():
+        total = stats["hits"] + stats["misses"]
+        rows.append({
+            "namespace": namespace,
+            **stats,
+            "requests": total,
+            "hit_ratio": round(stats["hits"] / total, 4) if total else 0.0,
+        })
+    key = "requests" if sort_by == "traffic" else "bytes_read"
+    return sorted(rows, key=lambda row: row[key], reverse=True)[:limit]
+
+
+async def sample_memory_usage(client, sample_size: Optional[int] = None) -> dict:
+    """
+    Оценка занимаемой памяти по пространствам имён:
+    выборка ключей через SCAN + MEMORY USAGE, экстраполяция на DBSIZE
+    """
+    from redis.exceptions import ResponseError
+
+    sample_size = sample_size or settings.CACHE_METRICS_MEMORY_SAMPLE
+    keys = []
+    cursor = 0
+    while len(keys) < sample_size:
+        cursor, batch = await client.scan(cursor=cursor, count=min(sample_size, 1000))
+        keys.extend(batch)
+        if not cursor:
+            break
+    keys = keys[:sample_size]
+    if not keys:
+        return {"sampled_keys": 0, "total_keys": 0, "namespaces": []}
+
+    async with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+        sizes = await pipe.execute(raise_on_error=False)
+    if any(isinstance(size, ResponseError) for size in sizes):
+        # MEMORY отключён (managed Redis) — приблизительно по длине строковых значений
+        async with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.strlen(key)
+            sizes = await pipe.execute(raise_on_error=False)
+
+    total_keys = await client.dbsize()
+    scale = total_keys / len(keys)
+    grouped: Dict[str, Dict[str, float]] = {}
+    for key, size in zip(keys, sizes):
+        if isinstance(size, Exception):
+            size = 0
+        row = grouped.setdefault(namespace_of(key), {"sampled_keys": 0, "sampled_bytes": 0})
+        row["sampled_keys"] += 1
+        row["sampled_bytes"] += size or 0
+
+    rows = [
+        {
+            "namespace": namespace,
+            "sampled_keys": row["sampled_keys"],
+            "sampled_bytes": row["sampled_bytes"],
+            "estimated_keys": int(row["sampled_keys"] * scale),
+            "estimated_bytes": int(row["sampled_bytes"] * scale),
+        }
+        for namespace, row in grouped.items()
+    ]
+    rows.sort(key=lambda row: row["estimated_bytes"], reverse=True)
+    return {"sampled_keys": len(keys), "total_keys": total_keys, "namespaces": rows}
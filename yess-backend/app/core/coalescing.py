@@ -0,0 +1,162 @@
+"""
+Объединение одинаковых одновременных анонимных GET (push-кампания: тысячи устройств
+запрашивают один и тот же каталог за секунды)
+- Только по явной отметке маршрута: роутер с route_class=CoalescedRoute и обработчик с @coalesce();
+  эндпоинты с ответом, зависящим от пользователя, не отмечаются
+- Запросы с Authorization не объединяются никогда
+- Ключ: путь, объявленные маршрутом query-параметры в отсортированном порядке (лишние,
+  например cache-buster, отбрасываются) и заголовки из vary (по умолчанию If-None-Match)
+- Обработчик (зависимости, запросы в БД, сериализация) выполняется один раз, остальные
+  получают копию готового ответа; исключения (в т.ч. 304 из conditional_get) — то же исключение
+- ttl > 0: ответ 200/304 ещё ttl секунд отдаётся из памяти процесса (микро-кэш)
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Coroutine, Optional, Sequence
+
+from fastapi.routing import APIRoute
+from prometheus_client import Counter
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.query_collector import route_template
+from app.core.single_flight import AsyncSingleFlight, LeaderCancelled
+
+COALESCED_REQUESTS = Counter(
+    "http_coalesced_requests_total", "GET requests served by another request's handler run",
+    ["endpoint", "source"]
+)
+
+CACHEABLE_STATUSES = (200, 304)
+
+
+class _Coalesce:
+    __slots__ = ("ttl", "vary")
+
+    def __init__(self, ttl: float, vary: Sequence[str]):
+        self.ttl = ttl
+        self.vary = tuple(name.lower() for name in vary)
+
+
+def query_param_names(dependant) -> frozenset:
+    """Имена query-параметров маршрута, включая параметры зависимостей"""
+    names = set()
+    stack = [dependant]
+    while stack:
+        current = stack.pop()
+        names.update(param.alias for param in current.query_params)
+        stack.extend(current.dependencies)
+    return frozenset(names)
+
+
+def coalesce(ttl: float = 0.0, vary: Sequence[str] = ("if-none-match",)):
+    """Отметка обработчика (ставится под @router.get): одинаковые анонимные GET объединяются"""
+    def decorator(endpoint):
+        endpoint.__coalesce__ = _Coalesce(ttl, vary)
+        return endpoint
+    return decorator
+
+
+class MicroCache:
+    """Готовые ответы на доли секунды; LRU по числу записей"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = settings.COALESCE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: tuple, snapshot: tuple, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, snapshot)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_flight = AsyncSingleFlight()
+micro_cache = MicroCache()
+
+
+def _snapshot(response: Response) -> Optional[tuple]:
+    """(статус, заголовки, тело) для раздачи другим запросам; None — ответ делить нельзя"""
+    body = getattr(response, "body", None)
+    if not isinstance(body, bytes) or response.background is not None:
+        return None  # Потоковый ответ или фоновая задача
+    if any(name == b"set-cookie" for name, _ in response.raw_headers):
+        return None
+    return response.status_code, list(response.raw_headers), body
+
+
+def _restore(snapshot: tuple) -> Response:
+    status_code, raw_headers, body = snapshot
+    response = Response(body, status_code=status_code)
+    response.raw_headers = list(raw_headers)
+    return response
+
+
+class CoalescedRoute(APIRoute):
+    """APIRoute, объединяющий одинаковые анонимные GET для обработчиков с @coalesce()"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine]:
+        handler = super().get_route_handler()
+        options: Optional[_Coalesce] = getattr(self.endpoint, "__coalesce__", None)
+        if options is None or not settings.COALESCING_ENABLED:
+            return handler
+        query_names = query_param_names(self.dependant)
+
+        def request_key(request: Request) -> tuple:
+            params = tuple(sorted(
+                (name, value) for name, value in request.query_params.multi_items() if name in query_names
+            ))
+            return (
+                request.method, request.url.path, params,
+                tuple(request.headers.get(name) for name in options.vary)
+            )
+
+        async def coalesced_handler(request: Request) -> Response:
+            if request.method not in ("GET", "HEAD") or "authorization" in request.headers:
+                return await handler(request)
+
+            key = request_key(request)
+            if options.ttl > 0:
+                snapshot = micro_cache.get(key)
+                if snapshot is not None:
+                    COALESCED_REQUESTS.labels(route_template(request.scope), "micro_cache").inc()
+                    return _restore(snapshot)
+
+            led = False
+
+            async def run() -> Response:
+                nonlocal led
+                led = True
+                return await handler(request)
+
+            try:
+                response = await _flight.do(key, run)
+            except LeaderCancelled:
+                # Отменён запрос-лидер, а не этот: выполняем обработчик сами
+                return await handler(request)
+
+            snapshot = _snapshot(response)
+            if led:
+                if snapshot is not None and options.ttl > 0 and response.status_code in CACHEABLE_STATUSES:
+                    micro_cache.set(key, snapshot, options.ttl)
+                return response
+            if snapshot is None:
+                return await handler(request)
+            COALESCED_REQUESTS.labels(route_template(request.scope), "in_flight").inc()
+            return _restore(snapshot)
+
+        return coalesced_handler
@@ -0,0 +1,220 @@
+"""
+Сжатие HTTP-ответов (чистый ASGI): br или gzip по Accept-Encoding клиента
+- Сжимаются JSON и текст от COMPRESSION_MIN_SIZE байт; тела больше COMPRESSION_MAX_SIZE,
+  потоковые ответы и ответы с Content-Encoding отдаются как есть
+- CPU-бюджет: воркер тратит на сжатие не больше COMPRESSION_CPU_BUDGET секунды в секунду,
+  сверх бюджета ответы уходят несжатыми — под нагрузкой CPU дороже трафика
+- Кэшируемые ответы (GET без no-store/private) хранятся сжатыми в памяти процесса (LRU,
+  COMPRESSION_CACHE_MAX_BYTES): ключ — маршрут и ETag, без ETag — хэш тела. Сжатие
+  оплачивается один раз на версию содержимого, попадание в кэш бюджет не тратит
+- Большие тела сжимаются в пуле потоков (zlib и brotli отпускают GIL), не блокируя event loop
+brotli — необязательная зависимость: без неё клиенты получают gzip
+"""
+import gzip
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import settings
+from app.core.request_timing import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+THREADPOOL_THRESHOLD = 256 * 1024
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Кодировка для ответа: br, затем gzip; q=0 запрещает кодировку"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 — одинаковое тело даёт одинаковый результат
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionBudget:
+    """Время сжатия за текущее окно в 1 секунду"""
+
+    def __init__(self, budget: Optional[float] = None):
+        self.budget = settings.COMPRESSION_CPU_BUDGET if budget is None else budget
+        self._window_start = 0.0
+        self._used = 0.0
+
+    def available(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if now - self._window_start >= 1.0:
+            self._window_start, self._used = now, 0.0
+        return self._used < self.budget
+
+    def spend(self, seconds: float):
+        self._used += seconds
+
+
+class PrecompressedCache:
+    """Сжатые тела по ключу (версия содержимого, кодировка); LRU по суммарному размеру"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = settings.COMPRESSION_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return body
+
+    def set(self, key: tuple, body: bytes):
+        # Одно тело не должно вытеснять весь кэш
+        if len(body) > self.max_bytes // 4:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def get_stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+def content_key(scope, headers: Headers, body: bytes) -> Optional[tuple]:
+    """Ключ версии содержимого; None — ответ не кэшируется"""
+    cache_control = headers.get("cache-control", "").lower()
+    if scope["method"] != "GET" or "no-store" in cache_control or "private" in cache_control:
+        return None
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        # Одна версия (ETag) может относиться к разным маршрутам
+        return ("etag", scope["path"], scope["query_string"], etag)
+    return ("body", hashlib.blake2b(body, digest_size=16).digest())
+
+
+class CompressionMiddleware:
+    """Сжатие ответов br/gzip с бюджетом CPU и кэшем предсжатых тел"""
+
+    def __init__(
+        self,
+        app,
+        cache: Optional[PrecompressedCache] = None,
+        budget: Optional[CompressionBudget] = None
+    ):
+        self.app = app
+        self.cache = cache if cache is not None else PrecompressedCache()
+        self.budget = budget if budget is not None else CompressionBudget()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            start, start_message = start_message, None
+            await self._send_response(scope, encoding, start, message, send)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _send_response(self, scope, encoding: Optional[str], start: dict, message: dict, send):
+        headers = MutableHeaders(scope=start)
+        body = message.get("body", b"")
+        if not self._is_compressible(start["status"], headers):
+            await send(start)
+            await send(message)
+            return
+
+        headers.add_vary_header("Accept-Encoding")
+        if (
+            encoding is None
+            or message.get("more_body", False)
+            or not settings.COMPRESSION_MIN_SIZE <= len(body) <= settings.COMPRESSION_MAX_SIZE
+        ):
+            await send(start)
+            await send(message)
+            return
+
+        with span("compression"):
+            compressed = await self._compressed_body(scope, headers, body, encoding)
+        if compressed is None or len(compressed) >= len(body):
+            await send(start)
+            await send(message)
+            return
+
+        headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(compressed))
+        await send(start)
+        await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+    async def _compressed_body(self, scope, headers: Headers, body: bytes, encoding: str) -> Optional[bytes]:
+        """Сжатое тело из кэша или сжатое сейчас; None — бюджет CPU исчерпан"""
+        key = content_key(scope, headers, body)
+        if key is not None:
+            cached = self.cache.get(key + (encoding,))
+            if cached is not None:
+                return cached
+
+        if not self.budget.available():
+            return None
+
+        start = time.perf_counter()
+        if len(body) >= THREADPOOL_THRESHOLD:
+            compressed = await run_in_threadpool(compress, body, encoding)
+        else:
+            compressed = compress(body, encoding)
+        self.budget.spend(time.perf_counter() - start)
+
+        if key is not None:
+            self.cache.set(key + (encoding,), compressed)
+        return compressed
+
+    @staticmethod
+    def _is_compressible(status_code: int, headers: Headers) -> bool:
+        return (
+            status_code not in (204, 206, 304)
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
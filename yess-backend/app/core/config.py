@@ -28,6 +28,38 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "yess_db")
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
     DATABASE_URL: Optional[str] = None  # Alternative database URL
+    # Реплики для чтения (app.core.db_replicas): URL через запятую, пусто — всё читается с primary
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    DB_REPLICA_MAX_LAG: float = 5.0  # Реплика с большим отставанием (сек) не используется
+    DB_REPLICA_CHECK_INTERVAL: float = 2.0  # Период опроса отставания реплик (сек)
+    DB_READ_YOUR_WRITES_TTL: int = 30  # Сколько помнить LSN последней записи пользователя (сек)
+    # Учёт SQL-запросов на HTTP-запрос (app.core.query_collector)
+    DB_QUERY_COLLECTOR_ENABLED: bool = True
+    DB_N_PLUS_ONE_THRESHOLD: int = 5  # Один отпечаток запроса столько раз за запрос — подозрение на N+1
+    DB_QUERY_BUDGET_DEFAULT: int = 50  # Лимит SQL-запросов на HTTP-запрос для эндпоинтов без своего
+    DB_QUERY_BUDGETS: Dict[str, int] = {
+        "GET /api/v1/stories": 5,
+        "GET /api/v1/partners/list": 2,
+        "GET /api/v1/partners/locations": 2,
+        "GET /api/v1/wallet/balance": 5,
+        "POST /api/v1/orders/calculate": 4,
+    }
+    DB_QUERY_BUDGET_STRICT: bool = False  # True (в тестах) — превышение бюджета вызывает ошибку
+    # Статистика запросов по отпечаткам (app.core.query_stats)
+    DB_QUERY_STATS_ENABLED: bool = True
+    DB_QUERY_STATS_MAX_FINGERPRINTS: int = 500  # Сколько отпечатков держать в памяти
+    DB_QUERY_STATS_SAMPLES: int = 256  # Последних длительностей на отпечаток для p95
+    DB_QUERY_STATS_EXPORT_TOP: int = 50  # Сколько отпечатков выгружать в /metrics
+    # Автоматический EXPLAIN медленных запросов (app.core.query_plans)
+    DB_EXPLAIN_ENABLED: bool = True
+    DB_EXPLAIN_THRESHOLD: float = 0.5  # SELECT дольше (сек) получает EXPLAIN
+    DB_EXPLAIN_INTERVAL: int = 300  # Не чаще одного плана на отпечаток за интервал (сек)
+    DB_EXPLAIN_BUFFER: int = 100  # Сколько последних планов хранить
+    DB_EXPLAIN_WATCH_TABLES: List[str] = ["transactions", "partners", "analytics_events"]
+    # Помесячные секции transactions и analytics_events (app.core.partitioning)
+    DB_PARTITION_PREMAKE_MONTHS: int = 3  # На сколько месяцев вперёд создавать секции
+    DB_PARTITION_RETENTION_MONTHS: Dict[str, int] = {"transactions": 36, "analytics_events": 13}  # 0 — хранить всё
+    DB_PARTITION_ARCHIVE_SCHEMA: str = "archive"  # Куда переносить старые секции; "" — удалять
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -67,6 +99,10 @@ class Settings(BaseSettings):
         "http://127.0.0.1:8000",
     ]
     
+    def get_replica_urls(self) -> List[str]:
+        """URL реплик из DATABASE_REPLICA_URLS"""
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    
     def get_cors_origins(self) -> List[str]:
         """Получить CORS origins в зависимости от окружения"""
         base_origins = self.CORS_ORIGINS.copy()
@@ -103,9 +139,61 @@ class Settings(BaseSettings):
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 100
     RATE_LIMIT_PER_HOUR: int = 1000
+    # Политики по префиксу пути (app.core.rate_limit): самый длинный совпавший префикс
+    # заменяет лимиты по умолчанию. Против перебора — только вход и регистрация:
+    # /auth/me клиенты вызывают при каждом открытии приложения
+    RATE_LIMIT_POLICIES: Dict[str, List[str]] = {
+        "/api/v1/auth/login": ["5/minute", "30/hour"],  # И /auth/login/json
+        "/api/v1/auth/register": ["5/minute", "30/hour"],
+        "/api/v1/partner/auth/login": ["5/minute", "30/hour"],
+        "/api/v1/admin/auth/login": ["5/minute", "30/hour"],
+        "/api/v1/upload": ["20/hour"],
+        "/api/v1/qr/qr/pay": ["10/minute", "100/hour"],  # Роутер qr смонтирован с префиксом /qr дважды
+        # Повторы платёжных шлюзов не должны упираться в лимит
+        "/api/v1/webhooks": ["300/minute"],
+        "/api/v1/wallet/webhook": ["300/minute"],
+    }
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000  # Ключей в памяти процесса, пока Redis недоступен
+
+    # Блокировка IP после серии неудачных ответов (app.core.security_middleware)
+    SECURITY_TRACKER_REDIS: bool = True  # Счётчики в Redis: блокировка общая для всех воркеров
+    SECURITY_TRACKER_MAX_IPS: int = 10000  # IP в памяти процесса (LRU)
+    SECURITY_BLOCK_CHECK_INTERVAL: float = 1.0  # Секунд кэшировать в процессе ответ Redis "не заблокирован"
 
     # Middleware & Monitoring
-    ENABLE_PERFORMANCE_MONITORING: bool = False
+    ENABLE_PERFORMANCE_MONITORING: bool = True  # HTTP-метрики в памяти процесса (/metrics)
+    # Разбивка времени запроса по участкам (app.core.request_timing): гистограмма всегда,
+    # заголовок Server-Timing — только клиентам из SERVER_TIMING_NETWORKS или с X-Server-Timing-Token
+    SERVER_TIMING_ENABLED: bool = True
+    SERVER_TIMING_NETWORKS: List[str] = ["127.0.0.0/8", "::1/128"]
+    SERVER_TIMING_TOKEN: Optional[str] = None
+    # /metrics (SQL-отпечатки, структура ключей кэша) — только прямым запросам из этих сетей
+    # (не через прокси: X-Forwarded-For) или с Authorization: Bearer METRICS_TOKEN
+    METRICS_NETWORKS: List[str] = ["127.0.0.0/8", "::1/128", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16"]
+    METRICS_TOKEN: Optional[str] = None
+
+    # Сжатие ответов (app.core.compression): br/gzip по Accept-Encoding
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # Меньшие тела сжатие не окупают
+    COMPRESSION_MAX_SIZE: int = 8 * 1024 * 1024  # Большие тела отдаются как есть
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5  # 5 — по скорости близко к gzip -6, тело меньше
+    COMPRESSION_CPU_BUDGET: float = 0.25  # Секунд сжатия в секунду на воркер; сверх — без сжатия
+    COMPRESSION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Предсжатые тела в памяти процесса
+
+    # Объединение одинаковых анонимных GET на отмеченных маршрутах (app.core.coalescing)
+    COALESCING_ENABLED: bool = True
+    COALESCE_CACHE_MAX_ENTRIES: int = 1000  # Ответов микро-кэша в памяти процесса
+
+    # Пространственный индекс точек партнёров в памяти процесса (app.services.spatial_index)
+    SPATIAL_INDEX_ENABLED: bool = True
+    SPATIAL_INDEX_POLL_INTERVAL: float = 1.0  # Секунд между чтениями потока изменений
+    SPATIAL_INDEX_MAX_AGE: int = 3600  # Страховочная полная перезагрузка, секунды
+    SPATIAL_INDEX_STREAM_MAXLEN: int = 10000
+    SPATIAL_INDEX_POINTS_PER_CELL: int = 8
+    SPATIAL_INDEX_KNN_MAX_KM: float = 50.0  # Дальше k ближайших не ищутся
+    # Поиск в радиусе сырым SQL (app.services.geo_search): auto | postgis | earthdistance | bbox
+    GEO_SEARCH_STRATEGY: str = "auto"
     LOG_LEVEL: str = "INFO"  # Logging level: DEBUG, INFO, WARNING, ERROR, CRITICAL
 
     # File Uploads & Storage
@@ -127,6 +215,35 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://redis:6379/0"
     REDIS_CACHE_TTL: int = 3600  # Default cache TTL in seconds
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", 150))  # Общий пул на процесс
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # Таймаут операции (сек) — кэш не должен задерживать запрос
+    REDIS_CONNECT_TIMEOUT: float = 1.0  # Таймаут установки соединения (сек)
+    REDIS_RETRY_BACKOFF: float = 5.0  # Пауза после ошибки соединения, в течение которой кэш пропускается
+
+    # In-process L1 кэш перед Redis (только для горячих, редко меняющихся ключей)
+    CACHE_L1_ENABLED: bool = True
+    CACHE_L1_MAX_ENTRIES: int = 10000
+    CACHE_L1_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_L1_TTL: int = 60  # Верхняя граница рассинхронизации, если pub/sub сообщение потеряно
+    CACHE_L1_PREFIXES: List[str] = ["partner:", "partners:", "categories"]
+    CACHE_INVALIDATION_CHANNEL: str = "cache:invalidate"
+    CACHE_TAG_TTL: int = 86400  # Минимальный TTL множеств tag:{tag}
+    CACHE_INVALIDATION_BATCH: int = 500  # Размер порции SCAN/UNLINK при инвалидации
+
+    # Формат значений в Redis (app.core.cache_codec)
+    CACHE_CODEC: str = "json"  # json (orjson, если установлен) | msgpack
+    CACHE_COMPRESSION: str = "zstd"  # zstd | lz4 | none
+    CACHE_COMPRESSION_THRESHOLD: int = 1024  # Сжимать значения от этого размера (байт)
+    CACHE_COMPRESSION_LEVEL: int = 3  # Уровень zstd
+
+    # Метрики кэша (app.core.cache_metrics)
+    CACHE_METRICS_MAX_NAMESPACES: int = 200  # Ограничение кардинальности метки namespace
+    CACHE_METRICS_MEMORY_SAMPLE: int = 1000  # Ключей в выборке MEMORY USAGE для /admin/cache
+
+    # Защита от cache stampede в CacheService.get_or_set / cache_method
+    CACHE_LOCK_TTL_MS: int = 10000  # Время жизни блокировки на пересчёт ключа
+    CACHE_LOCK_WAIT: float = 3.0  # Сколько ждать чужой пересчёт, прежде чем считать самим
+    CACHE_XFETCH_BETA: float = 1.0  # Агрессивность досрочного обновления (0 — отключено)
 
     # SMS Notifications (Twilio)
     SMS_ENABLED: bool = False
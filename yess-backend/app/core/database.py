@@ -2,12 +2,19 @@
 Database connection and session management with optimized pooling for high load
 Оптимизировано для 4000+ одновременных пользователей
 """
+from fastapi import Depends
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import QueuePool
 from sqlalchemy.engine import Engine
 from app.core.config import settings
+from app.core.db_replicas import AsyncRoutingSession, Replica, ReplicaSet, RoutingSession
+from app.core.query_collector import record_query
+from app.core.query_plans import capture_slow_statement, plan_capture
+from app.core.query_stats import record_statement
+from app.core.request_timing import record_span
 import logging
 import os
 
@@ -20,6 +27,12 @@ POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 30))  # Увеличено для вы
 MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 60))  # Дополнительные соединения
 POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))  # 1 час
 POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+# Отдельный пул для AsyncEngine; оба пула делят max_connections PostgreSQL
+ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", 20))
+ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", 10))
+# Пулы каждой реплики (sync и async)
+REPLICA_POOL_SIZE = int(os.getenv("DB_REPLICA_POOL_SIZE", 10))
+REPLICA_MAX_OVERFLOW = int(os.getenv("DB_REPLICA_MAX_OVERFLOW", 20))
 
 # Оптимизированная конфигурация пула соединений для production с высокой нагрузкой
 engine = create_engine(
@@ -53,13 +66,99 @@ def receive_after_cursor_execute(conn, cursor, statement, parameters, context, e
     if conn.info.get('query_start_time'):
         start_time = conn.info['query_start_time'].pop(-1)
         total = time.time() - start_time
+        record_query(statement, total)
+        record_span("db", total)
+        record_statement(statement, total, cursor.rowcount)
+        if not executemany:
+            capture_slow_statement(conn.engine, statement, parameters, total)
         if total > 1.0:  # Логируем запросы дольше 1 секунды
             logger.warning(f"Slow query detected ({total:.2f}s): {statement[:100]}")
         # Также логируем очень медленные запросы (> 5 секунд)
         if total > 5.0:
             logger.error(f"Very slow query detected ({total:.2f}s): {statement[:200]}")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
+
+
+def _async_database_url(url: str) -> str:
+    """postgresql:// → postgresql+asyncpg://, sqlite:// → sqlite+aiosqlite://"""
+    scheme, sep, rest = url.partition("://")
+    driver = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg",
+              "postgresql+psycopg2": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return f"{driver.get(scheme, scheme)}{sep}{rest}"
+
+
+# Асинхронный движок для горячих эндпоинтов: запросы не блокируют event loop,
+# воркер обслуживает несколько запросов к БД одновременно
+async_engine = create_async_engine(
+    _async_database_url(settings.SQLALCHEMY_DATABASE_URI or settings.DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=ASYNC_POOL_SIZE,
+    max_overflow=ASYNC_MAX_OVERFLOW,
+    pool_recycle=POOL_RECYCLE,
+    pool_timeout=POOL_TIMEOUT,
+    echo=False,
+    connect_args={
+        "timeout": 10,
+        "server_settings": {
+            "application_name": "yess_backend_async",
+            "statement_timeout": "30000"  # Таймаут запроса 30 секунд
+        }
+    },
+    isolation_level="READ COMMITTED"
+)
+
+# expire_on_commit=False: после commit атрибуты остаются доступны без ленивой загрузки
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+    sync_session_class=AsyncRoutingSession
+)
+
+
+def _create_replica(url: str) -> Replica:
+    async_url = _async_database_url(url)
+    replica_engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_pre_ping=True,
+        pool_size=REPLICA_POOL_SIZE,
+        max_overflow=REPLICA_MAX_OVERFLOW,
+        pool_recycle=POOL_RECYCLE,
+        pool_timeout=POOL_TIMEOUT,
+        connect_args={
+            "connect_timeout": 10,
+            "application_name": "yess_backend_replica",
+            "options": "-c statement_timeout=30000"
+        }
+    )
+    replica_async_engine = create_async_engine(
+        async_url,
+        pool_pre_ping=True,
+        pool_size=REPLICA_POOL_SIZE,
+        max_overflow=REPLICA_MAX_OVERFLOW,
+        pool_recycle=POOL_RECYCLE,
+        pool_timeout=POOL_TIMEOUT,
+        connect_args={
+            "timeout": 10,
+            "server_settings": {
+                "application_name": "yess_backend_replica_async",
+                "statement_timeout": "30000"
+            }
+        }
+    )
+    return Replica(replica_engine.url.host or url, replica_engine, replica_async_engine)
+
+
+# Реплики для чтения; без DATABASE_REPLICA_URLS всё идёт на primary
+replica_set = None
+if settings.get_replica_urls():
+    replica_set = ReplicaSet([_create_replica(url) for url in settings.get_replica_urls()])
+RoutingSession.replicas = replica_set
+
+# EXPLAIN для запросов через asyncpg снимается sync-движком той же базы
+plan_capture.register_sync_engine(async_engine.sync_engine, engine)
+for replica in (replica_set.replicas if replica_set is not None else ()):
+    plan_capture.register_sync_engine(replica.async_engine.sync_engine, replica.engine)
 
 Base = declarative_base()
 
@@ -73,13 +172,37 @@ def get_db():
         db.close()
 
 
-def get_engine_stats():
-    """Получение статистики пула соединений"""
-    pool = engine.pool
+async def get_async_db():
+    """Dependency for getting async DB session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db(db: Session = Depends(get_db)):
+    """Сессия для чтения: SELECT уходят на реплики (после записи — на primary)"""
+    db.info["read_only"] = True
+    return db
+
+
+async def get_async_read_db(db: AsyncSession = Depends(get_async_db)):
+    """Асинхронная сессия для чтения (см. get_read_db)"""
+    db.info["read_only"] = True
+    return db
+
+
+def _pool_stats(pool):
     return {
         "pool_size": pool.size(),
         "checked_in": pool.checkedin(),
         "checked_out": pool.checkedout(),
-        "overflow": pool.overflow(),
-        "invalid": pool.invalid()
+        "overflow": pool.overflow()
     }
+
+
+def get_engine_stats():
+    """Получение статистики пула соединений"""
+    stats = _pool_stats(engine.pool)
+    stats["async"] = _pool_stats(async_engine.pool)
+    if replica_set is not None:
+        stats["replicas"] = replica_set.stats()
+    return stats
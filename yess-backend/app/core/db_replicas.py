@@ -0,0 +1,203 @@
+"""
+Маршрутизация чтения на реплики PostgreSQL
+- RoutingSession.get_bind отправляет на реплику SELECT из read-only сессии (get_read_db /
+  get_async_read_db) и запросы, помеченные on_replica(); запись, SELECT ... FOR UPDATE и
+  всё, что идёт после записи в той же сессии, — на primary
+- ReplicaSet в фоновом потоке опрашивает отставание и позицию воспроизведения WAL;
+  недоступная или отставшая больше DB_REPLICA_MAX_LAG реплика не используется
+- Read-your-writes: после записи запоминается LSN primary (consistency token); чтение с
+  токеном идёт только на реплику, которая уже воспроизвела этот LSN, иначе — на primary
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import Select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONSISTENCY_HEADER = "X-Consistency-Token"
+
+_STATUS_SQL = text("""
+    SELECT
+        pg_last_wal_replay_lsn()::text AS replay_lsn,
+        CASE
+            WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END AS lag
+""")
+_WRITE_LSN_SQL = text("SELECT pg_current_wal_lsn()::text")
+
+
+def parse_lsn(lsn: Optional[str]) -> int:
+    """LSN PostgreSQL ("16/B374D848") → число для сравнения; пустое/некорректное → 0"""
+    if not lsn:
+        return 0
+    high, sep, low = str(lsn).partition("/")
+    try:
+        return (int(high, 16) << 32) + int(low, 16) if sep else 0
+    except ValueError:
+        return 0
+
+
+def on_replica(statement):
+    """Явная пометка запроса только на чтение: его можно выполнить на реплике"""
+    return statement.execution_options(replica=True)
+
+
+class Replica:
+    """Реплика: sync и async движки + последнее известное состояние"""
+
+    def __init__(self, name: str, engine: Engine, async_engine):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.lag: Optional[float] = None
+        self.replay_lsn = 0
+        self.checked_at = 0.0
+
+    def available(self, max_lag: float, stale_after: float) -> bool:
+        # Давно не опрашивалась (монитор не запущен или завис) — считаем недоступной
+        return self.lag is not None and self.lag <= max_lag and time.monotonic() - self.checked_at <= stale_after
+
+    def bind(self, use_async: bool) -> Engine:
+        return self.async_engine.sync_engine if use_async else self.engine
+
+
+class ReplicaSet:
+    """Набор реплик с выбором по кругу среди доступных и фоновой проверкой отставания"""
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        max_lag: Optional[float] = None,
+        check_interval: Optional[float] = None
+    ):
+        self.replicas = replicas
+        self.max_lag = settings.DB_REPLICA_MAX_LAG if max_lag is None else max_lag
+        self.check_interval = check_interval or settings.DB_REPLICA_CHECK_INTERVAL
+        self._counter = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def choose(self, min_lsn: int = 0, use_async: bool = False) -> Optional[Engine]:
+        """Движок доступной реплики, уже воспроизведшей min_lsn; None — читать с primary"""
+        stale_after = self.check_interval * 3
+        candidates = [
+            replica for replica in self.replicas
+            if replica.available(self.max_lag, stale_after) and replica.replay_lsn >= min_lsn
+        ]
+        if not candidates:
+            return None
+        return candidates[next(self._counter) % len(candidates)].bind(use_async)
+
+    def check(self):
+        """Опрос отставания всех реплик"""
+        for replica in self.replicas:
+            was_available = replica.lag is not None and replica.lag <= self.max_lag
+            try:
+                with replica.engine.connect() as conn:
+                    row = conn.execute(_STATUS_SQL).one()
+                replica.replay_lsn = parse_lsn(row.replay_lsn)
+                replica.lag = float(row.lag or 0)
+                if replica.lag > self.max_lag and was_available:
+                    logger.warning(f"Replica {replica.name} lags {replica.lag:.1f}s, reads go to primary")
+            except Exception as e:
+                if was_available or not replica.checked_at:
+                    logger.warning(f"Replica {replica.name} unavailable: {e}")
+                replica.lag = None
+            replica.checked_at = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.check_interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-replica-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+            self._thread = None
+
+    def stats(self) -> list:
+        return [
+            {"name": replica.name, "lag": replica.lag, "replay_lsn": replica.replay_lsn}
+            for replica in self.replicas
+        ]
+
+
+class RoutingSession(Session):
+    """Session с маршрутизацией чтения на реплики (без реплик — обычная Session)"""
+
+    replicas: Optional[ReplicaSet] = None  # Задаётся в app.core.database
+    use_async_engines = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self._replica_bind(clause)
+        if replica is not None:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+    def _replica_bind(self, clause) -> Optional[Engine]:
+        if self._flushing or isinstance(clause, UpdateBase):
+            # После записи сессия до конца читает с primary
+            self.info["wrote"] = True
+            return None
+        if self.replicas is None or clause is None or self.info.get("wrote"):
+            return None
+        marked = clause.get_execution_options().get("replica")
+        if marked is False or getattr(clause, "_for_update_arg", None) is not None:
+            return None
+        if not (marked or (self.info.get("read_only") and isinstance(clause, Select))):
+            return None
+        return self.replicas.choose(self.info.get("min_lsn", 0), self.use_async_engines)
+
+
+class AsyncRoutingSession(RoutingSession):
+    """sync_session_class для AsyncSession: реплики через sync_engine их AsyncEngine"""
+
+    use_async_engines = True
+
+
+def _token_key(user_id: int) -> str:
+    return f"ryw:user:{user_id}"
+
+
+async def aremember_write(db, user_id: int) -> Optional[str]:
+    """
+    После commit: LSN primary как consistency token пользователя
+    Сохраняется в Redis на DB_READ_YOUR_WRITES_TTL и возвращается для заголовка ответа
+    """
+    if RoutingSession.replicas is None:
+        return None
+    from app.core.cache import redis_cache
+
+    token = (await db.execute(_WRITE_LSN_SQL)).scalar()
+    await redis_cache.set(_token_key(user_id), token, ttl=settings.DB_READ_YOUR_WRITES_TTL)
+    return token
+
+
+async def aread_your_writes(db, user_id: Optional[int], token: Optional[str] = None):
+    """Чтение в этой сессии увидит последнюю запись пользователя (токен из заголовка или Redis)"""
+    if RoutingSession.replicas is None:
+        return
+    if not token and user_id is not None:
+        from app.core.cache import redis_cache
+        token = await redis_cache.get(_token_key(user_id))
+    min_lsn = parse_lsn(token)
+    if min_lsn:
+        db.info["min_lsn"] = max(db.info.get("min_lsn", 0), min_lsn)
@@ -5,7 +5,8 @@ import logging
 import traceback
 from typing import Optional, Dict, Any
 from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.utils import is_body_allowed_for_status_code
 from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from app.core.config import settings
@@ -76,8 +77,12 @@ async def app_exception_handler(request: Request, exc: AppException) -> JSONResp
     )
 
 
-async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
+async def http_exception_handler(request: Request, exc: HTTPException) -> Response:
     """Обработчик HTTP исключений"""
+    # 304 Not Modified (условные GET) — без тела, с заголовками ETag/Cache-Control
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=exc.headers)
+
     logger.warning(
         f"HTTP exception: {exc.detail}",
         extra={
@@ -0,0 +1,190 @@
+"""
+HTTP-кэширование справочных эндпоинтов: сильные ETag из версий содержимого и 304
+- Версия содержимого — счётчик пространства имён cache_service (Redis, копия в L1 обновляется
+  по pub/sub). Тело ответа не хэшируется: If-None-Match сверяется в зависимости маршрута,
+  до обработчика и до запросов к БД
+- Версия повышается после commit любой сессии, изменившей модели из CONTENT_MODELS
+  (в том числе query.update/delete); счётчики просмотров и кликов сторисов её не меняют.
+  Commit в потоке event loop повышает её фоновой задачей через async-клиент Redis
+- Тем же commit сбрасываются краткие представления изменённых партнёров, акций и городов
+  (app.services.entity_cache) — до повышения версии, чтобы под новым ETag не оказалось старое тело
+- Cache-Control задаётся на маршруте; ответы, зависящие от пользователя, — private,
+  в ETag входит пользователь из JWT (user:<sub>) или IP
+- Redis недоступен — ETag не выставляется, ответ формируется как обычно
+"""
+import hashlib
+import time
+from typing import Iterable, Optional, Set
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.rate_limit import client_identity
+from app.models.city import City
+from app.models.partner import Partner, PartnerLocation
+from app.models.partner_product import PartnerProduct
+from app.models.promotion import Promotion
+from app.models.story import Story
+from app.services.cache_service import cache_service
+from app.services.entity_cache import ENTITY_OF_MODEL, entity_tag, entity_wide_tag
+
+# Модель → содержимое, версию которого она меняет
+CONTENT_MODELS = {
+    Partner: "partners",
+    PartnerLocation: "partners",
+    PartnerProduct: "products",
+    Story: "stories",
+    Promotion: "stories",  # Название акции в сторисе
+    City: "stories",  # Название города в сторисе
+}
+
+# Поля, изменение которых не считается изменением содержимого
+IGNORED_ATTRIBUTES = {
+    Story: {"views_count", "clicks_count", "shares_count", "updated_at"},
+}
+
+_SESSION_KEY = "content_changes"
+_ENTITIES_KEY = "entity_changes"
+
+
+def namespace_key(content: str) -> str:
+    return f"http:{content}"
+
+
+def _has_content_changes(obj) -> bool:
+    ignored = IGNORED_ATTRIBUTES.get(type(obj), ())
+    return any(
+        attr.history.has_changes()
+        for attr in inspect(obj).attrs
+        if attr.key not in ignored
+    )
+
+
+def _changed_content(session: Session) -> Set[str]:
+    changed = set()
+    for obj in list(session.new) + list(session.deleted):
+        content = CONTENT_MODELS.get(type(obj))
+        if content:
+            changed.add(content)
+    for obj in session.dirty:
+        content = CONTENT_MODELS.get(type(obj))
+        if content and content not in changed and _has_content_changes(obj):
+            changed.add(content)
+    return changed
+
+
+def _changed_entities(session: Session) -> Set[str]:
+    """Теги кэша сущностей для удалённых и изменённых объектов (новых в кэше ещё нет)"""
+    tags = set()
+    for obj in session.deleted:
+        entity = ENTITY_OF_MODEL.get(type(obj))
+        if entity:
+            tags.add(entity_tag(entity, obj.id))
+    for obj in session.dirty:
+        entity = ENTITY_OF_MODEL.get(type(obj))
+        if entity and _has_content_changes(obj):
+            tags.add(entity_tag(entity, obj.id))
+    return tags
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    changed = _changed_content(session)
+    if changed:
+        session.info.setdefault(_SESSION_KEY, set()).update(changed)
+    tags = _changed_entities(session)
+    if tags:
+        session.info.setdefault(_ENTITIES_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        model = mapper.class_ if mapper is not None else None
+        content = CONTENT_MODELS.get(model)
+        if content:
+            orm_execute_state.session.info.setdefault(_SESSION_KEY, set()).add(content)
+        entity = ENTITY_OF_MODEL.get(model)
+        if entity:
+            orm_execute_state.session.info.setdefault(_ENTITIES_KEY, set()).add(entity_wide_tag(entity))
+
+
+async def _abump(tags, namespaces):
+    for tag in tags:
+        await cache_service.ainvalidate_tag(tag)
+    for namespace in namespaces:
+        await cache_service.ainvalidate_namespace(namespace)
+
+
+def _bump(tags, namespaces):
+    for tag in tags:
+        cache_service.invalidate_tag(tag)
+    for namespace in namespaces:
+        cache_service.invalidate_namespace(namespace)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_versions(session):
+    tags = sorted(session.info.pop(_ENTITIES_KEY, ()))
+    namespaces = [namespace_key(content) for content in sorted(session.info.pop(_SESSION_KEY, ()))]
+    if not tags and not namespaces:
+        return
+    cache_service.run_in_background(lambda: _abump(tags, namespaces), lambda: _bump(tags, namespaces))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_ENTITIES_KEY, None)
+
+
+def make_etag(parts: Iterable) -> str:
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match со слабым сравнением (W/ игнорируется), "*" совпадает с любым ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def conditional_get(
+    *contents: str,
+    cache_control: str,
+    per_user: bool = False,
+    refresh_every: Optional[int] = None
+):
+    """
+    Зависимость маршрута: ETag и Cache-Control; совпавший If-None-Match — 304 без обработчика
+    contents — содержимое, от которого зависит ответ ("partners", "products", "stories")
+    refresh_every — ответ меняется и со временем (сторисы истекают): ETag обновляется
+    не реже, чем раз в столько секунд
+    """
+    async def check(request: Request, response: Response):
+        versions = [await cache_service.aget_namespace_version(namespace_key(content)) for content in contents]
+        if not all(versions):
+            return  # Redis недоступен — без ETag
+
+        parts = list(versions)
+        if per_user:
+            parts.append(client_identity(request.scope))
+        if refresh_every:
+            parts.append(int(time.time() // refresh_every))
+        etag = make_etag(parts)
+
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if per_user:
+            headers["Vary"] = "Authorization"
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return Depends(check)
@@ -0,0 +1,160 @@
+"""
+In-process L1 кэш (LRU + TTL) перед Redis
+Хранит уже декодированные значения горячих ключей (partner:{id}, partners:city:{id}, категории),
+чтобы не ходить в Redis и не декодировать JSON на каждый запрос.
+Межпроцессная инвалидация — через Redis pub/sub (см. RedisCache.start_invalidation_listener)
+"""
+import fnmatch
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+
+class LocalCache:
+    """
+    LRU-кэш с TTL, ограниченный количеством записей и суммарным размером (в байтах)
+    Потокобезопасен: CacheService вызывается и из threadpool синхронных эндпоинтов.
+    Значения отдаются по ссылке — вызывающий код не должен их изменять.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl: int = 60,
+        prefixes: Optional[Iterable[str]] = None,
+        enabled: bool = True
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.prefixes: Tuple[str, ...] = tuple(prefixes or ())
+        self.enabled = enabled
+        # Идентификатор процесса в сообщениях инвалидации (свои сообщения не применяются повторно)
+        self.instance_id = uuid.uuid4().hex
+        # True, пока слушатель pub/sub (RedisCache) подписан на канал инвалидации: только тогда
+        # в L1 можно держать версии пространств имён — иначе чужой INCR дойдёт лишь по TTL
+        self.subscribed = False
+
+        # key -> (value, size_bytes, expires_at)
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Увеличивается при каждой инвалидации: значение, прочитанное из Redis
+        # до инвалидации, не должно попасть в L1 после неё
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_cacheable(self, key: str) -> bool:
+        """Попадает ли ключ в L1 (только горячие, редко меняющиеся префиксы)"""
+        return self.enabled and key.startswith(self.prefixes)
+
+    def get(self, key: str, default: Any = None, track: bool = True) -> Any:
+        """track=False — служебное чтение, не учитывается в статистике попаданий"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += track
+                return default
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += track
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += track
+            return value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        size: int,
+        ttl: Optional[int] = None,
+        generation: Optional[int] = None
+    ):
+        """
+        Сохранение значения
+        size: размер сериализованного значения в байтах (для ограничения памяти)
+        ttl: не больше default_ttl — L1 не должен жить дольше, чем допустимая рассинхронизация
+        generation: значение self.generation на момент чтения из Redis
+        """
+        if size > self.max_bytes:
+            return
+
+        ttl = min(ttl or self.default_ttl, self.default_ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, *keys: str) -> int:
+        removed = 0
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+        return removed
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Удаление по glob-шаблону (тот же синтаксис, что у Redis KEYS/SCAN)"""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Общий L1 для RedisCache и CacheService в рамках одного процесса
+local_cache = LocalCache(
+    max_entries=settings.CACHE_L1_MAX_ENTRIES,
+    max_bytes=settings.CACHE_L1_MAX_BYTES,
+    default_ttl=settings.CACHE_L1_TTL,
+    prefixes=settings.CACHE_L1_PREFIXES,
+    enabled=settings.CACHE_L1_ENABLED
+)
@@ -0,0 +1,157 @@
+"""
+Keyset (курсорная) пагинация списков
+Вместо OFFSET/LIMIT следующая страница начинается строго после последней строки
+предыдущей: WHERE (created_at, id) < (:created_at, :id) ORDER BY created_at DESC, id DESC.
+Такой запрос идёт по составному индексу (idx_transaction_user_status и т.п.) и стоит
+одинаково на любой глубине. Курсор — непрозрачная строка (base64 от значений ключа
+сортировки последней строки). Общее число строк считается только по запросу
+(include_total) и на PostgreSQL берётся из оценки планировщика, без полного COUNT(*)
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Query as QueryParam
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import Query, Session
+
+from app.core.exceptions import ValidationException
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _decode_value(value):
+    if not isinstance(value, dict):
+        return value
+    if "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    if "d" in value:
+        return date.fromisoformat(value["d"])
+    if "dec" in value:
+        return Decimal(value["dec"])
+    raise ValueError(f"unknown cursor value {value!r}")
+
+
+class Keyset:
+    """
+    Порядок сортировки для keyset-пагинации
+    Столбцы должны быть NOT NULL, последний — уникальный (обычно id), чтобы порядок
+    был строгим. Направление общее для всех столбцов — так сравнение кортежей
+    (a, b) < (x, y) обслуживается одним составным индексом
+    Столбец, допускающий NULL, указывается в nulls ({имя: заменитель}): и в ORDER BY,
+    и в условии курсора он идёт как COALESCE(столбец, заменитель) — иначе сравнение
+    кортежа с NULL даёт NULL и строки молча пропадают
+    """
+
+    def __init__(self, *columns, descending: bool = False, nulls: Optional[Dict[str, Any]] = None):
+        self.columns = columns
+        self.descending = descending
+        self.nulls = nulls or {}
+        self.expressions = [
+            func.coalesce(column, self.nulls[column.key]) if column.key in self.nulls else column
+            for column in columns
+        ]
+        self.signature = ",".join(column.key for column in columns) + (":desc" if descending else ":asc")
+
+    def order_by(self) -> list:
+        return [expression.desc() if self.descending else expression.asc() for expression in self.expressions]
+
+    def after(self, values: Tuple) -> Any:
+        """Условие "строго после строки с этими значениями ключа" """
+        key = tuple_(*self.expressions)
+        return key < tuple(values) if self.descending else key > tuple(values)
+
+    def values(self, row) -> Tuple:
+        values = []
+        for column in self.columns:
+            value = getattr(row, column.key)
+            values.append(self.nulls.get(column.key) if value is None else value)
+        return tuple(values)
+
+    def encode(self, row) -> str:
+        payload = [self.signature, [_encode_value(value) for value in self.values(row)]]
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> Tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            signature, values = json.loads(raw)
+            if signature != self.signature or len(values) != len(self.columns):
+                raise ValueError("cursor from another listing")
+            return tuple(_decode_value(value) for value in values)
+        except (ValueError, TypeError) as e:
+            raise ValidationException("Некорректный курсор пагинации", details={"cursor": str(e)})
+
+
+@dataclass
+class PageParams:
+    """Параметры страницы из query string (Depends(page_params))"""
+    cursor: Optional[str] = None
+    limit: int = DEFAULT_LIMIT
+    include_total: bool = False
+
+
+def page_params(
+    cursor: Optional[str] = QueryParam(None, description="next_cursor из предыдущей страницы"),
+    limit: int = QueryParam(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    include_total: bool = QueryParam(False, description="Вернуть оценку общего числа записей")
+) -> PageParams:
+    return PageParams(cursor=cursor, limit=limit, include_total=include_total)
+
+
+def keyset_query(query, keyset: Keyset, cursor: Optional[str], limit: int):
+    """
+    Query или Select страницы: фильтр по курсору, порядок ключа и limit + 1
+    (лишняя строка показывает, есть ли следующая страница)
+    """
+    if cursor:
+        query = query.filter(keyset.after(keyset.decode(cursor)))
+    return query.order_by(None).order_by(*keyset.order_by()).limit(limit + 1)
+
+
+def page_rows(rows: List, keyset: Keyset, limit: int) -> Tuple[List, Optional[str]]:
+    """Строки страницы и курсор следующей (None — это последняя страница)"""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    return rows, keyset.encode(rows[-1])
+
+
+def paginate(query: Query, keyset: Keyset, params: PageParams) -> Tuple[List, Optional[str]]:
+    """Страница sync Query; для AsyncSession — keyset_query + page_rows"""
+    rows = keyset_query(query, keyset, params.cursor, params.limit).all()
+    return page_rows(rows, keyset, params.limit)
+
+
+def estimate_total(db: Session, query) -> int:
+    """
+    Число строк запроса без пагинации: на PostgreSQL — оценка планировщика
+    (EXPLAIN, без чтения таблицы), на остальных СУБД — COUNT(*)
+    """
+    statement = (query.statement if isinstance(query, Query) else query).order_by(None)
+    connection = db.connection()
+    if connection.dialect.name != "postgresql":
+        return db.scalar(select(func.count()).select_from(statement.subquery())) or 0
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,148 @@
+"""
+Помесячное секционирование transactions и analytics_events (PostgreSQL, PARTITION BY RANGE)
+- Секция на календарный месяц: transactions_y2025m01 FOR VALUES FROM ('2025-01-01') TO ('2025-02-01');
+  ключ analytics_events — timestamp в epoch-секундах, границы — epoch начала месяцев (UTC)
+- Индексы объявлены на родительской таблице: PostgreSQL создаёт их в каждой секции, включая новые
+- maintain_partitions (app.core.tasks, запуск из cron) создаёт секции на DB_PARTITION_PREMAKE_MONTHS
+  вперёд и отсоединяет секции старше срока хранения: они переносятся в схему
+  DB_PARTITION_ARCHIVE_SCHEMA (или удаляются, если схема не задана)
+- Строки вне созданных секций попадают в секцию DEFAULT; непустая DEFAULT — повод проверить cron
+- Фильтр по ключу (created_at >= :start, timestamp >= :hour_ago) даёт partition pruning:
+  запрос читает только секции нужных месяцев
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    table: str
+    column: str
+    epoch: bool = False  # Ключ — epoch-секунды (double precision), а не timestamp
+
+
+PARTITIONED_TABLES = (
+    PartitionSpec("transactions", "created_at"),
+    PartitionSpec("analytics_events", "timestamp", epoch=True),
+)
+
+_PARTITION_MONTH = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Месяц секции по имени; None — не помесячная секция (например, DEFAULT)"""
+    match = _PARTITION_MONTH.search(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _bound(spec: PartitionSpec, month: date) -> str:
+    if spec.epoch:
+        return str(int(datetime(month.year, month.month, 1, tzinfo=timezone.utc).timestamp()))
+    return f"'{month.isoformat()}'"
+
+
+def create_partition_sql(spec: PartitionSpec, month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(spec.table, month)} PARTITION OF {spec.table} "
+        f"FOR VALUES FROM ({_bound(spec, month)}) TO ({_bound(spec, add_months(month, 1))})"
+    )
+
+
+def create_default_partition_sql(spec: PartitionSpec) -> str:
+    return f"CREATE TABLE IF NOT EXISTS {spec.table}_default PARTITION OF {spec.table} DEFAULT"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"), {"table": table}
+    ).first() is not None
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ),
+        {"table": table}
+    )
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(conn, spec: PartitionSpec, first: date, last: date) -> List[str]:
+    """Секции с месяца first по месяц last включительно; возвращает созданные"""
+    existing = set(list_partitions(conn, spec.table))
+    created = []
+    month = month_start(first)
+    while month <= last:
+        if partition_name(spec.table, month) not in existing:
+            conn.execute(text(create_partition_sql(spec, month)))
+            created.append(partition_name(spec.table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_expired(conn, spec: PartitionSpec, cutoff: date, archive_schema: str) -> List[str]:
+    """Отсоединяет секции месяцев раньше cutoff: в архивную схему или удаляет"""
+    detached = []
+    for name in list_partitions(conn, spec.table):
+        month = partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE {spec.table} DETACH PARTITION {name}"))
+        if archive_schema:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+        else:
+            conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
+
+
+def maintain_partitions(engine, today: Optional[date] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Обслуживание секций всех таблиц из PARTITIONED_TABLES (вызывается из cron)"""
+    if engine.dialect.name != "postgresql":
+        return {}
+    current = month_start(today or datetime.utcnow())
+    report = {}
+    for spec in PARTITIONED_TABLES:
+        # Каждая таблица в своей транзакции: DETACH берёт блокировку родительской таблицы
+        with engine.begin() as conn:
+            if not is_partitioned(conn, spec.table):
+                logger.warning(f"{spec.table} is not partitioned, run alembic upgrade")
+                continue
+            created = ensure_partitions(
+                conn, spec, current, add_months(current, settings.DB_PARTITION_PREMAKE_MONTHS)
+            )
+            retention = settings.DB_PARTITION_RETENTION_MONTHS.get(spec.table, 0)
+            detached = detach_expired(
+                conn, spec, add_months(current, -retention), settings.DB_PARTITION_ARCHIVE_SCHEMA
+            ) if retention else []
+            if conn.execute(text(f"SELECT 1 FROM {spec.table}_default LIMIT 1")).first() is not None:
+                logger.warning(f"{spec.table}_default has rows outside monthly partitions")
+        report[spec.table] = {"created": created, "detached": detached}
+        if created or detached:
+            logger.info(f"Partitions of {spec.table}: created {created}, detached {detached}")
+    return report
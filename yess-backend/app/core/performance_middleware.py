@@ -1,96 +1,158 @@
 """
-Middleware для мониторинга производительности запросов
+Middleware для мониторинга производительности запросов (чистый ASGI)
+Метрики держатся в памяти процесса и отдаются Prometheus через /metrics:
+- http_requests_total и http_request_duration_seconds (гистограмма) по методу и шаблону
+  маршрута в метке endpoint ("/api/v1/partners/{partner_id}", а не сырой путь — число
+  серий ограничено; метки совпадают с monitoring/grafana_dashboard.json)
+- http_requests_in_progress — запросы в обработке; маршрут определяется в момент сбора
+  метрик, на запрос это одна вставка и удаление из словаря
+- http_request_span_duration_seconds — время запроса по участкам (app.core.request_timing);
+  внутренним клиентам те же участки отдаются в заголовке Server-Timing
+Медленные запросы логируются, в ответ добавляются X-Process-Time и X-Request-ID
+/metrics закрыт зависимостью metrics_access: внутренняя сеть без прокси или METRICS_TOKEN
 """
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-import time
+import hmac
 import logging
-from typing import Callable
+import time
+from collections import Counter as Tally
+from typing import Dict
+
+from fastapi import HTTPException, Request, status
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from starlette.datastructures import MutableHeaders
+
+from app.core.query_collector import route_template
 from app.core.config import settings
-from app.services.cache_service import cache_service
+from app.core.request_timing import TOTAL_SPAN, client_in_networks, is_internal_client, track_request
 
 logger = logging.getLogger(__name__)
 
-class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
-    """
-    Middleware для отслеживания производительности запросов
-    Логирует медленные запросы и собирает метрики
-    """
-    
+SKIP_PATHS = frozenset(["/health", "/metrics", "/docs", "/openapi.json", "/redoc"])
+UNMATCHED_ROUTE = "<unmatched>"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["method", "endpoint", "status"]
+)
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+HTTP_SPAN_DURATION = Histogram(
+    "http_request_span_duration_seconds", "HTTP request time by span (security, auth, db, cache, app...)",
+    ["method", "endpoint", "span"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Серии гистограммы участков: labels() на каждый участок каждого запроса заметно дороже словаря
+_span_series: Dict[tuple, object] = {}
+
+# Запросы в обработке: id(scope) → scope (маршрут появляется в scope после роутинга)
+_in_flight: Dict[int, dict] = {}
+
+
+def route_label(scope) -> str:
+    """Шаблон маршрута; запросы мимо маршрутов (404) — одной серией, без сырого пути"""
+    if "route" in scope or (scope.get("fastapi") or {}).get("effective_route_context"):
+        return route_template(scope)
+    return UNMATCHED_ROUTE
+
+
+class InFlightCollector:
+    """Prometheus collector: http_requests_in_progress по методу и маршруту на момент сбора"""
+
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "http_requests_in_progress", "HTTP requests being processed", labels=["method", "endpoint"]
+        )
+        counts = Tally((scope["method"], route_label(scope)) for scope in list(_in_flight.values()))
+        for (method, route), count in counts.items():
+            gauge.add_metric([method, route], count)
+        yield gauge
+
+
+REGISTRY.register(InFlightCollector())
+
+
+class PerformanceMonitoringMiddleware:
+    """Латентность, число и статусы запросов по маршрутам; лог медленных запросов"""
+
     def __init__(self, app, slow_request_threshold: float = 1.0):
-        super().__init__(app)
+        self.app = app
         self.slow_request_threshold = slow_request_threshold
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+
+    async def __call__(self, scope, receive, send):
         # Пропускаем мониторинг для служебных эндпоинтов
-        if request.url.path in ['/health', '/metrics', '/docs', '/openapi.json', '/redoc']:
-            return await call_next(request)
-        
-        start_time = time.time()
-        request_id = request.headers.get('x-request-id', 'unknown')
-        
-        # Метрики запроса
-        method = request.method
-        path = request.url.path
-        client_ip = request.client.host if request.client else 'unknown'
-        
-        try:
-            response = await call_next(request)
-            
-            # Время выполнения
-            duration = time.time() - start_time
-            
-            # Логирование медленных запросов
-            if duration > self.slow_request_threshold:
-                logger.warning(
-                    f"Slow request detected: {method} {path} - {duration:.3f}s "
-                    f"[Status: {response.status_code}] [IP: {client_ip}] [Request-ID: {request_id}]"
+        if scope["type"] != "http" or scope["path"] in SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        request_id = "unknown"
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+
+        with track_request() as timings:
+            server_timing = timings is not None and is_internal_client(scope)
+
+            async def send_with_headers(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Process-Time"] = str(round(time.perf_counter() - start_time, 3))
+                    headers["X-Request-ID"] = request_id
+                    if server_timing:
+                        headers.append("Server-Timing", timings.header())
+                await send(message)
+
+            key = id(scope)
+            _in_flight[key] = scope
+            try:
+                await self.app(scope, receive, send_with_headers)
+            except Exception as e:
+                logger.error(
+                    f"Request failed: {scope['method']} {scope['path']} - "
+                    f"{time.perf_counter() - start_time:.3f}s [Error: {e}] [Request-ID: {request_id}]"
                 )
-            
-            # Добавление заголовков с метриками
-            response.headers["X-Process-Time"] = str(round(duration, 3))
-            response.headers["X-Request-ID"] = request_id
-            
-            # Кэширование метрик (для аналитики)
-            if cache_service and cache_service.health_check():
-                try:
-                    metrics_key = f"metrics:request:{path}:{method}"
-                    cache_service.increment(metrics_key)
-                    
-                    # Сохранение времени выполнения для агрегации
-                    duration_key = f"metrics:duration:{path}:{method}"
-                    cache_service.set(
-                        f"{duration_key}:{int(start_time)}",
-                        duration,
-                        expiry=3600
-                    )
-                except Exception as e:
-                    logger.debug(f"Failed to cache metrics: {e}")
-            
-            return response
-            
-        except Exception as e:
-            duration = time.time() - start_time
-            logger.error(
-                f"Request failed: {method} {path} - {duration:.3f}s "
-                f"[Error: {str(e)}] [IP: {client_ip}] [Request-ID: {request_id}]"
+                raise
+            finally:
+                del _in_flight[key]
+                self._observe(scope, status_code, time.perf_counter() - start_time, request_id, timings)
+
+    def _observe(self, scope, status_code: int, duration: float, request_id: str, timings=None):
+        method, route = scope["method"], route_label(scope)
+        HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+        HTTP_DURATION.labels(method, route).observe(duration)
+        if timings is not None:
+            for name, seconds in timings.breakdown().items():
+                if name == TOTAL_SPAN:  # total — это http_request_duration_seconds
+                    continue
+                series = _span_series.get((method, route, name))
+                if series is None:
+                    series = _span_series[(method, route, name)] = HTTP_SPAN_DURATION.labels(method, route, name)
+                series.observe(seconds)
+
+        # Логирование медленных запросов
+        if duration > self.slow_request_threshold:
+            client = scope.get("client")
+            logger.warning(
+                f"Slow request detected: {method} {scope['path']} - {duration:.3f}s "
+                f"[Status: {status_code}] [IP: {client[0] if client else 'unknown'}] [Request-ID: {request_id}]"
             )
-            raise
-
-    def get_metrics(self) -> dict:
-        """Получение собранных метрик"""
-        if not cache_service or not cache_service.health_check():
-            return {}
-        
-        try:
-            # Здесь можно добавить агрегацию метрик
-            # Для полноценной реализации нужно использовать Prometheus или подобное
-            return {
-                "status": "active",
-                "cache_status": cache_service.health_check()
-            }
-        except Exception as e:
-            logger.error(f"Failed to get metrics: {e}")
-            return {"status": "error", "message": str(e)}
 
+
+def metrics_access(request: Request):
+    """Зависимость /metrics: Bearer METRICS_TOKEN или прямой запрос из METRICS_NETWORKS"""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("authorization", "")
+    if token and hmac.compare_digest(authorization, f"Bearer {token}"):
+        return
+    # За прокси адрес соединения — адрес прокси, поэтому проксированный запрос не внутренний
+    proxied = "x-forwarded-for" in request.headers or "forwarded" in request.headers
+    if not proxied and client_in_networks(request.scope, settings.METRICS_NETWORKS):
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrics are internal")
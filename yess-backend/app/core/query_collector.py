@@ -0,0 +1,144 @@
+"""
+Учёт SQL-запросов в пределах одного HTTP-запроса
+- QueryCollector (contextvar) копит число запросов, время в БД и повторы по отпечатку
+  запроса (литералы и параметры заменены на ?): один отпечаток много раз — признак N+1
+- QueryCollectorMiddleware (чистый ASGI) добавляет заголовок X-DB-Queries, логирует N+1 и превышение бюджета запросов эндпоинта (DB_QUERY_BUDGETS);
+  в строгом режиме (тесты) превышение бюджета — ошибка
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),  # Строковые литералы
+    (re.compile(r"%\(\w+\)s|\$\d+|(?<![:\w]):\w+|\?"), "?"),  # Параметры драйверов
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),  # Числа
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),  # IN (?, ?, ?) → (?)
+    (re.compile(r"\s+"), " "),
+)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст запроса: одинаков для запросов, отличающихся только значениями"""
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Эндпоинт выполнил больше SQL-запросов, чем разрешено бюджетом"""
+
+
+class QueryCollector:
+    """SQL-запросы одного HTTP-запроса"""
+
+    __slots__ = ("count", "duration", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Отпечатки, повторённые не меньше threshold раз (подозрение на N+1)"""
+        threshold = threshold or settings.DB_N_PLUS_ONE_THRESHOLD
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+
+_collector: ContextVar[Optional[QueryCollector]] = ContextVar("query_collector", default=None)
+
+
+def record_query(statement: str, duration: float):
+    """Вызывается из after_cursor_execute (app.core.database)"""
+    collector = _collector.get()
+    if collector is not None:
+        collector.record(statement, duration)
+
+
+def current_collector() -> Optional[QueryCollector]:
+    return _collector.get()
+
+
+@contextmanager
+def collect_queries():
+    """Учёт запросов вне HTTP (тесты, скрипты): with collect_queries() as queries: ..."""
+    collector = QueryCollector()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+
+def route_template(scope) -> str:
+    """Шаблон пути эндпоинта ("/api/v1/partners/{partner_id}"); до маршрутизации — сам путь"""
+    # FastAPI с ленивым подключением роутеров хранит полный путь в effective_route_context,
+    # scope["route"].path там относителен роутеру
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None)
+    if path:
+        return path
+    return getattr(scope.get("route"), "path", None) or scope["path"]
+
+
+def query_budget(method: str, path: str) -> int:
+    return settings.DB_QUERY_BUDGETS.get(f"{method} {path}", settings.DB_QUERY_BUDGET_DEFAULT)
+
+
+class QueryCollectorMiddleware:
+    """Счётчик SQL-запросов на HTTP-запрос, N+1 и бюджет эндпоинта"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        collector = QueryCollector()
+        token = _collector.set(collector)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                self._check(scope, collector)
+                headers = MutableHeaders(scope=message)
+                # Время в БД — участок db в Server-Timing (app.core.request_timing)
+                headers.append("X-DB-Queries", str(collector.count))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _collector.reset(token)
+
+    @staticmethod
+    def _check(scope, collector: QueryCollector):
+        path = route_template(scope)
+        endpoint = f"{scope['method']} {path}"
+
+        for statement, count in collector.repeated():
+            logger.warning(f"Possible N+1 in {endpoint}: {count}x {statement[:200]}")
+
+        budget = query_budget(scope["method"], path)
+        if collector.count > budget:
+            message = f"{endpoint} executed {collector.count} SQL queries (budget {budget})"
+            if settings.DB_QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -0,0 +1,159 @@
+"""
+Автоматический EXPLAIN медленных запросов
+Если SELECT выполнялся дольше DB_EXPLAIN_THRESHOLD, в фоновом потоке снимается
+EXPLAIN (FORMAT JSON) с исходными параметрами — не чаще одного плана на отпечаток
+за DB_EXPLAIN_INTERVAL. Планы хранятся в кольцевом буфере (DB_EXPLAIN_BUFFER);
+Seq Scan по таблицам из DB_EXPLAIN_WATCH_TABLES помечается и логируется —
+так видны недостающие индексы без ручных сессий psql
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.query_collector import fingerprint
+
+logger = logging.getLogger(__name__)
+
+SEQ_SCANS_FLAGGED = Counter(
+    "db_seq_scans_flagged_total", "Seq Scan on watched tables in captured slow query plans", ["table"]
+)
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_ASYNCPG_PARAM = re.compile(r"\$(\d+)")
+_MAX_PENDING = 4
+
+
+def seq_scans(plan, tables) -> List[str]:
+    """Таблицы из tables, которые план читает через Seq Scan"""
+    found = []
+    nodes = list(plan) if isinstance(plan, list) else [plan]
+    while nodes:
+        node = nodes.pop()
+        if not isinstance(node, dict):
+            continue
+        if "Plan" in node:
+            nodes.append(node["Plan"])
+        nodes.extend(node.get("Plans", ()))
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in tables:
+            found.append(node["Relation Name"])
+    return sorted(set(found))
+
+
+def to_pyformat(statement: str, parameters):
+    """Запрос asyncpg ($1, $2) → формат psycopg2 (%s) для выполнения EXPLAIN через sync-движок"""
+    if not isinstance(parameters, (list, tuple)):
+        return statement, parameters
+    ordered = []
+
+    def _placeholder(match):
+        ordered.append(parameters[int(match.group(1)) - 1])
+        return "%s"
+
+    converted = _ASYNCPG_PARAM.sub(_placeholder, statement.replace("%", "%%"))
+    return converted, tuple(ordered)
+
+
+class PlanCapture:
+    """Фоновый захват планов с ограничением частоты и кольцевым буфером"""
+
+    def __init__(self, buffer_size: Optional[int] = None, interval: Optional[int] = None):
+        self.interval = interval or settings.DB_EXPLAIN_INTERVAL
+        self.plans = deque(maxlen=buffer_size or settings.DB_EXPLAIN_BUFFER)
+        self._last_capture: "OrderedDict[str, float]" = OrderedDict()
+        self._sync_engines: Dict[int, object] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register_sync_engine(self, async_sync_engine, sync_engine):
+        """Для запросов через asyncpg EXPLAIN выполняется sync-движком той же базы"""
+        self._sync_engines[id(async_sync_engine)] = sync_engine
+
+    def _due(self, query: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_capture.get(query)
+            if last is not None and now - last < self.interval:
+                return False
+            if self._pending >= _MAX_PENDING:
+                return False
+            self._last_capture[query] = now
+            self._last_capture.move_to_end(query)
+            while len(self._last_capture) > settings.DB_QUERY_STATS_MAX_FINGERPRINTS:
+                self._last_capture.popitem(last=False)
+            self._pending += 1
+            return True
+
+    def maybe_capture(self, engine, statement: str, parameters, duration: float):
+        """Вызывается из after_cursor_execute; сам EXPLAIN — в фоновом потоке"""
+        if engine.dialect.name != "postgresql" or not _EXPLAINABLE.match(statement):
+            return
+        query = fingerprint(statement)
+        if not self._due(query):
+            return
+        if engine.dialect.driver == "asyncpg":
+            engine = self._sync_engines.get(id(engine))
+            statement, parameters = to_pyformat(statement, parameters)
+            if engine is None:
+                self._done()
+                return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-explain")
+        self._executor.submit(self._capture, engine, query, statement, parameters, duration)
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _explain(self, engine, statement: str, parameters):
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def _capture(self, engine, query: str, statement: str, parameters, duration: float):
+        try:
+            plan = self._explain(engine, statement, parameters)
+        except Exception as e:
+            logger.warning(f"EXPLAIN failed for slow query: {e}")
+            return
+        finally:
+            self._done()
+        self.add(query, plan, duration)
+
+    def add(self, query: str, plan, duration: float) -> dict:
+        flagged = seq_scans(plan, settings.DB_EXPLAIN_WATCH_TABLES)
+        entry = {
+            "query_id": hashlib.sha1(query.encode()).hexdigest()[:16],
+            "query": query,
+            "duration": duration,
+            "captured_at": time.time(),
+            "seq_scans": flagged,
+            "plan": plan,
+        }
+        self.plans.append(entry)
+        for table in flagged:
+            SEQ_SCANS_FLAGGED.labels(table).inc()
+            logger.warning(f"Seq Scan on {table} in slow query ({duration:.2f}s): {query[:200]}")
+        return entry
+
+    def recent(self, limit: int = 20, flagged_only: bool = False) -> List[dict]:
+        plans = [plan for plan in reversed(self.plans) if plan["seq_scans"] or not flagged_only]
+        return plans[:limit]
+
+
+plan_capture = PlanCapture()
+
+
+def capture_slow_statement(engine, statement: str, parameters, duration: float):
+    """Вызывается из after_cursor_execute (app.core.database)"""
+    if settings.DB_EXPLAIN_ENABLED and duration >= settings.DB_EXPLAIN_THRESHOLD:
+        plan_capture.maybe_capture(engine, statement, parameters, duration)
@@ -0,0 +1,164 @@
+"""
+Статистика SQL-запросов процесса по отпечаткам (в духе pg_stat_statements)
+Для каждого отпечатка (app.core.query_collector.fingerprint): число вызовов, суммарное,
+среднее, p95 и максимальное время, число строк. Память ограничена: хранится не больше
+DB_QUERY_STATS_MAX_FINGERPRINTS отпечатков, при переполнении вытесняется самый дешёвый
+по суммарному времени (Space-Saving: новый отпечаток наследует его время как погрешность
+error, поэтому часто повторяющийся запрос не вытесняется раз за разом с нуля и попадает
+в топ; точное время — не меньше total - error). Минимум — по куче с ленивым обновлением.
+p95 считается по последним DB_QUERY_STATS_SAMPLES вызовам.
+Статистика у каждого воркера своя; в Prometheus выгружается топ DB_QUERY_STATS_EXPORT_TOP
+"""
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.core.config import settings
+from app.core.query_collector import fingerprint
+
+SORT_KEYS = ("total", "mean", "p95", "max", "calls", "rows")
+
+
+class _Entry:
+    __slots__ = ("query_id", "query", "calls", "total", "error", "max", "rows", "samples", "first_seen")
+
+    def __init__(self, query: str, samples: int, error: float = 0.0):
+        self.query_id = hashlib.sha1(query.encode()).hexdigest()[:16]
+        self.query = query
+        self.calls = 0
+        self.total = error  # Оценка сверху: унаследованное при вытеснении + своё
+        self.error = error
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=samples)
+        self.first_seen = time.time()
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] if ordered else 0.0
+        return {
+            "query_id": self.query_id,
+            "query": self.query,
+            "calls": self.calls,
+            "total": self.total,
+            "error": self.error,
+            "mean": (self.total - self.error) / self.calls if self.calls else 0.0,
+            "p95": p95,
+            "max": self.max,
+            "rows": self.rows,
+            "first_seen": self.first_seen,
+        }
+
+
+class QueryStats:
+    """Ограниченная по памяти статистика запросов по отпечаткам"""
+
+    def __init__(self, max_fingerprints: Optional[int] = None, samples: Optional[int] = None):
+        self.max_fingerprints = max_fingerprints or settings.DB_QUERY_STATS_MAX_FINGERPRINTS
+        self.samples = samples or settings.DB_QUERY_STATS_SAMPLES
+        self._entries: Dict[str, _Entry] = {}
+        # (total на момент добавления, порядок, отпечаток); total только растёт, поэтому
+        # устаревшая запись кучи просто перекладывается с текущим значением
+        self._heap: List[tuple] = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def record(self, statement: str, duration: float, rows: int = 0):
+        query = fingerprint(statement)
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                error = 0.0
+                if len(self._entries) >= self.max_fingerprints:
+                    # Вытесняем отпечаток с наименьшим суммарным временем — он интересен меньше всех
+                    error = self._pop_cheapest().total
+                    self.evicted += 1
+                entry = self._entries[query] = _Entry(query, self.samples, error)
+                heapq.heappush(self._heap, (entry.total, next(self._order), query))
+            entry.calls += 1
+            entry.total += duration
+            entry.max = max(entry.max, duration)
+            entry.rows += max(rows or 0, 0)
+            entry.samples.append(duration)
+
+    def _pop_cheapest(self) -> _Entry:
+        while True:
+            total, _, query = heapq.heappop(self._heap)
+            entry = self._entries.get(query)
+            if entry is None:
+                continue
+            if entry.total > total:
+                heapq.heappush(self._heap, (entry.total, next(self._order), query))
+                continue
+            del self._entries[query]
+            return entry
+
+    def top(self, limit: int = 20, sort_by: str = "total") -> List[dict]:
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {SORT_KEYS}")
+        with self._lock:
+            rows = [entry.snapshot() for entry in self._entries.values()]
+        rows.sort(key=lambda row: row[sort_by], reverse=True)
+        return rows[:limit]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "fingerprints": len(self._entries),
+                "max_fingerprints": self.max_fingerprints,
+                "evicted": self.evicted,
+                "calls": sum(entry.calls for entry in self._entries.values()),
+                "total": sum(entry.total for entry in self._entries.values()),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+            self._heap.clear()
+            self.evicted = 0
+
+
+query_stats = QueryStats()
+
+
+def record_statement(statement: str, duration: float, rows: int = 0):
+    """Вызывается из after_cursor_execute (app.core.database)"""
+    if settings.DB_QUERY_STATS_ENABLED:
+        query_stats.record(statement, duration, rows)
+
+
+class QueryStatsCollector:
+    """Prometheus collector: топ отпечатков по суммарному времени на момент сбора метрик"""
+
+    def __init__(self, stats: QueryStats):
+        self.stats = stats
+
+    def collect(self):
+        calls = CounterMetricFamily("db_statement_calls", "SQL statement executions", labels=["query_id"])
+        seconds = CounterMetricFamily(
+            "db_statement_duration_seconds", "Total SQL statement time", labels=["query_id"]
+        )
+        rows = CounterMetricFamily("db_statement_rows", "Rows returned or affected", labels=["query_id"])
+        p95 = GaugeMetricFamily(
+            "db_statement_duration_p95_seconds", "p95 over recent executions", labels=["query_id"]
+        )
+        info = GaugeMetricFamily("db_statement_info", "Normalized SQL text", labels=["query_id", "query"])
+        for row in self.stats.top(settings.DB_QUERY_STATS_EXPORT_TOP, "total"):
+            labels = [row["query_id"]]
+            calls.add_metric(labels, row["calls"])
+            seconds.add_metric(labels, row["total"])
+            rows.add_metric(labels, row["rows"])
+            p95.add_metric(labels, row["p95"])
+            info.add_metric(labels + [row["query"][:300]], 1)
+        yield from (calls, seconds, rows, p95, info)
+
+
+REGISTRY.register(QueryStatsCollector(query_stats))
@@ -1,110 +1,262 @@
 """
 Rate Limiting Middleware
 Защита от DDoS и злоупотреблений
+- Лимиты общие для всех воркеров и подов: GCRA (token bucket) в Redis одним Lua-скриптом —
+  все лимиты запроса проверяются и списываются атомарно за один round-trip
+- Ключ — пользователь из JWT (Authorization: Bearer), без валидного токена — IP клиента
+- Политики по префиксу пути (RATE_LIMIT_POLICIES): auth, upload, QR-оплата, webhooks;
+  остальные пути — RATE_LIMIT_PER_MINUTE и RATE_LIMIT_PER_HOUR
+- Redis недоступен — те же лимиты считаются в памяти процесса (fail-open: лимит действует
+  на воркер, но запросы не отклоняются из-за сбоя Redis)
+- Заголовки RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset; при 429 — Retry-After
 """
-import time
 import logging
-from typing import Callable
-from fastapi import Request, HTTPException, status
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import jwt
+from fastapi import status
 from fastapi.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from starlette.datastructures import MutableHeaders
+
+from app.core.cache import redis_cache
 from app.core.config import get_settings  # ✅ Импортируем функцию, а не объект
+from app.core.request_timing import span
 
 logger = logging.getLogger(__name__)
 
 # ✅ Инициализируем настройки корректно
 settings = get_settings()
 
-# Инициализация SlowAPI limiter
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=[
-        f"{settings.RATE_LIMIT_PER_MINUTE}/minute",
-        f"{settings.RATE_LIMIT_PER_HOUR}/hour"
-    ],
-    enabled=settings.RATE_LIMIT_ENABLED
-)
-
-def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
-    """Обработчик превышения лимита"""
-    return JSONResponse(
-        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-        content={
-            "error": "rate_limit_exceeded",
-            "message": "Слишком много запросов. Пожалуйста, подождите.",
-            "retry_after": str(exc.detail)
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+EXCLUDED_PATHS = ("/docs", "/redoc", "/openapi.json", "/health", "/metrics")
+
+# GCRA: для каждого ключа хранится TAT (theoretical arrival time, мс). Запрос допустим, если
+# TAT + интервал - период <= сейчас. Сначала проверяются все лимиты, списываются только
+# если прошли все. Время — из Redis (TIME), чтобы часы подов не расходились
+# ARGV: count1, period_ms1, count2, period_ms2, ...
+# Ответ: {allowed, индекс определяющего лимита, remaining, reset_ms, retry_after_ms}
+GCRA_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tats = {}
+local binding, remaining, reset, retry = 1, -1, 0, 0
+for i = 1, #KEYS do
+    local count = tonumber(ARGV[2 * i - 1])
+    local period = tonumber(ARGV[2 * i])
+    local interval = period / count
+    local tat = math.max(tonumber(redis.call('GET', KEYS[i]) or now), now)
+    local allow_at = tat + interval - period
+    if now < allow_at then
+        if allow_at - now > retry then
+            binding, retry = i, allow_at - now
+        end
+    else
+        local left = math.floor((now - allow_at) / interval)
+        if retry == 0 and (remaining < 0 or left < remaining) then
+            binding, remaining, reset = i, left, tat + interval - now
+        end
+    end
+    tats[i] = tat + interval
+end
+if retry > 0 then
+    return {0, binding, 0, math.ceil(retry), math.ceil(retry)}
+end
+for i = 1, #KEYS do
+    redis.call('SET', KEYS[i], string.format('%.3f', tats[i]), 'PX', math.ceil(tats[i] - now))
+end
+return {1, binding, remaining, math.ceil(reset), 0}
+"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    count: int
+    period: int  # секунды
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """ "5/minute" → Limit(5, 60)"""
+        count, _, period = value.partition("/")
+        return cls(int(count), _PERIODS[period.strip().rstrip("s")])
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: Limit
+    remaining: int
+    reset: float  # Секунд до полного восстановления лимита
+    retry_after: float = 0.0
+
+    def headers(self) -> dict:
+        headers = {
+            "RateLimit-Limit": str(self.limit.count),
+            "RateLimit-Remaining": str(max(self.remaining, 0)),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
         }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def _result(limits: Sequence[Limit], allowed, binding, remaining, reset_ms, retry_ms) -> RateLimitResult:
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=limits[int(binding) - 1],
+        remaining=int(remaining),
+        reset=int(reset_ms) / 1000,
+        retry_after=int(retry_ms) / 1000
     )
 
 
+class LocalLimiter:
+    """Тот же GCRA в памяти процесса (пока Redis недоступен); число ключей ограничено (LRU)"""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or settings.RATE_LIMIT_LOCAL_MAX_KEYS
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def hit(self, keys: Sequence[str], limits: Sequence[Limit], now: Optional[float] = None) -> RateLimitResult:
+        now = (time.time() if now is None else now) * 1000
+        tats, binding, remaining, reset, retry = [], 1, -1, 0.0, 0.0
+        for i, (key, limit) in enumerate(zip(keys, limits), start=1):
+            period = limit.period * 1000
+            interval = period / limit.count
+            tat = max(self._tats.get(key, now), now)
+            allow_at = tat + interval - period
+            if now < allow_at:
+                if allow_at - now > retry:
+                    binding, retry = i, allow_at - now
+            else:
+                left = int((now - allow_at) // interval)
+                if not retry and (remaining < 0 or left < remaining):
+                    binding, remaining, reset = i, left, tat + interval - now
+            tats.append(tat + interval)
+        if retry:
+            return _result(limits, 0, binding, 0, math.ceil(retry), math.ceil(retry))
+        for key, tat in zip(keys, tats):
+            self._tats[key] = tat
+            self._tats.move_to_end(key)
+        while len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+        return _result(limits, 1, binding, remaining, math.ceil(reset), 0)
+
+
+class RateLimiter:
+    """Распределённый лимитер: Redis (Lua GCRA), при недоступности — LocalLimiter"""
+
+    def __init__(self, cache=None, local: Optional[LocalLimiter] = None):
+        self.cache = cache if cache is not None else redis_cache
+        self.local = local if local is not None else LocalLimiter()
+        self._script = None
+
+    async def hit(self, keys: Sequence[str], limits: Sequence[Limit]) -> RateLimitResult:
+        if self.cache.redis is not None:
+            if self._script is None:
+                self._script = self.cache.redis.register_script(GCRA_SCRIPT)
+            args = [value for limit in limits for value in (limit.count, limit.period * 1000)]
+            reply = await self.cache.run_script(self._script, list(keys), args)
+            if reply is not None:
+                return _result(limits, *reply)
+        return self.local.hit(keys, limits)
+
+
+@lru_cache(maxsize=1)
+def _policies(items: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> List[Tuple[str, List[Limit]]]:
+    # Длинные префиксы первыми: /api/v1/partner/auth важнее /api/v1/partner
+    return sorted(
+        ((prefix, [Limit.parse(limit) for limit in limits]) for prefix, limits in items),
+        key=lambda policy: len(policy[0]),
+        reverse=True
+    )
+
+
+def policy_for(path: str) -> Tuple[str, List[Limit]]:
+    """Имя политики (префикс пути или "default") и её лимиты"""
+    items = tuple((prefix, tuple(limits)) for prefix, limits in settings.RATE_LIMIT_POLICIES.items())
+    for prefix, limits in _policies(items):
+        if path.startswith(prefix):
+            return prefix, limits
+    return "default", [Limit(settings.RATE_LIMIT_PER_MINUTE, 60), Limit(settings.RATE_LIMIT_PER_HOUR, 3600)]
+
+
+@lru_cache(maxsize=4096)
+def _token_subject(token: str) -> Optional[str]:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
+
+def client_identity(scope) -> str:
+    """user:<id> для запросов с валидным JWT, иначе ip:<адрес>"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                subject = _token_subject(token.strip())
+                if subject:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
 class RateLimitMiddleware:
     """Middleware для проверки rate limits"""
 
-    def __init__(self, app):
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
         self.app = app
+        self.limiter = limiter or RateLimiter()
 
     def _is_excluded_path(self, path: str) -> bool:
         """Пути, исключённые из rate limiting"""
-        excluded = [
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/health",
-            "/metrics"
-        ]
-        return any(path.startswith(p) for p in excluded)
-    
-    async def __call__(self, scope, receive, send):
-        if scope["type"] != "http":
-            await self.app(scope, receive, send)
-            return
+        return path.startswith(EXCLUDED_PATHS)
 
-        request = Request(scope, receive)
-        
-        # Пропускаем OPTIONS запросы (CORS preflight)
-        if request.method == "OPTIONS":
+    async def __call__(self, scope, receive, send):
+        # Пропускаем OPTIONS запросы (CORS preflight) и служебные эндпоинты
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMIT_ENABLED
+            or scope["method"] == "OPTIONS"
+            or self._is_excluded_path(scope["path"])
+        ):
             await self.app(scope, receive, send)
             return
 
-        # Пропускаем проверку для некоторых эндпоинтов
-        if self._is_excluded_path(request.url.path):
-            await self.app(scope, receive, send)
-            return
+        name, limits = policy_for(scope["path"])
+        identity = client_identity(scope)
+        keys = [f"rl:{name}:{limit.period}:{identity}" for limit in limits]
+        with span("ratelimit"):
+            result = await self.limiter.hit(keys, limits)
 
-        # Проверяем rate limit
-        if not await self._check_rate_limit(request):
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded: {identity} on {scope['path']} ({name})")
             response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "error": "rate_limit_exceeded",
-                    "message": "Слишком много запросов"
-                }
+                    "message": "Слишком много запросов. Пожалуйста, подождите.",
+                    "retry_after": math.ceil(result.retry_after)
+                },
+                headers=result.headers()
             )
             await response(scope, receive, send)
             return
 
-        await self.app(scope, receive, send)
-
-    async def _check_rate_limit(self, request: Request) -> bool:
-        """Проверка лимита (упрощённая версия)"""
-        # В реальном приложении используйте Redis для хранения счётчиков
-        return True
-
-
-# Декораторы для разных уровней лимитов
-
-def strict_rate_limit():
-    """Строгий лимит для чувствительных операций"""
-    return limiter.limit("10/minute")
-
-
-def auth_rate_limit():
-    """Лимит для авторизации"""
-    return limiter.limit("5/minute")
-
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for header, value in result.headers().items():
+                    headers[header] = value
+            await send(message)
 
-def upload_rate_limit():
-    """Лимит для загрузки файлов"""
-    return limiter.limit("20/hour")
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,144 @@
+"""
+Разбивка времени HTTP-запроса по участкам (Server-Timing)
+- RequestTimings (contextvar) заводит PerformanceMonitoringMiddleware на каждый запрос
+- Участки пишутся сами: security и ratelimit (проверки middleware до обработчика),
+  auth (get_current_user), db (after_cursor_execute), cache (CacheMetrics.timer),
+  compression; остаток до начала ответа — app (обработчик, валидация, сериализация)
+- Время участка — собственное: вложенные участки из него вычитаются (db внутри auth
+  попадает только в db), поэтому сумма участков равна total
+- Вне запроса и при SERVER_TIMING_ENABLED=False span()/record_span() ничего не делают
+"""
+import hmac
+import ipaddress
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+APP_SPAN = "app"
+TOTAL_SPAN = "total"
+
+
+class RequestTimings:
+    """Собственное время участков одного запроса, секунды"""
+
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+
+    def add(self, name: str, duration: float):
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def breakdown(self) -> Dict[str, float]:
+        """Участки на текущий момент; app — время, не попавшее ни в один участок"""
+        total = time.perf_counter() - self.started
+        spans = dict(self.spans)
+        spans[APP_SPAN] = max(total - sum(self.spans.values()), 0.0)
+        spans[TOTAL_SPAN] = total
+        return spans
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in self.breakdown().items())
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+_parent: ContextVar[Optional["_Span"]] = ContextVar("request_timing_span", default=None)
+
+
+# Контекстные менеджеры — классы: генератор @contextmanager на каждый участок в разы дороже
+
+
+class _TrackRequest:
+    __slots__ = ("timings", "token")
+
+    def __enter__(self) -> Optional[RequestTimings]:
+        if not settings.SERVER_TIMING_ENABLED:
+            self.timings = None
+            return None
+        self.timings = RequestTimings()
+        self.token = _timings.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            _timings.reset(self.token)
+
+
+def track_request() -> _TrackRequest:
+    """with track_request() as timings: ... — учёт участков запроса; None — учёт выключен"""
+    return _TrackRequest()
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _timings.get()
+
+
+def record_span(name: str, duration: float):
+    """Участок, измеренный вызывающим (запрос в БД, операция кэша)"""
+    timings = _timings.get()
+    if timings is None:
+        return
+    timings.add(name, duration)
+    parent = _parent.get()
+    if parent is not None:
+        parent.children += duration
+
+
+class _Span:
+    __slots__ = ("name", "timings", "token", "started", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children = 0.0
+
+    def __enter__(self):
+        self.timings = _timings.get()
+        if self.timings is not None:
+            self.token = _parent.set(self)
+            self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timings is None:
+            return
+        elapsed = time.perf_counter() - self.started
+        _parent.reset(self.token)
+        self.timings.add(self.name, max(elapsed - self.children, 0.0))
+        parent = _parent.get()
+        if parent is not None:
+            parent.children += elapsed
+
+
+def span(name: str) -> _Span:
+    """with span("auth"): ... — время блока без вложенных участков"""
+    return _Span(name)
+
+
+@lru_cache(maxsize=4096)
+def _is_internal_address(host: str, networks: tuple) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def client_in_networks(scope, networks) -> bool:
+    """IP клиента соединения (без учёта заголовков прокси) входит в одну из сетей"""
+    client = scope.get("client")
+    return bool(client) and _is_internal_address(client[0], tuple(networks))
+
+
+def is_internal_client(scope) -> bool:
+    """Заголовок Server-Timing — только для внутренних клиентов: IP из сети или служебный токен"""
+    token = settings.SERVER_TIMING_TOKEN
+    if token:
+        for name, value in scope["headers"]:
+            if name == b"x-server-timing-token":
+                if hmac.compare_digest(value.decode("latin-1"), token):
+                    return True
+                break
+    return client_in_networks(scope, settings.SERVER_TIMING_NETWORKS)
@@ -0,0 +1,38 @@
+"""
+Быстрый путь JSON-ответов
+1. Маршрут с response_model (или аннотацией возвращаемого типа) и без response_class:
+   FastAPI валидирует результат обработчика один раз и сериализует его сразу в JSON-байты
+   в Rust-ядре Pydantic — без промежуточного dict, jsonable_encoder и json.dumps
+   (FastAPI 0.130+; в более ранних — jsonable_encoder и json, поэтому такой нижний предел в requirements)
+2. Обработчик возвращает то, что валидируется ровно один раз:
+   - ORM-объекты или строки select(...) с полями схемы — валидация from_attributes;
+   - готовые модели ответа: экземпляр того же класса повторно не валидируется
+     (revalidate_instances="never"), дополнительные поля присваиваются атрибутам модели.
+   Лишнее: Model.model_validate(row).dict() → правка dict → Model(**dict) — это две
+   валидации и сериализация в dict, после которых FastAPI сериализует ответ ещё раз
+3. default_response_class приложения не меняется: любой явный response_class отключает
+   сериализацию в байты из п. 1 (сериализация идёт через dict), поэтому ORJSONResponse —
+   только для маршрутов без модели ответа (dict/list произвольной формы, /health)
+Замер: tests/benchmarks/bench_json_responses.py
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse на orjson (без orjson — стандартный json); datetime, Decimal и пр. — через str"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+            except (TypeError, orjson.JSONEncodeError):
+                pass  # Например, int больше 64 бит
+        return json.dumps(content, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
@@ -1,17 +1,157 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
+"""
+Защита от перебора: IP с max_attempts неудачными ответами (>= 400) за block_duration секунд
+блокируется (403) до конца окна; успешный ответ сбрасывает счётчик
+- Чистый ASGI (без BaseHTTPMiddleware): статус берётся из http.response.start
+- Счётчики в памяти процесса ограничены SECURITY_TRACKER_MAX_IPS (LRU) и удаляются по
+  истечении окна
+- SECURITY_TRACKER_REDIS: счётчики в Redis (INCR + EXPIRE одним Lua-скриптом) — блокировка
+  общая для всех воркеров; ответ "не заблокирован" кэшируется в процессе на
+  SECURITY_BLOCK_CHECK_INTERVAL секунд. Redis недоступен — работает счётчик процесса
+"""
+import logging
 import os
-from typing import Dict
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+from app.core.cache import redis_cache
 from app.core.config import settings
+from app.core.request_timing import span
+
+logger = logging.getLogger(__name__)
+
+# Окно фиксированное: TTL ставится при первой неудаче и не продлевается
+# Ответ: {attempts, мс до конца окна}
+TRACK_SCRIPT = """
+local attempts = redis.call('INCR', KEYS[1])
+if redis.call('PTTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return {attempts, redis.call('PTTL', KEYS[1])}
+"""
+
+CHECK_SCRIPT = """
+return {tonumber(redis.call('GET', KEYS[1]) or 0), redis.call('PTTL', KEYS[1])}
+"""
+
+
+@dataclass
+class _Attempts:
+    count: int
+    expires_at: float  # Конец окна; для записей без неудач — конец кэша проверки
+    checked_until: float = 0.0  # До этого момента Redis не перепроверяется
+
+
+class IPAttemptTracker:
+    """Неудачные попытки по IP: в памяти процесса (LRU + TTL), при SECURITY_TRACKER_REDIS — в Redis"""
+
+    def __init__(
+        self,
+        max_attempts: int = 10,
+        block_duration: int = 300,
+        max_ips: Optional[int] = None,
+        cache=None,
+        shared: Optional[bool] = None
+    ):
+        self.max_attempts = max_attempts
+        self.block_duration = block_duration
+        self.max_ips = max_ips or settings.SECURITY_TRACKER_MAX_IPS
+        self.shared = settings.SECURITY_TRACKER_REDIS if shared is None else shared
+        self.cache = cache if cache is not None else redis_cache
+        self._attempts: "OrderedDict[str, _Attempts]" = OrderedDict()
+        self._scripts = {}
+
+    def __len__(self) -> int:
+        return len(self._attempts)
+
+    async def is_blocked(self, ip: str) -> bool:
+        now = time.time()
+        entry = self._get(ip, now)
+        if entry is not None and entry.count >= self.max_attempts:
+            return True
+        if not self._use_redis() or (entry is not None and entry.checked_until > now):
+            return False
+        reply = await self._run(CHECK_SCRIPT, ip, [])
+        if reply is None:
+            return False
+        return self._remember(ip, reply, now).count >= self.max_attempts
+
+    async def track(self, ip: str) -> int:
+        """Учитывает неудачную попытку; возвращает число попыток в текущем окне"""
+        now = time.time()
+        if self._use_redis():
+            reply = await self._run(TRACK_SCRIPT, ip, [self.block_duration])
+            if reply is not None:
+                return self._remember(ip, reply, now).count
+        entry = self._get(ip, now)
+        if entry is None or not entry.count:
+            entry = _Attempts(0, now + self.block_duration)
+        entry.count += 1
+        self._store(ip, entry, now)
+        return entry.count
+
+    async def reset(self, ip: str):
+        """Сброс после успешного запроса; DEL в Redis — только если у IP известны неудачи"""
+        entry = self._attempts.pop(ip, None)
+        if entry is not None and entry.count and self._use_redis():
+            await self.cache.delete(self._key(ip))
+
+    def evict_expired(self, now: Optional[float] = None):
+        """Удаляет все записи с истёкшим окном (иначе они вытесняются по ходу работы)"""
+        now = time.time() if now is None else now
+        for ip in [ip for ip, entry in self._attempts.items() if entry.expires_at <= now]:
+            del self._attempts[ip]
+
+    @staticmethod
+    def _key(ip: str) -> str:
+        return f"sec:ip:{ip}"
+
+    def _use_redis(self) -> bool:
+        return self.shared and self.cache.redis is not None
+
+    async def _run(self, source: str, ip: str, args: list):
+        script = self._scripts.get(source)
+        if script is None:
+            script = self._scripts[source] = self.cache.redis.register_script(source)
+        return await self.cache.run_script(script, [self._key(ip)], args)
 
-class SecurityMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.ip_attempts: Dict[str, Dict] = {}
+    def _get(self, ip: str, now: float) -> Optional[_Attempts]:
+        entry = self._attempts.get(ip)
+        if entry is not None and entry.expires_at <= now:
+            del self._attempts[ip]
+            return None
+        return entry
+
+    def _remember(self, ip: str, reply, now: float) -> _Attempts:
+        count, ttl_ms = int(reply[0]), int(reply[1])
+        checked_until = now + settings.SECURITY_BLOCK_CHECK_INTERVAL
+        expires_at = now + ttl_ms / 1000 if count and ttl_ms > 0 else checked_until
+        entry = _Attempts(count, expires_at, checked_until)
+        self._store(ip, entry, now)
+        return entry
+
+    def _store(self, ip: str, entry: _Attempts, now: float):
+        self._attempts[ip] = entry
+        self._attempts.move_to_end(ip)
+        # Окна одинаковой длины: в начале словаря — самые старые записи
+        while self._attempts:
+            oldest = next(iter(self._attempts.values()))
+            if oldest.expires_at > now and len(self._attempts) <= self.max_ips:
+                break
+            self._attempts.popitem(last=False)
+
+
+class SecurityMiddleware:
+    def __init__(self, app, tracker: Optional[IPAttemptTracker] = None):
+        self.app = app
         self.max_attempts = 10  # Увеличено для разработки
         self.block_duration = 300  # 5 минут вместо 1 часа
-        
+        self.tracker = tracker if tracker is not None else IPAttemptTracker(self.max_attempts, self.block_duration)
+
         # Whitelist IP для разработки (localhost всегда разрешен)
         self.whitelist_ips = [
             "127.0.0.1",
@@ -19,93 +159,75 @@ class SecurityMiddleware(BaseHTTPMiddleware):
             "::1",
             "0.0.0.0"
         ]
-        
+
         # В режиме разработки отключаем блокировку для localhost
         self.development_mode = settings.DEVELOPMENT_MODE or os.getenv("ENVIRONMENT", "development") == "development"
-        
+
         # Публичные пути, которые не должны блокироваться
-        self.public_paths = [
+        self.public_paths = (
             "/health",
             "/health/db",
             "/health/cache",
             "/docs",
             "/openapi.json",
             "/redoc"
-        ]
+        )
 
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "127.0.0.1"
-        
+    def _is_local(self, client_ip: str) -> bool:
+        return (
+            client_ip in self.whitelist_ips or
+            client_ip.startswith("127.") or
+            client_ip.startswith("::1") or
+            "localhost" in client_ip.lower()
+        )
+
+    async def _is_blocked(self, client_ip: str) -> bool:
+        with span("security"):
+            return await self.tracker.is_blocked(client_ip)
+
+    async def __call__(self, scope, receive, send):
         # Пропускаем OPTIONS запросы (CORS preflight) - КРИТИЧНО для CORS
-        if request.method == "OPTIONS":
-            return await call_next(request)
-        
-        # Пропускаем публичные эндпоинты
-        if any(request.url.path.startswith(path) for path in self.public_paths):
-            return await call_next(request)
+        # и публичные эндпоинты
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(self.public_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "127.0.0.1"
 
         # В режиме разработки пропускаем localhost без проверки
-        # Также проверяем, что IP начинается с 127 или localhost
-        if self.development_mode:
-            if (client_ip in self.whitelist_ips or 
-                client_ip.startswith("127.") or 
-                client_ip.startswith("::1") or
-                "localhost" in str(client_ip).lower()):
-                return await call_next(request)
+        if self.development_mode and self._is_local(client_ip):
+            await self.app(scope, receive, send)
+            return
 
         # Проверка блокировки IP (только в продакшене)
-        if not self.development_mode and self._is_ip_blocked(client_ip):
-            raise HTTPException(status_code=403, detail="IP temporarily blocked")
+        if not self.development_mode and await self._is_blocked(client_ip):
+            logger.warning(f"Blocked IP request: {client_ip} {scope['path']}")
+            response = JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={"detail": "IP temporarily blocked"}
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
 
-        response = await call_next(request)
-        
         # Отслеживаем только НЕУДАЧНЫЕ попытки (401, 403, 500)
         # При успешных запросах (200, 201) сбрасываем счетчик
-        if response.status_code >= 400:
-            self._track_ip_attempt(client_ip)
-        elif response.status_code < 300:
-            # Успешный запрос - сбрасываем счетчик
-            self._reset_ip_attempts(client_ip)
-        
-        return response
-
-    def _is_ip_blocked(self, ip: str) -> bool:
-        if ip not in self.ip_attempts:
-            return False
-        
-        attempt_data = self.ip_attempts[ip]
-        return (
-            attempt_data['attempts'] >= self.max_attempts and
-            time.time() - attempt_data['first_attempt'] < self.block_duration
-        )
-
-    def _track_ip_attempt(self, ip: str):
-        current_time = time.time()
-        
-        if ip not in self.ip_attempts:
-            self.ip_attempts[ip] = {
-                'attempts': 1,
-                'first_attempt': current_time
-            }
-        else:
-            attempt_data = self.ip_attempts[ip]
-            
-            # Сброс счетчика, если время блокировки истекло
-            if current_time - attempt_data['first_attempt'] > self.block_duration:
-                attempt_data['attempts'] = 1
-                attempt_data['first_attempt'] = current_time
-            else:
-                attempt_data['attempts'] += 1
-
-    def _reset_ip_attempts(self, ip: str):
-        """Сброс счетчика попыток для IP (при успешном запросе)"""
-        if ip in self.ip_attempts:
-            del self.ip_attempts[ip]
-
-    def clear_old_attempts(self):
-        """Очистка старых попыток входа"""
-        current_time = time.time()
-        self.ip_attempts = {
-            ip: data for ip, data in self.ip_attempts.items()
-            if current_time - data['first_attempt'] < self.block_duration
-        }
+        with span("security"):
+            if status_code >= 400:
+                await self.tracker.track(client_ip)
+            elif status_code < 300:
+                await self.tracker.reset(client_ip)
@@ -0,0 +1,95 @@
+"""
+Single-flight: объединение одновременных вычислений одного и того же ключа
+Пока вычисление для ключа выполняется, остальные вызовы с тем же ключом
+ждут его результата вместо повторного запуска (защита от cache stampede)
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class LeaderCancelled(asyncio.CancelledError):
+    """Ожидающий AsyncSingleFlight.do: отменено общее вычисление (задача-лидер), а не он сам"""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Single-flight для синхронного кода (потоки threadpool)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Single-flight для корутин внутри одного event loop"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            # shield: отмена одного ожидающего не должна отменять общий результат
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Task.cancelling() есть только с Python 3.11: отмену лидера видно по future
+                if future.cancelled():
+                    raise LeaderCancelled() from None
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Помечаем как полученное, если ожидающих нет
+            raise
+        finally:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -1,6 +1,8 @@
-"""Background tasks for stories"""
+"""Background tasks: stories and monthly table partitions"""
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
+from app.core import http_cache  # noqa: F401  Изменения сторисов из cron тоже меняют их ETag
+from app.core import partitioning
+from app.core.database import SessionLocal, engine
 from app.services.story_service import StoryService
 import logging
 
@@ -34,3 +36,12 @@ def activate_scheduled_stories():
     finally:
         db.close()
 
+
+
+def maintain_partitions():
+    """Create upcoming monthly partitions and detach expired ones - call this from cron daily"""
+    try:
+        return partitioning.maintain_partitions(engine)
+    except Exception as e:
+        logger.error(f"Error maintaining partitions: {str(e)}")
+        return {}
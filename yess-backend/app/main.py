@@ -1,11 +1,13 @@
-import json
 import os
-from fastapi import FastAPI, Request
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
 from app.core.error_handler import setup_error_handlers
-from app.core.performance_middleware import PerformanceMonitoringMiddleware
+from app.core.performance_middleware import PerformanceMonitoringMiddleware, metrics_access
+from app.core.query_collector import QueryCollectorMiddleware
+from app.core.responses import ORJSONResponse
 from app.core.security_middleware import SecurityMiddleware
 from app.core.rate_limit import RateLimitMiddleware
 
@@ -53,15 +55,52 @@ app.add_middleware(
 )
 
 # ---- Middleware ----
-if settings.ENABLE_PERFORMANCE_MONITORING:
-    app.add_middleware(PerformanceMonitoringMiddleware)
-
+# Сжатие — внутри остальных middleware: они видят и дополняют заголовки уже сжатого ответа
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(SecurityMiddleware)
 app.add_middleware(RateLimitMiddleware)
 
+if settings.DB_QUERY_COLLECTOR_ENABLED:
+    app.add_middleware(QueryCollectorMiddleware)
+
+# Добавлен последним — внешний: латентность включает все остальные middleware
+if settings.ENABLE_PERFORMANCE_MONITORING:
+    app.add_middleware(PerformanceMonitoringMiddleware)
+
 setup_error_handlers(app)
 
 
+@app.on_event("startup")
+async def start_cache_invalidation_listener():
+    """Подписка воркера на инвалидацию in-process L1 кэша"""
+    from app.core.cache import redis_cache
+    redis_cache.start_invalidation_listener()
+
+
+@app.on_event("startup")
+async def start_replica_monitor():
+    """Фоновая проверка отставания реплик БД (если заданы DATABASE_REPLICA_URLS)"""
+    from app.core.database import replica_set
+    if replica_set is not None:
+        replica_set.start()
+
+
+@app.on_event("shutdown")
+async def stop_replica_monitor():
+    from app.core.database import replica_set
+    if replica_set is not None:
+        replica_set.stop()
+
+
+@app.on_event("shutdown")
+async def close_cache_connections():
+    """Закрытие пула соединений Redis при остановке воркера"""
+    from app.core.cache import redis_cache
+    from app.services.cache_service import cache_service
+    await cache_service.drain_background()  # Отложенные после commit записи (версии, поток изменений)
+    await redis_cache.close()
+
+
 # ✅ Подключаем все API-роуты одним include
 app.include_router(api_router, prefix="/api/v1")
 
@@ -174,16 +213,34 @@ async def health_check():
     }
     
     # Return response with appropriate status code
-    from fastapi import Response
     status_code = 200 if overall_status == "healthy" else 503
-    return Response(
-        content=json.dumps(response, ensure_ascii=False, default=str),
-        media_type="application/json",
-        status_code=status_code
-    )
+    return ORJSONResponse(content=response, status_code=status_code)
+
+
+@app.get("/health/cache", response_class=ORJSONResponse)
+async def health_check_cache():
+    """Проверка Redis и статистика попаданий по уровням кэша (L1 в процессе / L2 Redis)"""
+    from app.core.cache import redis_cache
+    from app.services.cache_service import cache_service
+
+    return {
+        "status": "connected" if await redis_cache.ping() else "disconnected",
+        "redis_cache": redis_cache.get_stats(),
+        "cache_service": cache_service.get_stats(),
+        "pool": cache_service.get_pool_stats()
+    }
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(metrics_access)])
+async def metrics():
+    """Метрики Prometheus"""
+    from fastapi import Response
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
-@app.get("/health/db")
+@app.get("/health/db", response_class=ORJSONResponse)
 async def health_check_db():
     """Детальная проверка базы данных"""
     from sqlalchemy import text
@@ -1,5 +1,5 @@
 """Order model"""
-from sqlalchemy import Column, Integer, Numeric, String, Text, DateTime, ForeignKey, CheckConstraint, Enum as SQLEnum
+from sqlalchemy import Column, Integer, Numeric, String, Text, DateTime, ForeignKey, CheckConstraint, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -46,7 +46,7 @@ class Order(Base):
     idempotency_key = Column(String(255), unique=True, nullable=False, index=True)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     paid_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     cancelled_at = Column(DateTime, nullable=True)
@@ -57,6 +57,8 @@ class Order(Base):
         CheckConstraint('discount <= order_total', name='check_discount_not_exceeds_total'),
         CheckConstraint('cashback_amount >= 0', name='check_positive_cashback'),
         CheckConstraint('final_amount >= 0', name='check_positive_final'),
+        # Список заказов пользователя (ORDERS_ORDER в app.api.v1.orders)
+        Index('idx_order_user_created', 'user_id', 'created_at', 'id'),
     )
     
     # Relationships
@@ -64,9 +64,10 @@ class Partner(Base):
         CheckConstraint('cashback_rate >= 0 AND cashback_rate <= 100', name='check_cashback_range'),
         # Оптимизированные индексы
         Index('idx_partner_location', 'city_id', 'latitude', 'longitude'),
+        Index('idx_partner_lat_lon', 'latitude', 'longitude'),  # Поиск в радиусе без города (geo_search)
         Index('idx_partner_status', 'is_active', 'is_verified', 'category'),
         Index('idx_partner_cashback', 'cashback_rate', 'is_active'),
-        # GIST индекс для геопространственных запросов (создается через миграцию Alembic)
+        # GIST индекс для геопространственных запросов (создается через миграцию Alembic partner_geography)
     )
     
     # Relationships
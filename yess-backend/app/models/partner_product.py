@@ -43,7 +43,7 @@ class PartnerProduct(Base):
     original_price = Column(Numeric(10, 2), nullable=True)  # Цена до скидки
     
     # Сортировка
-    sort_order = Column(Integer, default=0)
+    sort_order = Column(Integer, default=0, server_default='0', nullable=False)
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -55,6 +55,7 @@ class PartnerProduct(Base):
         CheckConstraint('stock_quantity IS NULL OR stock_quantity >= 0', name='check_positive_stock'),
         Index('idx_product_partner_category', 'partner_id', 'category', 'is_available'),
         Index('idx_product_available', 'is_available', 'partner_id'),
+        Index('idx_product_partner_sort', 'partner_id', 'sort_order', 'name', 'id'),
     )
     
     # Relationships
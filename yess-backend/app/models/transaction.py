@@ -30,9 +30,11 @@ class Transaction(Base):
     yescoin_earned = Column(Numeric(10, 2), default=0.0)  # Cashback earned
     description = Column(Text)  # Transaction description
     
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)  # Ключ помесячных секций
     completed_at = Column(DateTime)
     
+    # В PostgreSQL таблица секционирована по месяцам created_at (app.core.partitioning),
+    # первичный ключ в БД — (id, created_at)
     __table_args__ = (
         CheckConstraint('amount > 0', name='check_positive_amount'),
         # Составные индексы для оптимизации запросов
@@ -40,6 +42,7 @@ class Transaction(Base):
         Index('idx_transaction_type_status', 'type', 'status', 'created_at'),
         Index('idx_transaction_date_range', 'created_at', 'status'),
         Index('idx_transaction_partner', 'partner_id', 'created_at'),
+        Index('idx_transaction_user_created', 'user_id', 'created_at', 'id'),
     )
     
     # Relationships
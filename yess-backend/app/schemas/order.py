@@ -4,6 +4,7 @@ from decimal import Decimal
 from typing import Optional, List
 from datetime import datetime
 from app.models.order import OrderStatus
+from app.schemas.pagination import CursorPage
 
 
 class OrderItemCreate(BaseModel):
@@ -54,6 +55,10 @@ class OrderResponse(BaseModel):
         from_attributes = True
 
 
+class OrderListResponse(CursorPage[OrderResponse]):
+    pass
+
+
 class OrderCalculateRequest(BaseModel):
     partner_id: int
     items: List[OrderItemCreate] = Field(..., min_items=1)
@@ -0,0 +1,13 @@
+"""Схемы курсорной пагинации (app.core.pagination)"""
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы; null — страниц больше нет")
+    has_more: bool = False
+    total: Optional[int] = Field(None, description="Оценка общего числа записей (include_total=true)")
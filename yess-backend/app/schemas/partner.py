@@ -77,13 +77,17 @@ class PartnerUpdate(BaseModel):
 
 # ---- Локации партнёров ----
 
+class PartnerCategoryResponse(BaseModel):
+    name: str
+
+
 class PartnerLocationResponse(BaseModel):
     id: int
     address: Optional[str]
     latitude: Optional[float]
     longitude: Optional[float]
     phone_number: Optional[str]
-    working_hours: Optional[str]
+    working_hours: Optional[Dict[str, Any]]  # JSON: {"mon": "9:00-18:00", ...}
     partner_id: int
     partner_name: str
     max_discount_percent: float
@@ -137,7 +141,7 @@ class PartnerSearchRequest(BaseModel):
     query: Optional[str]
     filter: Optional[PartnerFilterRequest]
     sort: Optional[PartnerSortRequest]
-    page: int = Field(default=1, ge=1)
+    cursor: Optional[str] = Field(default=None, description="next_cursor из предыдущей страницы")
     page_size: int = Field(default=10, ge=1, le=100)
 
     @validator('query')
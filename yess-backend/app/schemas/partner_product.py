@@ -4,6 +4,8 @@ from typing import Optional, List
 from decimal import Decimal
 from datetime import datetime
 
+from app.schemas.pagination import CursorPage
+
 
 class PartnerProductBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
@@ -61,11 +63,8 @@ class PartnerProductResponse(PartnerProductBase):
         from_attributes = True
 
 
-class PartnerProductListResponse(BaseModel):
-    items: List[PartnerProductResponse]
-    total: int
-    page: int
-    page_size: int
+class PartnerProductListResponse(CursorPage[PartnerProductResponse]):
+    pass
 
 
 class CartItem(BaseModel):
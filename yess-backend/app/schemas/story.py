@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import datetime
 from app.models.story import StoryType, StoryActionType, StoryStatus
+from app.schemas.pagination import CursorPage
 
 
 class StoryBase(BaseModel):
@@ -79,11 +80,8 @@ class StoryResponse(StoryBase):
         from_attributes = True
 
 
-class StoryListResponse(BaseModel):
-    items: List[StoryResponse]
-    total: int
-    page: int
-    page_size: int
+class StoryListResponse(CursorPage[StoryResponse]):
+    pass
 
 
 class StoryViewRequest(BaseModel):
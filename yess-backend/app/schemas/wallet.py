@@ -4,6 +4,8 @@ from decimal import Decimal
 from datetime import datetime
 from typing import Optional
 
+from app.schemas.pagination import CursorPage
+
 
 class WalletResponse(BaseModel):
     id: int
@@ -42,3 +44,25 @@ class TopUpResponse(BaseModel):
     payment_url: str
     qr_code_data: str
 
+
+class TransactionResponse(BaseModel):
+    """Операция в истории кошелька"""
+    id: int
+    type: str
+    amount: Decimal
+    status: str
+    partner_id: Optional[int] = None
+    order_id: Optional[int] = None
+    description: Optional[str] = None
+    balance_before: Optional[Decimal] = None
+    balance_after: Optional[Decimal] = None
+    yescoin_used: Optional[Decimal] = None
+    yescoin_earned: Optional[Decimal] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class TransactionHistoryResponse(CursorPage[TransactionResponse]):
+    pass
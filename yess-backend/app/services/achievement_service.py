@@ -6,9 +6,13 @@ from enum import Enum
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import logging
+from app.services.cache_service import cache_service
 
 logger = logging.getLogger(__name__)
 
+# Пространство имён кэша: инвалидируется целиком при начислении очков/достижений
+CACHE_NAMESPACE = "achievements"
+
 class AchievementType(Enum):
     REGISTRATION = "registration"
     FIRST_PURCHASE = "first_purchase"
@@ -259,6 +263,8 @@ class AchievementService:
                 "completed_at": achievement.completed_at
             })
             
+            await cache_service.ainvalidate_namespace(CACHE_NAMESPACE)
+            
         except Exception as e:
             logger.error(f"Error saving achievement: {e}")
     
@@ -296,88 +302,100 @@ class AchievementService:
                 "created_at": time.time()
             })
             
+            await cache_service.ainvalidate_namespace(CACHE_NAMESPACE)
+            
         except Exception as e:
             logger.error(f"Error awarding points: {e}")
     
+    @cache_service.cache_method(expiry=60, namespace=CACHE_NAMESPACE)
+    async def _compute_leaderboard(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Таблица лидеров (кэшируется; ошибки БД пробрасываются)"""
+        query = text("""
+            SELECT 
+                u.id,
+                u.username,
+                us.achievement_points,
+                us.total_points,
+                COUNT(ua.id) as achievements_count,
+                RANK() OVER (ORDER BY us.achievement_points DESC) as rank
+            FROM users u
+            LEFT JOIN user_stats us ON u.id = us.user_id
+            LEFT JOIN user_achievements ua ON u.id = ua.user_id AND ua.status = 'completed'
+            WHERE u.is_active = true
+            GROUP BY u.id, u.username, us.achievement_points, us.total_points
+            ORDER BY us.achievement_points DESC
+            LIMIT :limit
+        """)
+        
+        results = self.db.execute(query, {"limit": limit}).fetchall()
+        
+        leaderboard = []
+        for row in results:
+            leaderboard.append({
+                "user_id": row[0],
+                "username": row[1],
+                "achievement_points": row[2] or 0,
+                "total_points": row[3] or 0,
+                "achievements_count": row[4] or 0,
+                "rank": row[5]
+            })
+        
+        return leaderboard
+
     async def get_leaderboard(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
         Получение таблицы лидеров
+        Ошибка БД не кэшируется: запасное значение отдаётся только этому вызову
         """
         try:
-            query = text("""
-                SELECT 
-                    u.id,
-                    u.username,
-                    us.achievement_points,
-                    us.total_points,
-                    COUNT(ua.id) as achievements_count,
-                    RANK() OVER (ORDER BY us.achievement_points DESC) as rank
-                FROM users u
-                LEFT JOIN user_stats us ON u.id = us.user_id
-                LEFT JOIN user_achievements ua ON u.id = ua.user_id AND ua.status = 'completed'
-                WHERE u.is_active = true
-                GROUP BY u.id, u.username, us.achievement_points, us.total_points
-                ORDER BY us.achievement_points DESC
-                LIMIT :limit
-            """)
-            
-            results = self.db.execute(query, {"limit": limit}).fetchall()
-            
-            leaderboard = []
-            for row in results:
-                leaderboard.append({
-                    "user_id": row[0],
-                    "username": row[1],
-                    "achievement_points": row[2] or 0,
-                    "total_points": row[3] or 0,
-                    "achievements_count": row[4] or 0,
-                    "rank": row[5]
-                })
-            
-            return leaderboard
-            
+            return await self._compute_leaderboard(limit)
         except Exception as e:
             logger.error(f"Error getting leaderboard: {e}")
             return []
     
+    @cache_service.cache_method(expiry=300, namespace=CACHE_NAMESPACE)
+    async def _compute_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Статистика пользователя (кэшируется; ошибки БД пробрасываются)"""
+        # Общая статистика
+        stats_query = text("""
+            SELECT 
+                achievement_points,
+                total_points,
+                level,
+                created_at
+            FROM user_stats 
+            WHERE user_id = :user_id
+        """)
+        
+        stats_result = self.db.execute(stats_query, {"user_id": user_id}).fetchone()
+        
+        # Количество достижений
+        achievements_query = text("""
+            SELECT 
+                COUNT(*) as total_achievements,
+                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_achievements
+            FROM user_achievements 
+            WHERE user_id = :user_id
+        """)
+        
+        achievements_result = self.db.execute(achievements_query, {"user_id": user_id}).fetchone()
+        
+        return {
+            "achievement_points": stats_result[0] if stats_result else 0,
+            "total_points": stats_result[1] if stats_result else 0,
+            "level": stats_result[2] if stats_result else 1,
+            "total_achievements": achievements_result[0] if achievements_result else 0,
+            "completed_achievements": achievements_result[1] if achievements_result else 0,
+            "member_since": stats_result[3] if stats_result else None
+        }
+
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """
         Получение статистики пользователя
+        Ошибка БД не кэшируется: запасное значение отдаётся только этому вызову
         """
         try:
-            # Общая статистика
-            stats_query = text("""
-                SELECT 
-                    achievement_points,
-                    total_points,
-                    level,
-                    created_at
-                FROM user_stats 
-                WHERE user_id = :user_id
-            """)
-            
-            stats_result = self.db.execute(stats_query, {"user_id": user_id}).fetchone()
-            
-            # Количество достижений
-            achievements_query = text("""
-                SELECT 
-                    COUNT(*) as total_achievements,
-                    COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed_achievements
-                FROM user_achievements 
-                WHERE user_id = :user_id
-            """)
-            
-            achievements_result = self.db.execute(achievements_query, {"user_id": user_id}).fetchone()
-            
-            return {
-                "achievement_points": stats_result[0] if stats_result else 0,
-                "total_points": stats_result[1] if stats_result else 0,
-                "level": stats_result[2] if stats_result else 1,
-                "total_achievements": achievements_result[0] if achievements_result else 0,
-                "completed_achievements": achievements_result[1] if achievements_result else 0,
-                "member_since": stats_result[3] if stats_result else None
-            }
-            
+            return await self._compute_user_stats(user_id)
         except Exception as e:
             logger.error(f"Error getting user stats: {e}")
             return {}
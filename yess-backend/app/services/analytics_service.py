@@ -9,9 +9,31 @@ from sqlalchemy import text
 import logging
 import statistics
 from datetime import datetime, timedelta
+from app.core.db_replicas import on_replica
+from app.services.cache_service import cache_service
 
 logger = logging.getLogger(__name__)
 
+CACHE_NAMESPACE = "analytics"
+
+# Метрики реального времени (get_real_time_metrics): фильтр по ключу секционирования
+# analytics_events (timestamp, epoch-секунды) — читаются только секции последних месяцев
+ACTIVE_USERS_SQL = """
+    SELECT COUNT(DISTINCT user_id) as count
+    FROM analytics_events
+    WHERE timestamp >= :hour_ago
+"""
+
+EVENTS_BY_TYPE_SQL = """
+    SELECT
+        event_type,
+        COUNT(*) as count
+    FROM analytics_events
+    WHERE timestamp >= :hour_ago
+    GROUP BY event_type
+"""
+
+
 class EventType(Enum):
     PAGE_VIEW = "page_view"
     BUTTON_CLICK = "button_click"
@@ -140,7 +162,7 @@ class AnalyticsService:
                 GROUP BY u.id, u.created_at, u.is_active, w.balance, us.achievement_points, us.level
             """
             
-            user_result = self.db.execute(text(user_query), {"user_id": user_id}).fetchone()
+            user_result = self.db.execute(on_replica(text(user_query)), {"user_id": user_id}).fetchone()
             
             if not user_result:
                 return None
@@ -155,7 +177,7 @@ class AnalyticsService:
                 LIMIT 1000
             """
             
-            events_results = self.db.execute(text(events_query), {"user_id": user_id}).fetchall()
+            events_results = self.db.execute(on_replica(text(events_query)), {"user_id": user_id}).fetchall()
             
             # Анализ поведения
             behavior_analysis = self.analyze_user_behavior(events_results, user_result)
@@ -402,190 +424,190 @@ class AnalyticsService:
             logger.error(f"Error analyzing activity patterns: {e}")
             return {}
     
-    async def get_cohort_analysis(self, start_date: float, end_date: float) -> Dict[str, Any]:
+    @cache_service.cache_method(expiry=900, namespace=CACHE_NAMESPACE)
+    async def _compute_cohort_analysis(self, start_date: float, end_date: float) -> Dict[str, Any]:
+        """Когортный анализ (кэшируется; ошибки БД пробрасываются)"""
+        # Получение данных о регистрациях по неделям
+        registration_query = """
+            SELECT 
+                DATE_TRUNC('week', created_at) as week,
+                COUNT(*) as registrations
+            FROM users
+            WHERE created_at BETWEEN :start_date AND :end_date
+            GROUP BY DATE_TRUNC('week', created_at)
+            ORDER BY week
         """
-        Когортный анализ пользователей
+        
+        registration_results = self.db.execute(on_replica(text(registration_query)), {
+            "start_date": start_date,
+            "end_date": end_date
+        }).fetchall()
+        
+        # Получение данных об активности по неделям
+        activity_query = """
+            SELECT 
+                DATE_TRUNC('week', u.created_at) as registration_week,
+                DATE_TRUNC('week', o.created_at) as activity_week,
+                COUNT(DISTINCT o.user_id) as active_users
+            FROM users u
+            JOIN orders o ON u.id = o.user_id
+            WHERE u.created_at BETWEEN :start_date AND :end_date
+            GROUP BY DATE_TRUNC('week', u.created_at), DATE_TRUNC('week', o.created_at)
+            ORDER BY registration_week, activity_week
         """
-        try:
-            # Получение данных о регистрациях по неделям
-            registration_query = """
-                SELECT 
-                    DATE_TRUNC('week', created_at) as week,
-                    COUNT(*) as registrations
-                FROM users
-                WHERE created_at BETWEEN :start_date AND :end_date
-                GROUP BY DATE_TRUNC('week', created_at)
-                ORDER BY week
-            """
-            
-            registration_results = self.db.execute(text(registration_query), {
-                "start_date": start_date,
-                "end_date": end_date
-            }).fetchall()
-            
-            # Получение данных об активности по неделям
-            activity_query = """
-                SELECT 
-                    DATE_TRUNC('week', u.created_at) as registration_week,
-                    DATE_TRUNC('week', o.created_at) as activity_week,
-                    COUNT(DISTINCT o.user_id) as active_users
-                FROM users u
-                JOIN orders o ON u.id = o.user_id
-                WHERE u.created_at BETWEEN :start_date AND :end_date
-                GROUP BY DATE_TRUNC('week', u.created_at), DATE_TRUNC('week', o.created_at)
-                ORDER BY registration_week, activity_week
-            """
+        
+        activity_results = self.db.execute(on_replica(text(activity_query)), {
+            "start_date": start_date,
+            "end_date": end_date
+        }).fetchall()
+        
+        # Формирование когортного анализа
+        cohorts = {}
+        for reg_week, reg_count in registration_results:
+            week_key = reg_week.strftime("%Y-%m-%d")
+            cohorts[week_key] = {
+                "registrations": reg_count,
+                "retention": {}
+            }
+        
+        for reg_week, activity_week, active_users in activity_results:
+            reg_week_key = reg_week.strftime("%Y-%m-%d")
+            activity_week_key = activity_week.strftime("%Y-%m-%d")
             
-            activity_results = self.db.execute(text(activity_query), {
+            if reg_week_key in cohorts:
+                weeks_diff = (activity_week - reg_week).days // 7
+                cohorts[reg_week_key]["retention"][weeks_diff] = active_users
+        
+        return {
+            "cohorts": cohorts,
+            "analysis_period": {
                 "start_date": start_date,
                 "end_date": end_date
-            }).fetchall()
-            
-            # Формирование когортного анализа
-            cohorts = {}
-            for reg_week, reg_count in registration_results:
-                week_key = reg_week.strftime("%Y-%m-%d")
-                cohorts[week_key] = {
-                    "registrations": reg_count,
-                    "retention": {}
-                }
-            
-            for reg_week, activity_week, active_users in activity_results:
-                reg_week_key = reg_week.strftime("%Y-%m-%d")
-                activity_week_key = activity_week.strftime("%Y-%m-%d")
-                
-                if reg_week_key in cohorts:
-                    weeks_diff = (activity_week - reg_week).days // 7
-                    cohorts[reg_week_key]["retention"][weeks_diff] = active_users
-            
-            return {
-                "cohorts": cohorts,
-                "analysis_period": {
-                    "start_date": start_date,
-                    "end_date": end_date
-                }
             }
-            
+        }
+
+    async def get_cohort_analysis(self, start_date: float, end_date: float) -> Dict[str, Any]:
+        """
+        Когортный анализ пользователей
+        Ошибка БД не кэшируется: запасное значение отдаётся только этому вызову
+        """
+        try:
+            return await self._compute_cohort_analysis(start_date, end_date)
         except Exception as e:
             logger.error(f"Error getting cohort analysis: {e}")
             return {}
     
+    @cache_service.cache_method(expiry=300, namespace=CACHE_NAMESPACE)
+    async def _compute_funnel_analysis(self, funnel_name: str) -> Dict[str, Any]:
+        """Воронка конверсии (кэшируется; ошибки БД пробрасываются)"""
+        # Определение этапов воронки
+        funnel_stages = {
+            "registration": "user_registration",
+            "first_login": "user_login",
+            "first_search": "partner_search",
+            "first_view": "partner_view",
+            "first_order": "order_created"
+        }
+        
+        funnel_data = {}
+        
+        for stage, event_name in funnel_stages.items():
+            query = """
+                SELECT COUNT(DISTINCT user_id) as count
+                FROM analytics_events
+                WHERE event_name = :event_name
+                AND timestamp >= :start_date
+            """
+            
+            start_date = time.time() - (30 * 24 * 3600)  # Последние 30 дней
+            
+            result = self.db.execute(on_replica(text(query)), {
+                "event_name": event_name,
+                "start_date": start_date
+            }).fetchone()
+            
+            funnel_data[stage] = result[0] if result else 0
+        
+        # Расчет конверсии между этапами
+        conversions = {}
+        stages = list(funnel_data.keys())
+        
+        for i in range(len(stages) - 1):
+            current_stage = stages[i]
+            next_stage = stages[i + 1]
+            
+            current_count = funnel_data[current_stage]
+            next_count = funnel_data[next_stage]
+            
+            if current_count > 0:
+                conversion_rate = next_count / current_count
+                conversions[f"{current_stage}_to_{next_stage}"] = {
+                    "rate": conversion_rate,
+                    "count": next_count
+                }
+        
+        return {
+            "funnel_name": funnel_name,
+            "stages": funnel_data,
+            "conversions": conversions,
+            "total_conversion": funnel_data["first_order"] / max(funnel_data["registration"], 1)
+        }
+
     async def get_funnel_analysis(self, funnel_name: str) -> Dict[str, Any]:
         """
         Анализ воронки конверсии
+        Ошибка БД не кэшируется: запасное значение отдаётся только этому вызову
         """
         try:
-            # Определение этапов воронки
-            funnel_stages = {
-                "registration": "user_registration",
-                "first_login": "user_login",
-                "first_search": "partner_search",
-                "first_view": "partner_view",
-                "first_order": "order_created"
-            }
-            
-            funnel_data = {}
-            
-            for stage, event_name in funnel_stages.items():
-                query = """
-                    SELECT COUNT(DISTINCT user_id) as count
-                    FROM analytics_events
-                    WHERE event_name = :event_name
-                    AND timestamp >= :start_date
-                """
-                
-                start_date = time.time() - (30 * 24 * 3600)  # Последние 30 дней
-                
-                result = self.db.execute(text(query), {
-                    "event_name": event_name,
-                    "start_date": start_date
-                }).fetchone()
-                
-                funnel_data[stage] = result[0] if result else 0
-            
-            # Расчет конверсии между этапами
-            conversions = {}
-            stages = list(funnel_data.keys())
-            
-            for i in range(len(stages) - 1):
-                current_stage = stages[i]
-                next_stage = stages[i + 1]
-                
-                current_count = funnel_data[current_stage]
-                next_count = funnel_data[next_stage]
-                
-                if current_count > 0:
-                    conversion_rate = next_count / current_count
-                    conversions[f"{current_stage}_to_{next_stage}"] = {
-                        "rate": conversion_rate,
-                        "count": next_count
-                    }
-            
-            return {
-                "funnel_name": funnel_name,
-                "stages": funnel_data,
-                "conversions": conversions,
-                "total_conversion": funnel_data["first_order"] / max(funnel_data["registration"], 1)
-            }
-            
+            return await self._compute_funnel_analysis(funnel_name)
         except Exception as e:
             logger.error(f"Error getting funnel analysis: {e}")
             return {}
     
+    @cache_service.cache_method(expiry=30, namespace=CACHE_NAMESPACE)
+    async def _compute_real_time_metrics(self) -> Dict[str, Any]:
+        """Метрики в реальном времени (кэшируются; ошибки БД пробрасываются)"""
+        current_time = time.time()
+        hour_ago = current_time - 3600
+        day_ago = current_time - (24 * 3600)
+        
+        # Активные пользователи за последний час
+        active_users_result = self.db.execute(on_replica(text(ACTIVE_USERS_SQL)), {
+            "hour_ago": hour_ago
+        }).fetchone()
+        
+        # События за последний час
+        events_results = self.db.execute(on_replica(text(EVENTS_BY_TYPE_SQL)), {
+            "hour_ago": hour_ago
+        }).fetchall()
+        
+        # Новые регистрации за последний день
+        new_registrations_query = """
+            SELECT COUNT(*) as count
+            FROM users
+            WHERE created_at >= :day_ago
+        """
+        
+        new_registrations_result = self.db.execute(on_replica(text(new_registrations_query)), {
+            "day_ago": day_ago
+        }).fetchone()
+        
+        return {
+            "active_users_last_hour": active_users_result[0] if active_users_result else 0,
+            "events_last_hour": {
+                event_type: count for event_type, count in events_results
+            },
+            "new_registrations_last_day": new_registrations_result[0] if new_registrations_result else 0,
+            "timestamp": current_time
+        }
+
     async def get_real_time_metrics(self) -> Dict[str, Any]:
         """
         Получение метрик в реальном времени
+        Ошибка БД не кэшируется: запасное значение отдаётся только этому вызову
         """
         try:
-            current_time = time.time()
-            hour_ago = current_time - 3600
-            day_ago = current_time - (24 * 3600)
-            
-            # Активные пользователи за последний час
-            active_users_query = """
-                SELECT COUNT(DISTINCT user_id) as count
-                FROM analytics_events
-                WHERE timestamp >= :hour_ago
-            """
-            
-            active_users_result = self.db.execute(text(active_users_query), {
-                "hour_ago": hour_ago
-            }).fetchone()
-            
-            # События за последний час
-            events_query = """
-                SELECT 
-                    event_type,
-                    COUNT(*) as count
-                FROM analytics_events
-                WHERE timestamp >= :hour_ago
-                GROUP BY event_type
-            """
-            
-            events_results = self.db.execute(text(events_query), {
-                "hour_ago": hour_ago
-            }).fetchall()
-            
-            # Новые регистрации за последний день
-            new_registrations_query = """
-                SELECT COUNT(*) as count
-                FROM users
-                WHERE created_at >= :day_ago
-            """
-            
-            new_registrations_result = self.db.execute(text(new_registrations_query), {
-                "day_ago": day_ago
-            }).fetchone()
-            
-            return {
-                "active_users_last_hour": active_users_result[0] if active_users_result else 0,
-                "events_last_hour": {
-                    event_type: count for event_type, count in events_results
-                },
-                "new_registrations_last_day": new_registrations_result[0] if new_registrations_result else 0,
-                "timestamp": current_time
-            }
-            
+            return await self._compute_real_time_metrics()
         except Exception as e:
             logger.error(f"Error getting real-time metrics: {e}")
             return {}
@@ -1,28 +1,81 @@
 from redis import Redis, ConnectionPool
+from redis.asyncio import Redis as AsyncRedis, ConnectionPool as AsyncConnectionPool
 from redis.exceptions import RedisError, ConnectionError as RedisConnectionError
-from typing import Any, Optional, Callable
+from typing import Any, Awaitable, Dict, Hashable, Iterable, List, Mapping, Optional, Callable, Tuple, Union
+import asyncio
+import inspect
 import json
 import hashlib
 import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
 from functools import wraps
+from uuid import UUID
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core import cache_invalidation
+from app.core.cache_codec import CacheCodec, codec as default_codec, raw_get, raw_mget
+from app.core.cache_metrics import CacheMetrics, register_pool_metrics
+from app.core.local_cache import LocalCache, local_cache
+from app.core.single_flight import SingleFlight, AsyncSingleFlight
 import os
 
 logger = logging.getLogger(__name__)
 
+# Значение, записанное через get_or_set, хранится в конверте с метаданными для XFetch:
+# v — значение, d — время вычисления (сек), e — unix-время истечения
+_ENVELOPE_MARKER = "__xf__"
+_MISSING = object()
+
+# Снятие блокировки только её владельцем (compare-and-delete)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
 class CacheService:
     """
     Оптимизированный сервис кэширования с connection pooling для высокой нагрузки (4000+ пользователей)
     """
-    def __init__(self, redis_host: str = None, redis_port: int = 6379, redis_url: str = None):
+    def __init__(
+        self,
+        redis_host: str = None,
+        redis_port: int = 6379,
+        redis_url: str = None,
+        local: Optional[LocalCache] = None,
+        codec: Optional[CacheCodec] = None
+    ):
         self.default_expiry = 3600  # 1 час по умолчанию
-        
+        self.codec = codec if codec is not None else default_codec
+
+        # L1 в памяти процесса (общий с RedisCache) и статистика L2
+        self.local = local if local is not None else local_cache
+        self.invalidation_channel = settings.CACHE_INVALIDATION_CHANNEL
+        self.hits = 0
+        self.misses = 0
+        self.metrics = CacheMetrics("cache_service")
+
+        # Защита от cache stampede: одно вычисление на ключ в процессе
+        self._single_flight = SingleFlight()
+        self._async_single_flight = AsyncSingleFlight()
+        self._background: set = set()  # Задачи run_in_background (сильные ссылки до завершения)
+
         # Получаем настройки из переменных окружения
         MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 150))  # Увеличено для высокой нагрузки
-        
+
         # Конфигурация connection pool для лучшей производительности при высокой нагрузке
         redis_url = redis_url or str(settings.REDIS_URL) if hasattr(settings, 'REDIS_URL') else None
-        
+
         if redis_url:
             self.pool = ConnectionPool.from_url(
                 redis_url,
@@ -34,6 +87,15 @@ class CacheService:
                 socket_keepalive=True,  # Поддержание соединений
                 socket_keepalive_options={}  # Опции keepalive
             )
+            # Асинхронный пул для вызовов из async-кода (aget_or_set, async cache_method)
+            self.async_pool = AsyncConnectionPool.from_url(
+                redis_url,
+                max_connections=MAX_CONNECTIONS,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                socket_keepalive=True
+            )
         else:
             redis_host = redis_host or getattr(settings, 'REDIS_HOST', 'redis')
             self.pool = ConnectionPool(
@@ -47,67 +109,607 @@ class CacheService:
                 socket_keepalive=True,
                 socket_keepalive_options={}
             )
-        
+            self.async_pool = AsyncConnectionPool(
+                host=redis_host,
+                port=redis_port,
+                max_connections=MAX_CONNECTIONS,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5,
+                socket_keepalive=True
+            )
+
         self.redis = Redis(connection_pool=self.pool)
+        self.async_redis = AsyncRedis(connection_pool=self.async_pool)
+        register_pool_metrics("cache_service", self.pool)
+        register_pool_metrics("cache_service_async", self.async_pool)
 
-    def _safe_operation(self, operation: Callable, default: Any = None):
-        """Безопасное выполнение операций с Redis с обработкой ошибок"""
+    def _safe_operation(self, operation: Callable, default: Any = None, name: str = "redis", key: Optional[str] = None):
+        """
+        Безопасное выполнение операций с Redis с обработкой ошибок
+        name/key — метки метрик латентности и ошибок (пространство имён берётся из ключа)
+        """
         try:
-            return operation()
+            with self.metrics.timer(name, key):
+                return operation()
         except (RedisError, RedisConnectionError) as e:
+            self.metrics.error(name, key)
             logger.error(f"Redis operation failed: {e}")
             return default
         except Exception as e:
+            self.metrics.error(name, key)
             logger.error(f"Unexpected error in cache operation: {e}")
             return default
 
-    def set(self, key: str, value: Any, expiry: Optional[int] = None):
-        """Установка значения в кэш"""
-        expiry = expiry or self.default_expiry
-        return self._safe_operation(
-            lambda: self.redis.setex(
-                key,
-                expiry,
-                json.dumps(value, default=str)  # Поддержка различных типов
-            ),
-            False
+    async def _async_safe_operation(self, operation: Callable, default: Any = None, name: str = "redis", key: Optional[str] = None):
+        """Асинхронный вариант _safe_operation"""
+        try:
+            with self.metrics.timer(name, key):
+                return await operation()
+        except (RedisError, RedisConnectionError) as e:
+            self.metrics.error(name, key)
+            logger.error(f"Redis operation failed: {e}")
+            return default
+        except Exception as e:
+            self.metrics.error(name, key)
+            logger.error(f"Unexpected error in cache operation: {e}")
+            return default
+
+    def run_in_background(self, operation: Callable[[], Awaitable], fallback: Callable[[], Any]):
+        """
+        Запись в Redis из синхронного кода (обработчики событий сессии), не блокирующая loop
+        В потоке event loop (commit внутри async-обработчика) — задачей через async-клиент,
+        вне loop (threadpool, скрипты) — синхронно: fallback блокирует только свой поток
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            fallback()
+            return
+        task = loop.create_task(operation())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def drain_background(self):
+        """Дождаться фоновых записей (тесты, остановка приложения)"""
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def _invalidation_message(self, keys: Optional[list] = None, pattern: Optional[str] = None) -> str:
+        return json.dumps({"origin": self.local.instance_id, "keys": keys or [], "pattern": pattern})
+
+    def _decode(self, key: str, cached_value: Optional[bytes], in_local: bool, generation: int) -> Any:
+        """Декодирование значения из Redis и заполнение L1"""
+        if not cached_value:
+            self.misses += 1
+            self.metrics.miss(key)
+            return None
+
+        self.hits += 1
+        self.metrics.hit(key, size=len(cached_value))
+        try:
+            value = self.codec.decode(cached_value)
+        except ValueError:
+            logger.error(f"Failed to decode cached value for key: {key}")
+            return None
+        if in_local:
+            self.local.set(key, value, size=len(cached_value), generation=generation)
+        return value
+
+    def _get_raw(self, key: str) -> Any:
+        """Хранимое значение как есть (включая конверт get_or_set)"""
+        in_local = self.local.is_cacheable(key)
+        if in_local:
+            value = self.local.get(key)
+            if value is not None:
+                self.metrics.hit(key, tier="l1")
+                return value
+
+        generation = self.local.generation
+        cached_value = self._safe_operation(lambda: raw_get(self.redis, key), name="get", key=key)
+        return self._decode(key, cached_value, in_local, generation)
+
+    async def _aget_raw(self, key: str) -> Any:
+        in_local = self.local.is_cacheable(key)
+        if in_local:
+            value = self.local.get(key)
+            if value is not None:
+                self.metrics.hit(key, tier="l1")
+                return value
+
+        generation = self.local.generation
+        cached_value = await self._async_safe_operation(lambda: raw_get(self.async_redis, key), name="get", key=key)
+        return self._decode(key, cached_value, in_local, generation)
+
+    def _queue_set(self, pipe, key: str, serialized: bytes, expiry: int, tags: Iterable[str], local: bool):
+        """SETEX + регистрация ключа в тегах + оповещение L1 в одном pipeline"""
+        pipe.setex(key, expiry, serialized)
+        for tag in tags:
+            pipe.sadd(cache_invalidation.tag_key(tag), key)
+            pipe.expire(cache_invalidation.tag_key(tag), cache_invalidation.tag_ttl(expiry))
+        if local:
+            pipe.publish(self.invalidation_channel, self._invalidation_message(keys=[key]))
+
+    def _set_raw(self, key: str, value: Any, expiry: int, tags: Optional[Iterable[str]] = None):
+        serialized = self.codec.encode(value)
+        self.metrics.written(key, len(serialized))
+        tags = list(tags or ())
+        local = self.local.is_cacheable(key)
+        if not local and not tags:
+            return self._safe_operation(
+                lambda: self.redis.setex(key, expiry, serialized),
+                False, name="set", key=key
+            )
+
+        # Запись в Redis, теги и инвалидация L1 остальных воркеров — один round-trip
+        def _set_and_publish():
+            pipe = self.redis.pipeline(transaction=False)
+            self._queue_set(pipe, key, serialized, expiry, tags, local)
+            return pipe.execute()[0]
+
+        if local:
+            self.local.delete(key)
+        result = self._safe_operation(_set_and_publish, False, name="set", key=key)
+        if result and local:
+            self.local.set(key, self.codec.decode(serialized), size=len(serialized), ttl=expiry)
+        return result
+
+    async def _aset_raw(self, key: str, value: Any, expiry: int, tags: Optional[Iterable[str]] = None):
+        serialized = self.codec.encode(value)
+        self.metrics.written(key, len(serialized))
+        tags = list(tags or ())
+        local = self.local.is_cacheable(key)
+        if not local and not tags:
+            return await self._async_safe_operation(
+                lambda: self.async_redis.setex(key, expiry, serialized),
+                False, name="set", key=key
+            )
+
+        async def _set_and_publish():
+            async with self.async_redis.pipeline(transaction=False) as pipe:
+                self._queue_set(pipe, key, serialized, expiry, tags, local)
+                return (await pipe.execute())[0]
+
+        if local:
+            self.local.delete(key)
+        result = await self._async_safe_operation(_set_and_publish, False, name="set", key=key)
+        if result and local:
+            self.local.set(key, self.codec.decode(serialized), size=len(serialized), ttl=expiry)
+        return result
+
+    @staticmethod
+    def _wrap(value: Any, delta: float, expiry: int) -> dict:
+        return {_ENVELOPE_MARKER: 1, "v": value, "d": round(delta, 4), "e": time.time() + expiry}
+
+    @staticmethod
+    def _unwrap(stored: Any) -> Any:
+        """Значение из конверта; _MISSING для отсутствующего или истёкшего (в L1) конверта"""
+        if stored is None:
+            return _MISSING
+        if isinstance(stored, dict) and stored.get(_ENVELOPE_MARKER) == 1:
+            if stored["e"] <= time.time():
+                return _MISSING
+            return stored["v"]
+        return stored
+
+    @staticmethod
+    def _should_refresh_early(stored: Any, beta: float) -> bool:
+        """
+        Вероятностное досрочное обновление (XFetch):
+        чем ближе истечение и чем дороже вычисление, тем выше шанс обновить ключ заранее
+        """
+        if not (isinstance(stored, dict) and stored.get(_ENVELOPE_MARKER) == 1) or beta <= 0:
+            return False
+        jitter = -stored["d"] * beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= stored["e"]
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f"lock:{key}"
+
+    def _acquire_lock(self, key: str) -> Tuple[bool, Optional[str]]:
+        """
+        Короткая блокировка в Redis на пересчёт ключа (между процессами и подами)
+        Возвращает (можно_вычислять, токен). При недоступности Redis вычисляем без блокировки.
+        """
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(self._lock_key(key), token, nx=True, px=settings.CACHE_LOCK_TTL_MS)
+        except RedisError as e:
+            logger.error(f"Redis lock failed: {e}")
+            return True, None
+        return bool(acquired), token if acquired else None
+
+    async def _aacquire_lock(self, key: str) -> Tuple[bool, Optional[str]]:
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.async_redis.set(
+                self._lock_key(key), token, nx=True, px=settings.CACHE_LOCK_TTL_MS
+            )
+        except RedisError as e:
+            logger.error(f"Redis lock failed: {e}")
+            return True, None
+        return bool(acquired), token if acquired else None
+
+    def _release_lock(self, key: str, token: str):
+        self._safe_operation(lambda: self.redis.eval(_RELEASE_LOCK_SCRIPT, 1, self._lock_key(key), token))
+
+    async def _arelease_lock(self, key: str, token: str):
+        await self._async_safe_operation(
+            lambda: self.async_redis.eval(_RELEASE_LOCK_SCRIPT, 1, self._lock_key(key), token)
         )
 
+    def set(self, key: str, value: Any, expiry: Optional[int] = None, tags: Optional[Iterable[str]] = None):
+        """Установка значения в кэш (tags — для групповой инвалидации через invalidate_tag)"""
+        return self._set_raw(key, value, expiry or self.default_expiry, tags)
+
     def get(self, key: str) -> Optional[Any]:
-        """Получение значения из кэша"""
-        cached_value = self._safe_operation(lambda: self.redis.get(key))
-        if cached_value:
-            try:
-                return json.loads(cached_value)
-            except json.JSONDecodeError:
-                logger.error(f"Failed to decode cached value for key: {key}")
-                return None
-        return None
+        """Получение значения из кэша (сначала L1, затем Redis)"""
+        value = self._unwrap(self._get_raw(key))
+        return None if value is _MISSING else value
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Асинхронное получение значения из кэша"""
+        value = self._unwrap(await self._aget_raw(key))
+        return None if value is _MISSING else value
+
+    async def aset(self, key: str, value: Any, expiry: Optional[int] = None, tags: Optional[Iterable[str]] = None):
+        """Асинхронная установка значения в кэш"""
+        return await self._aset_raw(key, value, expiry or self.default_expiry, tags)
+
+    # Пакетные операции: N ключей — один round-trip
+
+    def _split_local(self, keys: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """Значения, найденные в L1, и ключи, которые нужно прочитать из Redis"""
+        stored, remote = {}, []
+        for key in keys:
+            value = self.local.get(key) if self.local.is_cacheable(key) else None
+            if value is None:
+                remote.append(key)
+            else:
+                self.metrics.hit(key, tier="l1")
+                stored[key] = value
+        return stored, remote
+
+    def _merge_remote(self, stored: Dict[str, Any], keys: List[str], values: Optional[list], generation: int) -> Dict[str, Any]:
+        """Декодирование ответа MGET, заполнение L1 и снятие конвертов get_or_set"""
+        for key, cached_value in zip(keys, values or [None] * len(keys)):
+            stored[key] = self._decode(key, cached_value, self.local.is_cacheable(key), generation)
+        result = {}
+        for key, raw in stored.items():
+            value = self._unwrap(raw)
+            if value is not _MISSING:
+                result[key] = value
+        return result
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Чтение нескольких ключей: L1, затем один MGET для остальных
+        Возвращает только найденные ключи
+        """
+        stored, remote = self._split_local(list(dict.fromkeys(keys)))
+        values, generation = None, self.local.generation
+        if remote:
+            values = self._safe_operation(lambda: raw_mget(self.redis, remote), name="get_many", key=remote[0])
+        return self._merge_remote(stored, remote, values, generation)
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Асинхронный get_many"""
+        stored, remote = self._split_local(list(dict.fromkeys(keys)))
+        values, generation = None, self.local.generation
+        if remote:
+            values = await self._async_safe_operation(
+                lambda: raw_mget(self.async_redis, remote), name="get_many", key=remote[0]
+            )
+        return self._merge_remote(stored, remote, values, generation)
+
+    def _prepare_many(
+        self,
+        items: Mapping[str, Any],
+        expiry: Union[int, Mapping[str, int], None],
+        tags: Optional[Mapping[str, Iterable[str]]]
+    ) -> List[Tuple[str, bytes, int, list, bool]]:
+        prepared = []
+        for key, value in items.items():
+            ttl = expiry.get(key) if isinstance(expiry, Mapping) else expiry
+            serialized = self.codec.encode(value)
+            self.metrics.written(key, len(serialized))
+            prepared.append((
+                key,
+                serialized,
+                ttl or self.default_expiry,
+                list((tags or {}).get(key, ())),
+                self.local.is_cacheable(key)
+            ))
+        return prepared
+
+    def _queue_set_many(self, pipe, prepared: List[Tuple[str, bytes, int, list, bool]]):
+        local_keys = []
+        for key, serialized, ttl, key_tags, local in prepared:
+            self._queue_set(pipe, key, serialized, ttl, key_tags, local=False)
+            if local:
+                local_keys.append(key)
+        # Одно оповещение L1 на всю пачку
+        if local_keys:
+            pipe.publish(self.invalidation_channel, self._invalidation_message(keys=local_keys))
+        return local_keys
+
+    def _fill_local(self, prepared: List[Tuple[str, bytes, int, list, bool]]):
+        for key, serialized, ttl, _, local in prepared:
+            if local:
+                self.local.set(key, self.codec.decode(serialized), size=len(serialized), ttl=ttl)
+
+    def set_many(
+        self,
+        items: Mapping[str, Any],
+        expiry: Union[int, Mapping[str, int], None] = None,
+        tags: Optional[Mapping[str, Iterable[str]]] = None
+    ) -> bool:
+        """
+        Запись нескольких ключей одним pipeline (SETEX на ключ)
+        expiry: общий TTL или словарь ключ → TTL
+        tags: словарь ключ → теги
+        """
+        if not items:
+            return True
+        prepared = self._prepare_many(items, expiry, tags)
+
+        def _execute():
+            pipe = self.redis.pipeline(transaction=False)
+            local_keys = self._queue_set_many(pipe, prepared)
+            self.local.delete(*local_keys)
+            pipe.execute()
+            return True
+
+        result = self._safe_operation(_execute, False, name="set_many", key=prepared[0][0])
+        if result:
+            self._fill_local(prepared)
+        return result
+
+    async def aset_many(
+        self,
+        items: Mapping[str, Any],
+        expiry: Union[int, Mapping[str, int], None] = None,
+        tags: Optional[Mapping[str, Iterable[str]]] = None
+    ) -> bool:
+        """Асинхронный set_many"""
+        if not items:
+            return True
+        prepared = self._prepare_many(items, expiry, tags)
+
+        async def _execute():
+            async with self.async_redis.pipeline(transaction=False) as pipe:
+                local_keys = self._queue_set_many(pipe, prepared)
+                self.local.delete(*local_keys)
+                await pipe.execute()
+            return True
+
+        result = await self._async_safe_operation(_execute, False, name="set_many", key=prepared[0][0])
+        if result:
+            self._fill_local(prepared)
+        return result
+
+    def load_many(
+        self,
+        ids: Iterable[Hashable],
+        key_func: Callable[[Hashable], str],
+        fetch_many: Callable[[List[Hashable]], Mapping[Hashable, Any]],
+        expiry: Optional[int] = None,
+        tags_func: Optional[Callable[[Hashable], Iterable[str]]] = None
+    ) -> Dict[Hashable, Any]:
+        """
+        Загрузка сущностей по id через кэш: один MGET, затем fetch_many только для промахов
+        (например, один запрос WHERE id IN (...)) и запись найденного одним pipeline.
+        Возвращает словарь id → значение; отсутствующие в источнике id не попадают в результат
+        """
+        keys = {key_func(entity_id): entity_id for entity_id in dict.fromkeys(ids)}
+        if not keys:
+            return {}
+        cached = self.get_many(keys)
+        result = {keys[key]: value for key, value in cached.items()}
+
+        missing = [entity_id for key, entity_id in keys.items() if key not in cached]
+        if missing:
+            fetched = fetch_many(missing) or {}
+            self.set_many(*self._loaded_items(fetched, key_func, expiry, tags_func))
+            result.update(fetched)
+        return result
+
+    async def aload_many(
+        self,
+        ids: Iterable[Hashable],
+        key_func: Callable[[Hashable], str],
+        fetch_many: Callable,
+        expiry: Optional[int] = None,
+        tags_func: Optional[Callable[[Hashable], Iterable[str]]] = None
+    ) -> Dict[Hashable, Any]:
+        """Асинхронный load_many; fetch_many может быть обычной или корутинной функцией"""
+        keys = {key_func(entity_id): entity_id for entity_id in dict.fromkeys(ids)}
+        if not keys:
+            return {}
+        cached = await self.aget_many(keys)
+        result = {keys[key]: value for key, value in cached.items()}
+
+        missing = [entity_id for key, entity_id in keys.items() if key not in cached]
+        if missing:
+            fetched = fetch_many(missing)
+            if inspect.isawaitable(fetched):
+                fetched = await fetched
+            fetched = fetched or {}
+            await self.aset_many(*self._loaded_items(fetched, key_func, expiry, tags_func))
+            result.update(fetched)
+        return result
+
+    @staticmethod
+    def _loaded_items(fetched: Mapping, key_func: Callable, expiry: Optional[int], tags_func: Optional[Callable]):
+        items = {key_func(entity_id): value for entity_id, value in fetched.items()}
+        tags = None
+        if tags_func is not None:
+            tags = {key_func(entity_id): list(tags_func(entity_id)) for entity_id in fetched}
+        return items, expiry, tags
 
     def delete(self, key: str):
         """Удаление ключа из кэша"""
-        return self._safe_operation(lambda: self.redis.delete(key), False)
+        if not self.local.is_cacheable(key):
+            return self._safe_operation(lambda: self.redis.delete(key), False, name="delete", key=key)
+
+        def _delete_and_publish():
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.publish(self.invalidation_channel, self._invalidation_message(keys=[key]))
+            return pipe.execute()[0]
+
+        self.local.delete(key)
+        return self._safe_operation(_delete_and_publish, False, name="delete", key=key)
 
     def delete_pattern(self, pattern: str):
-        """Удаление всех ключей по паттерну"""
+        """Удаление всех ключей по паттерну (SCAN + UNLINK порциями, без KEYS)"""
+        self.local.delete_pattern(pattern)
+
+        def _delete_and_publish():
+            deleted = cache_invalidation.delete_pattern(self.redis, pattern)
+            self.redis.publish(self.invalidation_channel, self._invalidation_message(pattern=pattern))
+            return deleted
+
+        return self._safe_operation(_delete_and_publish, False)
+
+    def _evict_local(self, keys: list) -> list:
+        local_keys = [key for key in keys if self.local.is_cacheable(key)]
+        self.local.delete(*local_keys)
+        return local_keys
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Удаление всех записей, сохранённых с тегом"""
+        def _on_batch(keys: list):
+            local_keys = self._evict_local(keys)
+            if local_keys:
+                self.redis.publish(self.invalidation_channel, self._invalidation_message(keys=local_keys))
+
         return self._safe_operation(
-            lambda: self.redis.delete(*self.redis.keys(pattern)),
-            False
+            lambda: cache_invalidation.invalidate_tag(self.redis, tag, on_batch=_on_batch),
+            0
+        )
+
+    async def ainvalidate_tag(self, tag: str) -> int:
+        """Асинхронное удаление всех записей тега"""
+        async def _on_batch(keys: list):
+            local_keys = self._evict_local(keys)
+            if local_keys:
+                await self.async_redis.publish(self.invalidation_channel, self._invalidation_message(keys=local_keys))
+
+        return await self._async_safe_operation(
+            lambda: cache_invalidation.ainvalidate_tag(self.async_redis, tag, on_batch=_on_batch),
+            0
         )
 
     def clear_cache(self):
         """Очистка всего кэша"""
-        return self._safe_operation(lambda: self.redis.flushdb(), False)
-
-    def get_or_set(self, key: str, fetch_func: Callable, expiry: Optional[int] = None) -> Any:
-        """Получить из кэша или установить значение через функцию"""
-        cached = self.get(key)
-        if cached is not None:
-            return cached
-        
-        value = fetch_func()
-        self.set(key, value, expiry)
-        return value
+        self.local.clear()
+
+        def _flush_and_publish():
+            result = self.redis.flushdb()
+            self.redis.publish(self.invalidation_channel, self._invalidation_message(pattern="*"))
+            return result
+
+        return self._safe_operation(_flush_and_publish, False)
+
+    def get_or_set(
+        self,
+        key: str,
+        fetch_func: Callable,
+        expiry: Optional[int] = None,
+        beta: Optional[float] = None
+    ) -> Any:
+        """
+        Получить из кэша или установить значение через функцию
+        Одновременные промахи по ключу выполняют fetch_func один раз: внутри процесса —
+        через single-flight, между процессами — через короткую блокировку в Redis.
+        Горячие ключи обновляются заранее (XFetch, beta — агрессивность, 0 — отключить).
+        """
+        if inspect.iscoroutinefunction(fetch_func):
+            raise TypeError("Для async fetch_func используйте aget_or_set")
+
+        expiry = expiry or self.default_expiry
+        beta = settings.CACHE_XFETCH_BETA if beta is None else beta
+
+        stored = self._get_raw(key)
+        value = self._unwrap(stored)
+        if value is not _MISSING and not self._should_refresh_early(stored, beta):
+            return value
+
+        return self._single_flight.do(
+            key, lambda: self._recompute(key, fetch_func, expiry, stale=value)
+        )
+
+    def _recompute(self, key: str, fetch_func: Callable, expiry: int, stale: Any) -> Any:
+        can_compute, token = self._acquire_lock(key)
+        if not can_compute:
+            # Пересчёт уже идёт в другом процессе: отдаём устаревшее значение или ждём новое
+            if stale is not _MISSING:
+                return stale
+            deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                value = self._unwrap(self._get_raw(key))
+                if value is not _MISSING:
+                    return value
+            logger.warning(f"Cache lock wait timed out, computing without lock: {key}")
+
+        try:
+            started = time.monotonic()
+            value = fetch_func()
+            self._set_raw(key, self._wrap(value, time.monotonic() - started, expiry), expiry)
+            return value
+        finally:
+            if token:
+                self._release_lock(key, token)
+
+    async def aget_or_set(
+        self,
+        key: str,
+        fetch_func: Callable,
+        expiry: Optional[int] = None,
+        beta: Optional[float] = None
+    ) -> Any:
+        """
+        Асинхронный get_or_set: не блокирует event loop
+        fetch_func может быть как обычной функцией, так и корутинной
+        """
+        expiry = expiry or self.default_expiry
+        beta = settings.CACHE_XFETCH_BETA if beta is None else beta
+
+        stored = await self._aget_raw(key)
+        value = self._unwrap(stored)
+        if value is not _MISSING and not self._should_refresh_early(stored, beta):
+            return value
+
+        return await self._async_single_flight.do(
+            key, lambda: self._arecompute(key, fetch_func, expiry, stale=value)
+        )
+
+    async def _arecompute(self, key: str, fetch_func: Callable, expiry: int, stale: Any) -> Any:
+        can_compute, token = await self._aacquire_lock(key)
+        if not can_compute:
+            if stale is not _MISSING:
+                return stale
+            deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                value = self._unwrap(await self._aget_raw(key))
+                if value is not _MISSING:
+                    return value
+            logger.warning(f"Cache lock wait timed out, computing without lock: {key}")
+
+        try:
+            started = time.monotonic()
+            value = fetch_func()
+            if inspect.isawaitable(value):
+                value = await value
+            await self._aset_raw(key, self._wrap(value, time.monotonic() - started, expiry), expiry)
+            return value
+        finally:
+            if token:
+                await self._arelease_lock(key, token)
 
     def increment(self, key: str, amount: int = 1) -> Optional[int]:
         """Увеличить значение (для счетчиков)"""
@@ -123,30 +725,185 @@ class CacheService:
             False
         )
 
-    def _generate_cache_key(self, func_name: str, args: tuple, kwargs: dict) -> str:
-        """Генерация уникального ключа кэша"""
-        key_parts = [func_name]
-        if args:
-            key_parts.append(str(hash(args)))
-        if kwargs:
-            sorted_kwargs = sorted(kwargs.items())
-            key_parts.append(str(hash(tuple(sorted_kwargs))))
-        key_string = ":".join(key_parts)
-        return f"cache:{hashlib.md5(key_string.encode()).hexdigest()}"
-
-    def cache_method(self, expiry: Optional[int] = None):
-        """Декоратор для кэширования результатов функций"""
+    @staticmethod
+    def _canonicalize(value: Any) -> Any:
+        """
+        Каноническое представление аргумента для ключа кэша
+        Одинаково во всех процессах (в отличие от hash(), зависящего от PYTHONHASHSEED)
+        """
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, Enum):
+            return CacheService._canonicalize(value.value)
+        if isinstance(value, (Decimal, UUID)):
+            return str(value)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, dict):
+            return {str(k): CacheService._canonicalize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+        if isinstance(value, (list, tuple)):
+            return [CacheService._canonicalize(item) for item in value]
+        if isinstance(value, (set, frozenset)):
+            return sorted((CacheService._canonicalize(item) for item in value), key=json.dumps)
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json")
+        if is_dataclass(value) and not isinstance(value, type):
+            return CacheService._canonicalize(asdict(value))
+        # repr() объекта содержит адрес в памяти и различается между процессами
+        raise TypeError(f"Cannot build stable cache key from {type(value).__name__}")
+
+    def _generate_cache_key(
+        self,
+        func_name: str,
+        args: tuple,
+        kwargs: dict,
+        namespace: str = "default",
+        version: int = 0
+    ) -> str:
+        """
+        Генерация детерминированного ключа кэша:
+        cache:{namespace}:v{version}:{func_name}:{sha1 канонического JSON аргументов}
+        """
+        payload = json.dumps(
+            [self._canonicalize(list(args)), self._canonicalize(kwargs)],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False
+        )
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        return f"cache:{namespace}:v{version}:{func_name}:{digest}"
+
+    @staticmethod
+    def _namespace_key(namespace: str) -> str:
+        return f"cache:ns:{namespace}"
+
+    def _decode_version(self, namespace: str, raw: Optional[str]) -> int:
+        if not raw:
+            return 0  # Redis недоступен — не запоминаем версию
+        version = int(raw)
+        # Без подписки на инвалидацию чужой INCR не сбросит L1 — версию каждый раз читаем из Redis
+        if self.local.subscribed:
+            self.local.set(self._namespace_key(namespace), version, size=16)
+        return version
+
+    def _local_version(self, key: str) -> Optional[int]:
+        return self.local.get(key, track=False) if self.local.subscribed else None
+
+    def get_namespace_version(self, namespace: str) -> int:
+        """
+        Текущая версия пространства имён
+        Хранится в L1 и обновляется по pub/sub при инвалидации, поэтому обычно без round-trip;
+        пока слушатель инвалидации не подписан (L1 выключен, нет Redis, Celery), — из Redis.
+        Если счётчик пропал из Redis (eviction), он создаётся от текущего времени —
+        так версия не может откатиться к значению, под которым лежат старые ключи.
+        """
+        key = self._namespace_key(namespace)
+        version = self._local_version(key)
+        if version is not None:
+            return version
+
+        def _read():
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(key, int(time.time() * 1000), nx=True)
+            pipe.get(key)
+            return pipe.execute()[1]
+
+        return self._decode_version(namespace, self._safe_operation(_read))
+
+    async def aget_namespace_version(self, namespace: str) -> int:
+        key = self._namespace_key(namespace)
+        version = self._local_version(key)
+        if version is not None:
+            return version
+
+        async def _read():
+            async with self.async_redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, int(time.time() * 1000), nx=True)
+                pipe.get(key)
+                return (await pipe.execute())[1]
+
+        return self._decode_version(namespace, await self._async_safe_operation(_read))
+
+    def invalidate_namespace(self, namespace: str) -> bool:
+        """
+        Инвалидация всех ключей пространства имён за O(1): INCR версии
+        Старые ключи больше не читаются и истекают по собственному TTL
+        """
+        key = self._namespace_key(namespace)
+
+        def _incr_and_publish():
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.publish(self.invalidation_channel, self._invalidation_message(keys=[key]))
+            return pipe.execute()[0]
+
+        self.local.delete(key)
+        return bool(self._safe_operation(_incr_and_publish, False))
+
+    async def ainvalidate_namespace(self, namespace: str) -> bool:
+        key = self._namespace_key(namespace)
+
+        async def _incr_and_publish():
+            async with self.async_redis.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.publish(self.invalidation_channel, self._invalidation_message(keys=[key]))
+                return (await pipe.execute())[0]
+
+        self.local.delete(key)
+        bumped = bool(await self._async_safe_operation(_incr_and_publish, False))
+        # Пока шёл INCR, чтение в этом же loop могло снова запомнить в L1 старую версию
+        self.local.delete(key)
+        return bumped
+
+    def cache_method(self, expiry: Optional[int] = None, namespace: Optional[str] = None):
+        """
+        Декоратор для кэширования результатов функций
+        Поддерживает и обычные, и async-функции; одновременные промахи объединяются.
+        namespace: пространство имён для invalidate_namespace (по умолчанию — имя класса/модуля).
+        У методов первый аргумент (self/cls) и сессии БД в ключ не входят.
+        """
         def decorator(func):
+            parameters = list(inspect.signature(func).parameters)
+            skip_first = bool(parameters) and parameters[0] in ("self", "cls")
+            func_name = func.__qualname__
+            if namespace:
+                ns = namespace
+            elif "." in func_name:
+                ns = func_name.rsplit(".", 1)[0]
+            else:
+                ns = func.__module__
+
+            def _key_arguments(args, kwargs):
+                key_args = tuple(
+                    arg for arg in (args[1:] if skip_first else args)
+                    if not isinstance(arg, Session)
+                )
+                key_kwargs = {k: v for k, v in kwargs.items() if not isinstance(v, Session)}
+                return key_args, key_kwargs
+
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    try:
+                        key_args, key_kwargs = _key_arguments(args, kwargs)
+                        version = await self.aget_namespace_version(ns)
+                        cache_key = self._generate_cache_key(func_name, key_args, key_kwargs, ns, version)
+                    except TypeError as e:
+                        logger.warning(f"Skipping cache for {func_name}: {e}")
+                        return await func(*args, **kwargs)
+                    return await self.aget_or_set(cache_key, lambda: func(*args, **kwargs), expiry)
+                return async_wrapper
+
             @wraps(func)
             def wrapper(*args, **kwargs):
-                cache_key = self._generate_cache_key(func.__name__, args, kwargs)
-                cached_result = self.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
-                
-                result = func(*args, **kwargs)
-                self.set(cache_key, result, expiry)
-                return result
+                try:
+                    key_args, key_kwargs = _key_arguments(args, kwargs)
+                    version = self.get_namespace_version(ns)
+                    cache_key = self._generate_cache_key(func_name, key_args, key_kwargs, ns, version)
+                except TypeError as e:
+                    logger.warning(f"Skipping cache for {func_name}: {e}")
+                    return func(*args, **kwargs)
+                return self.get_or_set(cache_key, lambda: func(*args, **kwargs), expiry)
             return wrapper
         return decorator
 
@@ -157,16 +914,38 @@ class CacheService:
         except Exception as e:
             logger.error(f"Redis health check failed: {e}")
             return False
-    
+
+    def get_stats(self) -> dict:
+        """Статистика попаданий по уровням кэша"""
+        total = self.hits + self.misses
+        return {
+            "l1": self.local.get_stats(),
+            "l2": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+        }
+
+    @staticmethod
+    def _describe_pool(pool) -> dict:
+        in_use = len(getattr(pool, '_in_use_connections', ()))
+        available = len(getattr(pool, '_available_connections', ()))
+        max_connections = getattr(pool, 'max_connections', 0) or 0
+        return {
+            "created_connections": in_use + available,
+            "in_use_connections": in_use,
+            "available_connections": available,
+            "max_connections": max_connections,
+            "utilization": round(in_use / max_connections, 4) if max_connections else 0.0
+        }
+
     def get_pool_stats(self) -> dict:
-        """Получение статистики пула соединений"""
+        """Получение статистики пула соединений (синхронный пул + пул redis.asyncio)"""
         try:
-            pool = self.pool
-            return {
-                "created_connections": pool.created_connections if hasattr(pool, 'created_connections') else 0,
-                "available_connections": len(pool._available_connections) if hasattr(pool, '_available_connections') else 0,
-                "max_connections": pool.max_connections if hasattr(pool, 'max_connections') else 0
-            }
+            stats = self._describe_pool(self.pool)
+            stats["async"] = self._describe_pool(self.async_pool)
+            return stats
         except Exception as e:
             logger.error(f"Failed to get pool stats: {e}")
             return {}
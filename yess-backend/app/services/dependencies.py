@@ -6,13 +6,16 @@ import jwt
 import logging
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from types import SimpleNamespace
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
+from app.core.request_timing import span
 from app.models.user import User
+from app.models.role import Role, UserRole
 
 logger = logging.getLogger(__name__)
 
@@ -20,29 +23,16 @@ logger = logging.getLogger(__name__)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """
-    Получить текущего пользователя из JWT токена
-    
-    Args:
-        token (str): JWT токен из Authorization header
-        db (Session): Сессия базы данных
-    
-    Returns:
-        User: Текущий пользователь
-    
-    Raises:
-        HTTPException: Если токен невалидный или пользователь не найден
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+
+def _decode_user_id(token: str) -> str:
+    """user_id (sub) из JWT токена"""
     try:
         # Декодируем JWT токен
         payload = jwt.decode(
@@ -55,7 +45,8 @@ async def get_current_user(
         user_id: Optional[str] = payload.get("sub")
         
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
+        return user_id
             
     except jwt.ExpiredSignatureError:
         raise HTTPException(
@@ -64,58 +55,120 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     except jwt.JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+
+
+def _dev_user(user_id: str) -> SimpleNamespace:
+    """Моковый пользователь для режима разработки"""
+    return SimpleNamespace(
+        id=int(user_id),
+        email=f"user{user_id}@dev.local",
+        phone=f"+996555{abs(hash(str(user_id))) % 1000000:06d}",
+        first_name="Dev",
+        last_name="User",
+        password_hash="dev_mode_no_check",
+        is_active=True,
+        referral_code=f"DEV{abs(hash(str(user_id))) % 10000:04d}",
+        city_id=None,
+        avatar_url=None
+    )
+
+
+def _check_user(user: Optional[User], user_id: str) -> User:
+    if user is None:
+        # В режиме разработки создаем мокового пользователя
+        if settings.DEVELOPMENT_MODE:
+            logger.warning(f"User {user_id} not found in DB, creating mock user for development")
+            user = _dev_user(user_id)
+        else:
+            raise _credentials_exception()
     
-    # Получаем пользователя из базы данных
-    try:
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        
-        if user is None:
-            # В режиме разработки создаем мокового пользователя
-            if settings.DEVELOPMENT_MODE:
-                logger.warning(f"User {user_id} not found in DB, creating mock user for development")
-                user = SimpleNamespace(
-                    id=int(user_id),
-                    email=f"user{user_id}@dev.local",
-                    phone=f"+996555{abs(hash(str(user_id))) % 1000000:06d}",
-                    first_name="Dev",
-                    last_name="User",
-                    password_hash="dev_mode_no_check",
-                    is_active=True,
-                    referral_code=f"DEV{abs(hash(str(user_id))) % 10000:04d}",
-                    city_id=None,
-                    avatar_url=None
-                )
-            else:
-                raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Пользователь неактивен"
+        )
+    
+    return user
+
+
+def _database_unavailable(user_id: str, error: Exception) -> User:
+    logger.error(f"Database error in get_current_user: {str(error)}")
+    # В режиме разработки создаем мокового пользователя при ошибке БД
+    if settings.DEVELOPMENT_MODE:
+        logger.warning(f"Database unavailable, creating mock user for development (user_id: {user_id})")
+        return _dev_user(user_id)
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Ошибка подключения к базе данных"
+    )
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Получить текущего пользователя из JWT токена
+    
+    Args:
+        token (str): JWT токен из Authorization header
+        db (Session): Сессия базы данных
+    
+    Returns:
+        User: Текущий пользователь
+    
+    Raises:
+        HTTPException: Если токен невалидный или пользователь не найден
+    """
+    with span("auth"):
+        user_id = _decode_user_id(token)
         
-        if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Пользователь неактивен"
-            )
+        # Получаем пользователя из базы данных
+        try:
+            user = db.query(User).filter(User.id == int(user_id)).first()
+        except SQLAlchemyError as e:
+            return _database_unavailable(user_id, e)
+        return _check_user(user, user_id)
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """
+    get_current_user для эндпоинтов на AsyncSession
+    
+    Пользователь загружается в ту же сессию, что и у эндпоинта
+    (FastAPI кэширует get_async_db в пределах запроса)
+    """
+    with span("auth"):
+        user_id = _decode_user_id(token)
         
-        return user
-    except SQLAlchemyError as e:
-        logger.error(f"Database error in get_current_user: {str(e)}")
-        # В режиме разработки создаем мокового пользователя при ошибке БД
-        if settings.DEVELOPMENT_MODE:
-            logger.warning(f"Database unavailable, creating mock user for development (user_id: {user_id})")
-            user = SimpleNamespace(
-                id=int(user_id),
-                email=f"user{user_id}@dev.local",
-                phone=f"+996555{abs(hash(str(user_id))) % 1000000:06d}",
-                first_name="Dev",
-                last_name="User",
-                password_hash="dev_mode_no_check",
-                is_active=True,
-                referral_code=f"DEV{abs(hash(str(user_id))) % 10000:04d}",
-                city_id=None,
-                avatar_url=None
-            )
-            return user
+        try:
+            user = await db.get(User, int(user_id))
+        except SQLAlchemyError as e:
+            return _database_unavailable(user_id, e)
+        return _check_user(user, user_id)
+
+
+async def get_current_admin(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Текущий пользователь с ролью admin (служебные эндпоинты)
+    
+    Raises:
+        HTTPException: 403, если у пользователя нет роли admin
+    """
+    is_admin = db.query(UserRole.id).join(Role, Role.id == UserRole.role_id).filter(
+        UserRole.user_id == current_user.id,
+        Role.code == "admin"
+    ).first()
+    if not is_admin:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Ошибка подключения к базе данных"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав"
         )
-
+    return current_user
@@ -0,0 +1,112 @@
+"""
+Кэш сущностей для списочных эндпоинтов (сторисы, рекомендации, ближайшие партнёры)
+Вместо ленивой загрузки связи для каждой строки (N запросов к Redis и Postgres) —
+один MGET по всем id и один запрос WHERE id IN (...) только для промахов
+"""
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.db_replicas import on_replica
+from app.models.city import City
+from app.models.partner import Partner
+from app.models.promotion import Promotion
+from app.services.cache_service import cache_service
+
+# Сущность → (модель, колонки краткого представления)
+ENTITIES = {
+    "partner": (Partner, (
+        "id", "name", "category", "logo_url", "default_cashback_rate",
+        "max_discount_percent", "is_active", "is_verified"
+    )),
+    "promotion": (Promotion, ("id", "title")),
+    "city": (City, ("id", "name")),
+}
+
+# Модель → сущность: краткие представления сбрасываются по commit (app.core.http_cache)
+ENTITY_OF_MODEL = {model: entity for entity, (model, _) in ENTITIES.items()}
+
+
+def entity_tag(entity: str, entity_id: int) -> str:
+    return f"{entity}:{entity_id}"
+
+
+def entity_wide_tag(entity: str) -> str:
+    """Тег всех кратких представлений сущности — для query.update/delete, где id неизвестны"""
+    return f"{entity}:summaries"
+
+
+def _tags(entity: str, entity_id: int) -> List[str]:
+    return [entity_tag(entity, entity_id), entity_wide_tag(entity)]
+
+
+def _to_cache(value: Any) -> Any:
+    # Decimal после кэша всё равно вернётся числом — приводим сразу, чтобы ответ не зависел от попадания
+    return float(value) if isinstance(value, Decimal) else value
+
+
+class EntityCache:
+    """Краткие представления сущностей по id через кэш"""
+
+    EXPIRATION = 600
+
+    @staticmethod
+    def key(entity: str, entity_id: int) -> str:
+        # Префикс "partner:" попадает в L1; тег partner:{id} сбрасывают commit и invalidate_partner_cache
+        return f"{entity}:summary:{entity_id}"
+
+    @staticmethod
+    def _query(entity: str, ids: List[int]):
+        """Один запрос WHERE id IN (...) только по нужным колонкам (заполнение кэша — можно с реплики)"""
+        model, columns = ENTITIES[entity]
+        return on_replica(
+            select(*[getattr(model, column) for column in columns]).where(model.id.in_(ids))
+        )
+
+    @staticmethod
+    def _rows(entity: str, rows) -> Dict[int, dict]:
+        columns = ENTITIES[entity][1]
+        return {
+            row.id: {column: _to_cache(getattr(row, column)) for column in columns}
+            for row in rows
+        }
+
+    @classmethod
+    def _fetch(cls, db: Session, entity: str, ids: List[int]) -> Dict[int, dict]:
+        return cls._rows(entity, db.execute(cls._query(entity, ids)).all())
+
+    @classmethod
+    async def _afetch(cls, db: AsyncSession, entity: str, ids: List[int]) -> Dict[int, dict]:
+        return cls._rows(entity, (await db.execute(cls._query(entity, ids))).all())
+
+    @classmethod
+    def _ids(cls, ids: Iterable[Optional[int]]) -> List[int]:
+        return [entity_id for entity_id in dict.fromkeys(ids) if entity_id is not None]
+
+    @classmethod
+    def get_many(cls, db: Session, entity: str, ids: Iterable[Optional[int]]) -> Dict[int, dict]:
+        """Словарь id → краткое представление (None и несуществующие id пропускаются)"""
+        return cache_service.load_many(
+            cls._ids(ids),
+            key_func=lambda entity_id: cls.key(entity, entity_id),
+            fetch_many=lambda missing: cls._fetch(db, entity, missing),
+            expiry=cls.EXPIRATION,
+            tags_func=lambda entity_id: _tags(entity, entity_id)
+        )
+
+    @classmethod
+    async def aget_many(
+        cls, db: Union[Session, AsyncSession], entity: str, ids: Iterable[Optional[int]]
+    ) -> Dict[int, dict]:
+        """Асинхронный get_many; с AsyncSession и промахи догружаются без блокировки event loop"""
+        fetch = cls._afetch if isinstance(db, AsyncSession) else cls._fetch
+        return await cache_service.aload_many(
+            cls._ids(ids),
+            key_func=lambda entity_id: cls.key(entity, entity_id),
+            fetch_many=lambda missing: fetch(db, entity, missing),
+            expiry=cls.EXPIRATION,
+            tags_func=lambda entity_id: _tags(entity, entity_id)
+        )
@@ -0,0 +1,134 @@
+"""
+Поиск в радиусе сырым SQL по таблице с latitude/longitude (partners) — условие, которое
+может использовать индекс (выражение расстояния над столбцами индекс не использует)
+- postgis: столбец geography partners.geog с GiST-индексом (миграция partner_geography),
+  ST_DWithin и сортировка KNN <->
+- earthdistance: GiST-индекс по ll_to_earth(latitude, longitude), earth_box @> и earth_distance
+- bbox: прямоугольник вокруг точки (BETWEEN по latitude/longitude — idx_partner_lat_lon),
+  точное расстояние (гаверсинус) считает GeoFilter.refine по отобранным строкам
+- Стратегия выбирается по тому, что создала миграция (один раз на движок),
+  GEO_SEARCH_STRATEGY задаёт её явно
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.spatial_index import bounding_box, haversine_km
+
+logger = logging.getLogger(__name__)
+
+POSTGIS = "postgis"
+EARTHDISTANCE = "earthdistance"
+BBOX = "bbox"
+
+_DETECT_SQL = text("""
+    SELECT
+        EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'partners' AND column_name = 'geog') AS geography,
+        EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx_partner_earth') AS earth
+""")
+
+_strategies: Dict[str, str] = {}  # URL движка → стратегия
+
+_POINT = "ST_SetSRID(ST_MakePoint(:geo_lon, :geo_lat), 4326)::geography"
+_EARTH = "ll_to_earth(:geo_lat, :geo_lon)"
+
+
+def detect_strategy(db: Session) -> str:
+    if db.get_bind().dialect.name != "postgresql":
+        return BBOX
+    try:
+        geography, earth = db.execute(_DETECT_SQL).one()
+    except Exception as e:
+        logger.warning(f"Geo search strategy detection failed: {e}")
+        return BBOX
+    return POSTGIS if geography else EARTHDISTANCE if earth else BBOX
+
+
+def search_strategy(db: Session) -> str:
+    if settings.GEO_SEARCH_STRATEGY != "auto":
+        return settings.GEO_SEARCH_STRATEGY
+    key = str(db.get_bind().url)
+    strategy = _strategies.get(key)
+    if strategy is None:
+        strategy = _strategies[key] = detect_strategy(db)
+        logger.info(f"Geo search strategy: {strategy}")
+    return strategy
+
+
+@dataclass
+class GeoFilter:
+    """Условие «не дальше radius_km от точки» для строк таблицы alias"""
+
+    strategy: str
+    latitude: float
+    longitude: float
+    radius_km: float
+    alias: str = "p"
+
+    @property
+    def exact(self) -> bool:
+        """True — SQL отбирает точно и сортирует по расстоянию; False — нужен refine"""
+        return self.strategy != BBOX
+
+    def where(self) -> str:
+        p = self.alias
+        if self.strategy == POSTGIS:
+            return f"ST_DWithin({p}.geog, {_POINT}, :geo_radius_m)"
+        if self.strategy == EARTHDISTANCE:
+            # earth_box — по индексу, но шире круга; earth_distance отсекает углы
+            return (
+                f"earth_box({_EARTH}, :geo_radius_m) @> ll_to_earth({p}.latitude, {p}.longitude) "
+                f"AND earth_distance({_EARTH}, ll_to_earth({p}.latitude, {p}.longitude)) <= :geo_radius_m"
+            )
+        return (
+            f"{p}.latitude BETWEEN :geo_min_lat AND :geo_max_lat "
+            f"AND {p}.longitude BETWEEN :geo_min_lon AND :geo_max_lon"
+        )
+
+    def distance(self) -> str:
+        """SQL-выражение расстояния в км; для bbox — NULL (считает refine)"""
+        p = self.alias
+        if self.strategy == POSTGIS:
+            return f"ST_Distance({p}.geog, {_POINT}) / 1000"
+        if self.strategy == EARTHDISTANCE:
+            return f"earth_distance({_EARTH}, ll_to_earth({p}.latitude, {p}.longitude)) / 1000"
+        return "NULL"
+
+    def order(self) -> str:
+        """ORDER BY по расстоянию; у PostGIS — оператор KNN, он идёт по GiST-индексу"""
+        if self.strategy == POSTGIS:
+            return f"{self.alias}.geog <-> {_POINT}"
+        return self.distance()
+
+    def params(self) -> Dict[str, float]:
+        params = {"geo_lat": self.latitude, "geo_lon": self.longitude, "geo_radius_m": self.radius_km * 1000}
+        if self.strategy == BBOX:
+            min_lat, max_lat, min_lon, max_lon = bounding_box(self.latitude, self.longitude, self.radius_km)
+            params.update(geo_min_lat=min_lat, geo_max_lat=max_lat, geo_min_lon=min_lon, geo_max_lon=max_lon)
+        return params
+
+    def refine(self, rows: Sequence, limit: Optional[int] = None, by_distance: bool = True) -> List[Tuple[object, float]]:
+        """(строка, расстояние в км) для строк со столбцами latitude, longitude, distance.
+        bbox: отсев углов прямоугольника гаверсинусом; by_distance=False сохраняет порядок SQL"""
+        if self.exact:
+            hits = [(row, float(row.distance)) for row in rows]
+            return hits[:limit] if limit is not None else hits
+        hits = []
+        for row in rows:
+            distance = haversine_km(self.latitude, self.longitude, float(row.latitude), float(row.longitude))
+            if distance <= self.radius_km:
+                hits.append((row, distance))
+                if not by_distance and len(hits) == limit:
+                    break
+        if by_distance:
+            hits.sort(key=lambda hit: hit[1])
+        return hits[:limit] if limit is not None else hits
+
+
+def geo_filter(db: Session, latitude: float, longitude: float, radius_km: float, alias: str = "p") -> GeoFilter:
+    return GeoFilter(search_strategy(db), latitude, longitude, radius_km, alias)
@@ -16,7 +16,11 @@ import requests
 import logging
 
 from app.core.cache import redis_cache
+from app.services.entity_cache import EntityCache
 from app.models.partner import Partner, PartnerLocation
+from app.models.partner import Partner as PartnerModel  # Имя Partner ниже занимает dataclass
+from app.services.geo_search import geo_filter
+from app.services.spatial_index import locations_within
 from app.schemas.partner import (
     PartnerLocationResponse, 
     NearbyPartnerRequest, 
@@ -39,6 +43,13 @@ class PartnerCategory(Enum):
     HEALTH = "health"
     EDUCATION = "education"
 
+def _partner_category(value: Optional[str]) -> Optional[PartnerCategory]:
+    """Категория партнёра из БД; не из PartnerCategory — None"""
+    try:
+        return PartnerCategory(value)
+    except ValueError:
+        return None
+
 @dataclass
 class Location:
     latitude: float
@@ -59,6 +70,8 @@ class Partner:
     discount_percent: float = 0.0
 
 class GeolocationService:
+    CACHE_EXPIRATION = 300  # TTL кэша поиска ближайших партнеров (сек)
+
     def __init__(self, db_session: Session):
         self.db = db_session
         self.earth_radius = 6371  # Радиус Земли в километрах
@@ -83,92 +96,6 @@ class GeolocationService:
         
         return self.earth_radius * c
     
-    def find_nearby_partners(
-        self, 
-        user_lat: float, 
-        user_lon: float, 
-        radius_km: float = 5.0,
-        category: Optional[PartnerCategory] = None,
-        limit: int = 50
-    ) -> List[Partner]:
-        """
-        Поиск партнеров поблизости
-        """
-        try:
-            # Базовый запрос
-            base_query = """
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.category,
-                    p.latitude,
-                    p.longitude,
-                    p.address,
-                    p.city,
-                    p.rating,
-                    p.is_open,
-                    p.discount_percent,
-                    (
-                        6371 * acos(
-                            cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                            cos(radians(p.longitude) - radians(:user_lon)) + 
-                            sin(radians(:user_lat)) * sin(radians(p.latitude))
-                        )
-                    ) AS distance
-                FROM partners p
-                WHERE p.is_active = true
-                AND (
-                    6371 * acos(
-                        cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                        cos(radians(p.longitude) - radians(:user_lon)) + 
-                        sin(radians(:user_lat)) * sin(radians(p.latitude))
-                    )
-                ) <= :radius_km
-            """
-            
-            params = {
-                'user_lat': user_lat,
-                'user_lon': user_lon,
-                'radius_km': radius_km
-            }
-            
-            # Добавление фильтра по категории
-            if category:
-                base_query += " AND p.category = :category"
-                params['category'] = category.value
-            
-            # Сортировка по расстоянию и лимит
-            base_query += " ORDER BY distance ASC LIMIT :limit"
-            params['limit'] = limit
-            
-            query = text(base_query)
-            results = self.db.execute(query, params).fetchall()
-            
-            partners = []
-            for row in results:
-                partner = Partner(
-                    id=row[0],
-                    name=row[1],
-                    category=PartnerCategory(row[2]),
-                    location=Location(
-                        latitude=row[3],
-                        longitude=row[4],
-                        address=row[5],
-                        city=row[6]
-                    ),
-                    rating=float(row[7]),
-                    distance=float(row[10]),
-                    is_open=row[8],
-                    discount_percent=float(row[9])
-                )
-                partners.append(partner)
-            
-            return partners
-            
-        except Exception as e:
-            logger.error(f"Error finding nearby partners: {e}")
-            return []
-    
     def get_partners_by_category(
         self, 
         category: PartnerCategory, 
@@ -306,58 +233,60 @@ class GeolocationService:
         Поиск партнеров по названию или описанию
         """
         try:
-            base_query = """
+            # Если указаны координаты пользователя — фильтр по расстоянию (app.services.geo_search)
+            geo = geo_filter(self.db, user_lat, user_lon, radius_km) if user_lat and user_lon else None
+            # Столбцы — из схемы partners: адрес — основной точки, город — из cities;
+            # рейтинга у партнёров нет, порядок — по скидке
+            base_query = f"""
                 SELECT 
                     p.id,
                     p.name,
                     p.category,
                     p.latitude,
                     p.longitude,
-                    p.address,
-                    p.city,
-                    p.rating,
-                    p.is_open,
-                    p.discount_percent
+                    (SELECT pl.address FROM partner_locations pl WHERE pl.partner_id = p.id
+                     ORDER BY pl.is_main_location DESC, pl.id LIMIT 1) AS address,
+                    c.name AS city,
+                    0 AS rating,
+                    p.is_active AS is_open,
+                    p.max_discount_percent AS discount_percent,
+                    {geo.distance() if geo else "NULL"} AS distance
                 FROM partners p
+                LEFT JOIN cities c ON c.id = p.city_id
                 WHERE p.is_active = true
                 AND (
                     LOWER(p.name) LIKE LOWER(:search_query)
                     OR LOWER(p.description) LIKE LOWER(:search_query)
-                    OR LOWER(p.address) LIKE LOWER(:search_query)
+                    OR EXISTS (SELECT 1 FROM partner_locations pl WHERE pl.partner_id = p.id
+                               AND LOWER(pl.address) LIKE LOWER(:search_query))
                 )
             """
             
             params = {'search_query': f'%{query}%'}
             
-            # Если указаны координаты пользователя, добавляем фильтр по расстоянию
-            if user_lat and user_lon:
-                base_query += """
-                    AND (
-                        6371 * acos(
-                            cos(radians(:user_lat)) * cos(radians(p.latitude)) * 
-                            cos(radians(p.longitude) - radians(:user_lon)) + 
-                            sin(radians(:user_lat)) * sin(radians(p.latitude))
-                        )
-                    ) <= :radius_km
-                """
-                params.update({
-                    'user_lat': user_lat,
-                    'user_lon': user_lon,
-                    'radius_km': radius_km
-                })
-            
-            base_query += " ORDER BY p.rating DESC LIMIT :limit"
-            params['limit'] = limit
+            if geo is not None:
+                base_query += f" AND {geo.where()}"
+                params.update(geo.params())
+            
+            base_query += " ORDER BY p.max_discount_percent DESC, p.id"
+            # Для bbox лимит — после отсева по точному расстоянию
+            if geo is None or geo.exact:
+                base_query += " LIMIT :limit"
+                params['limit'] = limit
             
             sql_query = text(base_query)
             results = self.db.execute(sql_query, params).fetchall()
+            if geo is not None:
+                results = geo.refine(results, limit, by_distance=False)
+            else:
+                results = [(row, None) for row in results]
             
             partners = []
-            for row in results:
+            for row, distance in results:
                 partner = Partner(
                     id=row[0],
                     name=row[1],
-                    category=PartnerCategory(row[2]),
+                    category=_partner_category(row[2]),
                     location=Location(
                         latitude=row[3],
                         longitude=row[4],
@@ -369,11 +298,8 @@ class GeolocationService:
                     discount_percent=float(row[9])
                 )
                 
-                # Расчет расстояния если указаны координаты пользователя
-                if user_lat and user_lon:
-                    partner.distance = self.calculate_distance(
-                        user_lat, user_lon, partner.location.latitude, partner.location.longitude
-                    )
+                # Расстояние до пользователя, если указаны координаты
+                partner.distance = distance
                 
                 partners.append(partner)
             
@@ -408,7 +334,7 @@ class GeolocationService:
         return R * c
 
     @classmethod
-    def find_nearby_partners(
+    async def find_nearby_partners(
         cls, 
         db: Session, 
         request: NearbyPartnerRequest,
@@ -421,62 +347,62 @@ class GeolocationService:
         cache_key = f"nearby_partners:{request.latitude}:{request.longitude}:{request.radius}"
         
         # Попытка получить из кэша
-        cached_result = redis_cache.get(cache_key)
+        cached_result = await redis_cache.get(cache_key)
         if cached_result:
-            return cached_result
-        
-        # Базовый запрос с пространственным поиском
-        query = db.query(PartnerLocation).filter(
-            func.ST_DWithin(
-                PartnerLocation.geom, 
-                func.ST_MakePoint(request.longitude, request.latitude),
-                request.radius * 1000  # Перевод в метры
-            )
-        )
+            return [PartnerLocationResponse(**item) for item in cached_result]
+        
+        # Точки в радиусе — по индексу в памяти (столбца geom у PartnerLocation нет)
+        distances = await locations_within(db, request.latitude, request.longitude, request.radius)
+        query = db.query(PartnerLocation).join(
+            PartnerModel, PartnerModel.id == PartnerLocation.partner_id
+        ).filter(PartnerLocation.id.in_(distances))
         
         # Дополнительная фильтрация
         if filter_request:
             if filter_request.categories:
                 query = query.filter(
-                    Partner.category.in_(filter_request.categories)
+                    PartnerModel.category.in_(filter_request.categories)
                 )
             
             if filter_request.min_cashback:
                 query = query.filter(
-                    Partner.default_cashback_rate >= filter_request.min_cashback
+                    PartnerModel.default_cashback_rate >= filter_request.min_cashback
                 )
             
             if filter_request.is_verified:
-                query = query.filter(Partner.is_verified == True)
+                query = query.filter(PartnerModel.is_verified == True)
         
         # Выполнение запроса
         nearby_locations = query.all()
         
         # Сортировка по расстоянию
-        nearby_locations.sort(
-            key=lambda loc: cls.calculate_distance(
-                request.latitude, request.longitude, 
-                loc.latitude, loc.longitude
-            )
-        )
+        nearby_locations.sort(key=lambda loc: distances[loc.id])
         
+        # Данные партнёров — пакетно через кэш вместо loc.partner для каждой точки
+        partners = await EntityCache.aget_many(db, "partner", (loc.partner_id for loc in nearby_locations))
+
         # Преобразование в ответ
         result = [
             PartnerLocationResponse(
                 id=loc.id,
                 partner_id=loc.partner_id,
-                partner_name=loc.partner.name,
+                partner_name=partners[loc.partner_id]["name"],
                 address=loc.address,
                 latitude=loc.latitude,
                 longitude=loc.longitude,
                 phone_number=loc.phone_number,
                 working_hours=loc.working_hours,
-                max_discount_percent=loc.partner.default_cashback_rate
-            ) for loc in nearby_locations
+                max_discount_percent=partners[loc.partner_id]["default_cashback_rate"]
+            ) for loc in nearby_locations if loc.partner_id in partners
         ]
         
-        # Кэширование результата
-        redis_cache.set(cache_key, result, expire=cls.CACHE_EXPIRATION)
+        # Кэширование результата (теги — для инвалидации при изменении любого из партнёров)
+        await redis_cache.set(
+            cache_key,
+            [item.model_dump() for item in result],
+            ttl=cls.CACHE_EXPIRATION,
+            tags=["partners"] + sorted({f"partner:{loc.partner_id}" for loc in nearby_locations})
+        )
         
         return result
 
@@ -1,4 +1,6 @@
 """Order service for handling orders with products"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from decimal import Decimal
 from typing import List, Dict, Optional
@@ -6,8 +8,8 @@ from datetime import datetime
 import hashlib
 import secrets
 
-from app.models.order import Order, OrderStatus, OrderItem
-from app.models.partner_product import PartnerProduct
+from app.models.order import Order, OrderStatus
+from app.models.partner_product import PartnerProduct, OrderItem
 from app.models.partner import Partner
 from app.models.user import User
 from app.models.wallet import Wallet
@@ -19,30 +21,35 @@ class OrderService:
     """Service for order management"""
     
     @staticmethod
-    def calculate_order(
-        db: Session,
-        partner_id: int,
+    def _products_query(partner_id: int, items: List[OrderItemCreate]):
+        """Все товары заказа одним запросом WHERE id IN (...)"""
+        return select(PartnerProduct).where(
+            PartnerProduct.id.in_({item.product_id for item in items}),
+            PartnerProduct.partner_id == partner_id,
+            PartnerProduct.is_available == True
+        )
+    
+    @staticmethod
+    def _calculate(
+        partner: Optional[Partner],
         items: List[OrderItemCreate],
-        user_id: Optional[int] = None
+        products: List[PartnerProduct],
+        wallet: Optional[Wallet]
     ) -> Dict:
-        """Calculate order totals"""
-        partner = db.query(Partner).filter(Partner.id == partner_id).first()
+        """Расчет по уже загруженным партнеру, товарам и кошельку"""
         if not partner:
             raise NotFoundException("Партнер не найден")
         
         if not partner.is_active:
             raise ValidationException("Партнер неактивен")
         
+        products_by_id = {product.id: product for product in products}
         order_total = Decimal(0)
         order_items_data = []
         
         # Расчет суммы товаров
         for item in items:
-            product = db.query(PartnerProduct).filter(
-                PartnerProduct.id == item.product_id,
-                PartnerProduct.partner_id == partner_id,
-                PartnerProduct.is_available == True
-            ).first()
+            product = products_by_id.get(item.product_id)
             
             if not product:
                 raise NotFoundException(f"Товар {item.product_id} не найден или недоступен")
@@ -78,23 +85,55 @@ class OrderService:
         # Итоговая сумма
         final_amount = order_total - discount
         
-        # Получение баланса пользователя (если указан)
-        user_balance = None
-        if user_id:
-            wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-            if wallet:
-                user_balance = wallet.balance
-        
         return {
             "order_total": order_total,
             "discount": discount,
             "cashback_amount": cashback_amount,
             "final_amount": final_amount,
             "max_discount": max_discount,
-            "user_balance": user_balance,
+            "user_balance": wallet.balance if wallet else None,
             "items_data": order_items_data
         }
     
+    @staticmethod
+    def calculate_order(
+        db: Session,
+        partner_id: int,
+        items: List[OrderItemCreate],
+        user_id: Optional[int] = None
+    ) -> Dict:
+        """Calculate order totals"""
+        partner = db.get(Partner, partner_id)
+        products = []
+        if partner and partner.is_active:
+            products = db.scalars(OrderService._products_query(partner_id, items)).all()
+        
+        # Получение баланса пользователя (если указан)
+        wallet = None
+        if user_id:
+            wallet = db.scalar(select(Wallet).where(Wallet.user_id == user_id))
+        
+        return OrderService._calculate(partner, items, products, wallet)
+    
+    @staticmethod
+    async def acalculate_order(
+        db: AsyncSession,
+        partner_id: int,
+        items: List[OrderItemCreate],
+        user_id: Optional[int] = None
+    ) -> Dict:
+        """Calculate order totals (AsyncSession)"""
+        partner = await db.get(Partner, partner_id)
+        products = []
+        if partner and partner.is_active:
+            products = (await db.scalars(OrderService._products_query(partner_id, items))).all()
+        
+        wallet = None
+        if user_id:
+            wallet = await db.scalar(select(Wallet).where(Wallet.user_id == user_id))
+        
+        return OrderService._calculate(partner, items, products, wallet)
+    
     @staticmethod
     def create_order(
         db: Session,
@@ -1,6 +1,5 @@
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from datetime import datetime, timedelta
 
 from app.core.notifications import SMSService, PushNotificationService
@@ -10,6 +9,7 @@ from app.models.transaction import Transaction
 from app.models.wallet import Wallet
 from app.services.recommendation_service import RecommendationService
 from app.services.geolocation_service import GeolocationService
+from app.services.spatial_index import locations_within
 
 
 class ProximityMarketingService:
@@ -34,13 +34,10 @@ class ProximityMarketingService:
         Проверка ближайших партнеров и отправка персонализированных уведомлений
         """
         # Находим ближайшие локации партнеров
-        nearby_locations = db.query(PartnerLocation).filter(
-            func.ST_DWithin(
-                PartnerLocation.geom,
-                func.ST_MakePoint(current_location['longitude'], current_location['latitude']),
-                radius * 1000  # Перевод в метры
-            )
-        ).all()
+        distances = await locations_within(
+            db, current_location['latitude'], current_location['longitude'], radius
+        )
+        nearby_locations = db.query(PartnerLocation).filter(PartnerLocation.id.in_(distances)).all()
 
         if not nearby_locations:
             return
@@ -7,6 +7,7 @@ from app.models.user import User
 from app.models.partner import Partner
 from app.models.transaction import Transaction
 from app.schemas.partner import PartnerRecommendation
+from app.services.entity_cache import EntityCache
 
 
 class RecommendationService:
@@ -23,13 +24,16 @@ class RecommendationService:
         # 1. Анализ истории транзакций
         transactions = db.query(Transaction).filter(
             Transaction.user_id == user.id
-        ).all()
+        ).execution_options(replica=True).all()
 
         # 2. Группировка по категориям и сумме транзакций
+        # (категории партнёров — одним MGET/IN-запросом, а не загрузкой партнёра на каждую транзакцию)
+        partners = EntityCache.get_many(db, "partner", (t.partner_id for t in transactions))
         category_scores = defaultdict(float)
         for transaction in transactions:
-            if transaction.partner:
-                category_scores[transaction.partner.category] += transaction.amount
+            partner = partners.get(transaction.partner_id)
+            if partner:
+                category_scores[partner["category"]] += transaction.amount
 
         # 3. Определение топовых категорий
         top_categories = sorted(
@@ -43,7 +47,7 @@ class RecommendationService:
         for category, _ in top_categories:
             partners = db.query(Partner).filter(
                 Partner.category == category
-            ).order_by(func.random()).limit(3).all()
+            ).order_by(func.random()).limit(3).execution_options(replica=True).all()
 
             for partner in partners:
                 recommendation = PartnerRecommendation(
@@ -59,7 +63,7 @@ class RecommendationService:
         if len(recommendations) < limit:
             random_partners = db.query(Partner).order_by(func.random()).limit(
                 limit - len(recommendations)
-            ).all()
+            ).execution_options(replica=True).all()
 
             for partner in random_partners:
                 recommendation = PartnerRecommendation(
@@ -117,6 +121,7 @@ class RecommendationService:
             .group_by(Partner.id)
             .order_by(func.count(Transaction.id).desc())
             .limit(limit)
+            .execution_options(replica=True)
             .all()
         )
 
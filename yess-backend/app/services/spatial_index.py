@@ -0,0 +1,474 @@
+"""
+Пространственный индекс активных точек партнёров в памяти процесса
+- GridIndex: равномерная сетка по широте/долготе, в ячейке — массивы (array) id, партнёра
+  и координат; поиск в радиусе и k ближайших обходит только ячейки рядом с точкой
+  и считает гаверсинус для их точек. Размер ячейки при полной загрузке подбирается
+  по плотности (~SPATIAL_INDEX_POINTS_PER_CELL точек на непустую ячейку)
+- PartnerLocationIndex: GridIndex для PartnerLocation (точка и партнёр активны).
+  Первая загрузка и страховочная перезагрузка раз в SPATIAL_INDEX_MAX_AGE — полные,
+  дальше индекс обновляется по изменениям: commit сессии, изменившей координаты,
+  активность или партнёра точки, пишет id в поток Redis (XADD), воркеры не чаще раза
+  в SPATIAL_INDEX_POLL_INTERVAL читают новые записи и перечитывают из БД только эти точки.
+  Пропуск в потоке (обрезан по MAXLEN) или массовый UPDATE — полная перезагрузка
+- Чтение из БД и построение сетки идут в threadpool со своей сессией, XADD после commit
+  в потоке event loop — фоновой задачей: ни то, ни другое не останавливает loop.
+  Ждёт загрузки только самый первый запрос; перезагрузку готовой сетки запрос запускает
+  фоновой задачей и, как и остальные, работает со старой сеткой
+- Индекс не готов (первая загрузка идёт в другом запросе) или выключен — вызывающий
+  ищет в БД (ensure_fresh возвращает False)
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.partner import Partner, PartnerLocation
+from app.services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+STREAM_KEY = "geo:partner_locations:changes"
+
+# Найденная точка: (расстояние в км, id точки, id партнёра)
+Hit = Tuple[float, int, int]
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon), в котором лежат все точки не дальше radius_km"""
+    lat_span = radius_km / KM_PER_DEGREE
+    cos_edge = math.cos(math.radians(min(abs(lat) + lat_span, 90.0)))
+    lon_span = 180.0 if cos_edge < 1e-6 else min(lat_span / cos_edge, 180.0)
+    return lat - lat_span, lat + lat_span, lon - lon_span, lon + lon_span
+
+
+class _Cell:
+    __slots__ = ("ids", "partners", "lats", "lons")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.partners = array("q")
+        self.lats = array("d")
+        self.lons = array("d")
+
+
+class GridIndex:
+    """Точки в ячейках cell_km × cell_km (по меридиану); потокобезопасен"""
+
+    def __init__(self, cell_km: float = 1.0):
+        self.cell_km = cell_km
+        self._cell_deg = cell_km / KM_PER_DEGREE
+        self._lon_cells = math.ceil(360 / self._cell_deg)
+        self._cells: Dict[int, _Cell] = {}
+        self._points: Dict[int, int] = {}  # id точки → ключ ячейки
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_points(cls, points: Iterable[Tuple[int, int, float, float]], cell_km: float) -> "GridIndex":
+        """Построение сразу из (id, партнёр, широта, долгота) — без блокировки на каждую точку"""
+        grid = cls(cell_km)
+        cells, located = grid._cells, grid._points
+        for location_id, partner_id, lat, lon in points:
+            if location_id in located:
+                grid._remove(location_id)
+            key = grid._key(grid._row(lat), grid._column(lon))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = _Cell()
+            cell.ids.append(location_id)
+            cell.partners.append(partner_id)
+            cell.lats.append(lat)
+            cell.lons.append(lon)
+            located[location_id] = key
+        return grid
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _row(self, lat: float) -> int:
+        return math.floor((lat + 90) / self._cell_deg)
+
+    def _column(self, lon: float) -> int:
+        return math.floor((lon + 180) / self._cell_deg) % self._lon_cells
+
+    def _key(self, row: int, column: int) -> int:
+        return row * self._lon_cells + column
+
+    def upsert(self, location_id: int, partner_id: int, lat: float, lon: float):
+        with self._lock:
+            self._remove(location_id)
+            key = self._key(self._row(lat), self._column(lon))
+            cell = self._cells.get(key)
+            if cell is None:
+                cell = self._cells[key] = _Cell()
+            cell.ids.append(location_id)
+            cell.partners.append(partner_id)
+            cell.lats.append(lat)
+            cell.lons.append(lon)
+            self._points[location_id] = key
+
+    def remove(self, location_id: int):
+        with self._lock:
+            self._remove(location_id)
+
+    def _remove(self, location_id: int):
+        key = self._points.pop(location_id, None)
+        if key is None:
+            return
+        cell = self._cells[key]
+        # Последний элемент переносится на место удалённого
+        position = cell.ids.index(location_id)
+        for column in (cell.ids, cell.partners, cell.lats, cell.lons):
+            column[position] = column[-1]
+            column.pop()
+        if not cell.ids:
+            del self._cells[key]
+
+    def partner_locations(self, partner_ids: Set[int]) -> List[int]:
+        """id точек партнёров — полный обход, только для редких изменений партнёров"""
+        with self._lock:
+            return [
+                location_id
+                for cell in self._cells.values()
+                for location_id, partner_id in zip(cell.ids, cell.partners)
+                if partner_id in partner_ids
+            ]
+
+    def _columns(self, row: int, lat: float, lon: float, radius_km: float) -> range:
+        """Столбцы ячеек строки row, в которых могут быть точки ближе radius_km"""
+        # Долготный размах — по краю строки, дальнему от экватора (там градус долготы короче)
+        edge = max(abs(row * self._cell_deg - 90), abs((row + 1) * self._cell_deg - 90))
+        cos_edge = math.cos(math.radians(min(edge, 90.0)))
+        if cos_edge < 1e-6 or radius_km / (KM_PER_DEGREE * cos_edge) >= 180:
+            return range(self._lon_cells)
+        span = radius_km / (KM_PER_DEGREE * cos_edge)
+        first = math.floor((lon - span + 180) / self._cell_deg)
+        last = math.floor((lon + span + 180) / self._cell_deg)
+        return range(first, last + 1)
+
+    def _scan(self, lat: float, lon: float, radius_km: float, rows: Iterable[int], visit):
+        for row in rows:
+            if row < 0 or row * self._cell_deg > 180:
+                continue
+            base = row * self._lon_cells
+            for column in self._columns(row, lat, lon, radius_km):
+                cell = self._cells.get(base + column % self._lon_cells)
+                if cell is not None:
+                    visit(cell)
+
+    def within(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Hit]:
+        """Точки не дальше radius_km, по возрастанию расстояния"""
+        hits: List[Hit] = []
+        phi = math.radians(lat)
+        cos_phi = math.cos(phi)
+
+        def visit(cell: _Cell):
+            for location_id, partner_id, point_lat, point_lon in zip(cell.ids, cell.partners, cell.lats, cell.lons):
+                point_phi = math.radians(point_lat)
+                a = math.sin((point_phi - phi) / 2) ** 2 + \
+                    cos_phi * math.cos(point_phi) * math.sin(math.radians(point_lon - lon) / 2) ** 2
+                distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+                if distance <= radius_km:
+                    hits.append((distance, location_id, partner_id))
+
+        span = radius_km / KM_PER_DEGREE
+        with self._lock:
+            self._scan(lat, lon, radius_km, range(self._row(lat - span), self._row(lat + span) + 1), visit)
+        hits.sort()
+        return hits[:limit] if limit is not None else hits
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: Optional[float] = None) -> List[Hit]:
+        """k ближайших точек не дальше max_km: поиск в радиусе, удваиваемом, пока точек меньше k"""
+        max_km = settings.SPATIAL_INDEX_KNN_MAX_KM if max_km is None else max_km
+        # Все точки в радиусе r найдены точно, поэтому k первых из них — k ближайших
+        radius_km = min(self.cell_km * max(1.0, math.sqrt(k / settings.SPATIAL_INDEX_POINTS_PER_CELL)), max_km)
+        while True:
+            hits = self.within(lat, lon, radius_km)
+            if len(hits) >= k or radius_km >= max_km:
+                return hits[:k]
+            radius_km = min(radius_km * 2, max_km)
+
+
+def choose_cell_km(points: List[Tuple[int, int, float, float]]) -> float:
+    """Сторона ячейки, при которой в непустой ячейке ~SPATIAL_INDEX_POINTS_PER_CELL точек"""
+    if len(points) < 2:
+        return 1.0
+    lats = [point[2] for point in points]
+    lons = [point[3] for point in points]
+    height = (max(lats) - min(lats)) * KM_PER_DEGREE
+    width = (max(lons) - min(lons)) * KM_PER_DEGREE * math.cos(math.radians((max(lats) + min(lats)) / 2))
+    area = max(height, 0.1) * max(width, 0.1)
+    cell_km = math.sqrt(area * settings.SPATIAL_INDEX_POINTS_PER_CELL / len(points))
+    return min(max(cell_km, 0.05), 20.0)
+
+
+def _stream_id(raw) -> Tuple[int, int]:
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    milliseconds, _, sequence = raw.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def _ids(raw) -> Set[int]:
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    return {int(item) for item in raw.split(",") if item}
+
+
+class PartnerLocationIndex:
+    """GridIndex активных точек партнёров, обновляемый по потоку изменений"""
+
+    def __init__(self):
+        self.grid: Optional[GridIndex] = None
+        self.loaded_at = 0.0
+        self.polled_at = 0.0
+        self._last_id: Tuple[int, int] = (0, 0)
+        self._pending_locations: Set[int] = set()
+        self._pending_partners: Set[int] = set()
+        self._reload = False
+        self._refresh_lock = threading.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+
+    def notify(self, locations: Iterable[int] = (), partners: Iterable[int] = (), reload: bool = False):
+        """Изменения этого процесса применяются при следующем запросе, не дожидаясь Redis"""
+        self._pending_locations.update(locations)
+        self._pending_partners.update(partners)
+        self._reload = self._reload or reload
+
+    async def ensure_fresh(self, db: Session) -> bool:
+        """Применить изменения; False — индексом пользоваться нельзя, искать в БД"""
+        if not settings.SPATIAL_INDEX_ENABLED:
+            return False
+        now = time.monotonic()
+        if self.grid is not None and now - self.polled_at >= settings.SPATIAL_INDEX_POLL_INTERVAL:
+            self.polled_at = now
+            await self._poll()
+        stale = self.grid is None or self._reload or now - self.loaded_at >= settings.SPATIAL_INDEX_MAX_AGE
+        if not stale and not self._pending_locations and not self._pending_partners:
+            return True
+        # Обновляет один запрос; остальные тем временем работают с текущим индексом
+        if not self._refresh_lock.acquire(blocking=False):
+            return self.grid is not None
+        if stale and self.grid is not None:
+            self._reload_task = asyncio.get_running_loop().create_task(self._reload_in_background(db.get_bind()))
+            return True
+        try:
+            # Чтение из БД и построение сетки — в потоке со своей сессией: полная загрузка
+            # на 100k–1M точек заняла бы event loop на секунды
+            if stale:
+                await self._load(db.get_bind())
+            else:
+                # Набор забирается в потоке loop: notify() во время чтения попадёт в следующий
+                locations, partners = self._pending_locations, self._pending_partners
+                self._pending_locations, self._pending_partners = set(), set()
+                await run_in_threadpool(
+                    self._in_session, db.get_bind(), lambda session: self._apply(session, locations, partners)
+                )
+        except Exception as e:
+            logger.error(f"Spatial index refresh failed: {e}")
+            if self.grid is None:
+                return False
+        finally:
+            self._refresh_lock.release()
+        return True
+
+    async def _reload_in_background(self, bind):
+        try:
+            await self._load(bind)
+        except Exception as e:
+            logger.error(f"Spatial index reload failed: {e}")
+        finally:
+            self._refresh_lock.release()
+
+    async def _poll(self):
+        try:
+            async with cache_service.async_redis.pipeline(transaction=False) as pipe:
+                pipe.xrange(STREAM_KEY, count=1)
+                pipe.xrange(STREAM_KEY, min="%d-%d" % self._last_id, count=settings.SPATIAL_INDEX_STREAM_MAXLEN)
+                first, entries = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Spatial index change stream unavailable: {e}")
+            return
+        if first and _stream_id(first[0][0]) > self._last_id and self._last_id != (0, 0):
+            self._reload = True  # Записи после последней прочитанной уже обрезаны
+        for entry_id, fields in entries:
+            entry_id = _stream_id(entry_id)
+            if entry_id <= self._last_id:
+                continue
+            self._last_id = entry_id
+            fields = {key.decode() if isinstance(key, bytes) else key: value for key, value in fields.items()}
+            self.notify(_ids(fields.get("locations", "")), _ids(fields.get("partners", "")), "reload" in fields)
+
+    async def _last_stream_id(self) -> Tuple[int, int]:
+        try:
+            last = await cache_service.async_redis.xrevrange(STREAM_KEY, count=1)
+        except RedisError:
+            return self._last_id
+        return _stream_id(last[0][0]) if last else (0, 0)
+
+    def _rows(self, db: Session, *criteria):
+        return db.query(
+            PartnerLocation.id, PartnerLocation.partner_id, PartnerLocation.latitude, PartnerLocation.longitude,
+            PartnerLocation.is_active, Partner.is_active
+        ).outerjoin(Partner, Partner.id == PartnerLocation.partner_id).filter(*criteria)
+
+    @staticmethod
+    def _in_session(bind, work):
+        with Session(bind=bind) as db:
+            return work(db)
+
+    async def _load(self, bind):
+        # Изменения, попавшие в поток во время загрузки, применятся повторно — это безопасно
+        last_id = await self._last_stream_id()
+        self._pending_locations.clear()
+        self._pending_partners.clear()
+        self._reload = False
+        grid = await run_in_threadpool(self._in_session, bind, self._build)
+        self.grid, self._last_id = grid, last_id
+        self.loaded_at = self.polled_at = time.monotonic()
+        logger.info(f"Spatial index loaded: {len(grid)} locations, cell {grid.cell_km:.2f} km")
+
+    def _build(self, db: Session) -> GridIndex:
+        points = [
+            (location_id, partner_id, float(lat), float(lon))
+            for location_id, partner_id, lat, lon, active, partner_active in self._rows(
+                db, PartnerLocation.is_active == True, Partner.is_active == True,
+                PartnerLocation.latitude.isnot(None), PartnerLocation.longitude.isnot(None)
+            ).yield_per(10000)
+        ]
+        return GridIndex.from_points(points, choose_cell_km(points))
+
+    def _apply(self, db: Session, locations: Set[int], partners: Set[int]):
+        criteria = []
+        if locations:
+            criteria.append(PartnerLocation.id.in_(locations))
+        if partners:
+            criteria.append(PartnerLocation.partner_id.in_(partners))
+        seen = set()
+        for location_id, partner_id, lat, lon, active, partner_active in self._rows(db, or_(*criteria)):
+            seen.add(location_id)
+            if active and partner_active and lat is not None and lon is not None:
+                self.grid.upsert(location_id, partner_id, float(lat), float(lon))
+            else:
+                self.grid.remove(location_id)
+        # Удалённые из БД точки (в том числе вместе с партнёром)
+        gone = locations | (set(self.grid.partner_locations(partners)) if partners else set())
+        for location_id in gone - seen:
+            self.grid.remove(location_id)
+
+    def within(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Hit]:
+        return self.grid.within(lat, lon, radius_km, limit)
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: Optional[float] = None) -> List[Hit]:
+        return self.grid.nearest(lat, lon, k, max_km)
+
+
+partner_location_index = PartnerLocationIndex()
+
+
+async def locations_within(db: Session, lat: float, lon: float, radius_km: float) -> Dict[int, float]:
+    """id активных точек не дальше radius_km → расстояние, по возрастанию; индекс не готов — БД"""
+    if await partner_location_index.ensure_fresh(db):
+        return {location_id: distance for distance, location_id, _ in partner_location_index.within(lat, lon, radius_km)}
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    rows = db.query(PartnerLocation.id, PartnerLocation.latitude, PartnerLocation.longitude).join(
+        Partner, Partner.id == PartnerLocation.partner_id
+    ).filter(
+        PartnerLocation.is_active == True,
+        Partner.is_active == True,
+        PartnerLocation.latitude.between(min_lat, max_lat),
+        PartnerLocation.longitude.between(min_lon, max_lon)
+    ).all()
+    hits = sorted(
+        (haversine_km(lat, lon, float(point_lat), float(point_lon)), location_id)
+        for location_id, point_lat, point_lon in rows
+    )
+    return {location_id: distance for distance, location_id in hits if distance <= radius_km}
+
+
+# ---- Поток изменений: commit сессии → XADD ----
+
+_SESSION_KEY = "spatial_changes"
+_LOCATION_FIELDS = ("latitude", "longitude", "is_active", "partner_id")
+
+
+def _changes(session: Session) -> dict:
+    return session.info.setdefault(_SESSION_KEY, {"locations": set(), "partners": set(), "reload": False})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, PartnerLocation):
+            _changes(session)["locations"].add(obj.id)
+        elif isinstance(obj, Partner) and obj in session.deleted:
+            _changes(session)["partners"].add(obj.id)
+    for obj in session.dirty:
+        state = inspect(obj)
+        if isinstance(obj, PartnerLocation):
+            if any(state.attrs[field].history.has_changes() for field in _LOCATION_FIELDS):
+                _changes(session)["locations"].add(obj.id)
+        elif isinstance(obj, Partner) and state.attrs.is_active.history.has_changes():
+            _changes(session)["partners"].add(obj.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Partner, PartnerLocation):
+            _changes(orm_execute_state.session)["reload"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_changes(session):
+    changes = session.info.pop(_SESSION_KEY, None)
+    if not changes or not (changes["locations"] or changes["partners"] or changes["reload"]):
+        return
+    partner_location_index.notify(changes["locations"], changes["partners"], changes["reload"])
+    fields = {
+        "locations": ",".join(map(str, sorted(changes["locations"]))),
+        "partners": ",".join(map(str, sorted(changes["partners"]))),
+    }
+    if changes["reload"]:
+        fields["reload"] = "1"
+    # Commit в потоке event loop не ждёт Redis: XADD — фоновой задачей
+    cache_service.run_in_background(lambda: _apublish(fields), lambda: _publish(fields))
+
+
+def _publish(fields: dict):
+    try:
+        cache_service.redis.xadd(STREAM_KEY, fields, maxlen=settings.SPATIAL_INDEX_STREAM_MAXLEN, approximate=True)
+    except RedisError as e:
+        # Остальные воркеры увидят изменение при полной перезагрузке (SPATIAL_INDEX_MAX_AGE)
+        logger.warning(f"Failed to publish spatial index changes: {e}")
+
+
+async def _apublish(fields: dict):
+    try:
+        await cache_service.async_redis.xadd(
+            STREAM_KEY, fields, maxlen=settings.SPATIAL_INDEX_STREAM_MAXLEN, approximate=True
+        )
+    except RedisError as e:
+        logger.warning(f"Failed to publish spatial index changes: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_SESSION_KEY, None)
@@ -1,6 +1,7 @@
 """Service for managing stories"""
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import Select, and_, or_, select
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 from decimal import Decimal
@@ -15,17 +16,15 @@ class StoryService:
     """Service for story management"""
     
     @staticmethod
-    def get_active_stories(
-        db: Session,
-        user_id: Optional[int] = None,
+    def _active_stories_query(
         city_id: Optional[int] = None,
         partner_id: Optional[int] = None,
         limit: int = 50
-    ) -> List[Story]:
-        """Get active stories for user"""
+    ) -> Select:
+        """Запрос активных сторисов (общий для Session и AsyncSession)"""
         now = datetime.utcnow()
         
-        query = db.query(Story).filter(
+        query = select(Story).where(
             Story.is_active == True,
             Story.status == StoryStatus.ACTIVE.value,
             Story.expires_at > now,
@@ -37,7 +36,7 @@ class StoryService:
         
         # Фильтр по городу
         if city_id:
-            query = query.filter(
+            query = query.where(
                 or_(
                     Story.city_id == city_id,
                     Story.city_id == None,
@@ -47,26 +46,42 @@ class StoryService:
         
         # Фильтр по партнеру
         if partner_id:
-            query = query.filter(
+            query = query.where(
                 or_(
                     Story.partner_id == partner_id,
                     Story.partner_id == None
                 )
             )
         
-        # Исключаем уже просмотренные (опционально)
-        if user_id:
-            viewed_story_ids = db.query(StoryView.story_id).filter(
-                StoryView.user_id == user_id
-            ).subquery()
-            # Можно добавить фильтр для исключения просмотренных
-        
-        stories = query.order_by(
+        # Исключение уже просмотренных (по user_id) пока не применяется
+        return query.order_by(
             Story.priority.desc(),
             Story.created_at.desc()
-        ).limit(limit).all()
-        
-        return stories
+        ).limit(limit)
+    
+    @staticmethod
+    def get_active_stories(
+        db: Session,
+        user_id: Optional[int] = None,
+        city_id: Optional[int] = None,
+        partner_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Story]:
+        """Get active stories for user"""
+        query = StoryService._active_stories_query(city_id, partner_id, limit)
+        return list(db.scalars(query).all())
+    
+    @staticmethod
+    async def aget_active_stories(
+        db: AsyncSession,
+        user_id: Optional[int] = None,
+        city_id: Optional[int] = None,
+        partner_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Story]:
+        """Get active stories for user (AsyncSession)"""
+        query = StoryService._active_stories_query(city_id, partner_id, limit)
+        return list((await db.scalars(query)).all())
     
     @staticmethod
     def create_story(
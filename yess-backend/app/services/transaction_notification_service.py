@@ -1,4 +1,5 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.notifications import SMSService, PushNotificationService, sms_service, push_service
 from app.models.user import User
@@ -20,12 +21,16 @@ class TransactionNotificationService:
         user: User, 
         transaction: Transaction, 
         partner: Partner,
-        db: Session
+        db: Union[Session, AsyncSession]
     ):
         """
         Комплексное уведомление о транзакции
         Включает SMS, Push и In-App уведомления
         """
+        if isinstance(db, AsyncSession) and isinstance(user, User):
+            # В AsyncSession ленивая загрузка недоступна — подгружаем связь явно
+            await db.refresh(user, attribute_names=["notification_settings"])
+
         # Проверяем настройки уведомлений пользователя
         notification_settings = user.notification_settings
 
@@ -81,7 +86,7 @@ class TransactionNotificationService:
 
     async def _create_in_app_notification(
         self, 
-        db: Session, 
+        db: Union[Session, AsyncSession], 
         user: User, 
         transaction: Transaction, 
         partner: Partner
@@ -107,8 +112,12 @@ class TransactionNotificationService:
         )
         
         db.add(notification)
-        db.commit()
-        db.refresh(notification)
+        if isinstance(db, AsyncSession):
+            await db.commit()
+            await db.refresh(notification)
+        else:
+            db.commit()
+            db.refresh(notification)
 
 # Singleton
 transaction_notification_service = TransactionNotificationService(
@@ -0,0 +1,141 @@
+"""
+Бенчмарк: кодеки значений кэша (json.dumps vs orjson/msgpack + zstd/lz4)
+Для запуска:
+    python -m tests.benchmarks.bench_cache_codec
+    REDIS_URL=redis://localhost:6379/0 python -m tests.benchmarks.bench_cache_codec --redis
+
+Полезная нагрузка повторяет реальные значения кэша: карточка партнёра,
+список партнёров города и результат поиска ближайших точек.
+Для каждого варианта выводится размер значения, время encode/decode (медиана)
+и, с --redis, MEMORY USAGE ключа в Redis.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.core.cache_codec import CacheCodec, orjson, msgpack, zstandard, lz4_frame
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+CATEGORIES = ["Кафе", "Рестораны", "Продукты", "Одежда", "Красота", "Аптеки", "Электроника"]
+STREETS = ["пр. Чуй", "ул. Киевская", "ул. Токтогула", "пр. Манаса", "ул. Ибраимова"]
+
+
+def make_partner(partner_id: int, rng: random.Random) -> dict:
+    created = datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 600))
+    return {
+        "id": partner_id,
+        "name": f"Партнёр {partner_id}",
+        "description": "Скидки и кэшбэк для участников программы лояльности YESS. " * rng.randint(1, 3),
+        "category": rng.choice(CATEGORIES),
+        "city_id": 1,
+        "logo_url": f"/uploads/partners/{partner_id}/logo.png",
+        "cover_image_url": f"/uploads/partners/{partner_id}/cover.jpg",
+        "phone": f"+996 555 {rng.randint(100000, 999999)}",
+        "email": f"partner{partner_id}@example.kg",
+        "website": f"https://partner{partner_id}.kg",
+        "default_cashback_rate": rng.choice([2.5, 5.0, 7.5, 10.0]),
+        "max_discount_percent": rng.choice([5, 10, 15, 20]),
+        "is_active": True,
+        "is_verified": rng.random() > 0.2,
+        "created_at": created.isoformat(),
+        "locations": [
+            {
+                "id": partner_id * 10 + i,
+                "address": f"{rng.choice(STREETS)}, {rng.randint(1, 200)}",
+                "latitude": 42.87 + rng.uniform(-0.05, 0.05),
+                "longitude": 74.59 + rng.uniform(-0.05, 0.05),
+                "working_hours": {"mon-fri": "09:00-21:00", "sat-sun": "10:00-20:00"},
+            }
+            for i in range(rng.randint(1, 3))
+        ],
+    }
+
+
+def make_payloads() -> dict:
+    rng = random.Random(42)
+    partners = [make_partner(i, rng) for i in range(1, 301)]
+    nearby = [
+        {
+            "id": loc["id"],
+            "partner_id": p["id"],
+            "partner_name": p["name"],
+            "address": loc["address"],
+            "latitude": loc["latitude"],
+            "longitude": loc["longitude"],
+            "distance": round(rng.uniform(50, 5000), 1),
+            "max_discount_percent": p["default_cashback_rate"],
+        }
+        for p in partners[:50]
+        for loc in p["locations"]
+    ]
+    return {"partner": partners[0], "nearby": nearby, "partners_list": partners}
+
+
+class LegacyJsonCodec:
+    """Прежний формат: json.dumps(default=str) текстом"""
+
+    def encode(self, value) -> bytes:
+        return json.dumps(value, default=str).encode()
+
+    def decode(self, data: bytes):
+        return json.loads(data)
+
+
+def codecs() -> list:
+    variants = [("json.dumps (legacy)", LegacyJsonCodec())]
+    serializers = ["json"] + (["msgpack"] if msgpack else [])
+    compressions = ["none"] + (["zstd"] if zstandard else []) + (["lz4"] if lz4_frame else [])
+    for serializer in serializers:
+        for compression in compressions:
+            name = f"{'orjson' if serializer == 'json' and orjson else serializer}+{compression}"
+            variants.append((name, CacheCodec(serializer=serializer, compression=compression)))
+    return variants
+
+
+def timeit(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--redis", action="store_true", help="Замерить MEMORY USAGE в Redis")
+    args = parser.parse_args()
+
+    client = None
+    if args.redis:
+        from redis import Redis
+        client = Redis.from_url(REDIS_URL)
+
+    for payload_name, payload in make_payloads().items():
+        print(f"\n== {payload_name} ==")
+        print(f"{'codec':<22}{'bytes':>9}{'encode_us':>12}{'decode_us':>12}{'redis_bytes':>13}")
+        for name, codec in codecs():
+            data = codec.encode(payload)
+            assert codec.decode(data) == json.loads(json.dumps(payload, default=str))
+            encode_us = timeit(lambda: codec.encode(payload), args.repeat)
+            decode_us = timeit(lambda: codec.decode(data), args.repeat)
+            memory = "-"
+            if client is not None:
+                key = f"bench:codec:{payload_name}"
+                client.setex(key, 60, data)
+                memory = client.memory_usage(key, samples=0)
+                client.delete(key)
+            print(f"{name:<22}{len(data):>9}{encode_us:>12.1f}{decode_us:>12.1f}{memory:>13}")
+
+    if client is not None:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк: сжатие больших JSON-ответов и кэш предсжатых тел
+Для запуска (внешние сервисы не нужны):
+    python -m tests.benchmarks.bench_compression
+    python -m tests.benchmarks.bench_compression --partners 5000 --requests 300
+
+Эндпоинт со списком партнёров (как /partners/list для карты) вызывается через httpx
+ASGITransport без сжатия, со сжатием каждого ответа (кэш отключён) и с кэшем
+предсжатых тел. Выводятся размер тела, p50/p99 латентности и CPU на запрос.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.compression import CompressionBudget, CompressionMiddleware, PrecompressedCache, negotiate
+from tests.benchmarks.bench_redis_cache import percentile
+
+
+def build_app(partners: list, middleware_kwargs=None) -> FastAPI:
+    bench = FastAPI()
+    if middleware_kwargs is not None:
+        bench.add_middleware(CompressionMiddleware, **middleware_kwargs)
+
+    @bench.get("/partners/list")
+    async def partners_list():
+        return partners
+
+    return bench
+
+
+async def run_variant(app: FastAPI, requests: int, encoding: str):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Accept-Encoding": encoding}
+        await client.get("/partners/list", headers=headers)  # Прогрев
+        latencies, size = [], 0
+        cpu_start = time.process_time()
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.get("/partners/list", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            size = int(response.headers["Content-Length"])
+        cpu_ms = (time.process_time() - cpu_start) * 1000 / requests
+    return size, latencies, cpu_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partners", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    partners = [
+        {
+            "id": i,
+            "name": f"Partner {i}",
+            "category": ["cafe", "beauty", "grocery", "clothes"][i % 4],
+            "description": "Скидки и кэшбэк Yess!Coin для держателей карты",
+            "latitude": 42.87 + i / 100000,
+            "longitude": 74.59 + i / 100000,
+            "cashback_rate": 5.0,
+            "logo_url": f"/static/partners/{i}/logo.png",
+        }
+        for i in range(args.partners)
+    ]
+    encoding = negotiate("br, gzip")
+    variants = [
+        ("identity", None),
+        (f"{encoding}, per request", {"cache": PrecompressedCache(max_bytes=0), "budget": CompressionBudget(1e9)}),
+        (f"{encoding}, precompressed", {"cache": PrecompressedCache(), "budget": CompressionBudget(1e9)}),
+    ]
+    print(f"{args.partners} partners, {args.requests} requests per variant")
+    print(f"{'variant':<26}{'bytes':>10}{'p50 ms':>10}{'p99 ms':>10}{'cpu ms':>10}")
+    for name, kwargs in variants:
+        size, latencies, cpu_ms = asyncio.run(run_variant(build_app(partners, kwargs), args.requests, encoding))
+        print(
+            f"{name:<26}{size:>10}{percentile(latencies, 50):>10.2f}"
+            f"{percentile(latencies, 99):>10.2f}{cpu_ms:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
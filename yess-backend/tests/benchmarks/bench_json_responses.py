@@ -0,0 +1,166 @@
+"""
+Бенчмарк: CPU на сериализацию JSON-ответов (быстрый путь из app.core.responses)
+Для запуска (внешние сервисы не нужны, точки партнёров — в SQLite в памяти):
+    python -m tests.benchmarks.bench_json_responses
+    python -m tests.benchmarks.bench_json_responses --stories 100 --locations 5000
+
+Сравниваются прежние и новые обработчики:
+- /stories: model_validate(...).dict() → правка dict → StoryResponse(**dict) против одной
+  валидации с присваиванием полей; третий вариант — тот же обработчик с явным
+  response_class=ORJSONResponse: так выглядел бы orjson по умолчанию для всего приложения
+- /partners/locations: ORM-объекты + contains_eager + сборка dict против строк SELECT
+  с полями схемы
+Варианты чередуются по раундам; выводится медиана CPU-времени процесса на запрос.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, contains_eager, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.v1 import partner as partner_endpoints
+from app.core.database import Base, get_db
+from app.core.responses import ORJSONResponse
+from app.models.partner import Partner, PartnerLocation
+from app.schemas.partner import PartnerLocationResponse
+from app.schemas.story import StoryResponse
+
+
+def make_stories(count: int) -> list:
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=i, title=f"Акция {i}", title_kg=None, title_ru=f"Акция {i}",
+            description="Кэшбэк Yess!Coin до 10% у партнёров", description_kg=None, description_ru=None,
+            image_url=f"/static/stories/{i}.jpg", video_url=None, thumbnail_url=f"/static/stories/{i}_t.jpg",
+            story_type="promotion", partner_id=i % 20, promotion_id=None, city_id=1,
+            expires_at=now + timedelta(days=1), scheduled_at=None, priority=i % 5,
+            target_audience="all", action_type="partner", action_value=str(i % 20),
+            auto_delete=True, show_timer=True, status="active", is_active=True,
+            views_count=100 + i, clicks_count=i, shares_count=0,
+            created_at=now, updated_at=now, created_by=1
+        )
+        for i in range(count)
+    ]
+
+
+def build_stories_app(stories: list) -> FastAPI:
+    bench = FastAPI()
+    partners = {i: {"name": f"Partner {i}"} for i in range(20)}
+
+    @bench.get("/legacy", response_model=List[StoryResponse])
+    async def legacy():
+        result = []
+        for story in stories:
+            story_dict = StoryResponse.model_validate(story).dict()
+            story_dict["partner_name"] = partners[story.partner_id]["name"]
+            result.append(StoryResponse(**story_dict))
+        return result
+
+    async def single_pass():
+        result = []
+        for story in stories:
+            item = StoryResponse.model_validate(story)
+            item.partner_name = partners[story.partner_id]["name"]
+            result.append(item)
+        return result
+
+    bench.get("/single-pass", response_model=List[StoryResponse])(single_pass)
+    bench.get("/single-pass-orjson", response_model=List[StoryResponse], response_class=ORJSONResponse)(single_pass)
+    return bench
+
+
+def build_locations_app(count: int) -> FastAPI:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    partners = [Partner(name=f"Partner {i}", category="cafe", max_discount_percent=10) for i in range(50)]
+    session.add_all(partners)
+    session.flush()
+    session.add_all(
+        PartnerLocation(
+            partner_id=partners[i % 50].id, address=f"ул. Киевская, {i}", latitude=42.87, longitude=74.59,
+            phone_number="+996 555 000 000", working_hours={"mon": "9:00-18:00"}, is_active=True
+        )
+        for i in range(count)
+    )
+    session.commit()
+
+    bench = FastAPI()
+    bench.dependency_overrides[get_db] = lambda: session
+    # Обработчик без зависимости conditional_get: сравнивается только выборка и сериализация
+    bench.get("/locations", response_model=List[PartnerLocationResponse])(partner_endpoints.get_partner_locations)
+
+    @bench.get("/legacy/locations", response_model=List[PartnerLocationResponse])
+    async def legacy_locations(db: Session = Depends(get_db)):
+        query = db.query(PartnerLocation).join(Partner).options(
+            contains_eager(PartnerLocation.partner)
+        ).filter(PartnerLocation.is_active == True)
+        result = []
+        for loc in query.all():
+            result.append({
+                "id": loc.id,
+                "partner_id": loc.partner_id,
+                "partner_name": loc.partner.name,
+                "address": loc.address,
+                "latitude": loc.latitude,
+                "longitude": loc.longitude,
+                "phone_number": loc.phone_number,
+                "working_hours": loc.working_hours,
+                "max_discount_percent": loc.partner.max_discount_percent
+            })
+        # Как в обработчике: сессия живёт весь запрос, identity map не копится между запросами
+        db.expunge_all()
+        return result
+
+    return bench
+
+
+async def cpu_per_request(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get(path)  # Прогрев
+        assert response.status_code == 200, response.text
+        started = time.process_time()
+        for _ in range(requests):
+            await client.get(path)
+        return (time.process_time() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stories", type=int, default=50)
+    parser.add_argument("--locations", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=100, help="Запросов на вариант в раунде")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    stories_app = build_stories_app(make_stories(args.stories))
+    locations_app = build_locations_app(args.locations)
+    variants = {
+        "stories: legacy": (stories_app, "/legacy"),
+        "stories: single pass": (stories_app, "/single-pass"),
+        "stories: + ORJSONResponse": (stories_app, "/single-pass-orjson"),
+        "locations: ORM + dicts": (locations_app, "/legacy/locations"),
+        "locations: row select": (locations_app, "/locations"),
+    }
+    samples = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, (app, path) in variants.items():
+            samples[name].append(asyncio.run(cpu_per_request(app, path, args.requests)))
+
+    print(f"{args.stories} stories, {args.locations} locations; CPU per request, median of {args.rounds} rounds")
+    for name in variants:
+        print(f"{name:28s} {statistics.median(samples[name]) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Бенчмарк: накладные расходы middleware HTTP-метрик
+Для запуска (внешние сервисы не нужны):
+    python -m tests.benchmarks.bench_metrics_middleware
+    python -m tests.benchmarks.bench_metrics_middleware --requests 20000
+
+Один и тот же эндпоинт вызывается через httpx ASGITransport в трёх вариантах:
+без middleware, с PerformanceMonitoringMiddleware (чистый ASGI, метрики в памяти)
+и с пустым BaseHTTPMiddleware — нижняя граница прежней реализации, которая сверх
+этого делала три синхронных запроса в Redis. Варианты чередуются по раундам, чтобы
+прогрев и фоновая нагрузка влияли на всех одинаково; выводится медиана средних по
+раундам, p99 и добавка к варианту без middleware в микросекундах.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.performance_middleware import PerformanceMonitoringMiddleware
+from tests.benchmarks.bench_redis_cache import percentile
+
+
+class EmptyBaseHTTPMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def build_app(middleware=None) -> FastAPI:
+    bench = FastAPI()
+    if middleware is not None:
+        bench.add_middleware(middleware)
+
+    @bench.get("/partners/{partner_id}")
+    async def partner(partner_id: int):
+        return {"id": partner_id, "name": "bench"}
+
+    return bench
+
+
+async def run(app: FastAPI, requests: int) -> list:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(100):  # Прогрев
+            await client.get(f"/partners/{i}")
+        for i in range(requests):
+            started = time.perf_counter()
+            await client.get(f"/partners/{i % 500}")
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов на вариант в раунде")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = {
+        "no middleware": build_app(),
+        "pure ASGI metrics": build_app(PerformanceMonitoringMiddleware),
+        "empty BaseHTTPMiddleware": build_app(EmptyBaseHTTPMiddleware),
+    }
+    means = {name: [] for name in variants}
+    latencies = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, app in variants.items():
+            round_latencies = asyncio.run(run(app, args.requests))
+            means[name].append(statistics.mean(round_latencies))
+            latencies[name].extend(round_latencies)
+
+    baseline = statistics.median(means["no middleware"]) * 1e6
+    for name in variants:
+        mean = statistics.median(means[name]) * 1e6
+        print(
+            f"{name:26s} mean {mean:8.1f}us  p99 {percentile(latencies[name], 99) * 1e6:8.1f}us  "
+            f"overhead {mean - baseline:+7.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк: синхронный redis.Redis внутри async-методов vs RedisCache на redis.asyncio
+Для запуска (нужен работающий Redis):
+    REDIS_URL=redis://localhost:6379/0 python -m tests.benchmarks.bench_redis_cache
+
+Имитирует N одновременных запросов, каждый из которых делает чтение из кэша
+и небольшую асинхронную "работу". Сравнивается p50/p99 латентности запроса
+и максимальная задержка event loop.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from redis import Redis
+
+from app.core.cache import RedisCache
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class SyncRedisCache:
+    """Прежняя реализация: async-интерфейс поверх блокирующего клиента"""
+
+    def __init__(self, url: str):
+        self.redis = Redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str):
+        value = self.redis.get(key)
+        return json.loads(value) if value else None
+
+    async def close(self):
+        self.redis.close()
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.005):
+    """Замер задержки event loop: насколько позже запланированного просыпается корутина"""
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def run(cache, concurrency: int, requests_per_worker: int) -> dict:
+    latencies = []
+
+    async def worker(worker_id: int):
+        for i in range(requests_per_worker):
+            started = time.perf_counter()
+            await cache.get(f"bench:partner:{(worker_id + i) % 100}")
+            await asyncio.sleep(0.001)  # Остальная работа обработчика
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_loop_lag_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50, help="Запросов на одного воркера")
+    args = parser.parse_args()
+
+    seed = Redis.from_url(REDIS_URL, decode_responses=True)
+    payload = json.dumps({"id": 1, "name": "Partner", "cashback_rate": 5.0, "tags": ["cafe"] * 20})
+    for i in range(100):
+        seed.setex(f"bench:partner:{i}", 600, payload)
+
+    for name, cache in (("sync redis.Redis", SyncRedisCache(REDIS_URL)), ("redis.asyncio", RedisCache(REDIS_URL))):
+        await cache.get("bench:partner:0")  # Прогрев соединения
+        result = await run(cache, args.concurrency, args.requests)
+        await cache.close()
+        print(
+            f"{name:<18} requests={result['requests']} rps={result['rps']:.0f} "
+            f"p50={result['p50_ms']:.2f}ms p99={result['p99_ms']:.2f}ms "
+            f"max_loop_lag={result['max_loop_lag_ms']:.2f}ms"
+        )
+
+    seed.delete(*[f"bench:partner:{i}" for i in range(100)])
+    seed.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Бенчмарк: накладные расходы учёта участков запроса (app.core.request_timing)
+Для запуска (внешние сервисы не нужны, БД — SQLite в памяти):
+    python -m tests.benchmarks.bench_server_timing
+    python -m tests.benchmarks.bench_server_timing --requests 5000
+
+Эндпоинт в духе /qr/pay: зависимость авторизации (участок auth с запросом пользователя)
+и два запроса в обработчике, снаружи PerformanceMonitoringMiddleware. Варианты:
+учёт выключен (SERVER_TIMING_ENABLED=False), включён для внешнего клиента (только
+гистограмма) и для внутреннего (ещё и заголовок Server-Timing). Варианты чередуются
+по раундам; выводится медиана CPU процесса на запрос и добавка к варианту без учёта.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.core.database  # noqa: F401 — обработчики after_cursor_execute пишут участок db
+from app.core.config import settings
+from app.core.performance_middleware import PerformanceMonitoringMiddleware
+from app.core.request_timing import span
+
+
+def build_app() -> PerformanceMonitoringMiddleware:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE TABLE wallets (user_id INTEGER PRIMARY KEY, balance NUMERIC)"))
+        conn.execute(text("INSERT INTO users VALUES (1, 'bench')"))
+        conn.execute(text("INSERT INTO wallets VALUES (1, 100)"))
+    session_factory = sessionmaker(bind=engine)
+
+    def get_session():
+        with session_factory() as session:
+            yield session
+
+    async def current_user(db: Session = Depends(get_session)):
+        with span("auth"):
+            return db.execute(text("SELECT id, name FROM users WHERE id = 1")).one()
+
+    bench = FastAPI()
+
+    @bench.post("/qr/pay")
+    async def pay(user=Depends(current_user), db: Session = Depends(get_session)):
+        balance = db.execute(text("SELECT balance FROM wallets WHERE user_id = :id"), {"id": user.id}).scalar()
+        db.execute(text("SELECT count(*) FROM users"))
+        return {"user_id": user.id, "balance": float(balance), "status": "ok"}
+
+    return PerformanceMonitoringMiddleware(bench)
+
+
+async def cpu_per_request(asgi_app, requests: int, client_ip: str) -> float:
+    transport = httpx.ASGITransport(app=asgi_app, client=(client_ip, 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):  # Прогрев
+            await client.post("/qr/pay")
+        started = time.process_time()
+        for _ in range(requests):
+            await client.post("/qr/pay")
+        return (time.process_time() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов на вариант в раунде")
+    parser.add_argument("--rounds", type=int, default=7)
+    args = parser.parse_args()
+
+    asgi_app = build_app()
+    # (SERVER_TIMING_ENABLED, IP клиента)
+    variants = {
+        "timing off": (False, "203.0.113.5"),
+        "spans + histogram": (True, "203.0.113.5"),
+        "+ Server-Timing header": (True, "127.0.0.1"),
+    }
+    samples = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, (enabled, client_ip) in variants.items():
+            settings.SERVER_TIMING_ENABLED = enabled
+            samples[name].append(asyncio.run(cpu_per_request(asgi_app, args.requests, client_ip)))
+
+    baseline = statistics.median(samples["timing off"])
+    for name in variants:
+        cpu = statistics.median(samples[name])
+        print(f"{name:24s} CPU {cpu * 1e6:8.1f}us/request  overhead {(cpu - baseline) / baseline * 100:+5.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Бенчмарк: пространственный индекс точек партнёров (app.services.spatial_index.GridIndex)
+Для запуска (внешние сервисы не нужны):
+    python -m tests.benchmarks.bench_spatial_index
+    python -m tests.benchmarks.bench_spatial_index --sizes 10000 100000 --queries 500
+
+Точки равномерно по прямоугольнику Кыргызстана, запросы — из того же прямоугольника.
+Для каждого размера: время построения (GridIndex.from_points, как при полной загрузке),
+память индекса (tracemalloc), мкс на поиск в радиусе --radius км и на k ближайших против
+полного перебора (перебор — на --brute запросах, он линеен по числу точек). Результаты
+индекса сверяются с перебором.
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from app.services.spatial_index import GridIndex, choose_cell_km, haversine_km
+
+BBOX = (39.2, 43.3, 69.2, 80.3)  # min_lat, max_lat, min_lon, max_lon
+
+
+def random_point(rng: random.Random):
+    return rng.uniform(BBOX[0], BBOX[1]), rng.uniform(BBOX[2], BBOX[3])
+
+
+def brute_within(points, lat, lon, radius_km):
+    hits = []
+    for location_id, partner_id, point_lat, point_lon in points:
+        distance = haversine_km(lat, lon, point_lat, point_lon)
+        if distance <= radius_km:
+            hits.append((distance, location_id, partner_id))
+    hits.sort()
+    return hits
+
+
+def per_query_us(search, queries) -> float:
+    started = time.perf_counter()
+    for lat, lon in queries:
+        search(lat, lon)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def run(size: int, args):
+    rng = random.Random(size)
+    points = [(i, i % 5000, *random_point(rng)) for i in range(size)]
+    queries = [random_point(rng) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    grid = GridIndex.from_points(points, choose_cell_km(points))
+    build = time.perf_counter() - started
+    # Память — отдельным построением: под tracemalloc оно в разы медленнее
+    tracemalloc.start()
+    measured = GridIndex.from_points(points, grid.cell_km)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del measured
+
+    brute_queries = queries[:args.brute]
+    for lat, lon in brute_queries:
+        expected = brute_within(points, lat, lon, args.radius)
+        assert grid.within(lat, lon, args.radius) == expected
+        assert grid.nearest(lat, lon, args.k, max_km=1000) == brute_within(points, lat, lon, 1000)[:args.k]
+
+    within = statistics.median(per_query_us(lambda lat, lon: grid.within(lat, lon, args.radius), queries)
+                               for _ in range(3))
+    nearest = statistics.median(per_query_us(lambda lat, lon: grid.nearest(lat, lon, args.k, max_km=1000), queries)
+                                for _ in range(3))
+    brute = per_query_us(lambda lat, lon: brute_within(points, lat, lon, args.radius), brute_queries)
+    print(
+        f"{size:>8d} points  cell {grid.cell_km:5.2f} km  build {build:6.2f}s  memory {memory / 2 ** 20:7.1f} MiB  "
+        f"within {within:8.1f}us  knn({args.k}) {nearest:8.1f}us  brute {brute:11.1f}us  "
+        f"speedup x{brute / within:,.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000, help="Запросов к индексу")
+    parser.add_argument("--brute", type=int, default=5, help="Запросов полным перебором")
+    parser.add_argument("--radius", type=float, default=2.0, help="Радиус поиска, км")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,22 @@
 """
 Конфигурация pytest и общие фикстуры
 """
+import fakeredis
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app.core.config import settings
 from app.core.database import Base, get_db
+from app.core.local_cache import LocalCache
 from app.main import app
 
+# В тестах превышение бюджета SQL-запросов эндпоинта (DB_QUERY_BUDGETS) — ошибка
+settings.DB_QUERY_BUDGET_STRICT = True
+# Лимиты запросов проверяются отдельно (test_rate_limit); здесь они мешали бы сценариям
+settings.RATE_LIMIT_ENABLED = False
+
 
 # Тестовая база данных в памяти
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -52,5 +60,36 @@ def override_get_db(db_session):
 def client(override_get_db):
     """Тестовый клиент FastAPI"""
     from fastapi.testclient import TestClient
+    from app.core.coalescing import micro_cache
+
+    # Микро-кэш ответов живёт в процессе: ответы прошлых тестов — из другой БД
+    micro_cache.clear()
     return TestClient(app)
 
+
+
+@pytest.fixture
+def redis_cache():
+    """RedisCache поверх in-memory Redis с собственным L1"""
+    from app.core.cache import RedisCache
+
+    cache = RedisCache("redis://localhost:6379/15", local=LocalCache(prefixes=["partner:"]))
+    cache.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    return cache
+
+
+@pytest.fixture
+def cache_service(request, monkeypatch):
+    """
+    CacheService поверх общего in-memory Redis (sync + async клиенты)
+    Подставляется вместо глобального cache_service модулей из CACHE_SERVICE_MODULES тестового модуля
+    """
+    from app.services.cache_service import CacheService
+
+    server = fakeredis.FakeServer()
+    service = CacheService(redis_url="redis://localhost:6379/15", local=LocalCache(prefixes=["partner:"]))
+    service.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    service.async_redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    for module in getattr(request.module, "CACHE_SERVICE_MODULES", ()):
+        monkeypatch.setattr(module, "cache_service", service)
+    return service
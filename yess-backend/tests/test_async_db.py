@@ -0,0 +1,113 @@
+"""
+Тесты асинхронного пути к БД (AsyncEngine / AsyncSession)
+"""
+from decimal import Decimal
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base, _async_database_url, get_async_db
+from app.main import app
+from app.models.partner import Partner
+from app.models.partner_product import PartnerProduct
+from app.models.user import User
+from app.schemas.order import OrderItemCreate
+from app.services.order_service import OrderService
+
+
+@pytest_asyncio.fixture
+async def async_session_factory():
+    """aiosqlite в памяти; одно соединение (StaticPool) на весь тест"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_client(async_session_factory):
+    async def _get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = _get_async_db
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.clear()
+
+
+async def _seed(factory, *objects):
+    async with factory() as db:
+        db.add_all(objects)
+        await db.commit()
+
+
+def test_async_database_url():
+    assert _async_database_url("postgresql://u:p@db/yess") == "postgresql+asyncpg://u:p@db/yess"
+    assert _async_database_url("postgresql+psycopg2://u:p@db/yess") == "postgresql+asyncpg://u:p@db/yess"
+    assert _async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert _async_database_url("postgresql+asyncpg://db/yess") == "postgresql+asyncpg://db/yess"
+
+
+@pytest.mark.asyncio
+async def test_partners_list(async_session_factory, async_client):
+    await _seed(
+        async_session_factory,
+        Partner(name="Кафе", category="food", max_discount_percent=10, is_active=True),
+        Partner(name="Закрыт", category="food", max_discount_percent=10, is_active=False),
+        Partner(name="Аптека", category="pharmacy", max_discount_percent=5, is_active=True),
+    )
+
+    response = await async_client.get("/api/v1/partners/list", params={"category": "food"})
+
+    assert response.status_code == 200
+    assert [partner["name"] for partner in response.json()] == ["Кафе"]
+
+
+@pytest.mark.asyncio
+async def test_wallet_balance_creates_wallet_once(async_session_factory, async_client):
+    await _seed(async_session_factory, User(id=1, phone="+996700000001", is_active=True))
+
+    first = await async_client.get("/api/v1/wallet/balance", params={"user_id": 1})
+    second = await async_client.get("/api/v1/wallet/balance", params={"user_id": 1})
+
+    assert first.status_code == 200
+    assert first.json()["id"] == second.json()["id"]
+    assert Decimal(second.json()["yescoin_balance"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_acalculate_order_loads_products_in_one_query(async_session_factory):
+    partner = Partner(id=1, name="Кафе", category="food", max_discount_percent=10,
+                      cashback_rate=5, is_active=True)
+    products = [
+        PartnerProduct(id=i, partner_id=1, name=f"Товар {i}", price=Decimal("100.00"),
+                       discount_percent=0, is_available=True)
+        for i in range(1, 4)
+    ]
+    await _seed(async_session_factory, partner, *products)
+    items = [OrderItemCreate(product_id=i, quantity=2) for i in range(1, 4)]
+
+    statements = []
+    async with async_session_factory() as db:
+        sync_engine = db.bind.sync_engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(sync_engine, "before_cursor_execute", listener)
+        try:
+            calculation = await OrderService.acalculate_order(db, partner_id=1, items=items)
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert calculation["order_total"] == Decimal("600.00")
+    assert calculation["cashback_amount"] == Decimal("30.00")
+    assert sum("FROM partner_products" in statement for statement in statements) == 1
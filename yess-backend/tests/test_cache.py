@@ -0,0 +1,613 @@
+"""
+Тесты для слоя кэширования (RedisCache / CacheService)
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.core.cache import RedisCache
+from app.core.local_cache import LocalCache
+
+
+class TestRedisCache:
+    """Тесты асинхронного RedisCache"""
+
+    @pytest.mark.asyncio
+    async def test_set_and_get_roundtrip(self, redis_cache):
+        assert await redis_cache.set("partner:1", {"id": 1, "name": "Cafe"}, ttl=60)
+        assert await redis_cache.get("partner:1") == {"id": 1, "name": "Cafe"}
+
+    @pytest.mark.asyncio
+    async def test_specialized_helpers(self, redis_cache):
+        await redis_cache.cache_partner(7, {"id": 7})
+        cached = await redis_cache.get_cached_partner(7)
+        await redis_cache.invalidate_partner_cache(7)
+        after_invalidation = await redis_cache.get_cached_partner(7)
+        assert cached == {"id": 7}
+        assert after_invalidation is None
+
+    @pytest.mark.asyncio
+    async def test_increment_with_ttl_uses_single_pipeline(self, redis_cache):
+        await redis_cache.increment("counter", 2, ttl=30)
+        value = await redis_cache.increment("counter", 3, ttl=30)
+        ttl = await redis_cache.redis.ttl("counter")
+        assert value == 5
+        assert 0 < ttl <= 30
+
+    @pytest.mark.asyncio
+    async def test_disabled_cache_is_noop(self, redis_cache):
+        redis_cache.enabled = False
+
+        assert (await redis_cache.set("k", 1), await redis_cache.get("k")) == (False, None)
+
+    @pytest.mark.asyncio
+    async def test_connection_error_backs_off(self, redis_cache):
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        class BrokenRedis:
+            calls = 0
+
+            async def execute_command(self, *args, **options):
+                BrokenRedis.calls += 1
+                raise RedisConnectionError("down")
+
+        redis_cache.redis = BrokenRedis()
+
+        await redis_cache.get("a")
+        await redis_cache.get("b")
+        # После первой ошибки соединения кэш пропускается до истечения backoff
+        assert BrokenRedis.calls == 1
+
+
+class TestLocalCache:
+    """Тесты in-process L1 кэша"""
+
+    def test_evicts_least_recently_used_by_entry_count(self):
+        cache = LocalCache(max_entries=2, prefixes=["k"])
+        cache.set("k1", 1, size=1)
+        cache.set("k2", 2, size=1)
+        cache.get("k1")
+        cache.set("k3", 3, size=1)
+
+        assert cache.get("k1") == 1
+        assert cache.get("k2") is None
+        assert cache.get("k3") == 3
+
+    def test_evicts_by_total_bytes(self):
+        cache = LocalCache(max_bytes=100, prefixes=["k"])
+        cache.set("k1", "a", size=60)
+        cache.set("k2", "b", size=60)
+
+        assert cache.get("k1") is None
+        assert cache.get_stats()["bytes"] == 60
+
+    def test_expired_entry_is_miss(self, monkeypatch):
+        import app.core.local_cache as local_cache_module
+
+        now = [1000.0]
+        monkeypatch.setattr(local_cache_module.time, "monotonic", lambda: now[0])
+        cache = LocalCache(default_ttl=10, prefixes=["k"])
+        cache.set("k1", 1, size=1, ttl=3600)
+        now[0] += 11
+
+        assert cache.get("k1") is None
+
+    def test_stale_read_is_not_stored_after_invalidation(self):
+        cache = LocalCache(prefixes=["k"])
+        generation = cache.generation
+        cache.delete("k1")
+        cache.set("k1", "stale", size=1, generation=generation)
+
+        assert cache.get("k1") is None
+
+    def test_delete_pattern(self):
+        cache = LocalCache(prefixes=["partner"])
+        cache.set("partner:1", 1, size=1)
+        cache.set("partners:city:1", [], size=1)
+
+        assert cache.delete_pattern("partner:*") == 1
+        assert cache.get("partners:city:1") == []
+
+
+class TestTwoTierCache:
+    """Тесты связки L1 + Redis"""
+
+    @pytest.mark.asyncio
+    async def test_hot_key_is_served_from_l1(self, redis_cache):
+        await redis_cache.redis.set("partner:1", '{"id": 1}')
+        first = await redis_cache.get("partner:1")
+        await redis_cache.redis.delete("partner:1")
+        second = await redis_cache.get("partner:1")
+        assert (first, second) == ({"id": 1}, {"id": 1})
+        stats = redis_cache.get_stats()
+        assert stats["l1"]["hits"] == 1
+        assert stats["l2"]["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_non_hot_key_bypasses_l1(self, redis_cache):
+        await redis_cache.set("user:1", {"id": 1})
+        await redis_cache.get("user:1")
+        assert redis_cache.get_stats()["l1"]["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidation_is_published_to_other_workers(self, redis_cache):
+        other_worker = RedisCache("redis://localhost:6379/15", local=LocalCache(prefixes=["partner:"]))
+        other_worker.local.set("partner:42", {"id": 42}, size=10)
+
+        pubsub = redis_cache.redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(redis_cache.invalidation_channel)
+        await redis_cache.invalidate_partner_cache(42)
+        message = None
+        for _ in range(10):
+            message = await pubsub.get_message(timeout=0.1)
+            if message:
+                break
+        other_worker._apply_invalidation(message["data"])
+
+        assert other_worker.local.get("partner:42") is None
+
+    def test_own_invalidation_message_is_ignored(self, redis_cache):
+        redis_cache.local.set("partner:1", {"id": 1}, size=10)
+        redis_cache._apply_invalidation(redis_cache._invalidation_message(keys=["partner:1"]))
+
+        assert redis_cache.local.get("partner:1") == {"id": 1}
+
+
+class TestStampedeProtection:
+    """Тесты single-flight, блокировки и досрочного обновления"""
+
+    def test_concurrent_sync_misses_run_fetch_once(self, cache_service):
+        import threading
+        import time
+
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"partners": [1, 2, 3]}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache_service.get_or_set("partners:all", fetch, 60)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"partners": [1, 2, 3]}] * 10
+
+    @pytest.mark.asyncio
+    async def test_concurrent_async_misses_run_fetch_once(self, cache_service):
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return [1, 2]
+
+        results = await asyncio.gather(
+            *(cache_service.aget_or_set("partners:all", fetch, 60) for _ in range(20))
+        )
+        assert results == [[1, 2]] * 20
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_aget_or_set_accepts_sync_callable(self, cache_service):
+        first = await cache_service.aget_or_set("k", lambda: 42, 60)
+        second = await cache_service.aget_or_set("k", lambda: 0, 60)
+        assert (first, second) == (42, 42)
+        assert cache_service.get("k") == 42
+
+    def test_locked_key_returns_value_computed_elsewhere(self, cache_service, monkeypatch):
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "CACHE_LOCK_WAIT", 1.0)
+        cache_service.redis.set("lock:report", "other-process", px=5000)
+
+        def other_process_finishes():
+            import time
+            time.sleep(0.1)
+            cache_service.set("report", {"total": 10}, 60)
+
+        import threading
+        threading.Thread(target=other_process_finishes).start()
+
+        assert cache_service.get_or_set("report", lambda: {"total": -1}, 60) == {"total": 10}
+
+    def test_lock_is_released_after_compute(self, cache_service):
+        cache_service.get_or_set("report", lambda: 1, 60)
+        assert cache_service.redis.get("lock:report") is None
+
+    def test_early_refresh_near_expiry(self, cache_service):
+        import time
+
+        stored = cache_service._wrap("old", delta=1.0, expiry=60)
+        stored["e"] = time.time() + 0.001  # Почти истёк, вычисление дорогое
+        cache_service.redis.setex("report", 60, json.dumps(stored))
+
+        assert cache_service.get_or_set("report", lambda: "new", 60) == "new"
+
+    def test_no_early_refresh_when_disabled(self, cache_service):
+        cache_service.set("report", "plain", 60)
+        assert cache_service.get_or_set("report", lambda: "new", 60, beta=0) == "plain"
+
+    @pytest.mark.asyncio
+    async def test_cache_method_supports_async_functions(self, cache_service):
+        calls = []
+
+        @cache_service.cache_method(expiry=60)
+        async def load(partner_id):
+            calls.append(partner_id)
+            return {"id": partner_id}
+
+        assert (await load(1), await load(1)) == ({"id": 1}, {"id": 1})
+        assert calls == [1]
+
+
+class TestCacheKeys:
+    """Тесты детерминированных ключей и версий пространств имён"""
+
+    def test_key_is_stable_across_processes(self, cache_service):
+        import subprocess
+        import sys
+
+        code = (
+            "from app.services.cache_service import cache_service;"
+            "print(cache_service._generate_cache_key('f', ('a', 1), {'b': {2, 3}}, 'ns', 7))"
+        )
+        keys = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True, text=True, env={**__import__("os").environ, "PYTHONHASHSEED": seed}
+            ).stdout.strip().splitlines()[-1]
+            for seed in ("1", "2")
+        }
+
+        assert len(keys) == 1
+        assert keys.pop() == cache_service._generate_cache_key("f", ("a", 1), {"b": {3, 2}}, "ns", 7)
+
+    def test_kwargs_order_does_not_change_key(self, cache_service):
+        first = cache_service._generate_cache_key("f", (), {"a": 1, "b": 2})
+        second = cache_service._generate_cache_key("f", (), {"b": 2, "a": 1})
+        assert first == second
+
+    @pytest.mark.asyncio
+    async def test_method_self_and_session_are_not_part_of_key(self, cache_service):
+        from sqlalchemy.orm import Session
+
+        calls = []
+
+        class Service:
+            def __init__(self, db):
+                self.db = db
+
+            @cache_service.cache_method(expiry=60, namespace="reports")
+            async def report(self, user_id: int):
+                calls.append(user_id)
+                return {"user_id": user_id}
+
+        @cache_service.cache_method(expiry=60, namespace="reports")
+        def load(db, user_id):
+            calls.append(user_id)
+            return user_id
+
+        await Service(Session()).report(1)
+        await Service(Session()).report(1)
+        load(Session(), 5)
+        load(Session(), 5)
+
+        assert calls == [1, 5]
+
+    def test_invalidate_namespace_switches_version(self, cache_service):
+        calls = []
+
+        @cache_service.cache_method(expiry=60, namespace="reports")
+        def load(value):
+            calls.append(value)
+            return value
+
+        load(1)
+        load(1)
+        cache_service.invalidate_namespace("reports")
+        load(1)
+
+        assert calls == [1, 1]
+
+    @pytest.mark.asyncio
+    async def test_db_error_fallback_is_not_cached(self, cache_service, monkeypatch):
+        from app.services import achievement_service as module
+
+        # Декоратор привязан к глобальному сервису — подменяем его клиенты Redis
+        monkeypatch.setattr(module.cache_service, "redis", cache_service.redis)
+        monkeypatch.setattr(module.cache_service, "async_redis", cache_service.async_redis)
+
+        class FlakyDB:
+            calls = 0
+
+            def execute(self, *args, **kwargs):
+                FlakyDB.calls += 1
+                if FlakyDB.calls == 1:
+                    raise RuntimeError("connection reset")
+                return type("Result", (), {"fetchall": lambda self: [(1, "alice", 10, 20, 2, 1)]})()
+
+        service = module.AchievementService(FlakyDB())
+
+        failed, *served = [await service.get_leaderboard(5) for _ in range(3)]
+        assert failed == []
+        assert served == [[{"user_id": 1, "username": "alice", "achievement_points": 10,
+                            "total_points": 20, "achievements_count": 2, "rank": 1}]] * 2
+        assert FlakyDB.calls == 2  # Третий вызов — из кэша
+
+    def test_unhashable_argument_skips_cache(self, cache_service):
+        calls = []
+
+        @cache_service.cache_method(expiry=60)
+        def load(obj):
+            calls.append(obj)
+            return 1
+
+        marker = object()
+        load(marker)
+        load(marker)
+
+        assert len(calls) == 2
+
+
+class TestInvalidation:
+    """Инвалидация по тегам и шаблонам без KEYS"""
+
+    @pytest.mark.asyncio
+    async def test_partner_invalidation_drops_lists_with_partner(self, redis_cache):
+        await redis_cache.cache_partner(7, {"id": 7})
+        await redis_cache.cache_partners_list(1, [{"id": 7}, {"id": 8}])
+        await redis_cache.cache_partners_list(2, [{"id": 8}])
+        await redis_cache.invalidate_partner_cache(7)
+        cached = (
+            await redis_cache.get_cached_partner(7),
+            await redis_cache.get_cached_partners_list(1),
+            await redis_cache.get_cached_partners_list(2),
+        )
+        assert cached == (None, None, [{"id": 8}])
+
+    def test_tag_invalidation_in_batches(self, cache_service, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "CACHE_INVALIDATION_BATCH", 3)
+
+        for i in range(10):
+            cache_service.set(f"report:{i}", i, expiry=60, tags=["reports"])
+        cache_service.set("report:other", 1, expiry=60)
+
+        assert cache_service.invalidate_tag("reports") == 10
+        assert cache_service.redis.exists("tag:reports") == 0
+        assert cache_service.get("report:other") == 1
+
+    def test_tag_set_outlives_entries(self, cache_service):
+        cache_service.set("report:1", 1, expiry=60, tags=["reports"])
+        assert cache_service.redis.ttl("tag:reports") >= 60
+
+    def test_delete_pattern_does_not_use_keys(self, cache_service, monkeypatch):
+        def forbidden(*args, **kwargs):
+            raise AssertionError("KEYS must not be used")
+
+        monkeypatch.setattr(cache_service.redis, "keys", forbidden)
+        for i in range(5):
+            cache_service.set(f"user:{i}", i, expiry=60)
+        cache_service.set("partner:1", 1, expiry=60)
+
+        assert cache_service.delete_pattern("user:*") == 5
+        assert cache_service.get("partner:1") == 1
+
+    @pytest.mark.asyncio
+    async def test_clear_pattern_async(self, redis_cache):
+        for i in range(5):
+            await redis_cache.set(f"user:{i}", i, ttl=60)
+        deleted = await redis_cache.clear_pattern("user:*")
+        assert (deleted, await redis_cache.get("user:0")) == (5, None)
+
+    def test_namespace_version_cached_only_while_subscribed(self, cache_service):
+        from app.services.cache_service import CacheService
+
+        other_worker = CacheService(redis_url="redis://localhost:6379/15", local=LocalCache(prefixes=["partner:"]))
+        other_worker.redis = cache_service.redis
+        version = cache_service.get_namespace_version("reports")
+
+        # Слушатель не запущен: INCR другого воркера виден сразу, а не через TTL L1
+        other_worker.invalidate_namespace("reports")
+        assert cache_service.get_namespace_version("reports") == version + 1
+        assert cache_service.local.get("cache:ns:reports") is None
+
+        # Подписка активна: версия из L1, сбрасывается сообщением инвалидации
+        cache_service.local.subscribed = True
+        assert cache_service.get_namespace_version("reports") == version + 1
+        cache_service.redis.incr("cache:ns:reports")
+        assert cache_service.get_namespace_version("reports") == version + 1
+        cache_service.local.subscribed = False
+        assert cache_service.get_namespace_version("reports") == version + 2
+
+    def test_group_by_slot_single_node_passthrough(self, cache_service):
+        from app.core.cache_invalidation import group_by_slot
+        assert group_by_slot(cache_service.redis, ["a", "b"]) == [["a", "b"]]
+
+
+class TestCacheCodec:
+    """Бинарный формат значений с байтом заголовка"""
+
+    PARTNERS = [{"id": i, "name": f"Partner {i}", "cashback_rate": 5.0, "is_active": True} for i in range(200)]
+
+    @pytest.mark.parametrize("serializer", ["json", "msgpack"])
+    @pytest.mark.parametrize("compression", ["zstd", "lz4", "none"])
+    def test_roundtrip(self, serializer, compression):
+        from app.core.cache_codec import CacheCodec
+
+        codec = CacheCodec(serializer=serializer, compression=compression, threshold=256)
+        data = codec.encode(self.PARTNERS)
+
+        assert data[0] < 0x10
+        assert codec.decode(data) == self.PARTNERS
+
+    def test_small_values_are_not_compressed(self):
+        from app.core.cache_codec import CacheCodec, COMPRESSION_ZSTD
+
+        codec = CacheCodec(serializer="json", compression="zstd", threshold=1024)
+        assert not codec.encode({"id": 1})[0] & COMPRESSION_ZSTD
+        assert codec.encode(self.PARTNERS)[0] & COMPRESSION_ZSTD
+
+    def test_legacy_json_entries_stay_readable(self):
+        from app.core.cache_codec import CacheCodec
+
+        codec = CacheCodec(serializer="msgpack", compression="zstd")
+        assert codec.decode(json.dumps({"id": 1}).encode()) == {"id": 1}
+        assert codec.decode(b"[1, 2]") == [1, 2]
+
+    def test_corrupted_entry_raises_codec_error(self):
+        from app.core.cache_codec import CacheCodec, CacheCodecError
+
+        with pytest.raises(CacheCodecError):
+            CacheCodec().decode(b"\x05not-zstd")
+
+    def test_cache_service_stores_compressed_bytes(self, cache_service):
+        from app.core.cache_codec import raw_get
+
+        cache_service.set("partners:city:1", self.PARTNERS, expiry=60)
+        stored = raw_get(cache_service.redis, "partners:city:1")
+
+        assert len(stored) < len(json.dumps(self.PARTNERS))
+        assert cache_service.get("partners:city:1") == self.PARTNERS
+
+
+class TestBatchOperations:
+    """MGET / pipelined SETEX и пакетная загрузка промахов"""
+
+    def test_set_many_with_per_key_ttl(self, cache_service):
+        cache_service.set_many({"a": 1, "b": {"x": 2}}, expiry={"a": 30, "b": 90})
+
+        assert cache_service.get_many(["a", "b", "missing"]) == {"a": 1, "b": {"x": 2}}
+        assert 0 < cache_service.redis.ttl("a") <= 30
+        assert 30 < cache_service.redis.ttl("b") <= 90
+
+    def test_get_many_reads_l1_and_unwraps_envelopes(self, cache_service):
+        cache_service.get_or_set("report", lambda: [1, 2], expiry=60)
+        cache_service.set("partner:1", {"id": 1}, expiry=60)
+        cache_service.redis.delete("partner:1")  # Остаётся только в L1
+
+        assert cache_service.get_many(["report", "partner:1"]) == {"report": [1, 2], "partner:1": {"id": 1}}
+
+    def test_load_many_fetches_only_misses(self, cache_service):
+        batches = []
+
+        def fetch(ids):
+            batches.append(sorted(ids))
+            return {i: {"id": i} for i in ids if i != 404}
+
+        key = lambda i: f"entity:{i}"
+        cache_service.set(key(1), {"id": 1}, expiry=60)
+
+        first = cache_service.load_many([1, 2, 3, 404, 2], key, fetch, expiry=60, tags_func=lambda i: [f"entity:{i}"])
+        second = cache_service.load_many([1, 2, 3], key, fetch, expiry=60)
+
+        assert first == {1: {"id": 1}, 2: {"id": 2}, 3: {"id": 3}}
+        assert second == {1: {"id": 1}, 2: {"id": 2}, 3: {"id": 3}}
+        assert batches == [[2, 3, 404]]
+        assert cache_service.redis.sismember("tag:entity:2", "entity:2")
+
+    @pytest.mark.asyncio
+    async def test_aload_many_with_async_fetch(self, cache_service):
+        async def fetch(ids):
+            return {i: i * 10 for i in ids}
+
+        await cache_service.aload_many([1, 2], lambda i: f"n:{i}", fetch, expiry=60)
+        assert await cache_service.aget_many(["n:1", "n:2"]) == {"n:1": 10, "n:2": 20}
+
+    @pytest.mark.asyncio
+    async def test_redis_cache_get_many_set_many(self, redis_cache):
+        await redis_cache.set_many({"partner:1": {"id": 1}, "user:1": {"id": 1}}, ttl=60, tags={"partner:1": ["partner:1"]})
+        redis_cache.local.clear()
+        assert await redis_cache.get_many(["partner:1", "user:1", "user:2"]) == {"partner:1": {"id": 1}, "user:1": {"id": 1}}
+        assert redis_cache.local.get("partner:1") == {"id": 1}
+
+    def test_entity_cache_single_in_query(self, cache_service, db_session, monkeypatch):
+        from sqlalchemy import event
+        from app.models.city import City
+        from app.services import entity_cache
+
+        monkeypatch.setattr(entity_cache, "cache_service", cache_service)
+        db_session.add_all([City(id=1, name="Бишкек"), City(id=2, name="Ош")])
+        db_session.flush()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            first = entity_cache.EntityCache.get_many(db_session, "city", [1, 2, None, 1])
+            second = entity_cache.EntityCache.get_many(db_session, "city", [1, 2])
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+        assert first == second == {1: {"id": 1, "name": "Бишкек"}, 2: {"id": 2, "name": "Ош"}}
+        assert len(statements) == 1
+        assert " IN " in statements[0].upper()
+
+
+class TestCacheMetrics:
+    """Метрики Prometheus по пространствам имён"""
+
+    @staticmethod
+    def sample(name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_namespace_of(self):
+        from app.core.cache_metrics import namespace_of
+
+        assert namespace_of("partner:42") == "partner"
+        assert namespace_of("partners:city:1") == "partners"
+        assert namespace_of("cache:achievements:v3:get_user_stats:abc") == "cache:achievements"
+        assert namespace_of(b"tag:partner:1") == "tag:partner"
+        assert namespace_of("no-colon") == "other"
+
+    def test_hits_misses_and_bytes_by_namespace(self, cache_service):
+        hits = self.sample("cache_hits_total", cache="cache_service", namespace="report", tier="l2")
+        misses = self.sample("cache_misses_total", cache="cache_service", namespace="report")
+        written = self.sample("cache_bytes_total", cache="cache_service", namespace="report", direction="written")
+
+        cache_service.set("report:1", {"a": 1}, expiry=60)
+        cache_service.get("report:1")
+        cache_service.get("report:2")
+
+        assert self.sample("cache_hits_total", cache="cache_service", namespace="report", tier="l2") == hits + 1
+        assert self.sample("cache_misses_total", cache="cache_service", namespace="report") == misses + 1
+        assert self.sample("cache_bytes_total", cache="cache_service", namespace="report", direction="written") > written
+        assert self.sample("cache_operation_duration_seconds_count", cache="cache_service", namespace="report", operation="get") >= 2
+
+    def test_errors_are_counted(self, cache_service):
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        def broken(*args, **kwargs):
+            raise RedisConnectionError("down")
+
+        before = self.sample("cache_errors_total", cache="cache_service", namespace="report", operation="get")
+        cache_service.redis.execute_command = broken
+        assert cache_service.get("report:1") is None
+        assert self.sample("cache_errors_total", cache="cache_service", namespace="report", operation="get") == before + 1
+
+    def test_pool_stats_include_utilization(self, cache_service):
+        stats = cache_service.get_pool_stats()
+        assert {"in_use_connections", "available_connections", "max_connections", "utilization"} <= set(stats)
+        assert "async" in stats
+
+    @pytest.mark.asyncio
+    async def test_sample_memory_usage_groups_by_namespace(self, redis_cache):
+        from app.core.cache_metrics import sample_memory_usage
+
+        for i in range(5):
+            await redis_cache.redis.set(f"partner:{i}", "x" * 100)
+        await redis_cache.redis.set("user:1", "x")
+        report = await sample_memory_usage(redis_cache.redis, sample_size=100)
+        assert report["total_keys"] == 6
+        assert report["namespaces"][0]["namespace"] == "partner"
+        assert report["namespaces"][0]["estimated_keys"] == 5
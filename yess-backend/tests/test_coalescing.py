@@ -0,0 +1,101 @@
+"""
+Тесты объединения одинаковых анонимных GET (app.core.coalescing)
+"""
+import asyncio
+from typing import Optional
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app.core.coalescing import CoalescedRoute, coalesce, micro_cache
+
+
+def make_app(ttl: float = 0.0):
+    calls = []
+    release = asyncio.Event()
+    router = APIRouter(route_class=CoalescedRoute)
+
+    @router.get("/partners/list")
+    @coalesce(ttl=ttl)
+    async def partners(category: Optional[str] = None):
+        calls.append(category)
+        await release.wait()
+        return [{"category": category}]
+
+    @router.get("/profile")
+    async def profile():
+        calls.append("profile")
+        await release.wait()
+        return {"user": len(calls)}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    return app, calls, release
+
+
+async def gather_with_release(release, *requests):
+    tasks = [asyncio.ensure_future(request) for request in requests]
+    await asyncio.sleep(0.05)
+    release.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_identical_anonymous_requests_run_handler_once():
+    micro_cache.clear()
+    app, calls, release = make_app()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await gather_with_release(
+            release,
+            *(client.get("/api/v1/partners/list?category=food&_=%d" % i) for i in range(5)),
+            client.get("/api/v1/partners/list?category=cafe"),
+            client.get("/api/v1/partners/list?category=food", headers={"Authorization": "Bearer token"}),
+            client.get("/api/v1/profile"),
+            client.get("/api/v1/profile"),
+        )
+    assert all(response.status_code == 200 for response in responses)
+    assert [response.json() for response in responses[:5]] == [[{"category": "food"}]] * 5
+    # Лишний query-параметр не мешает объединению; другой category, Authorization
+    # и неотмеченный маршрут выполняются отдельно
+    assert sorted(calls, key=str) == ["cafe", "food", "food", "profile", "profile"]
+
+
+@pytest.mark.asyncio
+async def test_micro_ttl_serves_finished_response():
+    micro_cache.clear()
+    app, calls, release = make_app(ttl=1.0)
+    release.set()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.get("/api/v1/partners/list?category=food")
+        second = await client.get("/api/v1/partners/list?category=food")
+        conditional = await client.get("/api/v1/partners/list?category=food", headers={"If-None-Match": '"v1"'})
+    assert first.content == second.content and second.headers["content-length"] == first.headers["content-length"]
+    # If-None-Match входит в ключ: ответ с другим условием не берётся из микро-кэша
+    assert conditional.status_code == 200
+    assert calls == ["food", "food"]
+
+
+@pytest.mark.asyncio
+async def test_follower_retries_when_leader_cancelled():
+    micro_cache.clear()
+    app, calls, release = make_app()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        leader = asyncio.ensure_future(client.get("/api/v1/partners/list?category=food"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(client.get("/api/v1/partners/list?category=food"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        response = await follower
+    # Отмена лидера не отменяет ожидающего: он выполняет обработчик сам
+    assert response.status_code == 200
+    assert response.json() == [{"category": "food"}]
+    assert calls == ["food", "food"]
@@ -0,0 +1,95 @@
+"""
+Тесты сжатия ответов (app.core.compression): согласование кодировки, порог размера,
+кэш предсжатых тел и бюджет CPU
+"""
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+
+from app.core import compression
+from app.core.compression import (
+    CompressionBudget,
+    CompressionMiddleware,
+    PrecompressedCache,
+    negotiate,
+)
+
+PARTNERS = [{"id": i, "name": f"Partner {i}", "category": "cafe", "cashback_rate": 5.0} for i in range(200)]
+
+
+def build_app(budget: float = 1.0):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, cache=PrecompressedCache(), budget=CompressionBudget(budget))
+
+    @app.get("/partners")
+    async def partners():
+        return PARTNERS
+
+    @app.get("/partners/{partner_id}")
+    async def partner(partner_id: int):
+        return {"id": partner_id}
+
+    @app.get("/versioned")
+    async def versioned(response: Response):
+        response.headers["ETag"] = '"partners-1"'
+        return PARTNERS
+
+    return app
+
+
+async def _get(app, *paths, encoding="gzip"):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.get(path, headers={"Accept-Encoding": encoding}) for path in paths]
+
+
+def _middleware(app) -> CompressionMiddleware:
+    layer = app.middleware_stack
+    while not isinstance(layer, CompressionMiddleware):
+        layer = layer.app
+    return layer
+
+
+def test_negotiate():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, deflate") is None
+    assert negotiate("identity") is None
+    assert negotiate("*") in ("br", "gzip")
+    if compression.brotli is not None:
+        assert negotiate("gzip, br") == "br"
+
+
+@pytest.mark.asyncio
+async def test_large_json_is_compressed_small_is_not():
+    large, small = await _get(build_app(), "/partners", "/partners/1")
+
+    assert large.headers["Content-Encoding"] == "gzip"
+    assert large.json() == PARTNERS
+    assert int(large.headers["Content-Length"]) < len(large.content) // 3
+    assert "Accept-Encoding" in large.headers["Vary"]
+    assert "Content-Encoding" not in small.headers
+    assert "Accept-Encoding" in small.headers["Vary"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_content_is_compressed_once(monkeypatch):
+    calls = []
+    original = compression.compress
+    monkeypatch.setattr(compression, "compress", lambda body, encoding: calls.append(encoding) or original(body, encoding))
+    app = build_app()
+
+    responses = await _get(app, "/partners", "/partners", "/versioned", "/versioned")
+
+    assert all(r.json() == PARTNERS for r in responses)
+    # Одно сжатие на тело /partners (ключ — хэш) и одно на ETag /versioned
+    assert calls == ["gzip", "gzip"]
+    assert _middleware(app).cache.get_stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_sends_identity():
+    app = build_app(budget=0.0)
+    response, = await _get(app, "/partners")
+
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == PARTNERS
@@ -0,0 +1,86 @@
+"""
+Тесты маршрутизации чтения на реплики (app.core.db_replicas)
+"""
+import time
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.db_replicas import Replica, ReplicaSet, RoutingSession, on_replica, parse_lsn
+from app.models.city import City
+
+
+def _engine(city_name: str):
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    City.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(City.__table__.insert().values(id=1, name=city_name))
+    return engine
+
+
+@pytest.fixture
+def routing():
+    """primary и реплика — разные базы: по имени города видно, куда ушёл запрос"""
+    primary = _engine("primary")
+    replica = Replica("replica", _engine("replica"), async_engine=None)
+    replica.lag, replica.replay_lsn, replica.checked_at = 0.0, parse_lsn("0/100"), time.monotonic()
+    replica_set = ReplicaSet([replica], max_lag=5.0, check_interval=60)
+
+    class Routing(RoutingSession):
+        replicas = replica_set
+
+    yield sessionmaker(bind=primary, class_=Routing, autoflush=False), replica
+    primary.dispose()
+    replica.engine.dispose()
+
+
+def _city_name(db, statement=None):
+    return db.scalar(statement if statement is not None else select(City.name).where(City.id == 1))
+
+
+def test_parse_lsn():
+    assert parse_lsn("16/B374D848") == (0x16 << 32) + 0xB374D848
+    assert parse_lsn("0/200") > parse_lsn("0/1FF")
+    assert parse_lsn(None) == parse_lsn("garbage") == 0
+
+
+def test_read_only_session_reads_from_replica_until_write(routing):
+    factory, _ = routing
+    with factory(info={"read_only": True}) as db:
+        assert _city_name(db) == "replica"
+        db.add(City(id=2, name="Ош"))
+        db.flush()
+        # После записи — только primary, чтобы видеть свои изменения
+        assert _city_name(db) == "primary"
+
+
+def test_explicitly_marked_queries(routing):
+    factory, _ = routing
+    with factory() as db:
+        assert _city_name(db) == "primary"
+        assert _city_name(db, on_replica(select(City.name))) == "replica"
+        assert db.query(City.name).execution_options(replica=True).scalar() == "replica"
+        assert _city_name(db, on_replica(select(City.name)).with_for_update()) == "primary"
+
+
+def test_lagging_or_stale_replica_falls_back_to_primary(routing):
+    factory, replica = routing
+    replica.lag = 30.0
+    with factory(info={"read_only": True}) as db:
+        assert _city_name(db) == "primary"
+
+    replica.lag, replica.checked_at = 0.0, time.monotonic() - 3600
+    with factory(info={"read_only": True}) as db:
+        assert _city_name(db) == "primary"
+
+
+def test_read_your_writes_token(routing):
+    factory, _ = routing
+    with factory(info={"read_only": True, "min_lsn": parse_lsn("0/200")}) as db:
+        assert _city_name(db) == "primary"
+    with factory(info={"read_only": True, "min_lsn": parse_lsn("0/100")}) as db:
+        assert _city_name(db) == "replica"
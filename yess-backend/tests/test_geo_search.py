@@ -0,0 +1,79 @@
+"""
+Тесты поиска в радиусе сырым SQL (app.services.geo_search)
+"""
+import random
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.models.partner import Partner, PartnerLocation
+from app.services.geo_search import BBOX, EARTHDISTANCE, POSTGIS, GeoFilter, geo_filter, search_strategy
+from app.services.spatial_index import haversine_km
+
+
+def test_bbox_prefilter_matches_exact_distance(db_session):
+    rng = random.Random(3)
+    points = {i: (rng.uniform(42.7, 43.0), rng.uniform(74.4, 74.8)) for i in range(1, 301)}
+    db_session.add_all([
+        Partner(id=i, name=f"Партнёр {i}", max_discount_percent=10, latitude=lat, longitude=lon)
+        for i, (lat, lon) in points.items()
+    ])
+    db_session.add(Partner(id=1000, name="Без координат", max_discount_percent=10))
+    db_session.commit()
+
+    assert search_strategy(db_session) == BBOX
+    lat, lon, radius = 42.87, 74.6, 4.0
+    geo = geo_filter(db_session, lat, lon, radius)
+    rows = db_session.execute(text(
+        f"SELECT p.id, p.latitude, p.longitude, {geo.distance()} AS distance FROM partners p WHERE {geo.where()}"
+    ), geo.params()).fetchall()
+
+    expected = sorted(
+        (haversine_km(lat, lon, point_lat, point_lon), i) for i, (point_lat, point_lon) in points.items()
+    )
+    expected = [i for distance, i in expected if distance <= radius]
+    # Прямоугольник шире круга: точное расстояние отсекает углы
+    assert len(rows) > len(expected)
+    assert [row.id for row, _ in geo.refine(rows)] == expected
+    assert [row.id for row, _ in geo.refine(rows, limit=5)] == expected[:5]
+    assert len(geo.refine(rows, limit=5, by_distance=False)) == 5
+
+
+def test_search_partners_runs_bbox_query(db_session):
+    from app.models.city import City
+    from app.services.geolocation_service import GeolocationService, PartnerCategory
+
+    db_session.add(City(id=1, name="Бишкек"))
+    db_session.add_all([
+        Partner(id=1, name="Cafe Central", category="cafe", city_id=1, max_discount_percent=15,
+                latitude=42.8746, longitude=74.5698),
+        Partner(id=2, name="Cafe Far", category="cafe", max_discount_percent=20, latitude=42.95, longitude=74.70),
+        # Угол прямоугольника: внутри bbox, но дальше радиуса
+        Partner(id=3, name="Cafe Corner", category="bakery", max_discount_percent=30,
+                latitude=42.8746 + 0.025, longitude=74.5698 + 0.034),
+        Partner(id=4, name="Pharmacy", category="health", max_discount_percent=5, latitude=42.875, longitude=74.57),
+    ])
+    db_session.add(PartnerLocation(partner_id=1, address="ул. Киевская, 1", is_main_location=True))
+    db_session.commit()
+
+    partners = GeolocationService(db_session).search_partners("cafe", 42.8746, 74.5698, radius_km=3.0)
+
+    assert [partner.id for partner in partners] == [1]
+    found = partners[0]
+    assert found.category == PartnerCategory.CAFE and found.location.city == "Бишкек"
+    assert found.location.address == "ул. Киевская, 1" and found.distance < 0.01
+    assert found.discount_percent == 15.0
+    # Без координат — поиск только по тексту; неизвестная категория не роняет выдачу
+    assert [partner.id for partner in GeolocationService(db_session).search_partners("cafe")] == [3, 2, 1]
+
+
+def test_index_strategies_sql(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "GEO_SEARCH_STRATEGY", POSTGIS)
+    postgis = geo_filter(db_session, 42.87, 74.6, 2.0)
+    assert postgis.exact and postgis.where().startswith("ST_DWithin(p.geog,")
+    assert postgis.order().startswith("p.geog <->")
+    assert postgis.params() == {"geo_lat": 42.87, "geo_lon": 74.6, "geo_radius_m": 2000.0}
+
+    earth = GeoFilter(EARTHDISTANCE, 42.87, 74.6, 2.0, alias="pl")
+    assert "earth_box(ll_to_earth(:geo_lat, :geo_lon), :geo_radius_m) @> ll_to_earth(pl.latitude" in earth.where()
+    assert earth.order() == earth.distance()
@@ -0,0 +1,113 @@
+"""
+Тесты условных GET (app.core.http_cache): ETag из версий содержимого, 304 до обработчика,
+повышение версий по commit сессии
+"""
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import http_cache
+from app.core.error_handler import setup_error_handlers
+from app.core.http_cache import conditional_get, etag_matches, namespace_key
+from app.models.partner import Partner
+from app.models.story import Story
+from app.services import entity_cache
+
+
+CACHE_SERVICE_MODULES = [http_cache, entity_cache]
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.asyncio
+async def test_not_modified_skips_handler(cache_service):
+    app = FastAPI()
+    setup_error_handlers(app)
+    calls = []
+
+    @app.get("/partners/list", dependencies=[conditional_get("partners", cache_control="public, max-age=60")])
+    async def partners():
+        calls.append(1)
+        return [{"id": 1}]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.get("/partners/list")
+        etag = first.headers["ETag"]
+        cached = await client.get("/partners/list", headers={"If-None-Match": etag})
+        cache_service.invalidate_namespace(namespace_key("partners"))
+        changed = await client.get("/partners/list", headers={"If-None-Match": etag})
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "public, max-age=60"
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == first.headers["ETag"]
+    assert changed.status_code == 200 and changed.headers["ETag"] != first.headers["ETag"]
+    assert len(calls) == 2
+
+
+def test_commit_bumps_content_versions(cache_service, db_session):
+    def version(content):
+        return cache_service.get_namespace_version(namespace_key(content))
+
+    partners, stories = version("partners"), version("stories")
+    story = Story(title="Акция", image_url="/s.png", expires_at=datetime.utcnow() + timedelta(days=1))
+    db_session.add_all([Partner(name="Кафе", max_discount_percent=10), story])
+    db_session.commit()
+    assert version("partners") > partners
+    stories_after_create = version("stories")
+    assert stories_after_create > stories
+
+    # Счётчик просмотров — не изменение содержимого
+    story.views_count = (story.views_count or 0) + 1
+    db_session.commit()
+    assert version("stories") == stories_after_create
+
+    story.title = "Новая акция"
+    db_session.commit()
+    assert version("stories") > stories_after_create
+
+
+@pytest.mark.asyncio
+async def test_commit_on_event_loop_bumps_versions_in_background(cache_service, db_session, monkeypatch):
+    # Синхронный клиент на потоке event loop не используется
+    monkeypatch.setattr(cache_service, "invalidate_namespace", None)
+    before = cache_service.get_namespace_version(namespace_key("partners"))
+
+    db_session.add(Partner(name="Кафе", max_discount_percent=10))
+    db_session.commit()
+    await cache_service.drain_background()
+    assert await cache_service.aget_namespace_version(namespace_key("partners")) > before
+
+
+def test_commit_drops_entity_summaries(cache_service, db_session):
+    from app.models.city import City
+    from app.services.entity_cache import EntityCache
+
+    db_session.add_all([
+        Partner(id=1, name="Кафе", max_discount_percent=10),
+        Partner(id=2, name="Бар", max_discount_percent=10),
+        City(id=1, name="Бишкек"),
+    ])
+    db_session.commit()
+
+    def names(entity, *ids):
+        summaries = EntityCache.get_many(db_session, entity, ids)
+        return [summaries[entity_id]["name"] for entity_id in ids]
+
+    assert names("partner", 1, 2) == ["Кафе", "Бар"] and names("city", 1) == ["Бишкек"]
+    db_session.get(Partner, 1).name = "Кофейня"
+    db_session.get(City, 1).name = "Ош"
+    db_session.commit()
+    assert names("partner", 1, 2) == ["Кофейня", "Бар"] and names("city", 1) == ["Ош"]
+
+    # query.update: id неизвестны — сбрасываются все краткие представления партнёров
+    db_session.query(Partner).filter(Partner.id == 2).update({"name": "Паб"})
+    db_session.commit()
+    assert names("partner", 1, 2) == ["Кофейня", "Паб"]
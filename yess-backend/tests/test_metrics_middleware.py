@@ -0,0 +1,88 @@
+"""
+Тесты HTTP-метрик (app.core.performance_middleware): метки по шаблону маршрута, in-flight
+"""
+import httpx
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core.performance_middleware import UNMATCHED_ROUTE, PerformanceMonitoringMiddleware
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(PerformanceMonitoringMiddleware)
+    in_progress = []
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        in_progress.append(_sample("http_requests_in_progress", method="GET", endpoint="/items/{item_id}"))
+        return {"id": item_id}
+
+    return app, in_progress
+
+
+async def _get(app, *paths):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return [await client.get(path) for path in paths]
+
+
+@pytest.mark.asyncio
+async def test_requests_are_labeled_by_route_template():
+    app, in_progress = _app()
+    labels = {"method": "GET", "endpoint": "/items/{item_id}"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+    ok_before = _sample("http_requests_total", status="200", **labels)
+
+    responses = await _get(app, "/items/1", "/items/2")
+
+    assert all("X-Process-Time" in response.headers for response in responses)
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert _sample("http_requests_total", status="200", **labels) == ok_before + 2
+    assert _sample("http_requests_total", method="GET", endpoint="/items/1", status="200") == 0
+    # Во время обработки запрос виден в in-flight, после — нет
+    assert in_progress == [1, 1]
+    assert _sample("http_requests_in_progress", **labels) == 0
+
+
+@pytest.mark.asyncio
+async def test_unmatched_paths_share_one_series():
+    app, _ = _app()
+    labels = {"method": "GET", "endpoint": UNMATCHED_ROUTE, "status": "404"}
+    before = _sample("http_requests_total", **labels)
+
+    await _get(app, "/nope/1", "/nope/2")
+
+    assert _sample("http_requests_total", **labels) == before + 2
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_is_internal(monkeypatch):
+    from fastapi import Depends
+
+    from app.core.config import settings
+    from app.core.performance_middleware import metrics_access
+
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    app = FastAPI()
+
+    @app.get("/metrics", dependencies=[Depends(metrics_access)])
+    async def metrics():
+        return {}
+
+    async def get(client_ip, **headers):
+        transport = httpx.ASGITransport(app=app, client=(client_ip, 5000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.get("/metrics", headers=headers)).status_code
+
+    assert await get("10.1.2.3") == 200
+    assert await get("203.0.113.7") == 403
+    # Через прокси адрес соединения внутренний, но запрос внешний
+    assert await get("10.1.2.3", **{"X-Forwarded-For": "203.0.113.7"}) == 403
+    assert await get("203.0.113.7", Authorization="Bearer wrong") == 403
+    assert await get("203.0.113.7", Authorization="Bearer scrape-secret") == 200
@@ -0,0 +1,101 @@
+"""
+Тесты курсорной пагинации (app.core.pagination) и её использования в /wallet/history
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.core.exceptions import ValidationException
+from app.core.pagination import Keyset, PageParams, estimate_total, paginate
+from app.models.transaction import Transaction
+
+HISTORY = Keyset(Transaction.created_at, Transaction.id, descending=True)
+
+
+@pytest.fixture
+def transactions(db_session):
+    start = datetime(2025, 1, 1)
+    # Одинаковое время у пар операций: порядок внутри пары решает id
+    rows = [
+        Transaction(
+            user_id=1 if i < 7 else 2, type="topup", amount=Decimal("10.00") + i,
+            status="completed" if i % 2 else "pending", created_at=start + timedelta(hours=i // 2)
+        )
+        for i in range(9)
+    ]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+def _walk(db_session, limit, **filters):
+    query = db_session.query(Transaction).filter_by(**filters)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = paginate(query, HISTORY, PageParams(cursor=cursor, limit=limit))
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            return seen
+
+
+def test_pages_cover_all_rows_in_order(db_session, transactions):
+    expected = [
+        t.id for t in sorted(transactions[:7], key=lambda t: (t.created_at, t.id), reverse=True)
+    ]
+    assert _walk(db_session, limit=3, user_id=1) == expected
+    assert _walk(db_session, limit=7, user_id=1) == expected
+
+
+def test_cursor_is_bound_to_listing():
+    cursor = Keyset(Transaction.id).encode(Transaction(id=5))
+    assert Keyset(Transaction.id).decode(cursor) == (5,)
+    for bad in (cursor, "not-a-cursor"):
+        with pytest.raises(ValidationException):
+            HISTORY.decode(bad)
+
+
+def test_estimate_total_falls_back_to_count(db_session, transactions):
+    assert estimate_total(db_session, db_session.query(Transaction).filter_by(user_id=1)) == 7
+
+
+def test_wallet_history_endpoint(client, transactions):
+    first = client.get("/api/v1/wallet/history", params={"user_id": 1, "limit": 4, "include_total": True})
+    assert first.status_code == 200
+    body = first.json()
+    assert len(body["items"]) == 4 and body["has_more"] and body["total"] == 7
+
+    rest = client.get(
+        "/api/v1/wallet/history", params={"user_id": 1, "limit": 4, "cursor": body["next_cursor"]}
+    ).json()
+    assert len(rest["items"]) == 3 and rest["next_cursor"] is None and rest["total"] is None
+    assert {item["id"] for item in body["items"]}.isdisjoint(item["id"] for item in rest["items"])
+
+    assert client.get("/api/v1/wallet/history", params={"user_id": 1, "cursor": "garbage"}).status_code == 422
+
+
+def test_keyset_pages_across_null_values(db_session):
+    from app.api.partners import _search_keyset
+    from app.models.partner import Partner
+    from app.schemas.partner import PartnerSortRequest
+
+    rates = [7.5, None, 3.0, None, 7.5, 0.0, None, 12.0, 3.0]
+    db_session.add_all([
+        Partner(id=i + 1, name=f"Партнёр {i}", max_discount_percent=10, default_cashback_rate=rate)
+        for i, rate in enumerate(rates)
+    ])
+    db_session.flush()
+    # None при INSERT заменяется значением по умолчанию столбца — NULL ставим явно
+    db_session.query(Partner).filter(Partner.id.in_([2, 4, 7])).update({"default_cashback_rate": None})
+    db_session.commit()
+    keyset = _search_keyset(PartnerSortRequest(sort_by="cashback", sort_order="desc"))
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = paginate(db_session.query(Partner), keyset, PageParams(cursor=cursor, limit=2))
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+    # NULL идёт как 0: ни одна строка не пропущена и не повторена
+    expected = sorted(range(1, 10), key=lambda id: (rates[id - 1] or 0.0, id), reverse=True)
+    assert seen == expected
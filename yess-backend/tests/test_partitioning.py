@@ -0,0 +1,43 @@
+"""
+Тесты помесячного секционирования (app.core.partitioning): имена, границы и SQL секций
+"""
+from datetime import date
+
+from sqlalchemy import create_engine
+
+from app.core.partitioning import (
+    PartitionSpec,
+    add_months,
+    create_partition_sql,
+    maintain_partitions,
+    partition_month,
+    partition_name,
+)
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert add_months(date(2025, 1, 1), -36) == date(2022, 1, 1)
+
+
+def test_partition_names_round_trip():
+    assert partition_name("transactions", date(2025, 3, 1)) == "transactions_y2025m03"
+    assert partition_month("transactions_y2025m03") == date(2025, 3, 1)
+    assert partition_month("transactions_default") is None
+
+
+def test_partition_bounds():
+    assert create_partition_sql(PartitionSpec("transactions", "created_at"), date(2025, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS transactions_y2025m12 PARTITION OF transactions "
+        "FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')"
+    )
+    # analytics_events: epoch-секунды начала месяцев в UTC
+    assert create_partition_sql(PartitionSpec("analytics_events", "timestamp", epoch=True), date(2025, 1, 1)) == (
+        "CREATE TABLE IF NOT EXISTS analytics_events_y2025m01 PARTITION OF analytics_events "
+        "FOR VALUES FROM (1735689600) TO (1738368000)"
+    )
+
+
+def test_maintenance_is_noop_outside_postgresql():
+    assert maintain_partitions(create_engine("sqlite://")) == {}
@@ -0,0 +1,160 @@
+"""
+Тесты наблюдаемости SQL: запросы на HTTP-запрос (query_collector), статистика по отпечаткам
+(query_stats) и планы медленных запросов (query_plans)
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.core.query_collector import QueryBudgetExceeded, collect_queries, fingerprint
+from app.core.query_plans import PlanCapture, seq_scans, to_pyformat
+from app.core.query_stats import QueryStats, QueryStatsCollector, query_stats
+from app.models.partner import Partner, PartnerLocation
+
+
+@pytest.fixture
+def locations(db_session):
+    """Шесть точек шести разных партнёров"""
+    for i in range(1, 7):
+        partner = Partner(name=f"Партнёр {i}", category="food", max_discount_percent=10, is_active=True)
+        partner.locations.append(PartnerLocation(address=f"ул. Киевская, {i}", is_active=True))
+        db_session.add(partner)
+    db_session.commit()
+    db_session.expunge_all()
+
+
+def test_fingerprint_strips_literals_and_params():
+    assert fingerprint("SELECT * FROM partners WHERE id = 42 AND name = 'Кафе'") == \
+        fingerprint("SELECT *  FROM partners\n WHERE id = 7 AND name = 'Аптека'")
+    assert fingerprint("SELECT id FROM partners WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == \
+        "SELECT id FROM partners WHERE id IN (?)"
+    assert fingerprint("SELECT now()::text WHERE a = :a") == "SELECT now()::text WHERE a = ?"
+
+
+def test_lazy_loading_is_flagged_as_n_plus_one(db_session, locations):
+    with collect_queries() as queries:
+        for location in db_session.query(PartnerLocation).all():
+            location.partner.name
+
+    assert queries.count == 7
+    assert [count for _, count in queries.repeated()] == [6]
+
+
+def test_partner_locations_headers(client, locations, monkeypatch):
+    response = client.get("/api/v1/partners/locations")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 6
+    assert response.headers["X-DB-Queries"] == "1"
+    # Server-Timing — только внутренним клиентам (app.core.request_timing)
+    assert "Server-Timing" not in response.headers
+
+    monkeypatch.setattr(settings, "SERVER_TIMING_TOKEN", "secret")
+    response = client.get("/api/v1/partners/locations?partner_id=1", headers={"X-Server-Timing-Token": "secret"})
+    assert "db;dur=" in response.headers["Server-Timing"]
+
+
+def test_query_budget_exceeded_fails_in_strict_mode(client, locations, monkeypatch):
+    monkeypatch.setitem(settings.DB_QUERY_BUDGETS, "GET /api/v1/partners/locations", 0)
+
+    with pytest.raises(QueryBudgetExceeded):
+        client.get("/api/v1/partners/locations")
+
+
+class TestQueryStats:
+    def test_aggregates_by_fingerprint(self):
+        stats = QueryStats(max_fingerprints=10, samples=100)
+        for i in range(1, 101):
+            stats.record(f"SELECT * FROM partners WHERE id = {i}", i / 1000, rows=1)
+        stats.record("UPDATE wallets SET balance = 5 WHERE user_id = 1", 0.5, rows=1)
+
+        top = stats.top(sort_by="calls")
+        assert top[0]["query"] == "SELECT * FROM partners WHERE id = ?"
+        assert top[0]["calls"] == 100 and top[0]["rows"] == 100
+        assert top[0]["max"] == pytest.approx(0.1)
+        assert top[0]["mean"] == pytest.approx(0.0505)
+        assert top[0]["p95"] == pytest.approx(0.096)
+        assert stats.top(sort_by="max")[0]["query"].startswith("UPDATE wallets")
+
+    def test_memory_is_bounded_by_evicting_cheapest(self):
+        stats = QueryStats(max_fingerprints=3, samples=10)
+        stats.record("SELECT a FROM t1", 1.0)
+        stats.record("SELECT b FROM t2", 0.001)
+        stats.record("SELECT c FROM t3", 0.5)
+        stats.record("SELECT d FROM t4", 0.2)
+
+        queries = {row["query"] for row in stats.top()}
+        assert queries == {"SELECT a FROM t1", "SELECT c FROM t3", "SELECT d FROM t4"}
+        assert stats.summary()["evicted"] == 1
+
+    def test_frequent_query_survives_churn(self):
+        # Space-Saving: частый, но по отдельности дешёвый запрос не вытесняется с нуля
+        # каждым новым разовым запросом
+        stats = QueryStats(max_fingerprints=3, samples=10)
+        for i in range(100):
+            stats.record(f"SELECT x FROM once_{i}", 0.05)
+            stats.record("SELECT hot FROM h", 0.04)
+
+        top = stats.top()
+        assert top[0]["query"] == "SELECT hot FROM h"
+        assert top[0]["calls"] == 100 and top[0]["total"] == pytest.approx(4.0)
+        # У наследников вытесненных — погрешность, оценка точного времени total - error
+        assert all(row["total"] - row["error"] == pytest.approx(0.05) for row in top[1:])
+        assert stats.summary()["evicted"] == 98
+
+    def test_engine_hook_and_prometheus_export(self, db_session):
+        query_stats.reset()
+        for i in range(3):
+            db_session.query(Partner).filter(Partner.id == i).all()
+
+        row = next(row for row in query_stats.top() if "FROM partners" in row["query"])
+        assert row["calls"] == 3
+        families = {family.name: family for family in QueryStatsCollector(query_stats).collect()}
+        samples = families["db_statement_calls"].samples
+        assert any(sample.labels["query_id"] == row["query_id"] and sample.value == 3 for sample in samples)
+
+
+class TestSlowQueryPlans:
+    PLAN = [{"Plan": {
+        "Node Type": "Hash Join",
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "transactions"},
+            {"Node Type": "Index Scan", "Relation Name": "partners"},
+            {"Node Type": "Seq Scan", "Relation Name": "cities"},
+        ],
+    }}]
+
+    @staticmethod
+    def _capture(explained):
+        capture = PlanCapture(buffer_size=2, interval=300)
+        capture._explain = lambda engine, statement, parameters: explained.append((statement, parameters)) or \
+            TestSlowQueryPlans.PLAN
+        capture._executor = SimpleNamespace(submit=lambda fn, *args: fn(*args))
+        return capture
+
+    def test_seq_scans_on_watched_tables(self):
+        assert seq_scans(self.PLAN, ["transactions", "partners"]) == ["transactions"]
+
+    def test_to_pyformat_converts_asyncpg_params(self):
+        statement, parameters = to_pyformat("SELECT * FROM t WHERE a = $2 AND b LIKE '%x' AND c = $1", ("c", "a"))
+        assert statement == "SELECT * FROM t WHERE a = %s AND b LIKE '%%x' AND c = %s"
+        assert parameters == ("a", "c")
+
+    def test_capture_is_rate_limited_per_fingerprint(self):
+        explained = []
+        capture = self._capture(explained)
+        engine = SimpleNamespace(dialect=SimpleNamespace(name="postgresql", driver="psycopg2"))
+
+        capture.maybe_capture(engine, "SELECT * FROM transactions WHERE user_id = %(id)s", {"id": 1}, 0.9)
+        capture.maybe_capture(engine, "SELECT * FROM transactions WHERE user_id = %(id)s", {"id": 2}, 0.8)
+        capture.maybe_capture(engine, "UPDATE transactions SET status = 'x'", {}, 2.0)
+
+        assert explained == [("SELECT * FROM transactions WHERE user_id = %(id)s", {"id": 1})]
+        assert capture.recent(flagged_only=True)[0]["seq_scans"] == ["transactions"]
+
+    def test_ring_buffer_is_bounded(self):
+        capture = self._capture([])
+        for i in range(5):
+            capture.add(f"SELECT {i}", self.PLAN, 1.0)
+        assert [plan["query"] for plan in capture.recent()] == ["SELECT 4", "SELECT 3"]
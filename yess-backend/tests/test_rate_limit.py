@@ -0,0 +1,107 @@
+"""
+Тесты распределённого rate limiting (app.core.rate_limit): Lua GCRA в Redis,
+локальный fallback, политики по путям и заголовки RateLimit-*
+"""
+import httpx
+import jwt
+import pytest
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.rate_limit import (
+    Limit,
+    LocalLimiter,
+    RateLimiter,
+    RateLimitMiddleware,
+    client_identity,
+    policy_for,
+)
+
+PER_MINUTE = [Limit(3, 60)]
+
+
+async def _hits(limiter, count, keys=("rl:test:60:ip:1",), limits=PER_MINUTE):
+    return [await limiter.hit(list(keys), limits) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_redis_limit_is_shared_between_workers(redis_cache):
+    # Два лимитера на одном Redis — как два воркера gunicorn
+    first, second = RateLimiter(redis_cache), RateLimiter(redis_cache)
+    results = await _hits(first, 2) + await _hits(second, 2)
+
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert 0 < results[-1].retry_after <= 20
+    assert results[-1].headers()["Retry-After"] == str(int(results[-1].retry_after + 0.999))
+
+
+@pytest.mark.asyncio
+async def test_all_limits_are_checked_atomically(redis_cache):
+    limiter = RateLimiter(redis_cache)
+    limits = [Limit(10, 60), Limit(2, 3600)]
+    keys = ["rl:test:60:user:1", "rl:test:3600:user:1"]
+    results = await _hits(limiter, 2, keys, limits)
+    minute_tat = await redis_cache.redis.get(keys[0])
+    results += await _hits(limiter, 1, keys, limits)
+
+    assert [r.allowed for r in results] == [True, True, False]
+    assert results[0].limit == Limit(2, 3600)  # Заголовки — по самому строгому лимиту
+    # Отклонённый запрос не списывается и с минутного лимита
+    assert await redis_cache.redis.get(keys[0]) == minute_tat
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_limits_without_redis(redis_cache):
+    redis_cache.enabled = False
+    limiter = RateLimiter(redis_cache, LocalLimiter(max_keys=2))
+    assert [r.allowed for r in await _hits(limiter, 4)] == [True, True, True, False]
+
+    # Число ключей в памяти ограничено
+    for ip in range(5):
+        await _hits(limiter, 1, keys=(f"rl:test:60:ip:{ip}",))
+    assert len(limiter.local._tats) == 2
+
+
+def test_policies_and_identity():
+    assert policy_for("/api/v1/auth/login") == ("/api/v1/auth/login", [Limit(5, 60), Limit(30, 3600)])
+    assert policy_for("/api/v1/partners/list")[0] == "default"
+
+    token = jwt.encode({"sub": "42"}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    scope = {"headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1)}
+    assert client_identity(scope) == "user:42"
+    scope["headers"] = [(b"authorization", b"Bearer forged")]
+    assert client_identity(scope) == "ip:10.0.0.1"
+
+
+def test_policies_match_real_routes():
+    from app.main import app
+
+    paths = list(app.openapi()["paths"])
+    policies = {path: policy_for(path)[0] for path in paths}
+    # Каждая политика срабатывает хотя бы для одного реального маршрута
+    assert set(settings.RATE_LIMIT_POLICIES) <= set(policies.values())
+    assert policies["/api/v1/auth/login/json"] == "/api/v1/auth/login"
+    assert policies["/api/v1/auth/me"] == "default"
+    assert [path for path in paths if path.endswith("/pay")] == ["/api/v1/qr/qr/pay"]
+    assert policies["/api/v1/qr/qr/pay"] == "/api/v1/qr/qr/pay"
+    assert all(policy != "default" for path, policy in policies.items() if "webhook" in path)
+
+
+@pytest.mark.asyncio
+async def test_middleware_sets_headers_and_rejects(redis_cache, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_POLICIES", {"/limited": ["2/minute"]})
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(redis_cache))
+
+    @app.get("/limited")
+    async def limited():
+        return {"ok": True}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        ok, last_ok, rejected = [await client.get("/limited") for _ in range(3)]
+    assert ok.headers["RateLimit-Limit"] == "2" and ok.headers["RateLimit-Remaining"] == "1"
+    assert last_ok.headers["RateLimit-Remaining"] == "0"
+    assert rejected.status_code == 429 and int(rejected.headers["Retry-After"]) > 0
@@ -0,0 +1,67 @@
+"""
+Тесты разбивки времени запроса по участкам (app.core.request_timing) и Server-Timing
+"""
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core.performance_middleware import PerformanceMonitoringMiddleware
+from app.core.request_timing import record_span, span, track_request
+
+
+def test_nested_spans_are_exclusive():
+    def query(seconds):
+        started = time.perf_counter()
+        time.sleep(seconds)
+        record_span("db", time.perf_counter() - started)
+
+    with track_request() as timings:
+        with span("auth"):
+            time.sleep(0.01)
+            query(0.005)
+        query(0.005)
+        breakdown = timings.breakdown()
+
+    # db внутри auth вычитается из auth, сумма участков равна total
+    assert breakdown["db"] >= 0.01
+    assert 0.01 <= breakdown["auth"] < breakdown["total"] - breakdown["db"]
+    assert sum(value for name, value in breakdown.items() if name != "total") == pytest.approx(breakdown["total"])
+
+    # Вне запроса участки не пишутся
+    with span("auth"):
+        record_span("db", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header_only_for_internal_clients():
+    app = FastAPI()
+
+    @app.get("/qr/pay")
+    async def pay():
+        with span("auth"):
+            record_span("db", 0.002)
+        return {"ok": True}
+
+    async def get(client_ip):
+        transport = httpx.ASGITransport(app=PerformanceMonitoringMiddleware(app), client=(client_ip, 5000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/qr/pay")
+
+    def observed():
+        return REGISTRY.get_sample_value(
+            "http_request_span_duration_seconds_count", {"method": "GET", "endpoint": "/qr/pay", "span": "db"}
+        ) or 0
+
+    before = observed()
+    internal = await get("127.0.0.1")
+    external = await get("203.0.113.5")
+
+    names = [item.split(";")[0] for item in internal.headers["Server-Timing"].split(", ")]
+    assert names == ["db", "auth", "app", "total"]
+    assert "db;dur=2.0" in internal.headers["Server-Timing"]
+    assert "Server-Timing" not in external.headers
+    # В гистограмму участки пишутся для всех запросов
+    assert observed() == before + 2
@@ -0,0 +1,42 @@
+"""
+Тесты быстрого пути JSON-ответов (app.core.responses) и переведённых на него эндпоинтов
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from app.core.responses import ORJSONResponse
+from app.models.partner import Partner, PartnerLocation
+
+
+def test_orjson_response_renders_non_json_types():
+    response = ORJSONResponse({"at": datetime(2026, 1, 2, 3, 4, 5), "amount": Decimal("10.50"), 1: "Кафе"})
+
+    assert json.loads(response.body) == {"at": "2026-01-02T03:04:05", "amount": "10.50", "1": "Кафе"}
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_partner_catalog_rows_are_serialized_directly(client, db_session):
+    partner = Partner(name="Кафе", category="food", max_discount_percent=15, is_active=True)
+    partner.locations.append(PartnerLocation(
+        address="ул. Киевская, 1", latitude=42.87, longitude=74.59,
+        working_hours={"mon": "9:00-18:00"}, is_active=True
+    ))
+    db_session.add_all([partner, Partner(name="Без категории", max_discount_percent=5)])
+    db_session.commit()
+
+    locations = client.get("/api/v1/partners/locations").json()
+    categories = client.get("/api/v1/partners/categories").json()
+
+    assert locations == [{
+        "id": partner.locations[0].id,
+        "address": "ул. Киевская, 1",
+        "latitude": 42.87,
+        "longitude": 74.59,
+        "phone_number": None,
+        "working_hours": {"mon": "9:00-18:00"},
+        "partner_id": partner.id,
+        "partner_name": "Кафе",
+        "max_discount_percent": 15.0,
+    }]
+    assert categories == [{"name": "food"}]
@@ -0,0 +1,73 @@
+"""
+Тесты блокировки IP (app.core.security_middleware): ограниченный счётчик в памяти,
+общие счётчики в Redis и чистый ASGI middleware
+"""
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.core.config import settings
+from app.core.security_middleware import IPAttemptTracker, SecurityMiddleware
+
+
+@pytest.mark.asyncio
+async def test_local_tracker_is_bounded_and_expires():
+    tracker = IPAttemptTracker(max_attempts=2, block_duration=300, max_ips=3, shared=False)
+
+    for i in range(5):
+        await tracker.track(f"10.0.0.{i}")
+    await tracker.track("10.0.0.4")
+    assert (await tracker.is_blocked("10.0.0.4"), await tracker.is_blocked("10.0.0.3")) == (True, False)
+    assert len(tracker) == 3
+    assert "10.0.0.0" not in tracker._attempts
+
+    tracker.evict_expired(time.time() + 301)
+    assert len(tracker) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_block_is_shared_between_workers(redis_cache):
+    first = IPAttemptTracker(max_attempts=3, block_duration=300, cache=redis_cache, shared=True)
+    second = IPAttemptTracker(max_attempts=3, block_duration=300, cache=redis_cache, shared=True)
+
+    assert not await second.is_blocked("10.0.0.1")
+    counts = [await first.track("10.0.0.1") for _ in range(3)]
+    # "Не заблокирован" закэширован во втором воркере на SECURITY_BLOCK_CHECK_INTERVAL
+    second._attempts["10.0.0.1"].checked_until = 0
+    assert counts == [1, 2, 3]
+    assert await second.is_blocked("10.0.0.1")
+    assert 0 < await redis_cache.redis.pttl("sec:ip:10.0.0.1") <= 300_000
+
+    await first.reset("10.0.0.1")
+    assert await redis_cache.redis.exists("sec:ip:10.0.0.1") == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_blocks_after_failed_attempts(monkeypatch):
+    monkeypatch.setattr(settings, "DEVELOPMENT_MODE", False)
+    monkeypatch.setenv("ENVIRONMENT", "production")
+    app = FastAPI()
+    app.add_middleware(
+        SecurityMiddleware,
+        tracker=IPAttemptTracker(max_attempts=3, block_duration=300, shared=False)
+    )
+
+    @app.get("/login")
+    async def login(ok: bool = False):
+        if not ok:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        return {"ok": True}
+
+    transport = httpx.ASGITransport(app=app, client=("203.0.113.5", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        reset = [(await client.get(path)).status_code for path in ("/login", "/login", "/login?ok=1")]
+        failed = [(await client.get("/login")).status_code for _ in range(4)]
+        blocked = await client.get("/login?ok=1")
+        options = (await client.options("/login")).status_code
+    # Успешный ответ сбрасывает счётчик
+    assert reset == [401, 401, 200]
+    assert failed == [401, 401, 401, 403]
+    assert blocked.status_code == 403 and blocked.json() == {"detail": "IP temporarily blocked"}
+    assert options != 403
@@ -0,0 +1,123 @@
+"""
+Тесты пространственного индекса точек партнёров (app.services.spatial_index)
+"""
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.models.partner import Partner, PartnerLocation
+from app.services import spatial_index
+from app.services.spatial_index import GridIndex, PartnerLocationIndex, haversine_km
+
+
+CACHE_SERVICE_MODULES = [spatial_index]
+
+
+@pytest.fixture(autouse=True)
+def poll_on_every_request(monkeypatch):
+    monkeypatch.setattr(settings, "SPATIAL_INDEX_POLL_INTERVAL", 0.0)
+
+
+def test_grid_matches_brute_force():
+    rng = random.Random(7)
+    points = {i: (i % 50, rng.uniform(42.7, 43.0), rng.uniform(74.4, 74.8)) for i in range(2000)}
+    grid = GridIndex(cell_km=0.7)
+    for location_id, (partner_id, lat, lon) in points.items():
+        grid.upsert(location_id, partner_id, lat, lon)
+    # Перенос и удаление точек
+    for location_id in range(0, 2000, 10):
+        points[location_id] = (points[location_id][0], rng.uniform(42.7, 43.0), rng.uniform(74.4, 74.8))
+        grid.upsert(location_id, *points[location_id])
+    for location_id in range(5, 2000, 10):
+        del points[location_id]
+        grid.remove(location_id)
+    assert len(grid) == len(points)
+
+    def brute(lat, lon):
+        return sorted(
+            (haversine_km(lat, lon, point_lat, point_lon), location_id, partner_id)
+            for location_id, (partner_id, point_lat, point_lon) in points.items()
+        )
+
+    for _ in range(20):
+        lat, lon = rng.uniform(42.7, 43.0), rng.uniform(74.4, 74.8)
+        expected = brute(lat, lon)
+        radius = rng.uniform(0.1, 5.0)
+        assert grid.within(lat, lon, radius) == [hit for hit in expected if hit[0] <= radius]
+        assert grid.nearest(lat, lon, 10) == expected[:10]
+    # Дальше max_km ближайшие не ищутся
+    assert grid.nearest(0.0, 0.0, 5, max_km=100) == []
+
+
+@pytest.mark.asyncio
+async def test_index_follows_change_stream(cache_service, db_session):
+    partner = Partner(id=1, name="Кафе", max_discount_percent=10, is_active=True)
+    closing = Partner(id=2, name="Закрывается", max_discount_percent=10, is_active=True)
+    db_session.add_all([
+        partner, closing,
+        PartnerLocation(id=1, partner_id=1, latitude=42.8746, longitude=74.5698, is_active=True),
+        PartnerLocation(id=2, partner_id=1, latitude=42.8800, longitude=74.5800, is_active=True),
+        PartnerLocation(id=3, partner_id=2, latitude=42.8750, longitude=74.5700, is_active=True),
+    ])
+    db_session.commit()
+
+    # Другой воркер: о commit этого процесса узнаёт только из потока Redis
+    index = PartnerLocationIndex()
+
+    async def nearby():
+        await cache_service.drain_background()  # XADD после commit в потоке loop — фоновая задача
+        assert await index.ensure_fresh(db_session)
+        if index._reload_task is not None:
+            await index._reload_task  # Перезагрузка готовой сетки идёт в фоне
+        return [location_id for _, location_id, _ in index.within(42.8746, 74.5698, 3.0)]
+
+    assert await nearby() == [1, 3, 2]
+
+    db_session.get(PartnerLocation, 2).latitude = 43.5  # Уехала за радиус
+    db_session.get(Partner, 2).is_active = False
+    db_session.add(PartnerLocation(id=4, partner_id=1, latitude=42.8747, longitude=74.5699, is_active=True))
+    db_session.commit()
+    loaded_at = index.loaded_at
+    assert await nearby() == [1, 4]
+    assert index.loaded_at == loaded_at  # Перечитаны только изменённые точки
+
+    db_session.delete(db_session.get(PartnerLocation, 4))
+    db_session.commit()
+    assert await nearby() == [1]
+
+    # Массовый UPDATE — полная перезагрузка
+    db_session.query(Partner).filter(Partner.id == 2).update({"is_active": True})
+    db_session.commit()
+    assert await nearby() == [1, 3]
+    assert index.loaded_at > loaded_at
+
+
+@pytest.mark.asyncio
+async def test_reload_of_ready_grid_runs_in_background(cache_service, db_session):
+    db_session.add_all([
+        Partner(id=1, name="Кафе", max_discount_percent=10, is_active=True),
+        PartnerLocation(id=1, partner_id=1, latitude=42.87, longitude=74.57, is_active=True),
+    ])
+    db_session.commit()
+    index = PartnerLocationIndex()
+
+    assert await index.ensure_fresh(db_session)  # Первая загрузка — в самом запросе
+    first = index.grid
+    index.loaded_at -= settings.SPATIAL_INDEX_MAX_AGE
+    assert await index.ensure_fresh(db_session)
+    assert index.grid is first  # Запрос не ждал перезагрузки
+    await index._reload_task
+    assert index.grid is not first and len(index.grid) == 1
+
+
+@pytest.mark.asyncio
+async def test_commit_on_event_loop_publishes_in_background(cache_service, db_session):
+    db_session.add(Partner(id=1, name="Кафе", max_discount_percent=10, is_active=True))
+    db_session.commit()
+
+    db_session.add(PartnerLocation(id=1, partner_id=1, latitude=42.87, longitude=74.57, is_active=True))
+    db_session.commit()
+    await cache_service.drain_background()
+    entries = await cache_service.async_redis.xrange(spatial_index.STREAM_KEY)
+    assert entries[-1][1]["locations"] == "1"